@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark del broadcast particionado contra el stand-in local de FCM
+Carga ``--devices`` devices en un SQLite temporal y envía el mismo broadcast
+con 1, 2, 4... procesos worker (BROADCAST_WORKERS): cada uno lee su rango
+MOD(id, N) en lotes y envía con su propio transport fcm_http (HTTP/2 h2c al
+stand-in, que corre en otro proceso). La escala esperada es casi lineal
+mientras haya un core libre por worker; con menos cores que workers el
+resultado solo muestra el overhead del reparto.
+
+Uso:
+    python benchmarks/bench_broadcast.py
+    python benchmarks/bench_broadcast.py --devices 100000 --workers 1 2 4 8 --latency-ms 10
+    python benchmarks/bench_broadcast.py --transport fake --latency-ms 2
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.standins import serve_fcm_standin, sqlite_standin, standin_service_account  # noqa: E402
+from config import Settings  # noqa: E402
+from services.broadcast import partitioned_broadcast  # noqa: E402
+from services.push_transport import PushMessage  # noqa: E402
+
+
+def load_devices(directory: str, devices: int, users: int) -> str:
+    """Devices repartidos entre ``users`` usuarios; devuelve la ruta del SQLite"""
+    repository = sqlite_standin(directory)
+    tables = repository.tables
+    with repository.connection() as connection:
+        connection.executemany(
+            f"INSERT INTO {tables.users} (username, email, password_hash) VALUES (?, ?, ?)",
+            [(f"bench_user_{i}", f"bench_user_{i}@example.com", "hash") for i in range(users)],
+        )
+        connection.executemany(
+            f"INSERT INTO {tables.devices} (user_id, device_id, fcm_token) VALUES (?, ?, ?)",
+            [(i % users + 1, f"bench-device-{i}", f"bench-token-{i}-" + "x" * 120) for i in range(devices)],
+        )
+        connection.commit()
+    repository.close()
+    return os.path.join(directory, "push_notifications.db")
+
+
+def run(settings: Settings, workers: int, devices: int) -> dict:
+    message = PushMessage("Benchmark", "Mensaje de prueba", {"type": "push_notification"})
+    wall = time.perf_counter()
+    result = asyncio.run(partitioned_broadcast(settings, message, "normal", workers))
+    wall = time.perf_counter() - wall
+    return {
+        "sends_per_s": round(result.success_count / wall),
+        "wall_s": round(wall, 3),
+        "success": result.success_count,
+        # Incluye los tokens de una partición que no llegó a reportar
+        "failures": devices - result.success_count,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partitioned broadcast across worker processes benchmark")
+    parser.add_argument("--devices", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4], help="BROADCAST_WORKERS values")
+    parser.add_argument("--transport", choices=["fcm_http", "fake"], default="fcm_http")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Stand-in FCM response latency")
+    parser.add_argument("--in-flight", type=int, default=256, help="PUSH_MAX_IN_FLIGHT per worker")
+    parser.add_argument("--batch-size", type=int, default=1000, help="BROADCAST_BATCH_SIZE")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="push-bench-")
+    settings = Settings(storage_backend="sqlite", sqlite_path=load_devices(directory, args.devices, args.users),
+                        push_transport=args.transport, push_max_in_flight=args.in_flight,
+                        push_concurrency=args.in_flight, push_log_enabled=False,
+                        broadcast_batch_size=args.batch_size, log_file="", log_console=False)
+
+    standin = None
+    if args.transport == "fcm_http":
+        urls = multiprocessing.Queue()
+        standin = multiprocessing.Process(target=serve_fcm_standin, args=(args.latency_ms, urls), daemon=True)
+        standin.start()
+        http1_url, h2_url = urls.get(timeout=30)
+        settings.firebase_credentials_path = standin_service_account(directory, f"{http1_url}/token")
+        settings.fcm_http_endpoint = h2_url
+    else:
+        settings.fake_fcm_latency_ms = args.latency_ms
+
+    report = {"meta": {"devices": args.devices, "transport": args.transport, "latency_ms": args.latency_ms,
+                       "in_flight": args.in_flight, "cpus": os.cpu_count(), "python": sys.version.split()[0]},
+              "workers": {}}
+    try:
+        for workers in args.workers:
+            report["workers"][str(workers)] = run(settings, workers, args.devices)
+    finally:
+        if standin is not None:
+            standin.terminate()
+    base = report["workers"].get(str(args.workers[0]), {}).get("sends_per_s")
+    for result in report["workers"].values():
+        result["speedup"] = round(result["sends_per_s"] / base, 2) if base else None
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
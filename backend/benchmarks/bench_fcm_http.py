@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark de transports FCM reales contra un stand-in local
+Envía el mismo fan-out con firebase_admin (threadpool, requests HTTP/1.1) y
+con el transport fcm_http (httpx async, HTTP/2 multiplexado) a un FCM HTTP
+v1 local que responde con latencia fija. Ambos pasan por el PushScheduler
+con la misma capacidad y obtienen el access token OAuth del stand-in. El
+stand-in corre en otro proceso: el CPU medido es solo el del cliente.
+
+Uso:
+    python benchmarks/bench_fcm_http.py
+    python benchmarks/bench_fcm_http.py --tokens 20000 --in-flight 64 256 --latency-ms 30
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.standins import serve_fcm_standin, standin_service_account  # noqa: E402
+from services.fanout import fan_out  # noqa: E402
+from services.push_transport import FCMHttpTransport, FirebaseTransport, PushMessage  # noqa: E402
+from services.scheduler import PushScheduler  # noqa: E402
+
+
+def firebase_transport(http1_url: str, service_account: str, pool_size: int) -> FirebaseTransport:
+    """firebase_admin apuntado al stand-in: la URL de FCM está fija en el SDK"""
+    import firebase_admin
+    from firebase_admin import credentials, messaging
+    from requests.adapters import HTTPAdapter
+
+    app = firebase_admin.initialize_app(credentials.Certificate(service_account), name=f"bench-{pool_size}")
+    service = messaging._get_messaging_service(app)
+    service._fcm_url = f"{http1_url}/v1/projects/standin/messages:send"
+    # El SDK monta su pool de 100 conexiones solo para fcm.googleapis.com
+    service._client.session.mount(http1_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    transport = FirebaseTransport(service_account)
+    transport._app = app
+    return transport
+
+
+async def run(transport, tokens, in_flight: int) -> dict:
+    scheduler = PushScheduler(capacity=in_flight, reserved_high=0)
+    message = transport.prepare(PushMessage("Benchmark", "Mensaje de prueba", {"type": "push_notification"}))
+    await asyncio.to_thread(transport.warmup)
+
+    if transport.asynchronous:
+        async def send_one(token: str) -> str:
+            return await transport.send_async(token, message)
+    else:
+        def send_one(token: str) -> str:
+            return transport.send(token, message)
+
+    # Calentamiento: conexiones abiertas y access token antes de medir
+    await fan_out(tokens[:in_flight], send_one, concurrency=in_flight, scheduler=scheduler)
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    result = await fan_out(tokens, send_one, concurrency=in_flight, scheduler=scheduler)
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    threads = threading.active_count()
+
+    closing = transport.close()
+    if closing is not None:
+        await closing
+    scheduler.close()
+    return {
+        "sends_per_s": round(len(tokens) / wall),
+        "wall_s": round(wall, 3),
+        "cpu_us_per_send": round(cpu / len(tokens) * 1e6, 1),
+        "failures": result.failure_count,
+        "threads": threads,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="firebase_admin vs async HTTP/2 FCM transport benchmark")
+    parser.add_argument("--tokens", type=int, default=5000)
+    parser.add_argument("--in-flight", type=int, nargs="*", default=[64, 256], help="PushScheduler capacity")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Stand-in FCM response latency")
+    parser.add_argument("--connections", type=int, default=2, help="HTTP/2 connections of the fcm_http pool")
+    args = parser.parse_args(argv)
+
+    urls = multiprocessing.Queue()
+    standin = multiprocessing.Process(target=serve_fcm_standin, args=(args.latency_ms, urls), daemon=True)
+    standin.start()
+    http1_url, h2_url = urls.get(timeout=30)
+    service_account = standin_service_account(tempfile.mkdtemp(prefix="push-bench-"), f"{http1_url}/token")
+    tokens = [f"bench-token-{i}-" + "x" * 120 for i in range(args.tokens)]
+
+    report = {"meta": {"tokens": args.tokens, "latency_ms": args.latency_ms, "connections": args.connections,
+                       "python": sys.version.split()[0]}, "in_flight": {}}
+    try:
+        for in_flight in args.in_flight:
+            fcm_http = FCMHttpTransport(service_account, endpoint=h2_url, connections=args.connections)
+            report["in_flight"][str(in_flight)] = {
+                "firebase_admin": asyncio.run(run(firebase_transport(http1_url, service_account, in_flight),
+                                                  tokens, in_flight)),
+                "fcm_http": asyncio.run(run(fcm_http, tokens, in_flight)),
+            }
+    finally:
+        standin.terminate()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark de CPU por request del inbox
+Mide GET /internal-notifications con 100, 1k y 10k notificaciones (app en
+proceso sobre SQLite) y compara la serialización anterior (dict por fila con
+casts + jsonable_encoder + JSONResponse) con la actual (una pasada + orjson).
+
+Uso:
+    python benchmarks/bench_inbox_cpu.py
+    python benchmarks/bench_inbox_cpu.py --sizes 100 1000 10000 --requests 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def legacy_render(rows) -> bytes:
+    """Camino anterior del endpoint, solo la parte de serialización"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    notifications = []
+    for row in rows:
+        notifications.append({
+            "id": int(row[0]) if row[0] is not None else 0,
+            "title": str(row[1]) if row[1] is not None else "",
+            "message": str(row[2]) if row[2] is not None else "",
+            "is_read": bool(row[3]) if row[3] is not None else False,
+            "created_at": row[4].isoformat() if row[4] is not None else None,
+        })
+    len([n for n in notifications if not n["is_read"]])
+    return JSONResponse(jsonable_encoder({"notifications": notifications})).body
+
+
+def fast_render(rows) -> bytes:
+    from services.responses import FastJSONResponse
+
+    notifications = []
+    unread_count = 0
+    for notification_id, title, message, is_read, created_at in rows:
+        is_read = bool(is_read)
+        unread_count += not is_read
+        notifications.append({"id": notification_id, "title": title or "", "message": message or "",
+                              "is_read": is_read, "created_at": created_at})
+    return FastJSONResponse({"notifications": notifications, "unread_count": unread_count}).body
+
+
+def cpu_per_call(fn, runs: int) -> float:
+    fn()
+    start = time.process_time()
+    for _ in range(runs):
+        fn()
+    return (time.process_time() - start) / runs
+
+
+async def endpoint_cpu(size: int, runs: int) -> dict:
+    from benchmarks.standins import install_standins, seed
+    from config import Settings
+    from main import create_app
+
+    settings = Settings(storage_backend="sqlite", push_transport="fake", startup_warmup=False,
+                        log_file=os.devnull, log_console=False)
+    app = create_app(settings)
+    standins = install_standins(app.state.ctx)
+    seed(standins["repository"], users=0, devices_per_user=0, notifications_per_user=size)
+    rows = standins["repository"].list_internal_notifications(1)
+
+    results = {
+        "serialize_legacy_ms": round(cpu_per_call(lambda: legacy_render(rows), runs) * 1000, 3),
+        "serialize_fast_ms": round(cpu_per_call(lambda: fast_render(rows), runs) * 1000, 3),
+    }
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            login = await client.post("/login", json={"username": "admin", "password": "admin123"})
+            headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+            for encoding in ("identity", "gzip"):
+                request_headers = {**headers, "Accept-Encoding": encoding}
+                response = await client.get("/internal-notifications", headers=request_headers)
+                samples = []
+                for _ in range(runs):
+                    start = time.process_time()
+                    await client.get("/internal-notifications", headers=request_headers)
+                    samples.append(time.process_time() - start)
+                results[f"request_{encoding}"] = {
+                    "cpu_ms_mean": round(statistics.fmean(samples) * 1000, 3),
+                    "cpu_ms_p50": round(statistics.median(samples) * 1000, 3),
+                    "wire_bytes": int(response.headers.get("content-length", len(response.content))),
+                }
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inbox CPU-per-request benchmark")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[100, 1000, 10000])
+    parser.add_argument("--requests", type=int, default=20, help="Measured requests per size")
+    args = parser.parse_args(argv)
+
+    report = {"meta": {"requests": args.requests, "python": sys.version.split()[0]}, "sizes": {}}
+    for size in args.sizes:
+        report["sizes"][str(size)] = asyncio.run(endpoint_cpu(size, args.requests))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
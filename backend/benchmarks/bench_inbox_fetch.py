@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark del fetch del inbox con mensajes CLOB
+Mide list_internal_notifications con N filas de mensajes cortos y largos
+
+Uso:
+    python benchmarks/bench_inbox_fetch.py                     # SQLite temporal
+    python benchmarks/bench_inbox_fetch.py --backend oracle    # Oracle del .env (crea y borra un usuario de prueba)
+    python benchmarks/bench_inbox_fetch.py --rows 1000 --long-chars 20000 --runs 20
+
+Con Oracle compara además el fetch con LOB locators (un round trip por ``read()``)
+y el TO_CHAR() anterior, que falla con mensajes de más de 4000 bytes.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from config import Settings  # noqa: E402
+from storage.repository import create_repository  # noqa: E402
+
+LEGACY_TO_CHAR_SQL = """
+    SELECT id, TO_CHAR(title), TO_CHAR(message), is_read, created_at
+    FROM {table} WHERE user_id = :1 ORDER BY created_at DESC
+"""
+LOCATOR_SQL = """
+    SELECT id, title, message, is_read, created_at
+    FROM {table} WHERE user_id = :1 ORDER BY created_at DESC
+"""
+
+
+def summarize(samples: list, rows: int) -> dict:
+    mean = statistics.fmean(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "mean_ms": round(mean * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+        "rows_per_s": round(rows / mean) if mean else None,
+    }
+
+
+def measure(fetch, runs: int) -> list:
+    fetch()  # warm-up: statement cache y páginas en memoria
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fetch()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def oracle_variants(repository, user_id: int) -> dict:
+    """Fetch sin output type handler: LOB locators y el TO_CHAR() original"""
+    table = repository.tables.internal_notifications
+
+    def locators():
+        with repository.connection() as connection:
+            connection.outputtypehandler = None
+            cursor = connection.cursor()
+            cursor.arraysize = 100
+            cursor.execute(LOCATOR_SQL.format(table=table), (user_id,))
+            return [(row[0], row[1], row[2].read(), row[3], row[4]) for row in cursor]
+
+    def to_char():
+        with repository.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(LEGACY_TO_CHAR_SQL.format(table=table), (user_id,))
+            return cursor.fetchall()
+
+    return {"lob_locators": locators, "to_char": to_char}
+
+
+def run(args) -> dict:
+    if args.backend == "sqlite":
+        settings = Settings(storage_backend="sqlite",
+                            sqlite_path=os.path.join(tempfile.mkdtemp(prefix="push-bench-"), "inbox.db"))
+    else:
+        settings = Settings.from_env()
+        settings.storage_backend = "oracle"
+
+    repository = create_repository(settings)
+    username = f"bench_inbox_{uuid.uuid4().hex[:8]}"
+    repository.create_user(username, f"{username}@example.com", "x")
+    user_id = repository.get_user_id(username)
+
+    cases = {"short": "m" * args.short_chars, "long": "é" * args.long_chars}
+    report = {
+        "meta": {
+            "backend": repository.name,
+            "rows": args.rows,
+            "runs": args.runs,
+            "short_chars": args.short_chars,
+            "long_chars": args.long_chars,
+        },
+        "cases": {},
+    }
+
+    try:
+        for case, message in cases.items():
+            with repository.connection() as connection:
+                connection.cursor().execute(
+                    f"DELETE FROM {repository.tables.internal_notifications} WHERE user_id = {int(user_id)}"
+                )
+                connection.commit()
+            for start in range(0, args.rows, 500):
+                batch = min(500, args.rows - start)
+                repository.create_internal_notifications([user_id] * batch, f"Bench {case}", message)
+
+            rows = repository.list_internal_notifications(user_id)
+            assert len(rows) == args.rows and rows[0][2] == message, "message round trip mismatch"
+
+            # En Oracle el repositorio usa lob_output_type_handler
+            variants = {"repository": lambda: repository.list_internal_notifications(user_id)}
+            if repository.name == "oracle":
+                variants.update(oracle_variants(repository, user_id))
+
+            results = {}
+            for name, fetch in variants.items():
+                try:
+                    results[name] = summarize(measure(fetch, args.runs), args.rows)
+                except Exception as e:
+                    # TO_CHAR() falla con mensajes de más de 4000 bytes (ORA-22835)
+                    results[name] = {"error": str(e).splitlines()[0]}
+            report["cases"][case] = results
+    finally:
+        with repository.connection() as connection:
+            connection.cursor().execute(f"DELETE FROM {repository.tables.users} WHERE id = {int(user_id)}")
+            connection.commit()
+        repository.close()
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inbox fetch benchmark (CLOB messages)")
+    parser.add_argument("--backend", choices=["sqlite", "oracle"], default="sqlite")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--short-chars", type=int, default=200)
+    parser.add_argument("--long-chars", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark de particionado del historial (solo Oracle)
+Crea dos copias de prueba de internal_notifications, una heap con índices
+globales (esquema anterior) y otra particionada por mes con índices LOCAL
+(ddbb/create_tables.sql), las carga con las mismas filas repartidas en
+``--months`` meses y compara:
+
+- el plan (DBMS_XPLAN con Pstart/Pstop) y el tiempo del inbox con y sin el
+  límite ``created_at >= :since`` que agrega el endpoint
+- el plan y el tiempo de un rango de fechas como el del export
+- la retención: DELETE del mes más viejo contra DROP PARTITION
+
+Las tablas se borran al terminar.
+
+Uso:
+    python benchmarks/bench_partitions.py                        # Oracle del .env
+    python benchmarks/bench_partitions.py --rows 2000000 --users 5000 --months 12 --runs 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from config import Settings  # noqa: E402
+from storage.oracle_repository import HISTORY_PARTITIONS, partition_bound  # noqa: E402
+from storage.repository import create_repository  # noqa: E402
+
+COLUMNS = """
+    id NUMBER(10) NOT NULL,
+    user_id NUMBER(10) NOT NULL,
+    title VARCHAR2(255) NOT NULL,
+    message CLOB NOT NULL,
+    is_read NUMBER(1) DEFAULT 0,
+    created_at TIMESTAMP NOT NULL,
+    CONSTRAINT {name}_pk PRIMARY KEY (id)
+"""
+LAYOUTS = {
+    "heap": {
+        "table": "",
+        "index": "CREATE INDEX {name}_user ON {name}(user_id)",
+        "range_index": "CREATE INDEX {name}_created ON {name}(created_at DESC)",
+    },
+    "partitioned": {
+        "table": """
+            PARTITION BY RANGE (created_at) INTERVAL (NUMTOYMINTERVAL(1, 'MONTH'))
+            (PARTITION p_initial VALUES LESS THAN (TIMESTAMP '2000-01-01 00:00:00'))
+        """,
+        "index": "CREATE INDEX {name}_user ON {name}(user_id, created_at DESC) LOCAL",
+        "range_index": "CREATE INDEX {name}_created ON {name}(created_at DESC) LOCAL",
+    },
+}
+# Filas repartidas uniformemente entre usuarios y meses (el mes 0 es el actual)
+LOAD_SQL = """
+    INSERT /*+ APPEND */ INTO {name} (id, user_id, title, message, is_read, created_at)
+    SELECT LEVEL, MOD(LEVEL, :users) + 1, 'Bench', 'Mensaje de prueba ' || LEVEL, MOD(LEVEL, 2),
+           CAST(:now AS TIMESTAMP) - NUMTODSINTERVAL(MOD(LEVEL, :days) * 86400 + MOD(LEVEL, 86400), 'SECOND')
+    FROM dual CONNECT BY LEVEL <= :rows_
+"""
+QUERIES = {
+    # Consulta del inbox anterior: todas las particiones
+    "inbox_unbounded": "SELECT id, title, message, is_read, created_at FROM {name} "
+                       "WHERE user_id = :1 ORDER BY created_at DESC",
+    # Consulta actual del inbox (INBOX_WINDOW_DAYS / NOTIFICATION_RETENTION_DAYS)
+    "inbox_window": "SELECT id, title, message, is_read, created_at FROM {name} "
+                    "WHERE user_id = :1 AND created_at >= :2 ORDER BY created_at DESC",
+    # Rango de fechas como el del export y el recuento de /stats
+    "date_range": "SELECT COUNT(*) FROM {name} WHERE created_at >= :1 AND created_at < :2",
+}
+
+
+def measure(cursor, sql: str, params, runs: int) -> dict:
+    cursor.execute(sql, params)
+    cursor.fetchall()  # warm-up: parse y bloques en el buffer cache
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        rows = len(cursor.fetchall())
+        samples.append(time.perf_counter() - start)
+    return {"rows": rows, "p50_ms": round(statistics.median(samples) * 1000, 3),
+            "max_ms": round(max(samples) * 1000, 3)}
+
+
+def explain(cursor, sql: str, params) -> list:
+    """Operaciones del plan con el rango de particiones leído (Pstart/Pstop)"""
+    cursor.execute(f"EXPLAIN PLAN FOR {sql}", params)
+    cursor.execute("SELECT plan_table_output FROM TABLE(DBMS_XPLAN.DISPLAY(NULL, NULL, 'BASIC +PARTITION'))")
+    return [line for (line,) in cursor if line.startswith("|") and "Operation" not in line]
+
+
+def create(cursor, name: str, layout: dict, args, now: datetime):
+    cursor.execute(f"CREATE TABLE {name} ({COLUMNS.format(name=name)}) {layout['table']}")
+    cursor.execute(LOAD_SQL.format(name=name), users=args.users, now=now, days=args.months * 30, rows_=args.rows)
+    cursor.connection.commit()
+    cursor.execute(layout["index"].format(name=name))
+    cursor.execute(layout["range_index"].format(name=name))
+    cursor.execute("BEGIN DBMS_STATS.GATHER_TABLE_STATS(USER, :1); END;", [name.upper()])
+
+
+def retention(cursor, name: str, partitioned: bool, before: datetime) -> dict:
+    """Borra todo lo anterior a ``before``: DELETE por filas o DROP PARTITION"""
+    start = time.perf_counter()
+    if not partitioned:
+        cursor.execute(f"DELETE FROM {name} WHERE created_at < :1", [before])
+        removed = cursor.rowcount
+        cursor.connection.commit()
+        return {"method": "delete", "rows": removed, "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    cursor.execute(HISTORY_PARTITIONS, [None, name.upper()])
+    dropped = 0
+    for position, partition_name, high_value in cursor.fetchall():
+        bound = partition_bound(high_value)
+        if position == 1 or bound is None:
+            continue
+        if bound > before:
+            break
+        cursor.execute(f'ALTER TABLE {name} DROP PARTITION "{partition_name}" UPDATE GLOBAL INDEXES')
+        dropped += 1
+    return {"method": "drop_partition", "partitions": dropped,
+            "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+def run(args) -> dict:
+    settings = Settings.from_env()
+    settings.storage_backend = "oracle"
+    repository = create_repository(settings)
+    now = datetime.utcnow().replace(microsecond=0)
+    since = now - timedelta(days=args.window_days)
+    range_params = [now - timedelta(days=45), now - timedelta(days=15)]
+    report = {"meta": {"rows": args.rows, "users": args.users, "months": args.months,
+                       "window_days": args.window_days, "runs": args.runs}, "layouts": {}}
+
+    names = {layout: f"{settings.db_table_prefix}bench_{layout}" for layout in LAYOUTS}
+    with repository.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            for layout, spec in LAYOUTS.items():
+                name = names[layout]
+                create(cursor, name, spec, args, now)
+                params = {"inbox_unbounded": [7], "inbox_window": [7, since], "date_range": range_params}
+                result = {}
+                for query, sql in QUERIES.items():
+                    sql = sql.format(name=name)
+                    result[query] = {"plan": explain(cursor, sql, params[query]),
+                                     **measure(cursor, sql, params[query], args.runs)}
+                # El mes más viejo entero: el siguiente límite de partición mensual
+                oldest = (now - timedelta(days=args.months * 30)).replace(day=1, hour=0, minute=0, second=0)
+                before = (oldest + timedelta(days=32)).replace(day=1)
+                result["retention"] = retention(cursor, name, layout == "partitioned", before)
+                report["layouts"][layout] = result
+        finally:
+            for name in names.values():
+                try:
+                    cursor.execute(f"DROP TABLE {name} PURGE")
+                except Exception:
+                    pass
+    repository.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Heap vs interval-partitioned history benchmark (Oracle)")
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--months", type=int, default=12, help="Months of history loaded")
+    parser.add_argument("--window-days", type=int, default=30, help="Inbox window (INBOX_WINDOW_DAYS)")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark de allocations del payload de un fan-out
+Arma los ``messaging.Message`` de un push a 100k tokens y compara el camino
+anterior (Notification, AndroidConfig, APNSConfig y data nuevos por token)
+con el template armado una vez por PushTransport.prepare. Mide memoria pico
+con tracemalloc (los mensajes de un lote viven a la vez, como en send_each),
+bloques asignados por token y tiempo de CPU.
+
+Uso:
+    python benchmarks/bench_payload_alloc.py
+    python benchmarks/bench_payload_alloc.py --tokens 100000 --batch 500
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def measure(build, tokens, batch: int) -> dict:
+    """Arma los mensajes por lotes de ``batch``; solo un lote vive a la vez"""
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    start = time.process_time()
+    blocks = 0
+    for offset in range(0, len(tokens), batch):
+        messages = [build(token) for token in tokens[offset:offset + batch]]
+        blocks += sys.getallocatedblocks() - blocks_before
+        del messages
+    elapsed = time.process_time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    batches = -(-len(tokens) // batch)
+    return {
+        "cpu_ms": round(elapsed * 1000, 1),
+        "us_per_token": round(elapsed / len(tokens) * 1e6, 3),
+        "peak_kb": round(peak / 1024, 1),
+        "blocks_per_token": round(blocks / batches / batch, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Push payload allocation benchmark")
+    parser.add_argument("--tokens", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=500, help="Messages alive at once (FCM send_each max is 500)")
+    args = parser.parse_args(argv)
+
+    from services.push_transport import HIGH, FirebaseTransport, PushMessage, fit_payload, payload_size
+
+    # Sin credenciales: build_message no toca la red ni la app de Firebase
+    transport = FirebaseTransport.__new__(FirebaseTransport)
+    message = fit_payload(PushMessage(
+        title="Resultado final",
+        body="El partido terminó 2-1 " * 20,
+        data={"click_action": "FLUTTER_NOTIFICATION_CLICK", "type": "push_notification"},
+        priority=HIGH,
+        collapse_key="score",
+    ))
+    tokens = [f"fcm-token-{i:07d}-" + "x" * 140 for i in range(args.tokens)]
+
+    per_token = measure(lambda token: transport.build_message(token, message), tokens, args.batch)
+    prepared = transport.prepare(message)
+    shared = measure(lambda token: transport.build_message(token, prepared), tokens, args.batch)
+
+    report = {
+        "meta": {"tokens": args.tokens, "batch": args.batch, "payload_bytes": payload_size(
+            message.title, message.body, message.data), "python": sys.version.split()[0]},
+        "per_token_build": per_token,
+        "prepared_template": shared,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carriles de prioridad
+Mide la latencia de pushes priority=high mientras corre un broadcast grande
+contra el FCM falso, con y sin los carriles del PushScheduler.
+
+Uso:
+    python benchmarks/bench_priority.py
+    python benchmarks/bench_priority.py --broadcast-tokens 50000 --alerts 20 --fcm-latency-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from services.fanout import fan_out  # noqa: E402
+from services.push_transport import HIGH, NORMAL, FakeFCMTransport, LatencyModel, PushMessage  # noqa: E402
+from services.scheduler import PushScheduler  # noqa: E402
+
+
+async def scenario(args, lanes: bool) -> dict:
+    transport = FakeFCMTransport(latency=LatencyModel("constant", args.fcm_latency_ms))
+    scheduler = PushScheduler(args.max_in_flight, args.reserved_high) if lanes else None
+    bulk = PushMessage("Campaña", "Oferta", priority=NORMAL)
+    alert = PushMessage("Alerta de seguridad", "Nuevo inicio de sesión", priority=HIGH)
+
+    broadcasts = [
+        asyncio.create_task(fan_out(
+            [f"bulk-{b}-{i}" for i in range(args.broadcast_tokens)],
+            lambda token: transport.send(token, bulk),
+            concurrency=args.push_concurrency, scheduler=scheduler, priority=NORMAL,
+        ))
+        for b in range(args.broadcasts)
+    ]
+
+    # Las alertas llegan con el broadcast ya saturando la capacidad
+    await asyncio.sleep(args.alert_delay_ms / 1000)
+    latencies = []
+    for i in range(args.alerts):
+        start = time.perf_counter()
+        await fan_out([f"alert-{i}"], lambda token: transport.send(token, alert),
+                      concurrency=1, scheduler=scheduler, priority=HIGH)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(args.alert_interval_ms / 1000)
+
+    broadcast_start = time.perf_counter()
+    await asyncio.gather(*broadcasts)
+    if scheduler is not None:
+        scheduler.close()
+
+    ordered = sorted(latencies)
+    return {
+        "alert_latency_ms": {
+            "p50": round(statistics.median(ordered) * 1000, 3),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3),
+        },
+        "broadcast_tail_s": round(time.perf_counter() - broadcast_start, 3),
+        "sends": transport.stats["calls"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="High-priority latency during a broadcast")
+    parser.add_argument("--broadcast-tokens", type=int, default=20000)
+    parser.add_argument("--broadcasts", type=int, default=4, help="Concurrent broadcast requests")
+    parser.add_argument("--push-concurrency", type=int, default=32, help="PUSH_CONCURRENCY per request")
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--reserved-high", type=int, default=8)
+    parser.add_argument("--alerts", type=int, default=20)
+    parser.add_argument("--alert-delay-ms", type=float, default=200)
+    parser.add_argument("--alert-interval-ms", type=float, default=50)
+    parser.add_argument("--fcm-latency-ms", type=float, default=10)
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {key: value for key, value in vars(args).items()},
+        "shared_threadpool": asyncio.run(scenario(args, lanes=False)),
+        "priority_lanes": asyncio.run(scenario(args, lanes=True)),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
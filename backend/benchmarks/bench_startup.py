@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque en frío
+Mide el tiempo de importar main.py y el tiempo hasta la primera respuesta HTTP
+
+Uso:
+    python benchmarks/bench_startup.py               # usa la configuración del .env
+    python benchmarks/bench_startup.py --offline     # sin Oracle ni Firebase (sin warm-up)
+    python benchmarks/bench_startup.py --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Se ejecuta en un proceso nuevo para medir un arranque realmente en frío
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import main
+t_import = time.perf_counter() - t0
+
+from fastapi.testclient import TestClient
+t1 = time.perf_counter()
+with TestClient(main.create_app()) as client:
+    t_startup = time.perf_counter() - t1
+    response = client.get("/")
+    t_first = time.perf_counter() - t0
+print(json.dumps({
+    "import_s": t_import,
+    "lifespan_startup_s": t_startup,
+    "time_to_first_request_s": t_first,
+    "status_code": response.status_code,
+}))
+"""
+
+
+def offline_env() -> dict:
+    """Variables mínimas para arrancar sin recursos externos"""
+    credentials_file = tempfile.NamedTemporaryFile(prefix="bench-", suffix=".json", delete=False)
+    credentials_file.write(b"{}")
+    credentials_file.close()
+    return {
+        "ORACLE_USER": "bench",
+        "ORACLE_PASSWORD": "bench",
+        "SERVER_KEY": "bench",
+        "FIREBASE_CREDENTIALS_PATH": credentials_file.name,
+        "STARTUP_WARMUP": "false",
+        "LOG_FILE": "",
+    }
+
+
+def run_probe(env: dict) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # La última línea es el JSON; el resto son logs
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples: list, key: str) -> dict:
+    values = [sample[key] for sample in samples]
+    return {
+        "min": round(min(values), 4),
+        "median": round(statistics.median(values), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--offline", action="store_true", help="Run without Oracle/Firebase (warm-up disabled)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.offline:
+        env.update(offline_env())
+
+    samples = [run_probe(env) for _ in range(args.runs)]
+    report = {
+        "runs": args.runs,
+        "offline": args.offline,
+        "import": summarize(samples, "import_s"),
+        "lifespan_startup": summarize(samples, "lifespan_startup_s"),
+        "time_to_first_request": summarize(samples, "time_to_first_request_s"),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
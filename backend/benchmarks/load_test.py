@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Benchmark de throughput de la API
+Reproduce los escenarios de la colección Postman con concurrencia configurable
+y reporta RPS, latencias p50/p95/p99 y tasa de errores en JSON.
+
+Uso:
+    # Offline: app en proceso con stand-ins locales de Oracle y FCM
+    python benchmarks/load_test.py --concurrency 20 --requests 500
+
+    # Contra un servidor real
+    python benchmarks/load_test.py --base-url http://localhost:8000
+
+    # Comparar contra un baseline guardado (exit code 1 si hay regresión)
+    python benchmarks/load_test.py --baseline benchmarks/baseline.json
+    python benchmarks/load_test.py --save-baseline benchmarks/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+COLLECTION_PATH = os.path.join(BACKEND_DIR, "postman", "postman_collection.json")
+ENVIRONMENT_PATH = os.path.join(BACKEND_DIR, "postman", "postman_environment.json")
+DEFAULT_BASELINE_PATH = os.path.join(BACKEND_DIR, "benchmarks", "baseline.json")
+
+VARIABLE_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+
+
+# ==========================================
+# COLECCIÓN POSTMAN
+# ==========================================
+
+@dataclass
+class RequestTemplate:
+    name: str
+    method: str
+    url: str
+    body: Optional[str]
+
+    def render(self, variables: Dict[str, str]) -> tuple:
+        def substitute(text: str) -> str:
+            return VARIABLE_PATTERN.sub(lambda m: str(variables.get(m.group(1), m.group(0))), text)
+
+        url = substitute(self.url)
+        # base_url lo maneja el cliente HTTP
+        url = url.replace(str(variables.get("base_url", "")), "", 1) or "/"
+        body = substitute(self.body) if self.body else None
+        return self.method, url, body
+
+
+def load_collection(path: str = COLLECTION_PATH) -> Dict[str, RequestTemplate]:
+    with open(path, encoding="utf-8") as f:
+        collection = json.load(f)
+
+    templates = {}
+
+    def walk(items):
+        for item in items:
+            if "item" in item:
+                walk(item["item"])
+                continue
+            request = item["request"]
+            url = request["url"]["raw"] if isinstance(request["url"], dict) else request["url"]
+            body = (request.get("body") or {}).get("raw")
+            templates[item["name"]] = RequestTemplate(item["name"], request["method"], url, body)
+
+    walk(collection["item"])
+    return templates
+
+
+def load_environment(path: str = ENVIRONMENT_PATH) -> Dict[str, str]:
+    with open(path, encoding="utf-8") as f:
+        environment = json.load(f)
+    return {value["key"]: value["value"] for value in environment["values"] if value.get("enabled", True)}
+
+
+# ==========================================
+# ESCENARIOS
+# ==========================================
+
+@dataclass
+class Scenario:
+    name: str
+    request_name: str
+    # Variables por iteración (i = número de request, ctx = datos del setup)
+    vary: Callable[[int, dict], Dict[str, str]] = lambda i, ctx: {}
+    authenticated: bool = True
+
+
+SCENARIOS = [
+    Scenario(
+        "login_storm", "Login User",
+        vary=lambda i, ctx: dict(zip(("test_username", "test_password"), ctx["users"][i % len(ctx["users"])])),
+        authenticated=False,
+    ),
+    Scenario(
+        "device_registration", "Register Device",
+        vary=lambda i, ctx: {"test_device_id": f"load-device-{i}", "test_fcm_token": f"load-token-{i}-" + "x" * 120},
+    ),
+    Scenario("inbox_polling", "Get Internal Notifications"),
+    Scenario(
+        "push_single_user", "Send Push to Specific User",
+        vary=lambda i, ctx: {"user_id": ctx["user_ids"][i % len(ctx["user_ids"])]},
+    ),
+    Scenario("push_broadcast", "Send Push to All Users"),
+]
+
+
+# ==========================================
+# EJECUCIÓN
+# ==========================================
+
+@dataclass
+class ScenarioResult:
+    latencies: List[float] = field(default_factory=list)
+    status_codes: Dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    def report(self) -> dict:
+        total = len(self.latencies)
+        ordered = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not ordered:
+                return 0.0
+            index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+            return round(ordered[index] * 1000, 3)
+
+        return {
+            "requests": total,
+            "errors": self.errors,
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "rps": round(total / self.elapsed, 2) if self.elapsed else 0.0,
+            "latency_ms": {
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+                "mean": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+                "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+            },
+            "status_codes": dict(sorted(self.status_codes.items())),
+        }
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, template: RequestTemplate,
+                       variables: dict, setup: dict, concurrency: int, total_requests: int) -> dict:
+    result = ScenarioResult()
+    counter = iter(range(total_requests))
+    headers = {"Content-Type": "application/json"}
+    if scenario.authenticated:
+        headers["Authorization"] = f"Bearer {setup['token']}"
+
+    async def virtual_user():
+        for i in counter:
+            method, url, body = template.render({**variables, **scenario.vary(i, setup)})
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, content=body, headers=headers)
+                status_code = str(response.status_code)
+                failed = response.status_code >= 400
+            except httpx.HTTPError as e:
+                status_code = type(e).__name__
+                failed = True
+            result.latencies.append(time.perf_counter() - start)
+            result.status_codes[status_code] = result.status_codes.get(status_code, 0) + 1
+            result.errors += int(failed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(virtual_user() for _ in range(max(1, concurrency))))
+    result.elapsed = time.perf_counter() - start
+    return result.report()
+
+
+@asynccontextmanager
+async def offline_client(args):
+    """App en proceso con SQLite y FCM falso como stand-ins de Oracle y Firebase"""
+    from benchmarks.standins import install_standins, seed
+    from config import Settings
+    from main import create_app
+
+    settings = Settings(
+        storage_backend="sqlite",
+        push_transport="fake",
+        startup_warmup=False,
+        log_file=os.devnull,
+        log_console=False,
+        push_concurrency=args.push_concurrency,
+    )
+    app = create_app(settings)
+    standins = install_standins(
+        app.state.ctx, fcm_latency_ms=args.fcm_latency_ms, fcm_error_rates=args.fcm_error_rates
+    )
+    data = seed(standins["repository"], users=args.users, devices_per_user=args.devices_per_user)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client, data
+
+
+@asynccontextmanager
+async def remote_client(args):
+    """Servidor real; los usuarios deben existir (por defecto el admin de create_tables.sql)"""
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        yield client, {"users": [(args.username, args.password)], "user_ids": []}
+
+
+async def run(args) -> dict:
+    templates = load_collection()
+    variables = load_environment()
+    selected = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+
+    client_factory = remote_client if args.base_url else offline_client
+    async with client_factory(args) as (client, data):
+        variables["base_url"] = args.base_url or variables.get("base_url", "")
+
+        # Token compartido para los escenarios autenticados
+        admin_user, admin_password = data.get("admin", (args.username, args.password))
+        login = await client.post("/login", json={"username": admin_user, "password": admin_password})
+        login.raise_for_status()
+        token_data = login.json()
+        setup = {
+            "token": token_data["access_token"],
+            "users": data["users"],
+            "user_ids": data["user_ids"] or [token_data["user_id"]],
+        }
+
+        scenarios = {}
+        for scenario in selected:
+            requests_count = args.requests
+            if scenario.name == "login_storm":
+                # bcrypt domina el costo: menos requests para tiempos razonables
+                requests_count = max(1, args.requests // 10)
+            scenarios[scenario.name] = await run_scenario(
+                client, scenario, templates[scenario.request_name], variables, setup,
+                args.concurrency, requests_count,
+            )
+
+    return {
+        "meta": {
+            "target": args.base_url or "offline",
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests,
+            "fcm_latency_ms": None if args.base_url else args.fcm_latency_ms,
+            "fcm_error_rates": None if args.base_url else args.fcm_error_rates,
+            "python": sys.version.split()[0],
+        },
+        "scenarios": scenarios,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> dict:
+    """Compara RPS, p95 y tasa de errores contra el baseline"""
+    comparison = {}
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+
+        def change(now: float, before: float) -> Optional[float]:
+            return round((now - before) / before * 100, 2) if before else None
+
+        rps_change = change(current["rps"], previous["rps"])
+        p95_change = change(current["latency_ms"]["p95"], previous["latency_ms"]["p95"])
+        regression = (
+            (rps_change is not None and rps_change < -tolerance)
+            or (p95_change is not None and p95_change > tolerance)
+            or current["error_rate"] > previous["error_rate"]
+        )
+        comparison[name] = {
+            "rps_change_pct": rps_change,
+            "p95_change_pct": p95_change,
+            "error_rate_change": round(current["error_rate"] - previous["error_rate"], 4),
+            "regression": regression,
+        }
+    return comparison
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="API throughput benchmark")
+    parser.add_argument("--base-url", help="Target a running server instead of the offline in-process app")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--scenarios", nargs="*", choices=[s.name for s in SCENARIOS])
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--users", type=int, default=100, help="Offline: seeded users")
+    parser.add_argument("--devices-per-user", type=int, default=2, help="Offline: seeded devices per user")
+    parser.add_argument("--fcm-latency-ms", type=float, default=5.0, help="Offline: simulated FCM latency")
+    parser.add_argument("--fcm-error-rates", default="", help="Offline: e.g. UNREGISTERED=0.01,UNAVAILABLE=0.005")
+    parser.add_argument("--push-concurrency", type=int, default=10, help="Offline: PUSH_CONCURRENCY")
+    parser.add_argument("--baseline", help="Compare against this baseline JSON")
+    parser.add_argument("--save-baseline", help="Write the report as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=20.0, help="Allowed regression in percent")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f), args.tolerance)
+        if any(entry["regression"] for entry in report["comparison"].values()):
+            exit_code = 1
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+# Stand-ins locales de Oracle y FCM para correr benchmarks sin red
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import bcrypt
+
+from services.push_transport import FakeFCMTransport, LatencyModel, parse_error_rates
+from storage.repository import TableNames
+from storage.sqlite_repository import SQLiteRepository
+
+
+def sqlite_standin(directory: str = None, prefix: str = "np_") -> SQLiteRepository:
+    """Repositorio SQLite en un directorio temporal con el mismo esquema que Oracle"""
+    directory = directory or tempfile.mkdtemp(prefix="push-bench-")
+    return SQLiteRepository(os.path.join(directory, "push_notifications.db"), TableNames("", prefix))
+
+
+def seed(repository: SQLiteRepository, users: int = 100, devices_per_user: int = 2, notifications_per_user: int = 20,
+         password: str = "bench123") -> dict:
+    """Carga usuarios, devices y notificaciones; devuelve las credenciales creadas"""
+    # Un solo hash bcrypt para todos: el costo de checkpw en /login sigue siendo real
+    password_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    admin_hash = bcrypt.hashpw(b"admin123", bcrypt.gensalt()).decode("utf-8")
+    tables = repository.tables
+
+    with repository.connection() as connection:
+        connection.execute(
+            f"INSERT OR IGNORE INTO {tables.users} (username, email, password_hash) VALUES (?, ?, ?)",
+            ("admin", "admin@example.com", admin_hash),
+        )
+        connection.executemany(
+            f"INSERT OR IGNORE INTO {tables.users} (username, email, password_hash) VALUES (?, ?, ?)",
+            [(f"bench_user_{i}", f"bench_user_{i}@example.com", password_hash) for i in range(users)],
+        )
+        user_ids = [row[0] for row in connection.execute(f"SELECT id FROM {tables.users} ORDER BY id")]
+        connection.executemany(
+            f"INSERT OR IGNORE INTO {tables.devices} (user_id, device_id, fcm_token) VALUES (?, ?, ?)",
+            [
+                (user_id, f"bench-device-{user_id}-{d}", f"bench-token-{user_id}-{d}-" + "x" * 120)
+                for user_id in user_ids for d in range(devices_per_user)
+            ],
+        )
+        connection.executemany(
+            f"INSERT INTO {tables.internal_notifications} (user_id, title, message, is_read) VALUES (?, ?, ?, ?)",
+            [
+                (user_id, f"Notificación {n}", f"Mensaje de prueba {n} para el usuario {user_id}", n % 3 == 0)
+                for user_id in user_ids for n in range(notifications_per_user)
+            ],
+        )
+        connection.commit()
+
+    return {
+        "admin": ("admin", "admin123"),
+        "users": [(f"bench_user_{i}", password) for i in range(users)],
+        "user_ids": user_ids,
+    }
+
+
+def install_standins(ctx, fcm_latency_ms: float = 5.0, fcm_jitter_ms: float = 2.0, fcm_error_rates: str = "") -> dict:
+    """Conecta los stand-ins al AppContext y devuelve los datos de prueba"""
+    repository = sqlite_standin(prefix=ctx.settings.db_table_prefix)
+    transport = FakeFCMTransport(
+        latency=LatencyModel("uniform", fcm_latency_ms, min(fcm_jitter_ms, fcm_latency_ms)),
+        error_rates=parse_error_rates(fcm_error_rates),
+    )
+
+    ctx.repository = repository
+    ctx.push_transport = transport
+
+    return {"repository": repository, "fcm": transport}
+
+
+# ------------------------------------------
+# FCM HTTP v1 por la red local
+# ------------------------------------------
+
+class FCMHttpStandin:
+    """
+    FCM HTTP v1 y endpoint OAuth en 127.0.0.1. Escucha en dos puertos: HTTP/1.1
+    (firebase_admin y google-auth usan requests) y HTTP/2 sin TLS (h2c, el
+    transport fcm_http). Cada messages:send responde tras ``latency_ms``.
+    """
+
+    def __init__(self, latency_ms: float = 20.0):
+        self.latency = latency_ms / 1000.0
+        self.http1_url = None
+        self.h2_url = None
+        self._ids = itertools.count(1)
+        self._http1 = None
+        self._loop = None
+        self._h2_server = None
+
+    def message_body(self) -> bytes:
+        return json.dumps({"name": f"projects/standin/messages/{next(self._ids)}"}).encode()
+
+    def start(self) -> "FCMHttpStandin":
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path == "/token":
+                    body = json.dumps({"access_token": "standin-token", "expires_in": 3600,
+                                       "token_type": "Bearer"}).encode()
+                else:
+                    threading.Event().wait(standin.latency)
+                    body = standin.message_body()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._http1 = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._http1.daemon_threads = True
+        threading.Thread(target=self._http1.serve_forever, name="fcm-standin-http1", daemon=True).start()
+        self.http1_url = f"http://127.0.0.1:{self._http1.server_address[1]}"
+
+        ready = threading.Event()
+
+        def serve_h2():
+            self._loop = asyncio.new_event_loop()
+            self._h2_server = self._loop.run_until_complete(
+                self._loop.create_server(lambda: _H2StandinProtocol(self), "127.0.0.1", 0)
+            )
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=serve_h2, name="fcm-standin-h2", daemon=True).start()
+        ready.wait()
+        self.h2_url = f"http://127.0.0.1:{self._h2_server.sockets[0].getsockname()[1]}"
+        return self
+
+    def stop(self):
+        if self._http1 is not None:
+            self._http1.shutdown()
+            self._http1.server_close()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._h2_server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def serve_fcm_standin(latency_ms: float, urls):
+    """Corre el stand-in en este proceso (target de multiprocessing) y publica (http1_url, h2_url) en ``urls``"""
+    standin = FCMHttpStandin(latency_ms).start()
+    urls.put((standin.http1_url, standin.h2_url))
+    threading.Event().wait()
+
+
+def standin_service_account(directory: str, token_uri: str) -> str:
+    """Service account con una clave RSA nueva; google-auth pide el access token a ``token_uri``"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption()).decode()
+    path = os.path.join(directory, "standin-service-account.json")
+    with open(path, "w") as output:
+        json.dump({
+            "type": "service_account",
+            "project_id": "standin",
+            "private_key_id": "standin",
+            "private_key": pem,
+            "client_email": "bench@standin.iam.gserviceaccount.com",
+            "client_id": "1",
+            "token_uri": token_uri,
+        }, output)
+    return path
+
+
+class _H2StandinProtocol(asyncio.Protocol):
+    def __init__(self, standin: FCMHttpStandin):
+        import h2.config
+        import h2.connection
+
+        self.standin = standin
+        self.connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.connection.initiate_connection()
+        transport.write(self.connection.data_to_send())
+
+    def data_received(self, data: bytes):
+        import h2.events
+        import h2.exceptions
+
+        try:
+            events = self.connection.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.transport.close()
+            return
+        loop = asyncio.get_running_loop()
+        for event in events:
+            if isinstance(event, h2.events.DataReceived):
+                self.connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                loop.call_later(self.standin.latency, self._respond, event.stream_id)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self.transport.write(self.connection.data_to_send())
+
+    def _respond(self, stream_id: int):
+        if self.transport.is_closing():
+            return
+        body = self.standin.message_body()
+        self.connection.send_headers(stream_id, [(":status", "200"), ("content-type", "application/json"),
+                                                 ("content-length", str(len(body)))])
+        self.connection.send_data(stream_id, body, end_stream=True)
+        self.transport.write(self.connection.data_to_send())
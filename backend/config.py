@@ -0,0 +1,296 @@
+# Configuración de la API desde variables de entorno
+import logging
+import os
+import sys
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+config_logger = logging.getLogger("PushNotificationsAPI")
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class Settings:
+    # Firebase Configuration
+    sender_id: int = 0
+    server_key: str = ""
+    firebase_credentials_path: str = "./push-notifications-app.json"
+
+    # JWT Configuration
+    secret_key: str = "fallback-secret-key-change-this"
+    algorithm: str = "HS256"
+    access_token_expire_minutes: int = 30
+    # Refresh tokens rotativos: renuevan el access token sin bcrypt (/token/refresh); cada uso extiende el plazo
+    refresh_token_expire_days: int = 30
+    # Usernames separados por coma con acceso a datos de todos los usuarios (export)
+    admin_usernames: str = ""
+
+    # Storage: oracle o sqlite (embebido, modo WAL)
+    storage_backend: str = "oracle"
+    sqlite_path: str = "./push_notifications.db"
+    # Segunda base SQLite como réplica de lectura (stand-in local de ORACLE_READ_DSN)
+    sqlite_read_path: str = ""
+    # Tablas: <schema>.<prefix>users -> test.np_users
+    db_schema: str = "test"
+    db_table_prefix: str = "np_"
+
+    # Oracle Database Configuration
+    oracle_user: str = ""
+    oracle_password: str = ""
+    oracle_host: str = "10.5.2.171"
+    oracle_port: int = 1521
+    oracle_sid: str = "SICOOP"
+    oracle_jar_path: str = "./utils/instantclient"
+    db_pool_min: int = 1
+    db_pool_max: int = 10
+    # Réplica de lectura opcional (p. ej. standby Active Data Guard) con su propio pool
+    oracle_read_dsn: str = ""
+    db_read_pool_min: int = 1
+    db_read_pool_max: int = 10
+    # Tras una escritura propia, el usuario lee del primario durante estos segundos
+    read_your_writes_seconds: float = 5.0
+    # Statement cache por conexión y tamaño de lote para scans grandes
+    db_stmt_cache_size: int = 40
+    db_fetch_batch_size: int = 1000
+    # Elementos por bind de colección al resolver listas de destinatarios
+    db_array_chunk_size: int = 1000
+    # Límite de VARCHAR2 (32767 con MAX_STRING_SIZE=EXTENDED); textos más largos se bindean como CLOB
+    db_max_varchar_bytes: int = 4000
+
+    # Server Configuration
+    host: str = "0.0.0.0"
+    port: int = 8000
+    environment: str = "development"
+    graceful_shutdown_timeout: float = 30.0
+    # Si es False, Oracle y Firebase se inicializan en el primer uso
+    startup_warmup: bool = True
+    log_file: str = "app.log"
+    log_console: bool = True
+    # Respuestas de más de gzip_minimum_size bytes se comprimen si el cliente lo acepta
+    gzip_minimum_size: int = 4096
+    gzip_level: int = 6
+    # /health sirve el último resultado del prober (0 = probar en cada request)
+    health_probe_interval: float = 10.0
+    health_probe_timeout: float = 5.0
+    # Fallos seguidos que abren el circuito de Oracle/FCM y segundos hasta volver a probar
+    circuit_failure_threshold: int = 5
+    circuit_reset_timeout: float = 30.0
+    # Rollups de /stats: deltas aplicados cada intervalo; recuento de las tablas base cada STATS_RECONCILE_INTERVAL
+    stats_flush_interval: float = 5.0
+    stats_reconcile_interval: float = 3600.0
+    stats_reconcile_days: int = 2
+    # Retención del historial en días (0 = sin límite); en Oracle se borran particiones enteras
+    notification_retention_days: int = 0
+    push_log_retention_days: int = 0
+    # Ventana del inbox en días (0 = toda la retención): acota las particiones que lee
+    inbox_window_days: int = 0
+    retention_interval_s: float = 3600.0
+    # Profiling bajo demanda: requests con X-Profile-Token = PROFILE_TOKEN o una fracción PROFILE_SAMPLE_RATE.
+    # Sin ninguno de los dos el middleware no se instala
+    profile_token: str = ""
+    profile_sample_rate: float = 0.0
+    profile_interval_ms: float = 5.0
+    profile_dir: str = "./profiles"
+    profile_max_files: int = 50
+    profile_max_mb: float = 50.0
+    # Tracing por spans: none, file (OTLP/JSON por línea en TRACE_FILE) o memory (tests)
+    trace_exporter: str = "none"
+    trace_file: str = "./traces.jsonl"
+    trace_service_name: str = "push-notifications-api"
+    # Filas por fetchmany del export de historial (un lote = un chunk de la respuesta)
+    export_fetch_size: int = 5000
+
+    # Push Fan-out
+    push_concurrency: int = 10
+    # Envíos en vuelo de todo el proceso y cuántos quedan reservados para priority=high
+    push_max_in_flight: int = 64
+    push_high_priority_reserved: int = 8
+    # Pushes con el mismo destinatario y collapse_key dentro de la ventana: solo se envía el último
+    push_collapse_window_ms: int = 2000
+    # Broadcast a todos los devices repartido en N procesos (MOD(id, N)); 0/1 = en este proceso.
+    # Cada proceso tiene su propio transport y PUSH_MAX_IN_FLIGHT: el total en vuelo es N veces
+    broadcast_workers: int = 0
+    broadcast_batch_size: int = 1000
+    # Máximo de user_ids + usernames por request de push o notificación interna
+    max_recipients: int = 20000
+    # Máximo de devices por request de /register-devices
+    max_device_batch: int = 1000
+    # Registra cada envío en push_notification_log
+    push_log_enabled: bool = True
+    # Bytes de notification + data que acepta FCM; el excedente se rechaza (reject) o se recorta (truncate)
+    push_payload_limit: int = 4096
+    push_payload_overflow: str = "reject"
+    # Recibos de entrega/apertura: se aplican por lote cada intervalo o al juntar RECEIPT_BUFFER_MAX
+    receipt_flush_interval_ms: int = 1000
+    receipt_buffer_max: int = 5000
+    # Máximo de recibos por request de /push-receipts
+    max_receipt_batch: int = 500
+    # firebase = Firebase Admin real, fcm_http = FCM HTTP v1 async sobre HTTP/2, fake = FCM simulado en proceso
+    push_transport: str = "firebase"
+    # fcm_http: conexiones HTTP/2 del pool (cada una multiplexa hasta ~100 envíos) y renovación del access token
+    fcm_http_endpoint: str = "https://fcm.googleapis.com"
+    fcm_http_connections: int = 2
+    fcm_http_timeout_s: float = 10.0
+    fcm_token_refresh_margin_s: float = 300.0
+    fake_fcm_latency_distribution: str = "constant"
+    fake_fcm_latency_ms: float = 0.0
+    fake_fcm_jitter_ms: float = 0.0
+    fake_fcm_error_rates: str = ""
+    fake_fcm_max_rps: float = 0.0
+    fake_fcm_seed: int = 42
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        # Cargar variables de entorno
+        load_dotenv()
+        return cls(
+            sender_id=int(os.getenv("SENDER_ID", "0")),
+            server_key=os.getenv("SERVER_KEY", ""),
+            firebase_credentials_path=os.getenv("FIREBASE_CREDENTIALS_PATH", "./push-notifications-app.json"),
+            secret_key=os.getenv("SECRET_KEY", "fallback-secret-key-change-this"),
+            algorithm=os.getenv("ALGORITHM", "HS256"),
+            access_token_expire_minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")),
+            refresh_token_expire_days=int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30")),
+            admin_usernames=os.getenv("ADMIN_USERNAMES", ""),
+            storage_backend=os.getenv("STORAGE_BACKEND", "oracle").strip().lower(),
+            sqlite_path=os.getenv("SQLITE_PATH", "./push_notifications.db"),
+            sqlite_read_path=os.getenv("SQLITE_READ_PATH", ""),
+            db_schema=os.getenv("DB_SCHEMA", "test"),
+            db_table_prefix=os.getenv("DB_TABLE_PREFIX", "np_"),
+            oracle_user=os.getenv("ORACLE_USER", ""),
+            oracle_password=os.getenv("ORACLE_PASSWORD", ""),
+            oracle_host=os.getenv("ORACLE_HOST", "10.5.2.171"),
+            oracle_port=int(os.getenv("ORACLE_PORT", "1521")),
+            oracle_sid=os.getenv("ORACLE_SID", "SICOOP"),
+            oracle_jar_path=os.getenv("ORACLE_JAR_PATH", "./utils/instantclient"),
+            db_pool_min=int(os.getenv("DB_POOL_MIN", "1")),
+            db_pool_max=int(os.getenv("DB_POOL_MAX", "10")),
+            oracle_read_dsn=os.getenv("ORACLE_READ_DSN", ""),
+            db_read_pool_min=int(os.getenv("DB_READ_POOL_MIN", "1")),
+            db_read_pool_max=int(os.getenv("DB_READ_POOL_MAX", "10")),
+            read_your_writes_seconds=float(os.getenv("READ_YOUR_WRITES_SECONDS", "5")),
+            db_stmt_cache_size=int(os.getenv("DB_STMT_CACHE_SIZE", "40")),
+            db_fetch_batch_size=int(os.getenv("DB_FETCH_BATCH_SIZE", "1000")),
+            db_array_chunk_size=int(os.getenv("DB_ARRAY_CHUNK_SIZE", "1000")),
+            db_max_varchar_bytes=int(os.getenv("DB_MAX_VARCHAR_BYTES", "4000")),
+            host=os.getenv("HOST", "0.0.0.0"),
+            port=int(os.getenv("PORT", "8000")),
+            environment=os.getenv("ENVIRONMENT", "development"),
+            graceful_shutdown_timeout=float(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30")),
+            startup_warmup=_env_bool("STARTUP_WARMUP", "true"),
+            log_file=os.getenv("LOG_FILE", "app.log"),
+            log_console=_env_bool("LOG_CONSOLE", "true"),
+            gzip_minimum_size=int(os.getenv("GZIP_MINIMUM_SIZE", "4096")),
+            gzip_level=int(os.getenv("GZIP_LEVEL", "6")),
+            health_probe_interval=float(os.getenv("HEALTH_PROBE_INTERVAL", "10")),
+            health_probe_timeout=float(os.getenv("HEALTH_PROBE_TIMEOUT", "5")),
+            circuit_failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+            circuit_reset_timeout=float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30")),
+            stats_flush_interval=float(os.getenv("STATS_FLUSH_INTERVAL", "5")),
+            stats_reconcile_interval=float(os.getenv("STATS_RECONCILE_INTERVAL", "3600")),
+            stats_reconcile_days=int(os.getenv("STATS_RECONCILE_DAYS", "2")),
+            notification_retention_days=int(os.getenv("NOTIFICATION_RETENTION_DAYS", "0")),
+            push_log_retention_days=int(os.getenv("PUSH_LOG_RETENTION_DAYS", "0")),
+            inbox_window_days=int(os.getenv("INBOX_WINDOW_DAYS", "0")),
+            retention_interval_s=float(os.getenv("RETENTION_INTERVAL_S", "3600")),
+            profile_token=os.getenv("PROFILE_TOKEN", ""),
+            profile_sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            profile_interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+            profile_dir=os.getenv("PROFILE_DIR", "./profiles"),
+            profile_max_files=int(os.getenv("PROFILE_MAX_FILES", "50")),
+            profile_max_mb=float(os.getenv("PROFILE_MAX_MB", "50")),
+            trace_exporter=os.getenv("TRACE_EXPORTER", "none").strip().lower(),
+            trace_file=os.getenv("TRACE_FILE", "./traces.jsonl"),
+            trace_service_name=os.getenv("TRACE_SERVICE_NAME", "push-notifications-api"),
+            export_fetch_size=int(os.getenv("EXPORT_FETCH_SIZE", "5000")),
+            push_concurrency=int(os.getenv("PUSH_CONCURRENCY", "10")),
+            push_max_in_flight=int(os.getenv("PUSH_MAX_IN_FLIGHT", "64")),
+            push_high_priority_reserved=int(os.getenv("PUSH_HIGH_PRIORITY_RESERVED", "8")),
+            push_collapse_window_ms=int(os.getenv("PUSH_COLLAPSE_WINDOW_MS", "2000")),
+            broadcast_workers=int(os.getenv("BROADCAST_WORKERS", "0")),
+            broadcast_batch_size=int(os.getenv("BROADCAST_BATCH_SIZE", "1000")),
+            max_recipients=int(os.getenv("MAX_RECIPIENTS", "20000")),
+            max_device_batch=int(os.getenv("MAX_DEVICE_BATCH", "1000")),
+            push_log_enabled=_env_bool("PUSH_LOG_ENABLED", "true"),
+            push_payload_limit=int(os.getenv("PUSH_PAYLOAD_LIMIT", "4096")),
+            push_payload_overflow=os.getenv("PUSH_PAYLOAD_OVERFLOW", "reject").strip().lower(),
+            receipt_flush_interval_ms=int(os.getenv("RECEIPT_FLUSH_INTERVAL_MS", "1000")),
+            receipt_buffer_max=int(os.getenv("RECEIPT_BUFFER_MAX", "5000")),
+            max_receipt_batch=int(os.getenv("MAX_RECEIPT_BATCH", "500")),
+            push_transport=os.getenv("PUSH_TRANSPORT", "firebase").strip().lower(),
+            fcm_http_endpoint=os.getenv("FCM_HTTP_ENDPOINT", "https://fcm.googleapis.com"),
+            fcm_http_connections=int(os.getenv("FCM_HTTP_CONNECTIONS", "2")),
+            fcm_http_timeout_s=float(os.getenv("FCM_HTTP_TIMEOUT_S", "10")),
+            fcm_token_refresh_margin_s=float(os.getenv("FCM_TOKEN_REFRESH_MARGIN_S", "300")),
+            fake_fcm_latency_distribution=os.getenv("FAKE_FCM_LATENCY_DISTRIBUTION", "constant"),
+            fake_fcm_latency_ms=float(os.getenv("FAKE_FCM_LATENCY_MS", "0")),
+            fake_fcm_jitter_ms=float(os.getenv("FAKE_FCM_JITTER_MS", "0")),
+            fake_fcm_error_rates=os.getenv("FAKE_FCM_ERROR_RATES", ""),
+            fake_fcm_max_rps=float(os.getenv("FAKE_FCM_MAX_RPS", "0")),
+            fake_fcm_seed=int(os.getenv("FAKE_FCM_SEED", "42")),
+        )
+
+    @property
+    def oracle_dsn(self) -> str:
+        # Construir DSN sin requerir el cliente Oracle
+        return (
+            f"(DESCRIPTION=(ADDRESS=(PROTOCOL=TCP)(HOST={self.oracle_host})(PORT={self.oracle_port}))"
+            f"(CONNECT_DATA=(SID={self.oracle_sid})))"
+        )
+
+    def is_admin(self, username: str) -> bool:
+        return username in {name.strip() for name in self.admin_usernames.split(",") if name.strip()}
+
+    def validate(self):
+        """Valida las variables críticas; se llama al arrancar la aplicación"""
+        if self.storage_backend == "oracle" and (not self.oracle_user or not self.oracle_password):
+            config_logger.error("❌ ORACLE_USER and ORACLE_PASSWORD must be set in .env file")
+            raise ValueError("ORACLE_USER and ORACLE_PASSWORD must be set in .env file")
+
+        if self.push_payload_overflow not in ("reject", "truncate"):
+            config_logger.error(f"❌ Invalid PUSH_PAYLOAD_OVERFLOW: {self.push_payload_overflow}")
+            raise ValueError("PUSH_PAYLOAD_OVERFLOW must be 'reject' or 'truncate'")
+
+        # Las credenciales de Firebase solo hacen falta con los transportes reales
+        if self.push_transport not in ("firebase", "fcm_http"):
+            return
+
+        if self.push_transport == "firebase" and not self.server_key:
+            config_logger.error("❌ SERVER_KEY must be set in .env file")
+            raise ValueError("SERVER_KEY must be set in .env file")
+
+        if not os.path.exists(self.firebase_credentials_path):
+            config_logger.error(f"❌ Firebase credentials file not found: {self.firebase_credentials_path}")
+            raise ValueError(f"Firebase credentials file not found: {self.firebase_credentials_path}")
+
+
+def configure_logging(settings: Settings):
+    """Configura los handlers del logger root una sola vez por proceso"""
+    root_logger = logging.getLogger()
+    if getattr(root_logger, "_push_api_configured", False):
+        return
+
+    # Configurar stdout para UTF-8 en Windows
+    if sys.platform == "win32":
+        sys.stdout.reconfigure(encoding="utf-8")
+        sys.stderr.reconfigure(encoding="utf-8")
+
+    # Configurar handlers con encoding UTF-8 (LOG_FILE vacío desactiva el archivo)
+    if settings.log_file:
+        file_handler = logging.FileHandler(settings.log_file, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root_logger.addHandler(file_handler)
+
+    if settings.log_console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root_logger.addHandler(console_handler)
+
+    root_logger.setLevel(logging.INFO)
+    root_logger._push_api_configured = True
@@ -0,0 +1,53 @@
+"""
+Fixtures compartidas de los tests de la API
+``api`` levanta la app con SQLite temporal y FCM simulado; ``login`` registra un usuario y devuelve sus headers
+"""
+
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config import Settings
+from services.push_transport import FakeFCMTransport
+
+PASSWORD = "secreto"
+
+
+@pytest.fixture
+def api(tmp_path):
+    """
+    Fábrica de apps: ``with api(**settings) as (client, ctx)``. Los settings
+    parten de SQLite en ``tmp_path/api.db`` y FCM falso, sin logs; ``transport``
+    reemplaza el push transport del contexto (por defecto un FakeFCMTransport
+    que registra los envíos).
+    """
+    from main import create_app
+
+    @contextmanager
+    def make(transport=None, **overrides):
+        values = dict(storage_backend="sqlite", sqlite_path=str(tmp_path / "api.db"), push_transport="fake",
+                      log_file="", log_console=False)
+        values.update(overrides)
+        app = create_app(Settings(**values))
+        app.state.ctx.push_transport = transport or FakeFCMTransport(record=True)
+        with TestClient(app) as client:
+            yield client, app.state.ctx
+
+    return make
+
+
+def register_and_login(client, name: str = "ana", tokens=()) -> dict:
+    """Registra ``name``, hace login y registra un device por token (d0, d1...); devuelve los headers"""
+    client.post("/register", json={"username": name, "email": f"{name}@example.com", "password": PASSWORD})
+    token = client.post("/login", json={"username": name, "password": PASSWORD}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for index, fcm_token in enumerate(tokens):
+        client.post("/register-device", headers=headers, json={"device_id": f"d{index}", "fcm_token": fcm_token})
+    return headers
+
+
+@pytest.fixture
+def login():
+    """``login(client, name, tokens)`` → headers con el access token"""
+    return register_and_login
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Export del historial de notificaciones internas o pushes en NDJSON o CSV
+Lee directamente del repositorio configurado en .env (la réplica si hay una),
+con el mismo cursor por lotes que GET /export/{kind}: la memoria no crece con el total
+
+Uso:
+    python export_history.py pushes > pushes.ndjson
+    python export_history.py notifications --format csv --user-id 3 -o inbox_3.csv
+    python export_history.py pushes --since 2024-03-01 --until 2024-04-01 --status failed
+"""
+
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime
+
+from config import Settings
+from services.export import EXPORT_FORMATS, export_chunks
+from storage.repository import EXPORT_COLUMNS, HISTORY_STATUSES, HistoryFilter, create_repository
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Exporta el historial de notificaciones o pushes")
+    parser.add_argument("kind", choices=sorted(EXPORT_COLUMNS))
+    parser.add_argument("--format", dest="fmt", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--user-id", type=int, default=None)
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="ISO 8601, inclusive")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="ISO 8601, exclusivo")
+    parser.add_argument("--status", default=None, help="read/unread o sent/delivered/failed")
+    parser.add_argument("--fetch-size", type=int, default=None, help="Filas por lote (default EXPORT_FETCH_SIZE)")
+    parser.add_argument("-o", "--output", default="-", help="Archivo de salida (default stdout)")
+    args = parser.parse_args(argv)
+    if args.status is not None and args.status not in HISTORY_STATUSES[args.kind]:
+        parser.error(f"--status for {args.kind} must be one of: {', '.join(HISTORY_STATUSES[args.kind])}")
+    return args
+
+
+def export(repository, args, output, fetch_size: int) -> int:
+    """Escribe el export en ``output`` (binario); devuelve los bytes escritos"""
+    filters = HistoryFilter(user_id=args.user_id, since=args.since, until=args.until, status=args.status)
+    written = 0
+    batches = repository.iter_history(args.kind, filters, fetch_size)
+    for chunk in export_chunks(EXPORT_COLUMNS[args.kind], batches, args.fmt):
+        output.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Los logs van a stderr para no mezclarse con el export en stdout
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    settings = Settings.from_env()
+    repository = create_repository(settings)
+    start = time.perf_counter()
+    try:
+        if args.output == "-":
+            written = export(repository, args, sys.stdout.buffer, args.fetch_size or settings.export_fetch_size)
+            sys.stdout.buffer.flush()
+        else:
+            with open(args.output, "wb") as output:
+                written = export(repository, args, output, args.fetch_size or settings.export_fetch_size)
+    finally:
+        repository.close()
+    print(f"📤 Exported {args.kind} ({written} bytes) in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,51 +1,50 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Query, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import jwt
 import bcrypt
-import oracledb
-from datetime import datetime, timedelta
-from models.model import UserRegister, UserLogin, DeviceRegister, PushNotification, InternalNotification
-import firebase_admin
-from firebase_admin import credentials, messaging
-import os
-from contextlib import contextmanager
-import uuid
-from dotenv import load_dotenv
+from datetime import datetime, timedelta, timezone
+from models.model import (
+    UserRegister, UserLogin, TokenRefresh, DeviceRegister, DeviceBatch, PushNotification, InternalNotification,
+    NotificationSettings, PushReceiptIn, ReceiptBatch,
+)
+from contextlib import asynccontextmanager
 import logging
 import json
 import traceback
-from typing import Optional
+import hashlib
+import secrets
+from typing import Literal, Optional, Tuple, Union
 import time
+import asyncio
+import itertools
+import math
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from config import Settings, configure_logging
+from services.broadcast import partitioned_broadcast
+from services.coalesce import collapse_target
+from services.export import MEDIA_TYPES, export_chunks
+from services.context import AppContext
+from services.lifecycle import ShutdownInProgress
+from services.profiling import PROFILE_HEADER
+from services.tracing import span, start_trace
+from services.fanout import fan_out, push_sender
+from services.push_transport import PAYLOAD_TRUNCATE, PayloadTooLarge, PushMessage, fit_payload
+from services.responses import FastJSONResponse
+from services.retention import inbox_since
+from services.targeting import (
+    Recipients, TooManyRecipients, push_recipient_results, requested_recipients,
+    resolve_internal_targets, resolve_push_targets, resolve_recipient_ids,
+)
+from storage.repository import (
+    EXPORT_COLUMNS, HISTORY_STATUSES, DeviceInfo, DigestSettings, HistoryFilter, PushReceipt, message_id_of,
+    push_log_entries,
+)
+from storage.routing import use_primary_reads
 
-# Cargar variables de entorno
-load_dotenv()
-
-# ==========================================
-# CONFIGURACIÓN DE LOGGING
-# ==========================================
-
-# Configurar logging con encoding UTF-8 para Windows
-import sys
-
-# Configurar stdout para UTF-8 en Windows
-if sys.platform == "win32":
-    import codecs
-    sys.stdout = codecs.getwriter("utf-8")(sys.stdout.detach())
-    sys.stderr = codecs.getwriter("utf-8")(sys.stderr.detach())
-
-# Configurar handlers con encoding UTF-8
-file_handler = logging.FileHandler('app.log', encoding='utf-8')
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-
-# Configurar el logger root
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.INFO)
-root_logger.addHandler(file_handler)
-root_logger.addHandler(console_handler)
+# Oracle y Firebase se inicializan en el lifespan (o en el primer uso),
+# nunca al importar el módulo
 
 # Loggers específicos
 logger = logging.getLogger("PushNotificationsAPI")
@@ -53,23 +52,41 @@ db_logger = logging.getLogger("Database")
 firebase_logger = logging.getLogger("Firebase")
 auth_logger = logging.getLogger("Authentication")
 
-app = FastAPI(title="Push Notifications API")
+router = APIRouter()
 security = HTTPBearer()
 
-# Agregar CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # En producción, especifica los dominios permitidos
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def get_context(request: Request) -> AppContext:
+    return request.app.state.ctx
+
+def circuit_guard(breaker_name: str, detail: str):
+    """Dependencia que responde 503 al instante mientras el circuito está abierto"""
+    def guard(ctx: AppContext = Depends(get_context)):
+        retry_after = getattr(ctx, breaker_name).retry_after()
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=detail,
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+    return guard
+
+storage_available = circuit_guard("storage_breaker", "Database unavailable")
+push_available = circuit_guard("fcm_breaker", "Push service unavailable")
 
 # ==========================================
 # MIDDLEWARE DE LOGGING
 # ==========================================
 
-@app.middleware("http")
+async def reject_during_shutdown(request: Request, call_next):
+    # Durante el apagado no se acepta trabajo nuevo; el balanceador reintenta en otro worker
+    if not request.app.state.ctx.lifecycle.accepting:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "Server is shutting down"},
+            headers={"Connection": "close", "Retry-After": "1"}
+        )
+    return await call_next(request)
+
 async def log_requests(request: Request, call_next):
     start_time = time.time()
     
@@ -102,11 +119,20 @@ async def log_requests(request: Request, call_next):
         except:
             logger.info("   📄 Request Body: [Could not read body]")
     
-    # Recrear el request para que siga funcionando
-    async def receive():
-        return {"type": "http.request", "body": body if 'body' in locals() else b""}
-    
-    request._receive = receive
+    # Recrear el request para que siga funcionando: el body una sola vez y después
+    # los mensajes reales (http.disconnect), que escuchan las respuestas en streaming
+    if 'body' in locals():
+        original_receive = request._receive
+        replayed = False
+        
+        async def receive():
+            nonlocal replayed
+            if replayed:
+                return await original_receive()
+            replayed = True
+            return {"type": "http.request", "body": body}
+        
+        request._receive = receive
     
     # Procesar request
     try:
@@ -128,123 +154,162 @@ async def log_requests(request: Request, call_next):
         logger.error(f"   📚 Traceback: {traceback.format_exc()}")
         raise
 
-# ==========================================
-# CONFIGURACIÓN ORIGINAL
-# ==========================================
+async def trace_requests(request: Request, call_next):
+    # Solo se instala con TRACE_EXPORTER: span raíz del request, continúa el traceparent del llamador
+    exporter = request.app.state.ctx.span_exporter
+    with start_trace(f"{request.method} {request.url.path}", exporter, request.headers.get("traceparent"),
+                     **{"http.method": request.method, "http.target": request.url.path}) as root:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            root.name = f"{request.method} {route.path}"
+        root.set(**{"http.status_code": response.status_code})
+        if response.status_code >= 500:
+            root.error = f"HTTP {response.status_code}"
+    response.headers["X-Trace-Id"] = root.trace_id
+    return response
 
-# Configuración desde variables de entorno
-SENDER_ID = int(os.getenv("SENDER_ID", "0"))
-SERVER_KEY = os.getenv("SERVER_KEY", "")
-FIREBASE_CREDENTIALS_PATH = os.getenv("FIREBASE_CREDENTIALS_PATH", "./push-notifications-app.json")
-
-# JWT Configuration
-SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret-key-change-this")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
-
-# Oracle Database Configuration
-ORACLE_USER = os.getenv("ORACLE_USER", "")
-ORACLE_PASSWORD = os.getenv("ORACLE_PASSWORD", "")
-ORACLE_HOST = os.getenv("ORACLE_HOST", "10.5.2.171")
-ORACLE_PORT = int(os.getenv("ORACLE_PORT", "1521"))
-ORACLE_SID = os.getenv("ORACLE_SID", "SICOOP")
-ORACLE_JAR_PATH = os.getenv("ORACLE_JAR_PATH", "./utils/instantclient")
-
-# Server Configuration
-HOST = os.getenv("HOST", "0.0.0.0")
-PORT = int(os.getenv("PORT", "8000"))
-ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
-
-logger.info(f"🚀 Initializing Push Notifications API")
-logger.info(f"   🌍 Environment: {ENVIRONMENT}")
-logger.info(f"   🖥️ Host: {HOST}:{PORT}")
-
-# Validar variables críticas
-if not ORACLE_USER or not ORACLE_PASSWORD:
-    logger.error("❌ ORACLE_USER and ORACLE_PASSWORD must be set in .env file")
-    raise ValueError("ORACLE_USER and ORACLE_PASSWORD must be set in .env file")
-
-if not SERVER_KEY:
-    logger.error("❌ SERVER_KEY must be set in .env file")
-    raise ValueError("SERVER_KEY must be set in .env file")
-
-if not os.path.exists(FIREBASE_CREDENTIALS_PATH):
-    logger.error(f"❌ Firebase credentials file not found: {FIREBASE_CREDENTIALS_PATH}")
-    raise ValueError(f"Firebase credentials file not found: {FIREBASE_CREDENTIALS_PATH}")
-
-# Inicializar Oracle Client
-try:
-    if ORACLE_JAR_PATH and os.path.exists(ORACLE_JAR_PATH):
-        oracledb.init_oracle_client(lib_dir=os.path.abspath(ORACLE_JAR_PATH))
-        logger.info(f"✅ Oracle Client initialized from: {os.path.abspath(ORACLE_JAR_PATH)}")
-    else:
-        logger.warning("⚠️ Oracle Client path not found, using Thin mode")
-except Exception as e:
-    logger.warning(f"⚠️ Oracle Client init failed, using Thin mode: {e}")
-
-# Construir DSN
-ORACLE_DSN = oracledb.makedsn(ORACLE_HOST, ORACLE_PORT, sid=ORACLE_SID)
-logger.info(f"✅ Oracle DSN: {ORACLE_DSN}")
-
-# Inicializar Firebase Admin
-try:
-    cred = credentials.Certificate(FIREBASE_CREDENTIALS_PATH)
-    firebase_admin.initialize_app(cred)
-    firebase_logger.info(f"✅ Firebase initialized successfully with project: {cred.project_id}")
-except Exception as e:
-    firebase_logger.error(f"❌ Error initializing Firebase: {e}")
-    raise
+async def profile_requests(request: Request, call_next):
+    # Solo se instala con PROFILE_TOKEN o PROFILE_SAMPLE_RATE: deshabilitado no cuesta nada por request
+    profiler = request.app.state.ctx.profiler
+    sampler = profiler.begin() if profiler.wants(request.headers.get(PROFILE_HEADER)) else None
+    if sampler is None:
+        return await call_next(request)
+    
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        elapsed = time.perf_counter() - start
+        try:
+            name = await asyncio.to_thread(profiler.end, sampler, request.method, request.url.path, elapsed)
+        except OSError as e:
+            logger.error(f"❌ Could not save profile for {request.url.path}: {e}")
+            name = None
+    if name:
+        response.headers["X-Profile-Id"] = name
+    return response
 
 # ==========================================
 # FUNCIONES DE UTILIDAD CON LOGGING
 # ==========================================
 
-@contextmanager
-def get_db_connection():
-    connection = None
-    try:
-        db_logger.info("🔗 Attempting Oracle connection...")
-        connection = oracledb.connect(
-            user=ORACLE_USER, 
-            password=ORACLE_PASSWORD, 
-            dsn=ORACLE_DSN
-        )
-        db_logger.info("✅ Oracle connection established")
-        yield connection
-    except oracledb.Error as e:
-        db_logger.error(f"❌ Oracle connection error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Database connection failed"
-        )
-    finally:
-        if connection:
-            connection.close()
-            db_logger.info("🔗 Oracle connection closed")
-
 def hash_password(password: str) -> str:
     auth_logger.info("🔐 Hashing password...")
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    with span("auth.bcrypt_hash"):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     auth_logger.info("🔐 Verifying password...")
-    result = bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    with span("auth.bcrypt_verify"):
+        result = bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
     auth_logger.info(f"🔐 Password verification: {'✅ Success' if result else '❌ Failed'}")
     return result
 
-def create_access_token(data: dict):
+def create_access_token(data: dict, settings: Settings):
     auth_logger.info(f"🎫 Creating access token for user: {data.get('sub', 'unknown')}")
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     auth_logger.info(f"✅ Access token created, expires: {expire}")
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def refresh_token_hash(token: str) -> str:
+    # El token son 256 bits aleatorios: con un SHA-256 alcanza, bcrypt solo hace falta para contraseñas
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def new_refresh_token(settings: Settings) -> Tuple[str, datetime]:
+    return secrets.token_urlsafe(32), datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
+
+def issue_refresh_token(ctx: AppContext, user_id: int) -> str:
+    """Refresh token de una familia nueva (un login); /token/refresh lo rota dentro de la familia"""
+    token, expires_at = new_refresh_token(ctx.settings)
+    ctx.get_repository().create_refresh_token(user_id, refresh_token_hash(token), secrets.token_hex(16), expires_at)
+    auth_logger.info(f"🎫 Refresh token issued for user ID {user_id}, expires: {expires_at}")
+    return token
+
+def rotate_refresh(repository, settings: Settings, token: str) -> Tuple[int, str, str]:
+    """
+    Busca el refresh token, lo rota dentro de su familia y devuelve
+    (user_id, username, token nuevo). Un reuso revoca la familia entera.
+    Síncrono: las tres idas a la base corren juntas en un thread.
+    """
+    now = datetime.utcnow()
+    token_hash = refresh_token_hash(token)
+    row = repository.get_refresh_token(token_hash, now)
+    if row is None:
+        raise invalid_refresh_token("unknown token")
+    
+    user_id, username, family_id, revoked, expired = row
+    if revoked and not expired:
+        # Un token ya rotado volvió a usarse: alguien más tiene la familia, se revoca entera
+        revoked_count = repository.revoke_refresh_tokens(family_id, now)
+        raise invalid_refresh_token(f"reused token for user ID {user_id}, revoked {revoked_count} in family")
+    if revoked or expired:
+        raise invalid_refresh_token(f"expired token for user ID {user_id}")
+    
+    # Rotación: el token presentado queda revocado y se entrega uno nuevo de la misma familia
+    refresh_token, expires_at = new_refresh_token(settings)
+    if not repository.rotate_refresh_token(token_hash, refresh_token_hash(refresh_token), expires_at, now):
+        # Otro request rotó el mismo token entre la lectura y el UPDATE: mismo trato que un reuso
+        repository.revoke_refresh_tokens(family_id, now)
+        raise invalid_refresh_token(f"concurrent rotation for user ID {user_id}")
+    return user_id, username, refresh_token
+
+def revoke_refresh_family(repository, token: str):
+    """Revoca la familia del refresh token; devuelve (user_id, revocados) o None si no existe"""
+    now = datetime.utcnow()
+    row = repository.get_refresh_token(refresh_token_hash(token), now)
+    if row is None:
+        return None
+    return row[0], repository.revoke_refresh_tokens(row[2], now)
+
+def create_user_account(repository, user: UserRegister) -> bool:
+    """
+    Crea el usuario con la contraseña hasheada; False si el username o el
+    email ya existen. Síncrono: el chequeo, bcrypt y el INSERT corren juntos
+    en un thread.
+    """
+    db_logger.info(f"🔍 Checking if user exists: {user.username}")
+    if repository.user_exists(user.username, user.email):
+        return False
+    logger.info(f"💾 Creating new user: {user.username}")
+    repository.create_user(user.username, user.email, hash_password(user.password))
+    return True
+
+def authenticate_user(repository, username: str, password: str):
+    """
+    Devuelve la fila (user_id, username, password_hash) si el usuario existe y
+    la contraseña coincide, None si no. Síncrono: el lookup y bcrypt corren
+    juntos en un thread.
+    """
+    db_logger.info(f"🔍 Looking up user: {username}")
+    db_user = repository.get_login_user(username)
+    if not db_user:
+        logger.warning(f"⚠️ Login failed: User {username} not found")
+        return None
+    
+    logger.info(f"👤 User found: {username} (ID: {db_user[0]})")
+    
+    if not verify_password(password, db_user[2]):
+        logger.warning(f"⚠️ Login failed: Invalid password for {username}")
+        return None
+    return db_user
+
+def invalid_refresh_token(reason: str) -> HTTPException:
+    auth_logger.warning(f"⚠️ Token refresh rejected: {reason}")
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token"
+    )
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security), ctx: AppContext = Depends(get_context)):
     try:
         auth_logger.info("🎫 Verifying access token...")
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        settings = ctx.settings
+        with span("auth.jwt_verify"):
+            payload = jwt.decode(credentials.credentials, settings.secret_key, algorithms=[settings.algorithm])
         username: str = payload.get("sub")
         user_id: int = payload.get("user_id")
         
@@ -264,53 +329,51 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
             detail="Could not validate credentials"
         )
 
+def require_admin(current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
+    if not ctx.settings.is_admin(current_user["sub"]):
+        auth_logger.warning(f"⚠️ Admin endpoint denied for {current_user['sub']}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
+async def read_your_writes(current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
+    """Si el usuario escribió hace poco, sus lecturas de este request van al primario y no a la réplica"""
+    if ctx.recent_writers.recent(current_user["user_id"]):
+        use_primary_reads()
+
 # ==========================================
 # ENDPOINTS CON LOGGING DETALLADO
 # ==========================================
 
-@app.get("/")
-async def root():
+@router.get("/")
+async def root(ctx: AppContext = Depends(get_context)):
     logger.info("📋 Root endpoint accessed")
     return {
         "message": "Push Notifications API",
-        "environment": ENVIRONMENT,
+        "environment": ctx.settings.environment,
         "version": "1.0.0",
         "docs": "/docs"
     }
 
-@app.post("/register")
-async def register_user(user: UserRegister):
+@router.post("/register", dependencies=[Depends(storage_available)])
+async def register_user(user: UserRegister, ctx: AppContext = Depends(get_context)):
     logger.info(f"👤 Registration attempt for user: {user.username}")
     logger.info(f"   📧 Email: {user.email}")
     
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Verificar si usuario ya existe
-            db_logger.info(f"🔍 Checking if user exists: {user.username}")
-            cursor.execute("SELECT id FROM test.np_users WHERE username = :1 OR email = :2", 
-                        (user.username, user.email))
-            existing_user = cursor.fetchone()
-            
-            if existing_user:
-                logger.warning(f"⚠️ Registration failed: User {user.username} already exists")
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Username or email already registered"
-                )
-            
-            # Crear usuario
-            logger.info(f"💾 Creating new user: {user.username}")
-            hashed_password = hash_password(user.password)
-            cursor.execute("""
-                INSERT INTO test.np_users (username, email, password_hash) 
-                VALUES (:1, :2, :3)
-            """, (user.username, user.email, hashed_password))
-            conn.commit()
-            
-            logger.info(f"✅ User {user.username} registered successfully")
-            return {"message": "User registered successfully"}
+        # bcrypt y la base fuera del event loop
+        if not await asyncio.to_thread(create_user_account, ctx.get_repository(), user):
+            logger.warning(f"⚠️ Registration failed: User {user.username} already exists")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Username or email already registered"
+            )
+        ctx.stats.incr("users")
+        
+        logger.info(f"✅ User {user.username} registered successfully")
+        return {"message": "User registered successfully"}
             
     except HTTPException:
         raise
@@ -322,48 +385,31 @@ async def register_user(user: UserRegister):
             detail="Registration failed"
         )
 
-@app.post("/login")
-async def login_user(user: UserLogin):
+@router.post("/login", dependencies=[Depends(storage_available)])
+async def login_user(user: UserLogin, ctx: AppContext = Depends(get_context)):
     logger.info(f"🔑 Login attempt for user: {user.username}")
     
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            db_logger.info(f"🔍 Looking up user: {user.username}")
-            cursor.execute("""
-                SELECT id, username, password_hash 
-                FROM test.np_users WHERE username = :1
-            """, (user.username,))
-            
-            db_user = cursor.fetchone()
-            
-            if not db_user:
-                logger.warning(f"⚠️ Login failed: User {user.username} not found")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Incorrect username or password"
-                )
-            
-            logger.info(f"👤 User found: {user.username} (ID: {db_user[0]})")
-            
-            if not verify_password(user.password, db_user[2]):
-                logger.warning(f"⚠️ Login failed: Invalid password for {user.username}")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Incorrect username or password"
-                )
-            
-            # Crear token
-            access_token = create_access_token(data={"sub": user.username, "user_id": db_user[0]})
-            
-            logger.info(f"✅ Login successful for {user.username}")
-            return {
-                "access_token": access_token,
-                "token_type": "bearer",
-                "user_id": db_user[0],
-                "username": db_user[1]
-            }
+        # bcrypt y la base fuera del event loop
+        db_user = await asyncio.to_thread(authenticate_user, ctx.get_repository(), user.username, user.password)
+        if not db_user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect username or password"
+            )
+        
+        # Crear tokens: el refresh token evita repetir bcrypt cuando vence el access token
+        access_token = create_access_token(data={"sub": user.username, "user_id": db_user[0]}, settings=ctx.settings)
+        refresh_token = await asyncio.to_thread(issue_refresh_token, ctx, db_user[0])
+        
+        logger.info(f"✅ Login successful for {user.username}")
+        return {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "refresh_token": refresh_token,
+            "user_id": db_user[0],
+            "username": db_user[1]
+        }
             
     except HTTPException:
         raise
@@ -375,8 +421,55 @@ async def login_user(user: UserLogin):
             detail="Login failed"
         )
 
-@app.post("/register-device")
-async def register_device(device: DeviceRegister, current_user = Depends(verify_token)):
+@router.post("/token/refresh", dependencies=[Depends(storage_available)])
+async def refresh_access_token(body: TokenRefresh, ctx: AppContext = Depends(get_context)):
+    auth_logger.info("🔄 Token refresh attempt")
+    
+    try:
+        user_id, username, refresh_token = await asyncio.to_thread(
+            rotate_refresh, ctx.get_repository(), ctx.settings, body.refresh_token
+        )
+        access_token = create_access_token(data={"sub": username, "user_id": user_id}, settings=ctx.settings)
+        
+        auth_logger.info(f"✅ Token refreshed for {username} (ID: {user_id})")
+        return {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "refresh_token": refresh_token,
+            "user_id": user_id,
+            "username": username
+        }
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Token refresh error: {e}")
+        logger.error(f"📚 Traceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Token refresh failed"
+        )
+
+@router.post("/token/revoke", dependencies=[Depends(storage_available)])
+async def revoke_refresh_token(body: TokenRefresh, ctx: AppContext = Depends(get_context)):
+    """Logout: revoca el refresh token y todos los rotados de su familia"""
+    try:
+        revoked = await asyncio.to_thread(revoke_refresh_family, ctx.get_repository(), body.refresh_token)
+        # Un token desconocido también responde 200: no se revela si existía
+        if revoked is not None:
+            auth_logger.info(f"🚪 Refresh tokens revoked for user ID {revoked[0]}: {revoked[1]}")
+        return {"message": "Refresh token revoked"}
+        
+    except Exception as e:
+        logger.error(f"❌ Token revoke error: {e}")
+        logger.error(f"📚 Traceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Token revoke failed"
+        )
+
+@router.post("/register-device", dependencies=[Depends(storage_available)])
+async def register_device(device: DeviceRegister, current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
     user_id = current_user["user_id"]
     username = current_user["sub"]
     
@@ -385,37 +478,16 @@ async def register_device(device: DeviceRegister, current_user = Depends(verify_
     logger.info(f"   🔥 FCM Token: {device.fcm_token[:20]}...{device.fcm_token[-10:]}")
     
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Verificar si el device ya existe
-            db_logger.info(f"🔍 Checking existing device for user {user_id}")
-            cursor.execute("""
-                SELECT id FROM test.np_devices 
-                WHERE user_id = :1 AND device_id = :2
-            """, (user_id, device.device_id))
-            
-            existing_device = cursor.fetchone()
-            
-            if existing_device:
-                logger.info(f"🔄 Updating existing device {device.device_id}")
-                cursor.execute("""
-                    UPDATE test.np_devices 
-                    SET fcm_token = :1, updated_at = CURRENT_TIMESTAMP
-                    WHERE user_id = :2 AND device_id = :3
-                """, (device.fcm_token, user_id, device.device_id))
-                action = "updated"
-            else:
-                logger.info(f"➕ Creating new device registration {device.device_id}")
-                cursor.execute("""
-                    INSERT INTO test.np_devices (user_id, device_id, fcm_token)
-                    VALUES (:1, :2, :3)
-                """, (user_id, device.device_id, device.fcm_token))
-                action = "created"
-            
-            conn.commit()
-            logger.info(f"✅ Device {action} successfully for user {username}")
-            return {"message": "Device registered successfully"}
+        # MERGE: registro o actualización en un solo round trip
+        db_logger.info(f"🔍 Upserting device for user {user_id}")
+        await asyncio.to_thread(
+            ctx.get_repository().upsert_device, user_id, device.device_id, device.fcm_token,
+            device.device_name, device.os_version, device.app_version
+        )
+        ctx.recent_writers.note(user_id)
+        
+        logger.info(f"✅ Device registered successfully for user {username}")
+        return {"message": "Device registered successfully"}
             
     except Exception as e:
         logger.error(f"❌ Device registration error for {username}: {e}")
@@ -425,95 +497,330 @@ async def register_device(device: DeviceRegister, current_user = Depends(verify_
             detail="Device registration failed"
         )
 
-@app.post("/send-push-notification")
-async def send_push_notification(notification: PushNotification, current_user = Depends(verify_token)):
+@router.post("/register-devices", dependencies=[Depends(storage_available)])
+async def register_devices(batch: DeviceBatch, current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
+    user_id = current_user["user_id"]
     username = current_user["sub"]
     
-    logger.info(f"🔔 Push notification request from user: {username}")
-    logger.info(f"   📝 Title: {notification.title}")
-    logger.info(f"   📄 Body: {notification.body[:100]}...")
-    logger.info(f"   🎯 Target User ID: {notification.user_id}")
-    logger.info(f"   🎯 Target Username: {notification.username}")
+    logger.info(f"📱 Batch device sync for user: {username} (ID: {user_id}), {len(batch.devices)} devices")
+    
+    limit = ctx.settings.max_device_batch
+    if len(batch.devices) > limit:
+        logger.warning(f"⚠️ Too many devices: {len(batch.devices)} (max {limit})")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many devices: {len(batch.devices)} (max {limit})"
+        )
+    
+    # Un device_id repetido en el batch: gana el último
+    devices = {
+        device.device_id: DeviceInfo(user_id, device.device_id, device.fcm_token,
+                                     device.device_name, device.os_version, device.app_version)
+        for device in batch.devices
+    }
     
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Obtener tokens FCM
-            if notification.user_id:
-                logger.info(f"🔍 Getting FCM tokens for user ID: {notification.user_id}")
-                cursor.execute("SELECT fcm_token FROM test.np_devices WHERE user_id = :1", (notification.user_id,))
-            elif notification.username:
-                logger.info(f"🔍 Getting FCM tokens for username: {notification.username}")
-                cursor.execute("""
-                    SELECT d.fcm_token FROM test.np_devices d
-                    JOIN test.np_users u ON d.user_id = u.id
-                    WHERE u.username = :1
-                """, (notification.username,))
-            else:
-                logger.info("🔍 Getting FCM tokens for ALL users")
-                cursor.execute("SELECT fcm_token FROM test.np_devices")
-            
-            tokens = [row[0] for row in cursor.fetchall()]
-            logger.info(f"📱 Found {len(tokens)} FCM tokens")
+        db_logger.info(f"🔍 Upserting {len(devices)} devices in one batch for user {user_id}")
+        count = await asyncio.to_thread(ctx.get_repository().upsert_devices, list(devices.values()))
+        ctx.recent_writers.note(user_id)
+        
+        logger.info(f"✅ {count} devices synced for user {username}")
+        return {"message": "Devices registered successfully", "count": count}
             
-            if not tokens:
-                logger.warning("⚠️ No devices found for push notification")
+    except Exception as e:
+        logger.error(f"❌ Batch device sync error for {username}: {e}")
+        logger.error(f"📚 Traceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Device registration failed"
+        )
+
+@router.post("/push-receipts", status_code=status.HTTP_202_ACCEPTED)
+async def push_receipts(body: Union[ReceiptBatch, PushReceiptIn], current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
+    user_id = current_user["user_id"]
+    receipts = body.receipts if isinstance(body, ReceiptBatch) else [body]
+    
+    limit = ctx.settings.max_receipt_batch
+    if len(receipts) > limit:
+        logger.warning(f"⚠️ Too many receipts: {len(receipts)} (max {limit})")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many receipts: {len(receipts)} (max {limit})"
+        )
+    
+    # Se aplican en el próximo flush del buffer; la hora del dispositivo no puede ser futura
+    now = datetime.utcnow()
+    accepted = ctx.receipts.add([
+        PushReceipt(
+            user_id=user_id,
+            message_id=message_id_of(receipt.message_id),
+            event=receipt.event,
+            at=min(to_utc(receipt.at), now) if receipt.at else now
+        )
+        for receipt in receipts
+    ])
+    return {"message": "Receipts accepted", "accepted": accepted}
+
+def to_utc(moment: datetime) -> datetime:
+    """datetime naive en UTC, como CURRENT_TIMESTAMP"""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+def target_recipients(notification, ctx: AppContext):
+    try:
+        return requested_recipients(notification, ctx.settings.max_recipients)
+    except TooManyRecipients as e:
+        logger.warning(f"⚠️ {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+def count_pushes(ctx: AppContext, result):
+    ctx.stats.incr("pushes_sent", result.success_count, daily=True)
+    ctx.stats.incr("pushes_failed", result.failure_count, daily=True)
+
+async def record_push_log(ctx: AppContext, title: str, body: str, result, token_owners: dict):
+    """Guarda un registro por token; un fallo del log no afecta la respuesta del push"""
+    entries = push_log_entries(title, body, result.outcomes, token_owners)
+    try:
+        count = await asyncio.to_thread(ctx.get_repository().record_push_log, entries)
+        db_logger.info(f"🧾 Push log: {count} rows recorded")
+    except Exception as e:
+        db_logger.error(f"❌ Push log write failed: {e}")
+
+def build_push_message(ctx: AppContext, notification: PushNotification) -> PushMessage:
+    """
+    Payload compartido por todos los tokens del push, ya dentro del límite de
+    FCM: uno que no entra fallaría en cada token, se rechaza antes del fan-out.
+    """
+    push_message = PushMessage(
+        title=notification.title,
+        body=notification.body,
+        data={
+            'click_action': 'FLUTTER_NOTIFICATION_CLICK',
+            'type': 'push_notification'
+        },
+        priority=notification.priority,
+        collapse_key=notification.collapse_key
+    )
+    try:
+        return fit_payload(push_message, ctx.settings.push_payload_limit,
+                           truncate=ctx.settings.push_payload_overflow == PAYLOAD_TRUNCATE)
+    except PayloadTooLarge as e:
+        logger.warning(f"⚠️ Push rejected: payload is {e.size} bytes (limit {e.limit})")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Push payload is {e.size} bytes; FCM limit is {e.limit}"
+        )
+
+async def deliver_push(ctx: AppContext, notification: PushNotification, recipients, tracked: bool = False) -> dict:
+    """
+    Resuelve tokens, hace el fan-out y registra el push log. ``tracked`` indica
+    que el llamador ya es una tarea del lifecycle (push retenido por collapse_key).
+    """
+    if recipients.broadcast and ctx.settings.broadcast_workers > 1:
+        return await deliver_partitioned_broadcast(ctx, notification, tracked)
+    
+    # Obtener tokens FCM: listas resueltas por lotes con array bind, tokens sin duplicados
+    if recipients.broadcast:
+        logger.info("🔍 Getting FCM tokens for ALL users")
+    else:
+        logger.info(f"🔍 Getting FCM tokens for {recipients.count} recipients")
+    with span("push.resolve_targets", broadcast=recipients.broadcast) as stage:
+        targets = await asyncio.to_thread(resolve_push_targets, ctx.get_repository(), recipients)
+        if stage is not None:
+            stage.set(tokens=len(targets.tokens))
+    tokens = targets.tokens
+    
+    logger.info(f"📱 Found {len(tokens)} FCM tokens")
+    
+    if not tokens:
+        logger.warning("⚠️ No devices found for push notification")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No devices found"
+        )
+    
+    # Log de tokens (parcial por seguridad)
+    for i, token in enumerate(tokens):
+        logger.info(f"   🔥 Token {i+1}: {token[:15]}...{token[-10:]}")
+    
+    # Enviar notificación push
+    firebase_logger.info("🚀 Sending push notification via FCM...")
+    
+    transport = ctx.get_push_transport()
+    await asyncio.to_thread(transport.warmup)
+    # Notification, configs de Android/APNs y data se arman una vez para todo el fan-out
+    push_message = transport.prepare(build_push_message(ctx, notification))
+    
+    send_one = push_sender(ctx.fcm_breaker, transport, push_message)
+    
+    # La tarea del fan-out se crea dentro del span: copia el contexto y los envíos quedan anidados
+    with span("push.fanout", tokens=len(tokens), priority=notification.priority) as stage:
+        fanout = fan_out(tokens, send_one, concurrency=ctx.settings.push_concurrency,
+                         scheduler=ctx.push_scheduler, priority=notification.priority)
+        if tracked:
+            result = await fanout
+        else:
+            # El fan-out se rastrea en el lifecycle para que un apagado a mitad de
+            # broadcast espere a que termine; shield evita cancelarlo si el cliente se va
+            try:
+                task = ctx.lifecycle.spawn(fanout, name="push-fanout")
+            except ShutdownInProgress:
                 raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No devices found"
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is shutting down"
                 )
-            
-            # Log de tokens (parcial por seguridad)
-            for i, token in enumerate(tokens):
-                logger.info(f"   🔥 Token {i+1}: {token[:15]}...{token[-10:]}")
-            
-            # Enviar notificación push
-            firebase_logger.info("🚀 Sending push notification via FCM...")
-            
-            success_count = 0
-            failure_count = 0
-            errors = []
-            
-            # Enviar a cada token individualmente (compatible con todas las versiones)
-            for i, token in enumerate(tokens):
-                try:
-                    message = messaging.Message(
-                        notification=messaging.Notification(
-                            title=notification.title,
-                            body=notification.body
-                        ),
-                        data={
-                            'click_action': 'FLUTTER_NOTIFICATION_CLICK',
-                            'type': 'push_notification'
-                        },
-                        token=token
-                    )
-                    
-                    response = messaging.send(message)
-                    firebase_logger.info(f"   ✅ Token {i+1} sent successfully: {response}")
-                    success_count += 1
-                    
-                except Exception as token_error:
-                    firebase_logger.error(f"   ❌ Token {i+1} failed: {str(token_error)}")
-                    failure_count += 1
-                    errors.append(str(token_error))
-            
-            firebase_logger.info(f"📊 FCM Response Summary:")
-            firebase_logger.info(f"   ✅ Success: {success_count}")
-            firebase_logger.info(f"   ❌ Failures: {failure_count}")
-            
-            if errors:
-                firebase_logger.error(f"   💥 Errors: {errors}")
-            
-            logger.info(f"✅ Push notification sent successfully")
-            return {
-                "message": "Push notification sent",
-                "success_count": success_count,
-                "failure_count": failure_count,
-                "tokens_used": len(tokens),
-                "errors": errors if errors else None
-            }
+            result = await asyncio.shield(task)
+        if stage is not None:
+            stage.set(success=result.success_count, failure=result.failure_count)
+    
+    firebase_logger.info(f"📊 FCM Response Summary:")
+    firebase_logger.info(f"   ✅ Success: {result.success_count}")
+    firebase_logger.info(f"   ❌ Failures: {result.failure_count}")
+    
+    if result.errors:
+        firebase_logger.error(f"   💥 Errors: {result.errors}")
+    count_pushes(ctx, result)
+    
+    if ctx.settings.push_log_enabled:
+        with span("push.log", rows=len(result.outcomes)):
+            await record_push_log(ctx, push_message.title, push_message.body, result, targets.token_owners)
+    
+    logger.info(f"✅ Push notification sent successfully")
+    response = {
+        "message": "Push notification sent",
+        "success_count": result.success_count,
+        "failure_count": result.failure_count,
+        "tokens_used": len(tokens),
+        "errors": result.errors if result.errors else None
+    }
+    if not recipients.broadcast:
+        response["recipients"] = push_recipient_results(targets, result)
+    return response
+
+async def deliver_partitioned_broadcast(ctx: AppContext, notification: PushNotification, tracked: bool) -> dict:
+    """
+    Broadcast repartido entre BROADCAST_WORKERS procesos por MOD(id, N) sobre
+    los devices: cada uno lee sus tokens en lotes, envía con su propio transport
+    y escribe su push log; aquí solo se agrega el progreso.
+    """
+    partitions = ctx.settings.broadcast_workers
+    logger.info(f"🔍 Broadcasting to ALL users across {partitions} partitions")
+    # El worker prepara el mensaje con su transport; aquí se arma sin preparar
+    push_message = build_push_message(ctx, notification)
+    
+    with span("push.broadcast", partitions=partitions, priority=notification.priority) as stage:
+        broadcast = partitioned_broadcast(ctx.settings, push_message, notification.priority, partitions)
+        if tracked:
+            result = await broadcast
+        else:
+            try:
+                task = ctx.lifecycle.spawn(broadcast, name="push-broadcast")
+            except ShutdownInProgress:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is shutting down"
+                )
+            result = await asyncio.shield(task)
+        if stage is not None:
+            stage.set(success=result.success_count, failure=result.failure_count)
+    
+    tokens_used = result.success_count + result.failure_count
+    if not tokens_used and not result.errors:
+        logger.warning("⚠️ No devices found for push notification")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No devices found"
+        )
+    
+    firebase_logger.info(f"📊 FCM Response Summary:")
+    firebase_logger.info(f"   ✅ Success: {result.success_count}")
+    firebase_logger.info(f"   ❌ Failures: {result.failure_count}")
+    
+    if result.errors:
+        firebase_logger.error(f"   💥 Errors: {result.errors}")
+    count_pushes(ctx, result)
+    
+    logger.info(f"✅ Push notification sent successfully")
+    return {
+        "message": "Push notification sent",
+        "success_count": result.success_count,
+        "failure_count": result.failure_count,
+        "tokens_used": tokens_used,
+        "errors": result.errors if result.errors else None,
+        "partitions": partitions
+    }
+
+async def hold_push(ctx: AppContext, notification: PushNotification, recipients) -> dict:
+    """
+    Retiene el push por (user_id, collapse_key): los destinatarios se resuelven
+    a user ids y cada uno ocupa su slot, así un usuario recibe un solo push por
+    ventana aunque lo pidan por user_id, por username o dentro de una lista.
+    Si el usuario ya tenía uno retenido, el nuevo lo reemplaza.
+    """
+    if recipients.broadcast:
+        user_ids, missing = [None], []
+    else:
+        user_ids, missing = await asyncio.to_thread(resolve_recipient_ids, ctx.get_repository(), recipients)
+        if not user_ids:
+            logger.warning("⚠️ No devices found for push notification")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No devices found"
+            )
+    
+    slots = []
+    try:
+        for user_id in user_ids:
+            target = recipients if user_id is None else Recipients(user_ids=[user_id])
+            held = ctx.push_coalescer.submit(
+                collapse_target(user_id, notification.collapse_key), notification,
+                lambda latest, target=target: deliver_push(ctx, latest, target, tracked=True)
+            )
+            slots.append({"user_id": user_id, **held})
+    except ShutdownInProgress:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is shutting down"
+        )
+    
+    # "held" si el push abrió al menos una ventana; se envía entero cuando cierra la última
+    held_status = "held" if any(slot["status"] == "held" for slot in slots) else "collapsed"
+    send_in_ms = max(slot["send_in_ms"] for slot in slots)
+    logger.info(f"🧩 Push {held_status} for collapse_key {notification.collapse_key!r} "
+                f"({len(slots)} slots), sending in {send_in_ms}ms")
+    response = {
+        "message": "Push notification queued",
+        "collapse_key": notification.collapse_key,
+        "status": held_status,
+        "send_in_ms": send_in_ms
+    }
+    if not recipients.broadcast:
+        response["recipients"] = slots + [{"username": username, "status": "not_found"} for username in missing]
+    return response
+
+@router.post("/send-push-notification", dependencies=[Depends(storage_available), Depends(push_available), Depends(read_your_writes)])
+async def send_push_notification(notification: PushNotification, current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
+    username = current_user["sub"]
+    
+    logger.info(f"🔔 Push notification request from user: {username}")
+    logger.info(f"   📝 Title: {notification.title}")
+    logger.info(f"   📄 Body: {notification.body[:100]}...")
+    logger.info(f"   ⚡ Priority: {notification.priority}")
+    recipients = target_recipients(notification, ctx)
+    logger.info(f"   🎯 Target users: {len(recipients.user_ids)} ids, {len(recipients.usernames)} usernames")
+    # Antes de retener o resolver tokens: un payload que excede el límite no se acepta
+    build_push_message(ctx, notification)
+    
+    # Ráfagas con el mismo collapse_key: solo se envía el último de la ventana
+    if notification.collapse_key and ctx.settings.push_collapse_window_ms > 0:
+        return await hold_push(ctx, notification, recipients)
+    
+    try:
+        return await deliver_push(ctx, notification, recipients)
             
     except HTTPException:
         raise
@@ -525,62 +832,112 @@ async def send_push_notification(notification: PushNotification, current_user =
             detail=f"Failed to send notification: {str(e)}"
         )
 
-@app.post("/send-internal-notification")
-async def send_internal_notification(notification: InternalNotification, current_user = Depends(verify_token)):
+async def queue_digests(ctx: AppContext, user_ids, title: str, message: str) -> int:
+    """Encola el push de la notificación interna para los usuarios que lo tienen habilitado"""
+    try:
+        preferences = await asyncio.to_thread(ctx.get_repository().get_digest_settings, user_ids)
+    except Exception as e:
+        # La notificación ya está en el inbox; solo se pierde el push
+        logger.error(f"❌ Could not load digest settings: {e}")
+        return 0
+    
+    enabled = [settings for settings in preferences.values() if settings.push_enabled]
+    for settings in enabled:
+        ctx.digests.add(settings, title, message)
+    if enabled:
+        logger.info(f"📬 Internal notification queued as push for {len(enabled)} users")
+    return len(enabled)
+
+async def deliver_digests(ctx: AppContext, digests):
+    """Un push por usuario con el resumen de lo acumulado en su ventana"""
+    rows = await asyncio.to_thread(ctx.get_repository().get_tokens_by_user_ids, [d.user_id for d in digests])
+    user_tokens = {}
+    for user_id, token in rows:
+        user_tokens.setdefault(user_id, []).append(token)
+    
+    transport = ctx.get_push_transport()
+    await asyncio.to_thread(transport.warmup)
+    
+    async def send_digest(digest):
+        tokens = user_tokens.get(digest.user_id)
+        if not tokens:
+            return
+        title, body = digest.summary()
+        push_message = PushMessage(
+            title=title,
+            body=body,
+            data={
+                'click_action': 'FLUTTER_NOTIFICATION_CLICK',
+                'type': 'internal_digest',
+                'count': str(digest.count)
+            },
+            collapse_key="internal-digest"
+        )
+        # El resumen lo arma el servidor: se recorta en vez de perder el push
+        try:
+            push_message = transport.prepare(fit_payload(push_message, ctx.settings.push_payload_limit, truncate=True))
+        except PayloadTooLarge as e:
+            firebase_logger.error(f"❌ Digest push for user {digest.user_id} dropped: {e}")
+            return
+        title, body = push_message.title, push_message.body
+        
+        result = await fan_out(tokens, push_sender(ctx.fcm_breaker, transport, push_message), concurrency=ctx.settings.push_concurrency,
+                               scheduler=ctx.push_scheduler)
+        count_pushes(ctx, result)
+        if ctx.settings.push_log_enabled:
+            await record_push_log(ctx, title, body, result, {token: digest.user_id for token in tokens})
+    
+    await asyncio.gather(*(send_digest(digest) for digest in digests))
+    firebase_logger.info(f"📬 Digest pushes sent to {len(digests)} users "
+                         f"({sum(d.count for d in digests)} notifications)")
+
+@router.post("/send-internal-notification", dependencies=[Depends(storage_available), Depends(read_your_writes)])
+async def send_internal_notification(notification: InternalNotification, current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
     username = current_user["sub"]
     
     logger.info(f"📢 Internal notification request from user: {username}")
     logger.info(f"   📝 Title: {notification.title}")
     logger.info(f"   📄 Message: {notification.message[:100]}...")
-    logger.info(f"   🎯 Target User ID: {notification.user_id}")
-    logger.info(f"   🎯 Target Username: {notification.username}")
+    recipients = target_recipients(notification, ctx)
+    logger.info(f"   🎯 Target users: {len(recipients.user_ids)} ids, {len(recipients.usernames)} usernames")
     
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Obtener user_ids objetivo
-            user_ids = []
-            if notification.user_id:
-                logger.info(f"🔍 Targeting specific user ID: {notification.user_id}")
-                user_ids = [notification.user_id]
-            elif notification.username:
-                logger.info(f"🔍 Looking up user by username: {notification.username}")
-                cursor.execute("SELECT id FROM test.np_users WHERE username = :1", (notification.username,))
-                user = cursor.fetchone()
-                if user:
-                    user_ids = [user[0]]
-                    logger.info(f"👤 Found user ID: {user[0]}")
-            else:
-                logger.info("🔍 Targeting ALL users")
-                cursor.execute("SELECT id FROM test.np_users")
-                user_ids = [row[0] for row in cursor.fetchall()]
-            
-            logger.info(f"🎯 Targeting {len(user_ids)} users")
-            
-            if not user_ids:
-                logger.warning("⚠️ No users found for internal notification")
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No users found"
-                )
-            
-            # Insertar notificaciones internas
-            logger.info("💾 Creating internal notifications...")
-            for user_id in user_ids:
-                cursor.execute("""
-                    INSERT INTO test.np_internal_notifications (user_id, title, message)
-                    VALUES (:1, :2, :3)
-                """, (user_id, notification.title, notification.message))
-                logger.info(f"   ✅ Created notification for user ID: {user_id}")
-            
-            conn.commit()
-            
-            logger.info(f"✅ Internal notifications sent to {len(user_ids)} users")
-            return {
-                "message": "Internal notifications sent",
-                "count": len(user_ids)
-            }
+        repository = ctx.get_repository()
+        
+        # Obtener user_ids objetivo (solo los que existen)
+        if recipients.broadcast:
+            logger.info("🔍 Targeting ALL users")
+        else:
+            logger.info(f"🔍 Resolving {recipients.count} recipients")
+        targets = await asyncio.to_thread(resolve_internal_targets, repository, recipients)
+        user_ids = targets.user_ids
+        
+        logger.info(f"🎯 Targeting {len(user_ids)} users")
+        
+        if not user_ids:
+            logger.warning("⚠️ No users found for internal notification")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No users found"
+            )
+        
+        # Insertar notificaciones internas en un solo batch
+        logger.info("💾 Creating internal notifications...")
+        count = await asyncio.to_thread(repository.create_internal_notifications, user_ids,
+                                        notification.title, notification.message)
+        
+        logger.info(f"✅ Internal notifications sent to {count} users")
+        ctx.stats.incr("internal_notifications", count, daily=True)
+        ctx.stats.incr("unread_notifications", count)
+        push_queued = await queue_digests(ctx, user_ids, notification.title, notification.message)
+        response = {
+            "message": "Internal notifications sent",
+            "count": count,
+            "push_queued": push_queued
+        }
+        if not recipients.broadcast:
+            response["recipients"] = targets.results
+        return response
             
     except HTTPException:
         raise
@@ -592,52 +949,39 @@ async def send_internal_notification(notification: InternalNotification, current
             detail="Failed to send internal notification"
         )
 
-@app.get("/internal-notifications")
-async def get_internal_notifications(current_user = Depends(verify_token)):
+@router.get("/internal-notifications", dependencies=[Depends(storage_available), Depends(read_your_writes)])
+async def get_internal_notifications(current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
     user_id = current_user["user_id"]
     username = current_user["sub"]
     
     logger.info(f"📋 Getting internal notifications for user: {username} (ID: {user_id})")
     
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Usar TO_CHAR() para convertir CLOB a VARCHAR2 directamente en la query
-            cursor.execute("""
-                SELECT id, 
-                       TO_CHAR(title) as title, 
-                       TO_CHAR(message) as message, 
-                       is_read, 
-                       created_at
-                FROM test.np_internal_notifications
-                WHERE user_id = :1
-                ORDER BY created_at DESC
-            """, (user_id,))
-            
-            notifications = []
-            for row in cursor.fetchall():
-                # Ahora todos los campos deberían ser tipos primitivos
-                notification_data = {
-                    "id": int(row[0]) if row[0] is not None else 0,
-                    "title": str(row[1]) if row[1] is not None else "",
-                    "message": str(row[2]) if row[2] is not None else "",
-                    "is_read": bool(row[3]) if row[3] is not None else False,
-                    "created_at": row[4].isoformat() if row[4] is not None else None
-                }
-                notifications.append(notification_data)
-                
-                logger.info(f"   📄 Notification {notification_data['id']}: {notification_data['title'][:30]}...")
-            
-            unread_count = len([n for n in notifications if not n["is_read"]])
-            logger.info(f"📊 Found {len(notifications)} notifications ({unread_count} unread) for {username}")
-            
-            # Crear respuesta explícita con tipos primitivos
-            response_data = {
-                "notifications": notifications
-            }
-            
-            return response_data
+        # Límite en created_at: Oracle solo lee las particiones de la ventana
+        rows = await asyncio.to_thread(ctx.get_repository().list_internal_notifications, user_id,
+                                       inbox_since(ctx.settings))
+        
+        # Una sola pasada: arma cada item y cuenta los no leídos
+        notifications = []
+        unread_count = 0
+        for notification_id, title, message, is_read, created_at in rows:
+            is_read = bool(is_read)
+            unread_count += not is_read
+            notifications.append({
+                "id": notification_id,
+                "title": title or "",
+                "message": message or "",
+                "is_read": is_read,
+                "created_at": created_at
+            })
+        
+        logger.info(f"📊 Found {len(notifications)} notifications ({unread_count} unread) for {username}")
+        
+        # orjson serializa datetime en ISO 8601 sin pasar por jsonable_encoder
+        return FastJSONResponse({
+            "notifications": notifications,
+            "unread_count": unread_count
+        })
             
     except Exception as e:
         logger.error(f"❌ Error getting notifications for {username}: {e}")
@@ -647,33 +991,27 @@ async def get_internal_notifications(current_user = Depends(verify_token)):
             detail="Failed to get notifications"
         )
 
-@app.put("/internal-notifications/{notification_id}/read")
-async def mark_notification_as_read(notification_id: int, current_user = Depends(verify_token)):
+@router.put("/internal-notifications/{notification_id}/read", dependencies=[Depends(storage_available)])
+async def mark_notification_as_read(notification_id: int, current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
     user_id = current_user["user_id"]
     username = current_user["sub"]
     
     logger.info(f"✅ Marking notification {notification_id} as read for user: {username}")
     
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE test.np_internal_notifications 
-                SET is_read = 1
-                WHERE id = :1 AND user_id = :2
-            """, (notification_id, user_id))
-            
-            if cursor.rowcount == 0:
-                logger.warning(f"⚠️ Notification {notification_id} not found for user {username}")
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Notification not found"
-                )
-            
-            conn.commit()
-            logger.info(f"✅ Notification {notification_id} marked as read for {username}")
-            return {"message": "Notification marked as read"}
+        marked = await asyncio.to_thread(ctx.get_repository().mark_notification_read, notification_id, user_id)
+        if marked is None:
+            logger.warning(f"⚠️ Notification {notification_id} not found for user {username}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Notification not found"
+            )
+        ctx.recent_writers.note(user_id)
+        if marked:
+            ctx.stats.incr("unread_notifications", -1)
+        
+        logger.info(f"✅ Notification {notification_id} marked as read for {username}")
+        return {"message": "Notification marked as read"}
             
     except HTTPException:
         raise
@@ -684,73 +1022,243 @@ async def mark_notification_as_read(notification_id: int, current_user = Depends
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to mark notification as read"
         )
+
+@router.get("/notification-settings", dependencies=[Depends(storage_available), Depends(read_your_writes)])
+async def get_notification_settings(current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
+    user_id = current_user["user_id"]
     
-@app.get("/health")
-async def health_check():
-    logger.info("🏥 Health check requested")
+    try:
+        preferences = await asyncio.to_thread(ctx.get_repository().get_digest_settings, [user_id])
+    except Exception as e:
+        logger.error(f"❌ Error getting notification settings for user {user_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get notification settings"
+        )
     
-    status_info = {
-        "environment": ENVIRONMENT,
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    settings = preferences.get(user_id) or DigestSettings(user_id)
+    return NotificationSettings(
+        push_enabled=settings.push_enabled,
+        digest_window_seconds=settings.window_seconds,
+        quiet_hours_start=settings.quiet_start,
+        quiet_hours_end=settings.quiet_end,
+        timezone=settings.timezone
+    )
+
+@router.put("/notification-settings", dependencies=[Depends(storage_available)])
+async def update_notification_settings(preferences: NotificationSettings, current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
+    user_id = current_user["user_id"]
+    username = current_user["sub"]
+    
+    logger.info(f"⚙️ Updating notification settings for user: {username}")
+    settings = DigestSettings(
+        user_id=user_id,
+        push_enabled=preferences.push_enabled,
+        window_seconds=preferences.digest_window_seconds,
+        quiet_start=preferences.quiet_hours_start,
+        quiet_end=preferences.quiet_hours_end,
+        timezone=preferences.timezone
+    )
     
-    # Test Oracle
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1 FROM dual")
-            result = cursor.fetchone()
-            status_info["oracle"] = {
-                "status": "✅ Connected",
-                "dsn": ORACLE_DSN,
-                "user": ORACLE_USER,
-                "test_query": result[0] if result else None
-            }
-            db_logger.info("✅ Oracle health check passed")
+        await asyncio.to_thread(ctx.get_repository().save_digest_settings, settings)
     except Exception as e:
-        status_info["oracle"] = {
-            "status": f"❌ Error: {str(e)}",
-            "dsn": ORACLE_DSN,
-            "user": ORACLE_USER
-        }
-        db_logger.error(f"❌ Oracle health check failed: {e}")
+        logger.error(f"❌ Error updating notification settings for {username}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update notification settings"
+        )
+    ctx.recent_writers.note(user_id)
+    
+    return {"message": "Notification settings updated"}
+    
+@router.get("/stats", dependencies=[Depends(storage_available)])
+async def get_stats(days: int = Query(7, ge=1, le=90), current_user = Depends(verify_token), ctx: AppContext = Depends(get_context)):
+    logger.info(f"📊 Stats requested by {current_user['sub']} ({days} days)")
     
-    # Test Firebase
     try:
-        app_instance = firebase_admin.get_app()
-        status_info["firebase"] = {
-            "status": "✅ Initialized",
-            "project_id": app_instance.project_id if hasattr(app_instance, 'project_id') else "unknown"
-        }
-        firebase_logger.info("✅ Firebase health check passed")
+        # Unas pocas filas de stats_rollup; los COUNT(*) corren solo en la reconciliación
+        return await ctx.stats.snapshot(days)
     except Exception as e:
-        status_info["firebase"] = {
-            "status": f"❌ Error: {str(e)}",
-            "credentials_path": FIREBASE_CREDENTIALS_PATH
-        }
-        firebase_logger.error(f"❌ Firebase health check failed: {e}")
+        logger.error(f"❌ Error getting stats: {e}")
+        logger.error(f"📚 Traceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get stats"
+        )
+
+@router.get("/export/{kind}", dependencies=[Depends(storage_available)])
+async def export_history(
+    kind: Literal["notifications", "pushes"],
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    current_user = Depends(verify_token),
+    ctx: AppContext = Depends(get_context)
+):
+    username = current_user["sub"]
+    # Sin permisos de admin solo se exporta el historial propio
+    if not ctx.settings.is_admin(username):
+        if user_id is not None and user_id != current_user["user_id"]:
+            logger.warning(f"⚠️ Export of user {user_id} denied for {username}")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not allowed to export other users' history"
+            )
+        user_id = current_user["user_id"]
+    if status_filter is not None and status_filter not in HISTORY_STATUSES[kind]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"status must be one of: {', '.join(HISTORY_STATUSES[kind])}"
+        )
+    
+    filters = HistoryFilter(
+        user_id=user_id,
+        since=to_utc(since) if since else None,
+        until=to_utc(until) if until else None,
+        status=status_filter
+    )
+    logger.info(f"📤 Exporting {kind} as {fmt} for {username}: {filters}")
+    
+    batches = ctx.get_repository().iter_history(kind, filters, ctx.settings.export_fetch_size)
+    try:
+        # El primer lote se lee antes de responder: si la base falla todavía se puede devolver un error
+        first = await asyncio.to_thread(next, batches, None)
+    except Exception as e:
+        logger.error(f"❌ Error exporting {kind}: {e}")
+        logger.error(f"📚 Traceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to export history"
+        )
+    
+    # El resto se lee lote a lote en el threadpool mientras se envía: cursor abierto, memoria constante
+    rows = itertools.chain([first], batches) if first is not None else iter(())
+    return StreamingResponse(
+        export_chunks(EXPORT_COLUMNS[kind], rows, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{fmt}"'}
+    )
+
+@router.get("/admin/profiles")
+async def list_profiles(current_user = Depends(require_admin), ctx: AppContext = Depends(get_context)):
+    profiler = ctx.profiler
+    return {
+        "enabled": profiler.enabled,
+        "profiles": await asyncio.to_thread(profiler.store.list),
+        "stats": dict(profiler.stats)
+    }
+
+@router.get("/admin/profiles/{name}")
+async def download_profile(name: str, current_user = Depends(require_admin), ctx: AppContext = Depends(get_context)):
+    path = ctx.profiler.store.path(name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=name)
+
+@router.get("/health")
+async def health_check(ctx: AppContext = Depends(get_context)):
+    logger.info("🏥 Health check requested")
+    
+    settings = ctx.settings
+    status_info = {
+        "environment": settings.environment,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    
+    # Último resultado del prober en segundo plano; antes del primer chequeo
+    # (o con HEALTH_PROBE_INTERVAL=0) se prueba en este request
+    snapshot = ctx.health_prober.snapshot
+    if snapshot is None or settings.health_probe_interval <= 0:
+        snapshot = await ctx.health_prober.probe_once()
+        ctx.health_prober.start()
+    status_info.update(snapshot)
+    repository_name = ctx.get_repository().name
+    
+    status_info["circuit_breakers"] = {
+        "storage": ctx.storage_breaker.snapshot(),
+        "fcm": ctx.fcm_breaker.snapshot()
+    }
     
     # Configuration summary
     status_info["config"] = {
-        "sender_id": SENDER_ID,
-        "server_key_configured": bool(SERVER_KEY),
-        "secret_key_configured": bool(SECRET_KEY),
-        "host": HOST,
-        "port": PORT
+        "sender_id": settings.sender_id,
+        "server_key_configured": bool(settings.server_key),
+        "secret_key_configured": bool(settings.secret_key),
+        "host": settings.host,
+        "port": settings.port
     }
     
     overall_status = "healthy" if all([
-        "✅" in str(status_info["oracle"]["status"]),
+        "✅" in str(status_info[repository_name]["status"]),
         "✅" in str(status_info["firebase"]["status"])
     ]) else "unhealthy"
+    status_info["status"] = overall_status
     
     logger.info(f"🏥 Health check result: {overall_status}")
     
     return status_info
 
+# ==========================================
+# APP FACTORY
+# ==========================================
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """
+    Crea la aplicación sin tocar recursos externos; la validación de
+    configuración, el logging y el warm-up de Oracle/Firebase ocurren en el lifespan.
+    """
+    settings = settings or Settings.from_env()
+    ctx = AppContext(settings)
+    ctx.digests.deliver = lambda digests: deliver_digests(ctx, digests)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        configure_logging(settings)
+        await ctx.startup()
+        yield
+        await ctx.shutdown()
+
+    app = FastAPI(title="Push Notifications API", lifespan=lifespan)
+    app.state.ctx = ctx
+
+    # Agregar CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # En producción, especifica los dominios permitidos
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    # Comprime solo respuestas grandes (inbox) si el cliente envía Accept-Encoding: gzip
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=settings.gzip_minimum_size,
+        compresslevel=settings.gzip_level,
+    )
+    if ctx.profiler.enabled:
+        # El más interno: el perfil cubre el endpoint y no el logging de requests
+        app.middleware("http")(profile_requests)
+    app.middleware("http")(reject_during_shutdown)
+    app.middleware("http")(log_requests)
+    if ctx.span_exporter is not None:
+        # El más externo: el span raíz cubre todo el request
+        app.middleware("http")(trace_requests)
+
+    app.include_router(router)
+    return app
+
+app = create_app()
+
 if __name__ == "__main__":
-    import uvicorn
-    logger.info(f"🚀 Starting server in {ENVIRONMENT} mode...")
-    logger.info(f"📊 Health check available at: http://{HOST}:{PORT}/health")
-    logger.info(f"📖 API docs available at: http://{HOST}:{PORT}/docs")
-    uvicorn.run(app, host=HOST, port=PORT)
\ No newline at end of file
+    from server import serve
+    settings = app.state.ctx.settings
+    logger.info(f"🚀 Starting server in {settings.environment} mode...")
+    logger.info(f"📊 Health check available at: http://{settings.host}:{settings.port}/health")
+    logger.info(f"📖 API docs available at: http://{settings.host}:{settings.port}/docs")
+    serve()
@@ -1,6 +1,10 @@
 # Modelos Pydantic
-from typing import Optional
-from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Literal, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from pydantic import BaseModel, Field, field_validator
+
+HHMM = r"^([01]\d|2[0-3]):[0-5]\d$"
 
 
 class UserRegister(BaseModel):
@@ -12,18 +16,66 @@ class UserLogin(BaseModel):
     username: str
     password: str
 
+class TokenRefresh(BaseModel):
+    refresh_token: str = Field(..., min_length=1, max_length=200)
+
 class DeviceRegister(BaseModel):
     fcm_token: str
     device_id: str
+    # Metadatos opcionales; si no vienen se conserva lo ya registrado
+    device_name: Optional[str] = Field(None, max_length=100)
+    os_version: Optional[str] = Field(None, max_length=50)
+    app_version: Optional[str] = Field(None, max_length=20)
+
+class DeviceBatch(BaseModel):
+    devices: List[DeviceRegister]
 
 class PushNotification(BaseModel):
     title: str
     body: str
     user_id: Optional[int] = None
     username: Optional[str] = None
+    # Varios destinatarios en un solo request (hasta MAX_RECIPIENTS en total)
+    user_ids: Optional[List[int]] = None
+    usernames: Optional[List[str]] = None
+    # high: Android priority=high / apns-priority=10 y carril de envío prioritario
+    priority: Literal["high", "normal"] = "normal"
+    # Pushes repetidos con la misma clave se agrupan y solo se entrega el último
+    collapse_key: Optional[str] = Field(None, min_length=1, max_length=64)
 
 class InternalNotification(BaseModel):
     title: str
     message: str
     user_id: Optional[int] = None
-    username: Optional[str] = None
\ No newline at end of file
+    username: Optional[str] = None
+    user_ids: Optional[List[int]] = None
+    usernames: Optional[List[str]] = None
+
+class NotificationSettings(BaseModel):
+    # Las notificaciones internas también se envían como push
+    push_enabled: bool = False
+    # 0 = un push por notificación; > 0 = un solo push de resumen por ventana
+    digest_window_seconds: int = Field(0, ge=0, le=86400)
+    # Horario silencioso "HH:MM" en la zona horaria del usuario; puede cruzar la medianoche
+    quiet_hours_start: Optional[str] = Field(None, pattern=HHMM)
+    quiet_hours_end: Optional[str] = Field(None, pattern=HHMM)
+    timezone: str = "UTC"
+
+    @field_validator("timezone")
+    @classmethod
+    def known_timezone(cls, value: str) -> str:
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone: {value}")
+        return value
+
+class PushReceiptIn(BaseModel):
+    # RemoteMessage.messageId tal como lo recibe la app (también acepta projects/<p>/messages/<id>)
+    message_id: str = Field(..., min_length=1, max_length=255)
+    event: Literal["delivered", "opened"] = "delivered"
+    # Momento en el dispositivo; sin valor se usa la hora de llegada al servidor
+    at: Optional[datetime] = None
+
+class ReceiptBatch(BaseModel):
+    receipts: List[PushReceiptIn]
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Punto de entrada de producción para la API
+
+Uso:
+    python server.py
+
+Configuración vía .env:
+    WORKERS                    Número de procesos worker (0 = uno por CPU)
+    KEEP_ALIVE_TIMEOUT         Segundos que se mantiene abierta una conexión ociosa
+    GRACEFUL_SHUTDOWN_TIMEOUT  Segundos máximos para drenar requests y fan-outs al apagar
+    BACKLOG                    Conexiones pendientes en la cola del socket
+    LIMIT_CONCURRENCY          Máximo de conexiones simultáneas por worker (vacío = sin límite)
+    LIMIT_MAX_REQUESTS         Reciclar el worker tras N requests (vacío = nunca)
+"""
+
+import importlib.util
+import logging
+import os
+
+from config import Settings
+
+server_logger = logging.getLogger("Server")
+
+APP_IMPORT_STRING = "main:app"
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _optional_int(name: str) -> int | None:
+    value = os.getenv(name, "").strip()
+    return int(value) if value else None
+
+
+def resolve_workers() -> int:
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def build_uvicorn_config(settings: Settings | None = None) -> dict:
+    """Opciones para uvicorn.run, usando uvloop/httptools si están instalados"""
+    settings = settings or Settings.from_env()
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+    return {
+        "host": settings.host,
+        "port": settings.port,
+        "workers": resolve_workers(),
+        "loop": loop,
+        "http": http,
+        "timeout_keep_alive": int(os.getenv("KEEP_ALIVE_TIMEOUT", "5")),
+        "timeout_graceful_shutdown": int(settings.graceful_shutdown_timeout),
+        "backlog": int(os.getenv("BACKLOG", "2048")),
+        "limit_concurrency": _optional_int("LIMIT_CONCURRENCY"),
+        "limit_max_requests": _optional_int("LIMIT_MAX_REQUESTS"),
+        "proxy_headers": True,
+        # El middleware log_requests ya registra cada request
+        "access_log": False,
+    }
+
+
+def serve(app=None):
+    import uvicorn
+
+    config = build_uvicorn_config()
+
+    # Con varios workers uvicorn necesita el import string para crear cada proceso
+    if app is not None and config["workers"] > 1:
+        server_logger.warning("⚠️ Multiple workers require 'python server.py', starting a single worker")
+        config["workers"] = 1
+
+    server_logger.info(
+        f"🚀 Serving with {config['workers']} worker(s), loop={config['loop']}, http={config['http']}, "
+        f"keep-alive={config['timeout_keep_alive']}s"
+    )
+    uvicorn.run(app if app is not None else APP_IMPORT_STRING, app_dir=APP_DIR, **config)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    serve()
@@ -0,0 +1,173 @@
+# Broadcast particionado: los devices se reparten por MOD(id, N) entre N procesos que envían en paralelo
+import asyncio
+import inspect
+import logging
+import multiprocessing
+import queue
+import time
+from typing import Dict
+
+from config import Settings, configure_logging
+from services.circuit import CircuitBreaker
+from services.fanout import FanoutResult, fan_out, push_sender
+from services.push_transport import PushMessage, create_push_transport
+from services.scheduler import PushScheduler
+from storage.repository import create_repository, push_log_entries
+
+logger = logging.getLogger("PushNotificationsAPI")
+db_logger = logging.getLogger("Database")
+firebase_logger = logging.getLogger("Firebase")
+
+# Errores que devuelve cada partición para la respuesta; el push log los tiene todos
+MAX_PARTITION_ERRORS = 100
+# Segundos entre logs del progreso agregado
+PROGRESS_LOG_INTERVAL = 1.0
+
+# ------------------------------------------
+# Proceso worker
+# ------------------------------------------
+
+
+def run_partition(settings: Settings, push_message: PushMessage, priority: str, partition: int, partitions: int,
+                  progress):
+    """Entrada del proceso worker (spawn): envía su partición y reporta cada lote por ``progress``"""
+    configure_logging(settings)
+    try:
+        asyncio.run(send_partition(settings, push_message, priority, partition, partitions, progress))
+    except Exception as e:
+        firebase_logger.error(f"❌ Broadcast partition {partition}/{partitions} failed: {e}")
+        progress.put(("failed", partition, str(e)))
+        return
+    progress.put(("done", partition))
+
+
+async def send_partition(settings: Settings, push_message: PushMessage, priority: str, partition: int,
+                         partitions: int, progress):
+    """
+    Recorre los tokens de la partición en lotes de ``broadcast_batch_size``
+    (cursor del lado del servidor, el siguiente lote se lee mientras se envía
+    el actual) y hace el fan-out y el push log de cada lote con un transport,
+    un scheduler y un circuit breaker propios del proceso.
+    """
+    repository = create_repository(settings)
+    transport = create_push_transport(settings)
+    scheduler = PushScheduler(settings.push_max_in_flight, settings.push_high_priority_reserved)
+    breaker = CircuitBreaker("fcm", settings.circuit_failure_threshold, settings.circuit_reset_timeout)
+    batches = repository.iter_broadcast_tokens(partition, partitions, settings.broadcast_batch_size)
+    pending = None
+    try:
+        await asyncio.to_thread(transport.warmup)
+        message = transport.prepare(push_message)
+        send_one = push_sender(breaker, transport, message)
+        reported = 0
+
+        pending = asyncio.ensure_future(asyncio.to_thread(next, batches, None))
+        while True:
+            batch = await pending
+            if batch is None:
+                break
+            pending = asyncio.ensure_future(asyncio.to_thread(next, batches, None))
+
+            owners = {token: user_id for user_id, token in batch}
+            result = await fan_out(list(owners), send_one, concurrency=settings.push_concurrency,
+                                   scheduler=scheduler, priority=priority)
+            if settings.push_log_enabled:
+                try:
+                    await asyncio.to_thread(repository.record_push_log, push_log_entries(
+                        message.title, message.body, result.outcomes, owners))
+                except Exception as e:
+                    db_logger.error(f"❌ Push log write failed for broadcast partition {partition}: {e}")
+
+            errors = result.errors[:max(0, MAX_PARTITION_ERRORS - reported)]
+            reported += len(errors)
+            progress.put(("progress", partition, result.success_count, result.failure_count, errors))
+    finally:
+        # El generador no se puede cerrar mientras un thread lo avanza
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+        batches.close()
+        closing = transport.close()
+        if inspect.isawaitable(closing):
+            await closing
+        scheduler.close()
+        repository.close()
+
+
+# ------------------------------------------
+# Proceso del request
+# ------------------------------------------
+
+async def partitioned_broadcast(settings: Settings, push_message: PushMessage, priority: str,
+                                partitions: int) -> FanoutResult:
+    """
+    Lanza un proceso por partición y agrega el progreso que reportan. El
+    resultado tiene los totales y hasta MAX_PARTITION_ERRORS errores por
+    partición; ``outcomes`` queda vacío porque cada worker escribe su push log.
+    Una partición que termina sin reportar (crash, OOM) cuenta como error:
+    sus envíos ya reportados se mantienen.
+    """
+    context = multiprocessing.get_context("spawn")
+    progress = context.Queue()
+    processes: Dict[int, multiprocessing.Process] = {
+        partition: context.Process(
+            target=run_partition,
+            args=(settings, push_message, priority, partition, partitions, progress),
+            name=f"broadcast-{partition}",
+            daemon=True,
+        )
+        for partition in range(partitions)
+    }
+    for process in processes.values():
+        process.start()
+    firebase_logger.info(f"🧵 Broadcast split into {partitions} worker processes")
+
+    result = FanoutResult()
+    running = set(processes)
+    last_log = time.monotonic()
+
+    def apply(message):
+        kind, partition = message[:2]
+        if kind == "progress":
+            success, failure, errors = message[2:]
+            result.success_count += success
+            result.failure_count += failure
+            result.errors.extend(errors)
+        else:
+            running.discard(partition)
+            if kind == "failed":
+                result.errors.append(f"Broadcast partition {partition} failed: {message[2]}")
+
+    try:
+        while running:
+            try:
+                apply(await asyncio.to_thread(progress.get, True, 0.5))
+            except queue.Empty:
+                # Los procesos que ya salieron pudieron encolar sus últimos mensajes
+                # después del timeout: se leen antes de decidir quién terminó sin reportar
+                exited = [p for p in running if processes[p].exitcode is not None]
+                if not exited:
+                    continue
+                while True:
+                    try:
+                        apply(progress.get_nowait())
+                    except queue.Empty:
+                        break
+                for partition in [p for p in exited if p in running]:
+                    running.discard(partition)
+                    error = f"Broadcast partition {partition} exited with code {processes[partition].exitcode}"
+                    firebase_logger.error(f"❌ {error}")
+                    result.errors.append(error)
+
+            if not running or time.monotonic() - last_log >= PROGRESS_LOG_INTERVAL:
+                last_log = time.monotonic()
+                firebase_logger.info(f"📡 Broadcast progress: {result.success_count} sent, "
+                                     f"{result.failure_count} failed, "
+                                     f"{partitions - len(running)}/{partitions} partitions done")
+    finally:
+        # Cancelado (apagado con timeout): los workers que siguen se terminan
+        for partition in running:
+            processes[partition].terminate()
+        for process in processes.values():
+            await asyncio.to_thread(process.join)
+        progress.close()
+    return result
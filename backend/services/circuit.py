@@ -0,0 +1,125 @@
+# Circuit breakers para dependencias externas (Oracle, FCM)
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger("PushNotificationsAPI")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """La dependencia está marcada como caída; se falla sin intentar la llamada"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Tras ``failure_threshold`` fallos seguidos se abre: durante ``reset_timeout``
+    segundos las llamadas fallan al instante con CircuitOpenError en vez de
+    esperar timeouts. Después pasa a half-open y deja pasar llamadas: el primer
+    éxito lo cierra y el primer fallo lo vuelve a abrir.
+
+    Thread-safe: lo usan los threads del repositorio y del threadpool de envíos.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self.stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._current_state() != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def before_call(self):
+        """Lanza CircuitOpenError si el circuito está abierto"""
+        with self._lock:
+            if self._current_state() != OPEN:
+                return
+            self.stats["rejected"] += 1
+            retry_after = self.reset_timeout - (self._clock() - self._opened_at)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"✅ Circuit '{self.name}' closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == HALF_OPEN or (state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self.stats["opened"] += 1
+                logger.error(f"❌ Circuit '{self.name}' opened after {self._failures} failures")
+
+    def call(self, fn: Callable, *args, is_failure: Callable[[Exception], bool] = lambda e: True):
+        """Ejecuta ``fn(*args)``; solo las excepciones con ``is_failure`` cuentan como caída"""
+        self.before_call()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            if is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    async def call_async(self, fn: Callable, *args, is_failure: Callable[[Exception], bool] = lambda e: True):
+        """Como ``call`` pero esperando la corrutina ``fn(*args)``"""
+        self.before_call()
+        try:
+            result = await fn(*args)
+        except Exception as e:
+            if is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            retry_after = self.reset_timeout - (self._clock() - self._opened_at) if state == OPEN else 0.0
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_after_s": round(max(0.0, retry_after), 1),
+                **self.stats,
+            }
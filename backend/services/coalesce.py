@@ -0,0 +1,82 @@
+# Agrupación de pushes repetidos: mismo usuario + collapse_key dentro de una ventana
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from services.lifecycle import LifecycleManager
+
+firebase_logger = logging.getLogger("Firebase")
+
+Deliver = Callable[[Any], Awaitable[Any]]
+
+
+def collapse_target(user_id: Optional[int], collapse_key: str) -> Tuple:
+    """
+    Clave de agrupación: el user_id ya resuelto (``None`` = broadcast) y el
+    collapse_key. Un push a varios usuarios ocupa un slot por usuario, así
+    ``user_id=5`` y ``user_ids=[5, 6]`` o ``username`` de 5 se agrupan.
+    """
+    return ("*" if user_id is None else user_id, collapse_key)
+
+
+@dataclass
+class HeldPush:
+    item: Any
+    deliver: Deliver
+    send_at: float
+    collapsed: int = 0
+
+
+class PushCoalescer:
+    """
+    Retiene el primer push de cada clave durante ``window`` segundos; los que
+    llegan mientras tanto reemplazan al retenido y al cerrar la ventana se
+    envía solo el último. La ventana cuenta desde el primero (no se reinicia),
+    así una ráfaga continua envía como mucho un push por ventana.
+
+    Cada ventana abierta es una tarea del lifecycle: un apagado espera a que
+    los pushes retenidos salgan.
+    """
+
+    def __init__(self, lifecycle: LifecycleManager, window: float):
+        self.lifecycle = lifecycle
+        self.window = window
+        self._held: Dict[Hashable, HeldPush] = {}
+        self.stats = {"held": 0, "collapsed": 0, "sent": 0, "failed": 0}
+
+    @property
+    def pending(self) -> int:
+        return len(self._held)
+
+    def submit(self, key: Hashable, item: Any, deliver: Deliver) -> dict:
+        held = self._held.get(key)
+        if held is not None:
+            held.item = item
+            held.deliver = deliver
+            held.collapsed += 1
+            self.stats["collapsed"] += 1
+            return {"status": "collapsed", "send_in_ms": self._remaining_ms(held)}
+
+        held = HeldPush(item, deliver, time.monotonic() + self.window)
+        # spawn lanza ShutdownInProgress si el proceso ya se está apagando
+        self.lifecycle.spawn(self._flush_after_window(key), name="push-collapse")
+        self._held[key] = held
+        self.stats["held"] += 1
+        return {"status": "held", "send_in_ms": self._remaining_ms(held)}
+
+    def _remaining_ms(self, held: HeldPush) -> int:
+        return max(0, round((held.send_at - time.monotonic()) * 1000))
+
+    async def _flush_after_window(self, key: Hashable):
+        await asyncio.sleep(self.window)
+        held = self._held.pop(key)
+        try:
+            await held.deliver(held.item)
+            self.stats["sent"] += 1
+            if held.collapsed:
+                firebase_logger.info(f"🧩 Collapsed {held.collapsed} pushes into 1 for key {key[-1]!r}")
+        except Exception as e:
+            self.stats["failed"] += 1
+            firebase_logger.error(f"❌ Collapsed push for key {key[-1]!r} failed: {e}")
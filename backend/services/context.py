@@ -0,0 +1,158 @@
+# Estado compartido por aplicación: configuración, repositorio y push transport
+import asyncio
+import logging
+import threading
+import time
+
+from config import Settings
+from services.circuit import CircuitBreaker
+from services.coalesce import PushCoalescer
+from services.digest import DigestScheduler
+from services.health import HealthProber
+from services.lifecycle import LifecycleManager
+from services.profiling import ProfileStore, RequestProfiler
+from services.push_transport import PushTransport, create_push_transport
+from services.receipts import ReceiptBuffer
+from services.retention import RetentionJob, retention_days
+from services.scheduler import PushScheduler
+from services.stats import StatsRollup
+from services.tracing import create_span_exporter
+from storage.repository import Repository, create_repository
+from storage.routing import RecentWriters
+
+logger = logging.getLogger("PushNotificationsAPI")
+db_logger = logging.getLogger("Database")
+firebase_logger = logging.getLogger("Firebase")
+
+
+class AppContext:
+    """
+    Recursos de una instancia de la aplicación (repositorio, push transport).
+    Se crean en el primer uso o en el arranque (lifespan) si ``startup_warmup`` está activo.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.lifecycle = LifecycleManager()
+        self.repository = None
+        self.push_transport = None
+        self.push_scheduler = PushScheduler(settings.push_max_in_flight, settings.push_high_priority_reserved)
+        self.push_coalescer = PushCoalescer(self.lifecycle, settings.push_collapse_window_ms / 1000)
+        self.storage_breaker = CircuitBreaker("storage", settings.circuit_failure_threshold,
+                                              settings.circuit_reset_timeout)
+        self.fcm_breaker = CircuitBreaker("fcm", settings.circuit_failure_threshold, settings.circuit_reset_timeout)
+        self.recent_writers = RecentWriters(settings.read_your_writes_seconds)
+        self.digests = DigestScheduler()
+        self.receipts = ReceiptBuffer(self.apply_push_receipts, settings.receipt_flush_interval_ms / 1000,
+                                      settings.receipt_buffer_max)
+        self.stats = StatsRollup(self.get_repository, settings.stats_flush_interval,
+                                 settings.stats_reconcile_interval, settings.stats_reconcile_days,
+                                 include_pushes=settings.push_log_enabled)
+        self.retention = RetentionJob(self.get_repository, retention_days(settings), settings.retention_interval_s)
+        self.profiler = RequestProfiler(
+            ProfileStore(settings.profile_dir, settings.profile_max_files, int(settings.profile_max_mb * 1024 * 1024)),
+            token=settings.profile_token,
+            sample_rate=settings.profile_sample_rate,
+            interval=settings.profile_interval_ms / 1000,
+        )
+        self.span_exporter = create_span_exporter(settings)
+        self.health_prober = HealthProber(self, settings.health_probe_interval, settings.health_probe_timeout)
+        self._db_lock = threading.Lock()
+        self._push_lock = threading.Lock()
+
+    # ------------------------------------------
+    # Storage (Oracle o SQLite)
+    # ------------------------------------------
+
+    def get_repository(self) -> Repository:
+        if self.repository is None:
+            with self._db_lock:
+                if self.repository is None:
+                    repository = create_repository(self.settings)
+                    repository.breaker = self.storage_breaker
+                    self.repository = repository
+                    db_logger.info(f"🗄️ Storage backend: {self.repository.name}")
+        return self.repository
+
+    def warm_repository(self):
+        self.get_repository().warmup()
+
+    def apply_push_receipts(self, receipts) -> int:
+        return self.get_repository().apply_push_receipts(receipts)
+
+    def close_repository(self):
+        if self.repository is not None:
+            self.repository.close()
+
+    # ------------------------------------------
+    # Push transport (Firebase o FCM falso)
+    # ------------------------------------------
+
+    def get_push_transport(self) -> PushTransport:
+        if self.push_transport is None:
+            with self._push_lock:
+                if self.push_transport is None:
+                    self.push_transport = create_push_transport(self.settings)
+                    firebase_logger.info(f"📡 Push transport: {self.push_transport.name}")
+        return self.push_transport
+
+    def warm_push_transport(self):
+        self.get_push_transport().warmup()
+
+    def close_push_transport(self):
+        if self.push_transport is not None:
+            return self.push_transport.close()
+
+    # ------------------------------------------
+    # Tracing
+    # ------------------------------------------
+
+    def close_span_exporter(self):
+        if self.span_exporter is not None:
+            self.span_exporter.close()
+
+    # ------------------------------------------
+    # Arranque y apagado
+    # ------------------------------------------
+
+    async def startup(self):
+        settings = self.settings
+        logger.info(f"🚀 Initializing Push Notifications API")
+        logger.info(f"   🌍 Environment: {settings.environment}")
+        logger.info(f"   🖥️ Host: {settings.host}:{settings.port}")
+
+        settings.validate()
+        self.stats.start()
+        self.retention.start()
+
+        # Se ejecutan después de drenar los fan-outs en vuelo
+        self.lifecycle.add_drain_hook("health_prober", self.health_prober.stop)
+        # Los digests pendientes se envían antes de cerrar el transport y la base
+        self.lifecycle.add_drain_hook("digests", self.digests.close)
+        self.lifecycle.add_drain_hook("push_receipts", self.receipts.close)
+        self.lifecycle.add_drain_hook("stats", self.stats.close)
+        self.lifecycle.add_drain_hook("retention", self.retention.close)
+        self.lifecycle.add_drain_hook("log_buffers", flush_log_handlers)
+        self.lifecycle.add_drain_hook("push_scheduler", self.push_scheduler.close)
+        self.lifecycle.add_drain_hook("push_transport", self.close_push_transport)
+        self.lifecycle.add_drain_hook("storage", self.close_repository)
+        self.lifecycle.add_drain_hook("span_exporter", self.close_span_exporter)
+
+        if settings.startup_warmup:
+            # La base de datos y el push transport se calientan en paralelo
+            start = time.perf_counter()
+            await asyncio.gather(
+                asyncio.to_thread(self.warm_repository),
+                asyncio.to_thread(self.warm_push_transport),
+            )
+            logger.info(f"✅ Warm-up completed in {time.perf_counter() - start:.3f}s")
+            # Sin warm-up los recursos se crean en el primer uso: el prober arranca con el primer /health
+            self.health_prober.start()
+
+    async def shutdown(self):
+        await self.lifecycle.shutdown(timeout=self.settings.graceful_shutdown_timeout)
+
+
+def flush_log_handlers():
+    for handler in logging.getLogger().handlers:
+        handler.flush()
@@ -0,0 +1,182 @@
+# Digest de notificaciones internas: agrupa por usuario y envía un solo push al cerrar la ventana
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from storage.repository import DigestSettings
+
+logger = logging.getLogger("PushNotificationsAPI")
+
+# Títulos que se muestran en el cuerpo del resumen
+DIGEST_PREVIEW_TITLES = 3
+
+
+def parse_hhmm(value: str) -> Tuple[int, int]:
+    hours, minutes = value.split(":")
+    return int(hours), int(minutes)
+
+
+def quiet_until(moment: float, settings: DigestSettings) -> Optional[float]:
+    """Si ``moment`` (epoch) cae en el horario silencioso, devuelve cuándo termina; si no, None"""
+    if not settings.quiet_start or not settings.quiet_end or settings.quiet_start == settings.quiet_end:
+        return None
+
+    local = datetime.fromtimestamp(moment, tz=timezone.utc).astimezone(ZoneInfo(settings.timezone))
+    start_hour, start_minute = parse_hhmm(settings.quiet_start)
+    end_hour, end_minute = parse_hhmm(settings.quiet_end)
+    start = local.replace(hour=start_hour, minute=start_minute, second=0, microsecond=0)
+    end = local.replace(hour=end_hour, minute=end_minute, second=0, microsecond=0)
+
+    if start < end:
+        # Mismo día, p. ej. 13:00-15:00
+        return end.timestamp() if start <= local < end else None
+    # Cruza la medianoche, p. ej. 22:00-07:00
+    if local >= start:
+        return (end + timedelta(days=1)).timestamp()
+    if local < end:
+        return end.timestamp()
+    return None
+
+
+@dataclass
+class Digest:
+    user_id: int
+    due_at: float
+    # Pospuesto hasta el final del horario silencioso
+    quiet: bool = False
+    items: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.items)
+
+    def summary(self) -> Tuple[str, str]:
+        """(título, cuerpo) del push: la notificación tal cual si es una sola"""
+        if self.count == 1:
+            return self.items[0]
+        titles = [title for title, _ in self.items[-DIGEST_PREVIEW_TITLES:]]
+        more = self.count - len(titles)
+        body = " · ".join(reversed(titles)) + (f" y {more} más" if more else "")
+        return f"Tenés {self.count} notificaciones nuevas", body
+
+
+class DigestScheduler:
+    """
+    Un Digest pendiente por usuario y un heap de vencimientos: agregar es
+    O(log n) y una sola tarea duerme hasta el próximo vencimiento, sin
+    recorrer la base de datos periódicamente.
+
+    La ventana cuenta desde la primera notificación; si vence dentro del
+    horario silencioso del usuario se pospone al final de ese horario.
+    ``deliver`` recibe todos los digests vencidos juntos.
+    """
+
+    def __init__(self, deliver: Optional[Callable[[List[Digest]], Awaitable[None]]] = None,
+                 clock: Callable[[], float] = time.time):
+        self.deliver = deliver
+        self.clock = clock
+        self._pending: Dict[int, Digest] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._deliveries: Set[asyncio.Task] = set()
+        self.stats = {"queued": 0, "digests": 0, "pushes_saved": 0}
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add(self, settings: DigestSettings, title: str, message: str) -> Digest:
+        digest = self._pending.get(settings.user_id)
+        if digest is None:
+            due_at = self.clock() + max(settings.window_seconds, 0)
+            quiet_end = quiet_until(due_at, settings)
+            digest = Digest(settings.user_id, quiet_end or due_at, quiet=quiet_end is not None)
+            self._pending[settings.user_id] = digest
+            heapq.heappush(self._heap, (digest.due_at, settings.user_id))
+            self._wake()
+        digest.items.append((title, message))
+        self.stats["queued"] += 1
+        return digest
+
+    def pop_due(self, now: Optional[float] = None) -> List[Digest]:
+        now = self.clock() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, user_id = heapq.heappop(self._heap)
+            digest = self._pending.get(user_id)
+            # Entradas viejas del heap (digest ya enviado) se descartan
+            if digest is not None and digest.due_at == due_at:
+                due.append(self._pending.pop(user_id))
+        self.stats["digests"] += len(due)
+        self.stats["pushes_saved"] += sum(digest.count - 1 for digest in due)
+        return due
+
+    def next_due(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    # ------------------------------------------
+    # Timer
+    # ------------------------------------------
+
+    def _wake(self):
+        if self._task is None:
+            loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run(), name="digest-timer")
+        else:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            next_due = self.next_due()
+            timeout = None if next_due is None else max(0.0, next_due - self.clock())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            due = self.pop_due()
+            if due:
+                # El envío corre aparte para que el timer siga atendiendo vencimientos
+                task = asyncio.ensure_future(self._deliver(due))
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, digests: List[Digest]):
+        try:
+            await self.deliver(digests)
+        except Exception as e:
+            logger.error(f"❌ Digest delivery failed for {len(digests)} users: {e}")
+
+    async def stop(self):
+        """Detiene el timer y espera los envíos en curso; los pendientes quedan en memoria"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+
+    async def close(self):
+        """Detiene el timer y envía los digests pendientes que no están en horario silencioso"""
+        await self.stop()
+        flush = [digest for digest in self._pending.values() if not digest.quiet]
+        held = self.pending - len(flush)
+        self._pending.clear()
+        self._heap.clear()
+        if held:
+            # Las notificaciones siguen en el inbox; solo se pierde el push de resumen
+            logger.warning(f"⚠️ {held} digests in quiet hours dropped on shutdown")
+        if flush:
+            self.stats["digests"] += len(flush)
+            await self._deliver(flush)
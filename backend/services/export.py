@@ -0,0 +1,44 @@
+# Export de historial en NDJSON o CSV: un chunk por lote de filas, sin materializar el resultado
+import csv
+import io
+from datetime import date, datetime
+from typing import Iterable, Iterator, Sequence
+
+from services.responses import dumps
+
+EXPORT_FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _csv_value(value):
+    # Mismo formato de fechas que el NDJSON (ISO 8601 con "T")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def ndjson_chunk(columns: Sequence[str], rows: Iterable[tuple]) -> bytes:
+    return b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def csv_chunk(rows: Iterable[Sequence], formatter=_csv_value) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows([formatter(value) for value in row] for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def export_chunks(columns: Sequence[str], batches: Iterable[list], fmt: str) -> Iterator[bytes]:
+    """
+    Un chunk de bytes por lote del cursor: la memoria depende del tamaño del
+    lote y no del total exportado. En CSV el primer chunk es el encabezado.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == "csv":
+        yield csv_chunk([columns], formatter=lambda value: value)
+    for batch in batches:
+        yield ndjson_chunk(columns, batch) if fmt == "ndjson" else csv_chunk(batch)
@@ -0,0 +1,86 @@
+# Envío de push notifications a múltiples tokens FCM
+import asyncio
+import inspect
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from services.health import fcm_outage
+from services.tracing import span
+
+firebase_logger = logging.getLogger("Firebase")
+
+
+@dataclass
+class FanoutResult:
+    success_count: int = 0
+    failure_count: int = 0
+    errors: List[str] = field(default_factory=list)
+    # (token, respuesta FCM, error) por envío, para push_notification_log
+    outcomes: List[Tuple[str, Optional[str], Optional[str]]] = field(default_factory=list)
+
+    @property
+    def tokens_used(self) -> int:
+        return self.success_count + self.failure_count
+
+
+def push_sender(breaker, transport, push_message):
+    """
+    ``send_one`` del fan-out: corrutina con un transport async, función
+    bloqueante (threadpool) con el resto. Con FCM caído el circuito
+    (``breaker``) se abre y el resto de los tokens falla al instante.
+    """
+    if transport.asynchronous:
+        async def send_one(token: str) -> str:
+            with span("fcm.send", token=token[-8:]):
+                return await breaker.call_async(transport.send_async, token, push_message, is_failure=fcm_outage)
+        return send_one
+
+    def send_one(token: str) -> str:
+        # Un span por token (solo los últimos caracteres: el token es una credencial del device)
+        with span("fcm.send", token=token[-8:]):
+            return breaker.call(transport.send, token, push_message, is_failure=fcm_outage)
+    return send_one
+
+
+async def fan_out(tokens: Sequence[str], send_one: Callable[[str], str], concurrency: int = 10,
+                  scheduler=None, priority: str = "normal") -> FanoutResult:
+    """
+    Envía a cada token usando ``send_one`` (bloqueante) en el threadpool,
+    con como máximo ``concurrency`` envíos simultáneos. Con ``scheduler``
+    (PushScheduler) cada envío toma además un slot global del carril ``priority``.
+    Si ``send_one`` es una corrutina se espera en el event loop, sin threads.
+    """
+    result = FanoutResult()
+    pending = iter(enumerate(tokens))
+
+    if inspect.iscoroutinefunction(send_one):
+        if scheduler is not None:
+            async def send(token: str) -> str:
+                return await scheduler.run_async(priority, send_one, token)
+        else:
+            send = send_one
+    elif scheduler is not None:
+        async def send(token: str) -> str:
+            return await scheduler.run(priority, send_one, token)
+    else:
+        async def send(token: str) -> str:
+            return await asyncio.to_thread(send_one, token)
+
+    # Cada worker toma el siguiente token del iterador compartido
+    async def _worker():
+        for index, token in pending:
+            try:
+                response = await send(token)
+                firebase_logger.info(f"   ✅ Token {index + 1} sent successfully: {response}")
+                result.success_count += 1
+                result.outcomes.append((token, response, None))
+            except Exception as token_error:
+                firebase_logger.error(f"   ❌ Token {index + 1} failed: {str(token_error)}")
+                result.failure_count += 1
+                result.errors.append(str(token_error))
+                result.outcomes.append((token, None, str(token_error)))
+
+    workers = max(1, min(concurrency, len(tokens)))
+    await asyncio.gather(*(_worker() for _ in range(workers)))
+    return result
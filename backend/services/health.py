@@ -0,0 +1,112 @@
+# Health checks en segundo plano: /health sirve el último resultado sin tocar Oracle
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from services.circuit import CircuitBreaker
+from services.push_transport import INTERNAL, UNAVAILABLE, PushError
+
+logger = logging.getLogger("PushNotificationsAPI")
+db_logger = logging.getLogger("Database")
+firebase_logger = logging.getLogger("Firebase")
+
+
+def fcm_outage(error: Exception) -> bool:
+    """Errores que indican FCM caído (no los de un token en particular)"""
+    if isinstance(error, PushError):
+        return error.code in (UNAVAILABLE, INTERNAL)
+    return True
+
+
+class HealthProber:
+    """
+    Chequea storage y push transport cada ``interval`` segundos y guarda el
+    resultado en ``snapshot``. Los probes de load balancer y Kubernetes leen el
+    snapshot en vez de abrir una conexión por request.
+
+    Los chequeos pasan por los circuit breakers: con el circuito abierto no
+    tocan la dependencia, y cuando vence ``reset_timeout`` el probe sirve de
+    llamada de prueba para cerrarlo.
+    """
+
+    def __init__(self, ctx, interval: float, timeout: float):
+        self.ctx = ctx
+        self.interval = interval
+        self.timeout = timeout
+        self.snapshot: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _check_storage(self) -> tuple:
+        repository = self.ctx.get_repository()
+        try:
+            result = await asyncio.wait_for(asyncio.to_thread(repository.ping), self.timeout)
+            db_logger.info(f"✅ {repository.name} health check passed")
+            return repository.name, {
+                "status": "✅ Connected",
+                **repository.describe(),
+                "test_query": result,
+                "statements": repository.statement_timings()
+            }
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                e = TimeoutError(f"ping timed out after {self.timeout}s")
+                if repository.breaker is not None:
+                    repository.breaker.record_failure()
+            db_logger.error(f"❌ {repository.name} health check failed: {e}")
+            return repository.name, {"status": f"❌ Error: {str(e)}", **repository.describe()}
+
+    async def _check_push(self) -> dict:
+        breaker: CircuitBreaker = self.ctx.fcm_breaker
+        try:
+            transport = self.ctx.get_push_transport()
+            info = await asyncio.wait_for(
+                asyncio.to_thread(breaker.call, transport.probe, is_failure=fcm_outage), self.timeout
+            )
+            firebase_logger.info("✅ Firebase health check passed")
+            return info
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                e = TimeoutError(f"probe timed out after {self.timeout}s")
+                breaker.record_failure()
+            firebase_logger.error(f"❌ Firebase health check failed: {e}")
+            return {
+                "status": f"❌ Error: {str(e)}",
+                "credentials_path": self.ctx.settings.firebase_credentials_path
+            }
+
+    async def probe_once(self) -> dict:
+        start = time.perf_counter()
+        (storage_name, storage), firebase = await asyncio.gather(self._check_storage(), self._check_push())
+        self.snapshot = {
+            "checked_at": datetime.utcnow().isoformat(),
+            "probe_ms": round((time.perf_counter() - start) * 1000, 3),
+            storage_name: storage,
+            "firebase": firebase,
+        }
+        return self.snapshot
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe_once()
+            except Exception as e:
+                logger.error(f"❌ Health probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="health-prober")
+            logger.info(f"🏥 Health prober running every {self.interval}s")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
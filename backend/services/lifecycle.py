@@ -0,0 +1,84 @@
+# Ciclo de vida del proceso: trabajo en vuelo y apagado ordenado
+import asyncio
+import inspect
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+lifecycle_logger = logging.getLogger("Lifecycle")
+
+DrainHook = Callable[[], Union[None, Awaitable[None]]]
+
+
+class ShutdownInProgress(Exception):
+    """Se lanza cuando se intenta iniciar trabajo nuevo durante el apagado"""
+
+
+class LifecycleManager:
+    """
+    Registra el trabajo en segundo plano (fan-outs de push, colas) y los hooks
+    de drenado que se ejecutan al apagar el worker.
+
+    Orden de apagado:
+      1. Deja de aceptar trabajo nuevo (``accepting`` pasa a False)
+      2. Espera a que terminen las tareas en vuelo (hasta ``timeout``)
+      3. Ejecuta los hooks de drenado en orden de registro
+         (colas, buffers de log, pools de conexión)
+    """
+
+    def __init__(self):
+        self._accepting = True
+        self._tasks: Set[asyncio.Task] = set()
+        self._drain_hooks: List[Tuple[str, DrainHook]] = []
+
+    @property
+    def accepting(self) -> bool:
+        return self._accepting
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def spawn(self, coro: Awaitable, name: Optional[str] = None) -> asyncio.Task:
+        """Lanza una tarea rastreada; el apagado espera a que termine"""
+        if not self._accepting:
+            if inspect.iscoroutine(coro):
+                coro.close()
+            raise ShutdownInProgress("Server is shutting down")
+
+        task = asyncio.ensure_future(coro)
+        if name:
+            task.set_name(name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def add_drain_hook(self, name: str, hook: DrainHook):
+        """Registra una función (sync o async) a ejecutar tras drenar las tareas"""
+        self._drain_hooks.append((name, hook))
+
+    async def shutdown(self, timeout: float = 30.0) -> Dict[str, int]:
+        self._accepting = False
+        pending_at_start = len(self._tasks)
+        lifecycle_logger.info(f"🛑 Shutdown requested, draining {pending_at_start} in-flight tasks...")
+
+        abandoned = 0
+        if self._tasks:
+            done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            abandoned = len(pending)
+            if pending:
+                lifecycle_logger.error(f"❌ {abandoned} tasks still running after {timeout}s, cancelling")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        for name, hook in self._drain_hooks:
+            try:
+                result = hook()
+                if inspect.isawaitable(result):
+                    await result
+                lifecycle_logger.info(f"   ✅ Drain hook '{name}' completed")
+            except Exception as e:
+                lifecycle_logger.error(f"   ❌ Drain hook '{name}' failed: {e}")
+
+        lifecycle_logger.info("✅ Shutdown complete")
+        return {"drained": pending_at_start - abandoned, "abandoned": abandoned}
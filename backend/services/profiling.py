@@ -0,0 +1,182 @@
+# Profiling bajo demanda: muestreo de stacks de un request y perfiles en disco con presupuesto acotado
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+
+logger = logging.getLogger("PushNotificationsAPI")
+
+# Header que pide perfilar un request; su valor debe ser PROFILE_TOKEN
+PROFILE_HEADER = "x-profile-token"
+PROFILE_SUFFIX = ".folded"
+# Nombres que genera ProfileStore: no se aceptan rutas ni otros archivos del directorio
+PROFILE_NAME = re.compile(r"^[0-9T]+_[A-Z]+_[\w.-]*_\d+ms_[0-9a-f]{8}\.folded$")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class StackSampler:
+    """
+    Profiler de muestreo: un thread toma el stack de todos los threads cada
+    ``interval`` segundos (``sys._current_frames``) y cuenta los stacks
+    iguales. El código perfilado no se instrumenta; el costo es el del thread
+    de muestreo y solo existe mientras el sampler está activo.
+
+    El resultado está en formato "folded" (``thread;f1;f2;f3 N`` por línea),
+    que leen flamegraph.pl, speedscope e inferno.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            self.samples[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfileStore:
+    """
+    Perfiles como archivos en ``directory``. Tras cada perfil nuevo se borran
+    los más viejos hasta quedar dentro de ``max_files`` y ``max_bytes``; el
+    directorio es la fuente de verdad, así varios workers comparten el presupuesto.
+    """
+
+    def __init__(self, directory: str, max_files: int, max_bytes: int):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+
+    def _entries(self) -> List[os.DirEntry]:
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if PROFILE_NAME.match(entry.name)]
+        except FileNotFoundError:
+            return []
+        return sorted(entries, key=lambda entry: entry.stat().st_mtime, reverse=True)
+
+    def save(self, method: str, path: str, elapsed: float, content: str) -> str:
+        slug = re.sub(r"[^\w.-]+", "-", path.strip("/"))[:60] or "root"
+        name = (f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}_{method.upper()}_{slug}_"
+                f"{int(elapsed * 1000)}ms_{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}")
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "w", encoding="utf-8") as profile:
+            profile.write(content)
+        self.rotate()
+        return name
+
+    def rotate(self) -> int:
+        """Borra los perfiles más viejos que exceden el presupuesto; devuelve cuántos"""
+        removed = 0
+        total = 0
+        for index, entry in enumerate(self._entries()):
+            total += entry.stat().st_size
+            if index >= self.max_files or total > self.max_bytes:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass  # otro worker lo borró primero
+        return removed
+
+    def list(self) -> List[dict]:
+        """Perfiles guardados, el más reciente primero"""
+        return [
+            {
+                "name": entry.name,
+                "bytes": entry.stat().st_size,
+                "created_at": datetime.utcfromtimestamp(entry.stat().st_mtime).isoformat(),
+            }
+            for entry in self._entries()
+        ]
+
+    def path(self, name: str) -> Optional[str]:
+        """Ruta del perfil, o None si el nombre no es de un perfil existente"""
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+class RequestProfiler:
+    """
+    Decide qué requests se perfilan: los que traen ``X-Profile-Token`` con el
+    token configurado y una fracción ``sample_rate`` del resto. Un solo perfil
+    a la vez por worker: el sampler ve todos los threads y dos perfiles
+    simultáneos se mezclarían.
+    """
+
+    def __init__(self, store: ProfileStore, token: str = "", sample_rate: float = 0.0, interval: float = 0.005):
+        self.store = store
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self._active = threading.Lock()
+        self.stats = {"profiled": 0, "skipped_busy": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token) or self.sample_rate > 0
+
+    def wants(self, header: Optional[str]) -> bool:
+        if header is not None and self.token:
+            return hmac.compare_digest(header.encode(), self.token.encode())
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self) -> Optional[StackSampler]:
+        if not self._active.acquire(blocking=False):
+            self.stats["skipped_busy"] += 1
+            return None
+        sampler = StackSampler(self.interval)
+        sampler.start()
+        return sampler
+
+    def end(self, sampler: StackSampler, method: str, path: str, elapsed: float) -> Optional[str]:
+        try:
+            sampler.stop()
+        finally:
+            self._active.release()
+        if not sampler.samples:
+            return None
+        self.stats["profiled"] += 1
+        name = self.store.save(method, path, elapsed, sampler.folded())
+        logger.info(f"🔬 Profile saved: {name} ({sum(sampler.samples.values())} samples)")
+        return name
+
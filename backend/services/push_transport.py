@@ -0,0 +1,634 @@
+# Transportes de push: Firebase Admin real, FCM HTTP v1 async y un FCM falso en proceso
+import asyncio
+import calendar
+import json
+import logging
+import math
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, Optional, Tuple
+
+firebase_logger = logging.getLogger("Firebase")
+
+# Códigos de error FCM (HTTP v1) que distinguimos
+UNREGISTERED = "UNREGISTERED"
+QUOTA_EXCEEDED = "QUOTA_EXCEEDED"
+UNAVAILABLE = "UNAVAILABLE"
+INVALID_ARGUMENT = "INVALID_ARGUMENT"
+INTERNAL = "INTERNAL"
+
+# Errores transitorios que vale la pena reintentar
+RETRYABLE_CODES = frozenset({QUOTA_EXCEEDED, UNAVAILABLE, INTERNAL})
+
+# Prioridades de entrega
+HIGH = "high"
+NORMAL = "normal"
+PRIORITIES = (HIGH, NORMAL)
+
+# Header apns-priority: 10 = inmediato, 5 = según el consumo de batería del dispositivo
+APNS_PRIORITY = {HIGH: "10", NORMAL: "5"}
+
+# Límite de FCM para notification + data de un mensaje
+FCM_PAYLOAD_LIMIT = 4096
+# Qué hacer con un payload que no entra: rechazar el envío o recortar body y título
+PAYLOAD_REJECT = "reject"
+PAYLOAD_TRUNCATE = "truncate"
+ELLIPSIS = "…"
+
+
+@dataclass
+class PushMessage:
+    """Contenido de una push notification, independiente del token destino"""
+    title: str
+    body: str
+    data: Dict[str, str] = field(default_factory=dict)
+    priority: str = NORMAL
+    # FCM/APNs reemplazan en el dispositivo una notificación pendiente con la misma clave
+    collapse_key: Optional[str] = None
+    # Payload del transport armado una sola vez (PushTransport.prepare) y compartido por todos los tokens
+    template: Optional[object] = field(default=None, repr=False, compare=False)
+
+
+class PayloadTooLarge(ValueError):
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"Push payload is {size} bytes, FCM allows {limit}")
+        self.size = size
+        self.limit = limit
+
+
+def payload_size(title: str, body: str, data: Dict[str, str]) -> int:
+    """Bytes de notification + data codificados como en el request a FCM (JSON UTF-8 compacto)"""
+    payload = {"notification": {"title": title, "body": body}, "data": data}
+    return len(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _shorten(text: str, fits) -> str:
+    """El prefijo más largo de ``text`` (más "…") para el que ``fits`` es True; búsqueda binaria"""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(text[:middle] + ELLIPSIS):
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + ELLIPSIS if low else ""
+
+
+def fit_payload(message: PushMessage, limit: int = FCM_PAYLOAD_LIMIT, truncate: bool = False) -> PushMessage:
+    """
+    Verifica el tamaño del payload antes del fan-out: FCM rechazaría cada
+    token por separado. Con ``truncate`` se recorta primero el body y después
+    el título; si ni así entra (data demasiado grande) lanza PayloadTooLarge.
+    """
+    size = payload_size(message.title, message.body, message.data)
+    if size <= limit:
+        return message
+    if not truncate:
+        raise PayloadTooLarge(size, limit)
+
+    body = _shorten(message.body, lambda text: payload_size(message.title, text, message.data) <= limit)
+    title = message.title
+    if payload_size(title, body, message.data) > limit:
+        title = _shorten(title, lambda text: payload_size(text, body, message.data) <= limit)
+    final = payload_size(title, body, message.data)
+    if final > limit:
+        raise PayloadTooLarge(final, limit)
+    firebase_logger.warning(f"⚠️ Push payload truncated from {size} to {final} bytes")
+    return replace(message, title=title, body=body, template=None)
+
+
+class PushError(Exception):
+    """Fallo al enviar a un token, con el código de error FCM"""
+
+    def __init__(self, code: str, message: str = "", token: Optional[str] = None):
+        super().__init__(f"{code}: {message}" if message else code)
+        self.code = code
+        self.token = token
+
+    @property
+    def retryable(self) -> bool:
+        return self.code in RETRYABLE_CODES
+
+
+class PushTransport(ABC):
+    """
+    Interfaz de envío; ``send`` es bloqueante y se llama desde el threadpool.
+    Los transportes con ``asynchronous`` implementan ``send_async`` y el
+    fan-out los llama desde el event loop, sin ocupar un thread por envío.
+    """
+
+    name = "abstract"
+    asynchronous = False
+
+    @abstractmethod
+    def send(self, token: str, message: PushMessage) -> str:
+        """Envía a un token y devuelve el message id; lanza PushError si falla"""
+
+    async def send_async(self, token: str, message: PushMessage) -> str:
+        return await asyncio.to_thread(self.send, token, message)
+
+    def prepare(self, message: PushMessage) -> PushMessage:
+        """Arma una vez por envío lo que no depende del token (``template``)"""
+        return message
+
+    def warmup(self):
+        """Inicializa credenciales/conexiones antes del primer envío"""
+
+    def health(self) -> dict:
+        return {"status": "✅ Initialized", "transport": self.name}
+
+    def probe(self) -> dict:
+        """Chequeo del health prober; por defecto igual a ``health``"""
+        return self.health()
+
+    def close(self):
+        """Libera conexiones; puede devolver un awaitable (lo espera el drain hook)"""
+
+
+# ==========================================
+# FIREBASE ADMIN
+# ==========================================
+
+class FirebaseTransport(PushTransport):
+    name = "firebase"
+
+    def __init__(self, credentials_path: str):
+        self.credentials_path = credentials_path
+        self._app = None
+        self._lock = threading.Lock()
+
+    @property
+    def app(self):
+        if self._app is not None:
+            return self._app
+
+        with self._lock:
+            if self._app is None:
+                import firebase_admin
+                from firebase_admin import credentials
+
+                try:
+                    self._app = firebase_admin.get_app()
+                except ValueError:
+                    try:
+                        cred = credentials.Certificate(self.credentials_path)
+                        self._app = firebase_admin.initialize_app(cred)
+                        firebase_logger.info(f"✅ Firebase initialized successfully with project: {cred.project_id}")
+                    except Exception as e:
+                        firebase_logger.error(f"❌ Error initializing Firebase: {e}")
+                        raise
+        return self._app
+
+    def warmup(self):
+        self.app
+
+    def build_template(self, message: PushMessage) -> dict:
+        """Partes del ``messaging.Message`` que comparten todos los tokens"""
+        from firebase_admin import messaging
+
+        apns_headers = {"apns-priority": APNS_PRIORITY[message.priority]}
+        android_notification = None
+        if message.collapse_key:
+            apns_headers["apns-collapse-id"] = message.collapse_key
+            android_notification = messaging.AndroidNotification(tag=message.collapse_key)
+
+        return {
+            "notification": messaging.Notification(
+                title=message.title,
+                body=message.body
+            ),
+            "data": message.data,
+            "android": messaging.AndroidConfig(
+                priority=message.priority,
+                collapse_key=message.collapse_key,
+                notification=android_notification
+            ),
+            "apns": messaging.APNSConfig(headers=apns_headers),
+        }
+
+    def prepare(self, message: PushMessage) -> PushMessage:
+        return replace(message, template=self.build_template(message))
+
+    def build_message(self, token: str, message: PushMessage):
+        from firebase_admin import messaging
+
+        # Con template solo se crea el Message por token; las partes se reutilizan
+        template = message.template if message.template is not None else self.build_template(message)
+        return messaging.Message(token=token, **template)
+
+    def send(self, token: str, message: PushMessage) -> str:
+        from firebase_admin import messaging
+
+        try:
+            return messaging.send(self.build_message(token, message), app=self.app)
+        except Exception as e:
+            raise PushError(firebase_error_code(e), str(e), token) from e
+
+    def health(self) -> dict:
+        app = self.app
+        return {
+            "status": "✅ Initialized",
+            "transport": self.name,
+            "project_id": app.project_id if hasattr(app, 'project_id') else "unknown"
+        }
+
+    def probe(self) -> dict:
+        # Obtener el access token OAuth ejercita credenciales y conectividad con Google;
+        # google-auth lo cachea hasta que expira, así que casi nunca sale a la red
+        info = self.health()
+        self.app.credential.get_access_token()
+        return info
+
+
+def firebase_error_code(error: Exception) -> str:
+    """Traduce las excepciones de firebase_admin a códigos FCM"""
+    from firebase_admin import exceptions, messaging
+
+    if isinstance(error, messaging.UnregisteredError):
+        return UNREGISTERED
+    if isinstance(error, messaging.QuotaExceededError):
+        return QUOTA_EXCEEDED
+    if isinstance(error, exceptions.UnavailableError):
+        return UNAVAILABLE
+    if isinstance(error, exceptions.InvalidArgumentError):
+        return INVALID_ARGUMENT
+    return INTERNAL
+
+
+# ==========================================
+# FCM HTTP v1 (ASYNC, HTTP/2)
+# ==========================================
+
+FCM_ENDPOINT = "https://fcm.googleapis.com"
+FCM_SCOPE = "https://www.googleapis.com/auth/firebase.messaging"
+FCM_ERROR_CODES = frozenset({UNREGISTERED, QUOTA_EXCEEDED, UNAVAILABLE, INVALID_ARGUMENT, INTERNAL})
+# Status de google.rpc cuando la respuesta no trae un FcmError
+FCM_STATUS_CODES = {"RESOURCE_EXHAUSTED": QUOTA_EXCEEDED, UNAVAILABLE: UNAVAILABLE, INVALID_ARGUMENT: INVALID_ARGUMENT}
+FCM_HTTP_STATUS = {400: INVALID_ARGUMENT, 429: QUOTA_EXCEEDED, 503: UNAVAILABLE}
+
+
+def service_account_token(credentials_path: str) -> Tuple[str, Callable[[], Tuple[str, float]]]:
+    """(project_id, fetch) del service account; ``fetch`` pide un access token OAuth (bloqueante)"""
+    from google.auth.transport.requests import Request
+    from google.oauth2 import service_account
+
+    credentials = service_account.Credentials.from_service_account_file(credentials_path, scopes=[FCM_SCOPE])
+
+    def fetch() -> Tuple[str, float]:
+        credentials.refresh(Request())
+        # google-auth guarda la expiración como datetime UTC naive
+        return credentials.token, calendar.timegm(credentials.expiry.utctimetuple())
+
+    return credentials.project_id, fetch
+
+
+class AccessTokenCache:
+    """
+    Access token OAuth cacheado hasta ``margin`` segundos antes de expirar:
+    se renueva por adelantado y los envíos concurrentes no esperan a Google.
+    ``fetch`` devuelve (token, expiración en epoch).
+    """
+
+    def __init__(self, fetch: Callable[[], Tuple[str, float]], margin: float = 300.0,
+                 clock: Callable[[], float] = time.time):
+        self._fetch = fetch
+        self.margin = margin
+        self._clock = clock
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    def current(self) -> Optional[str]:
+        """Token vigente sin bloquear, o None si hay que renovarlo"""
+        if self._token is not None and self._clock() < self._expires_at - self.margin:
+            return self._token
+        return None
+
+    def get(self) -> str:
+        token = self.current()
+        if token is not None:
+            return token
+        with self._lock:
+            token = self.current()
+            if token is None:
+                token, self._expires_at = self._fetch()
+                self._token = token
+                self.refreshes += 1
+                firebase_logger.info("🔑 FCM access token refreshed")
+        return token
+
+    def invalidate(self, token: str):
+        """Descarta ``token`` (FCM respondió 401) si nadie lo renovó ya"""
+        with self._lock:
+            if self._token == token:
+                self._token = None
+
+
+def fcm_http_error_code(status_code: int, payload) -> str:
+    """Código FCM de una respuesta de error de HTTP v1"""
+    error = payload.get("error") if isinstance(payload, dict) else None
+    if not isinstance(error, dict):
+        return FCM_HTTP_STATUS.get(status_code, INTERNAL)
+    for detail in error.get("details") or ():
+        if isinstance(detail, dict) and detail.get("errorCode") in FCM_ERROR_CODES:
+            return detail["errorCode"]
+    return FCM_STATUS_CODES.get(error.get("status"), FCM_HTTP_STATUS.get(status_code, INTERNAL))
+
+
+class FCMHttpTransport(PushTransport):
+    """
+    Cliente de FCM HTTP v1 sin firebase_admin: POST messages:send con httpx
+    async sobre HTTP/2. Pocas conexiones multiplexan todos los envíos en
+    vuelo (los limita PUSH_MAX_IN_FLIGHT en el scheduler) y el access token
+    se cachea. Con un endpoint ``http://`` (stand-in local) usa HTTP/2 sin TLS.
+    """
+
+    name = "fcm_http"
+    asynchronous = True
+
+    def __init__(self, credentials_path: str, endpoint: str = FCM_ENDPOINT, connections: int = 2,
+                 timeout: float = 10.0, token_margin: float = 300.0, token_source=None, http_transport=None):
+        self.credentials_path = credentials_path
+        self.endpoint = endpoint.rstrip("/")
+        self.connections = max(1, connections)
+        self.timeout = timeout
+        self.token_margin = token_margin
+        # (project_id, fetch) en vez del service account; http_transport reemplaza la red (tests)
+        self._token_source = token_source
+        self._http_transport = http_transport
+        self._tokens: Optional[AccessTokenCache] = None
+        self._client = None
+        self._lock = threading.Lock()
+        self.project_id: Optional[str] = None
+        self.url: Optional[str] = None
+        self.stats = {"sent": 0, "errors": 0, "auth_retries": 0}
+
+    @property
+    def tokens(self) -> AccessTokenCache:
+        if self._tokens is None:
+            with self._lock:
+                if self._tokens is None:
+                    project_id, fetch = self._token_source or service_account_token(self.credentials_path)
+                    self.project_id = project_id
+                    self.url = f"{self.endpoint}/v1/projects/{project_id}/messages:send"
+                    self._tokens = AccessTokenCache(fetch, self.token_margin)
+        return self._tokens
+
+    def warmup(self):
+        self.tokens.get()
+
+    def _new_client(self):
+        import httpx
+
+        return httpx.AsyncClient(
+            http1=not self.endpoint.startswith("http://"),
+            http2=True,
+            limits=httpx.Limits(max_connections=self.connections, max_keepalive_connections=self.connections),
+            timeout=self.timeout,
+            transport=self._http_transport,
+        )
+
+    def build_template(self, message: PushMessage) -> dict:
+        """Campos JSON del mensaje v1 que comparten todos los tokens"""
+        apns_headers = {"apns-priority": APNS_PRIORITY[message.priority]}
+        android = {"priority": message.priority}
+        if message.collapse_key:
+            apns_headers["apns-collapse-id"] = message.collapse_key
+            android["collapse_key"] = message.collapse_key
+            android["notification"] = {"tag": message.collapse_key}
+        return {
+            "notification": {"title": message.title, "body": message.body},
+            "data": message.data,
+            "android": android,
+            "apns": {"headers": apns_headers},
+        }
+
+    def prepare(self, message: PushMessage) -> PushMessage:
+        # El body se codifica una vez; por token solo se inserta el token entre prefijo y sufijo
+        fields = json.dumps(self.build_template(message), ensure_ascii=False, separators=(",", ":"))
+        return replace(message, template=(b'{"message":{"token":', b"," + fields[1:].encode("utf-8") + b"}"))
+
+    def encode(self, token: str, message: PushMessage) -> bytes:
+        prefix, suffix = (message.template if message.template is not None else self.prepare(message).template)
+        return prefix + json.dumps(token).encode("utf-8") + suffix
+
+    async def _post(self, client, token: str, message: PushMessage) -> str:
+        import httpx
+
+        tokens = self.tokens
+        body = self.encode(token, message)
+        for attempt in range(2):
+            access_token = tokens.current() or await asyncio.to_thread(tokens.get)
+            try:
+                response = await client.post(self.url, content=body, headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "Content-Type": "application/json; charset=UTF-8",
+                })
+            except httpx.HTTPError as e:
+                self.stats["errors"] += 1
+                raise PushError(UNAVAILABLE, str(e) or type(e).__name__, token) from e
+            # Token revocado o vencido antes de tiempo: se renueva una vez
+            if response.status_code == 401 and attempt == 0:
+                self.stats["auth_retries"] += 1
+                tokens.invalidate(access_token)
+                continue
+            break
+
+        if response.status_code == 200:
+            self.stats["sent"] += 1
+            return response.json()["name"]
+        self.stats["errors"] += 1
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        error = payload.get("error") if isinstance(payload, dict) else None
+        detail = error.get("message", "") if isinstance(error, dict) else response.text[:200]
+        raise PushError(fcm_http_error_code(response.status_code, payload), detail, token)
+
+    async def send_async(self, token: str, message: PushMessage) -> str:
+        # El cliente se crea en el event loop que envía: el pool HTTP/2 queda atado a ese loop
+        if self._client is None:
+            self._client = self._new_client()
+        return await self._post(self._client, token, message)
+
+    def send(self, token: str, message: PushMessage) -> str:
+        """Envío bloqueante para llamadores sin event loop (scripts): usa un cliente propio"""
+        async def send_once():
+            async with self._new_client() as client:
+                return await self._post(client, token, message)
+
+        return asyncio.run(send_once())
+
+    def health(self) -> dict:
+        self.tokens
+        return {
+            "status": "✅ Initialized",
+            "transport": self.name,
+            "project_id": self.project_id,
+            "endpoint": self.endpoint,
+            "token_refreshes": self.tokens.refreshes,
+            "stats": dict(self.stats),
+        }
+
+    def probe(self) -> dict:
+        info = self.health()
+        self.tokens.get()
+        return info
+
+    def close(self):
+        client, self._client = self._client, None
+        if client is not None:
+            return client.aclose()
+
+
+# ==========================================
+# FCM FALSO
+# ==========================================
+
+class LatencyModel:
+    """
+    Distribución de latencia por llamada, en milisegundos.
+
+    - ``constant``: siempre ``mean_ms``
+    - ``uniform``: entre ``mean_ms - jitter_ms`` y ``mean_ms + jitter_ms``
+    - ``normal``: media ``mean_ms``, desvío ``jitter_ms``
+    - ``lognormal``: mediana ``mean_ms`` con cola larga (``jitter_ms`` como desvío aproximado)
+    - ``exponential``: media ``mean_ms``
+    """
+
+    DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal", "exponential")
+
+    def __init__(self, distribution: str = "constant", mean_ms: float = 0.0, jitter_ms: float = 0.0):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+
+    def sample(self, rng: random.Random) -> float:
+        if self.mean_ms <= 0:
+            return 0.0
+        if self.distribution == "constant":
+            value = self.mean_ms
+        elif self.distribution == "uniform":
+            value = rng.uniform(self.mean_ms - self.jitter_ms, self.mean_ms + self.jitter_ms)
+        elif self.distribution == "normal":
+            value = rng.gauss(self.mean_ms, self.jitter_ms)
+        elif self.distribution == "lognormal":
+            sigma = math.log1p(self.jitter_ms / self.mean_ms) if self.jitter_ms else 0.0
+            value = rng.lognormvariate(math.log(self.mean_ms), sigma)
+        else:
+            value = rng.expovariate(1.0 / self.mean_ms)
+        return max(0.0, value)
+
+
+class FakeFCMTransport(PushTransport):
+    """
+    FCM en proceso para benchmarks y tests reproducibles.
+
+    ``error_rates`` mapea código de error a probabilidad por llamada
+    (p. ej. ``{"UNREGISTERED": 0.01}``). ``max_rps`` limita el throughput
+    global: las llamadas que lo exceden fallan con QUOTA_EXCEEDED, como FCM.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: Optional[LatencyModel] = None, error_rates: Optional[Dict[str, float]] = None,
+                 max_rps: Optional[float] = None, seed: Optional[int] = 42, record: bool = False):
+        self.latency = latency or LatencyModel()
+        self.error_rates = dict(error_rates or {})
+        if sum(self.error_rates.values()) > 1:
+            raise ValueError("Error rates must add up to at most 1")
+        self.max_rps = max_rps
+        self.record = record
+
+        self.sent = []
+        self.stats = {"calls": 0, "success": 0, "errors": {}}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # Token bucket con capacidad de un segundo de tráfico
+        self._tokens = float(max_rps or 0)
+        self._last_refill = time.monotonic()
+
+    def _take_capacity(self) -> bool:
+        if not self.max_rps:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.max_rps, self._tokens + (now - self._last_refill) * self.max_rps)
+        self._last_refill = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _pick_error(self) -> Optional[str]:
+        roll = self._rng.random()
+        cumulative = 0.0
+        for code, rate in self.error_rates.items():
+            cumulative += rate
+            if roll < cumulative:
+                return code
+        return None
+
+    def send(self, token: str, message: PushMessage) -> str:
+        # Las decisiones aleatorias se toman bajo lock para que sean reproducibles con la semilla
+        with self._lock:
+            self.stats["calls"] += 1
+            call_number = self.stats["calls"]
+            delay_ms = self.latency.sample(self._rng)
+            error = None if self._take_capacity() else QUOTA_EXCEEDED
+            error = error or self._pick_error()
+            if error:
+                self.stats["errors"][error] = self.stats["errors"].get(error, 0) + 1
+            else:
+                self.stats["success"] += 1
+                if self.record:
+                    self.sent.append((token, message))
+
+        if delay_ms:
+            time.sleep(delay_ms / 1000.0)
+        if error:
+            raise PushError(error, "fake FCM injected failure", token)
+        return f"projects/fake/messages/{call_number}"
+
+    def health(self) -> dict:
+        return {"status": "✅ Initialized", "transport": self.name, "stats": dict(self.stats)}
+
+
+def parse_error_rates(value: str) -> Dict[str, float]:
+    """Parsea ``"UNREGISTERED=0.01,UNAVAILABLE=0.005"``"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        code, _, rate = item.partition("=")
+        rates[code.strip().upper()] = float(rate)
+    return rates
+
+
+def create_push_transport(settings) -> PushTransport:
+    if settings.push_transport == "fake":
+        return FakeFCMTransport(
+            latency=LatencyModel(
+                settings.fake_fcm_latency_distribution,
+                settings.fake_fcm_latency_ms,
+                settings.fake_fcm_jitter_ms,
+            ),
+            error_rates=parse_error_rates(settings.fake_fcm_error_rates),
+            max_rps=settings.fake_fcm_max_rps or None,
+            seed=settings.fake_fcm_seed,
+        )
+    if settings.push_transport == "firebase":
+        return FirebaseTransport(settings.firebase_credentials_path)
+    if settings.push_transport == "fcm_http":
+        return FCMHttpTransport(
+            settings.firebase_credentials_path,
+            endpoint=settings.fcm_http_endpoint,
+            connections=settings.fcm_http_connections,
+            timeout=settings.fcm_http_timeout_s,
+            token_margin=settings.fcm_token_refresh_margin_s,
+        )
+    raise ValueError(f"Unknown PUSH_TRANSPORT: {settings.push_transport}")
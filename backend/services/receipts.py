@@ -0,0 +1,100 @@
+# Recibos de entrega y apertura: se acumulan en memoria y se aplican con UPDATEs por lote
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from storage.repository import PushReceipt
+
+db_logger = logging.getLogger("Database")
+
+DELIVERED = "delivered"
+OPENED = "opened"
+
+
+class ReceiptBuffer:
+    """
+    Los recibos llegan de a uno por device (varias veces el tráfico de push);
+    se guardan en un dict por (message_id, evento), así los reintentos de la
+    app se deduplican en memoria, y cada ``flush_interval`` segundos se aplican
+    todos juntos con ``apply`` (un UPDATE por lote por tipo de recibo).
+
+    Con ``max_pending`` recibos acumulados se adelanta el flush. Si el flush
+    falla los recibos se descartan: son métricas, no datos del usuario.
+    """
+
+    def __init__(self, apply: Optional[Callable[[Sequence[PushReceipt]], int]], flush_interval: float,
+                 max_pending: int):
+        self.apply = apply
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[Tuple[str, str], PushReceipt] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.stats = {"received": 0, "duplicates": 0, "flushes": 0, "applied": 0, "dropped": 0}
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add(self, receipts: Sequence[PushReceipt]) -> int:
+        """Encola los recibos; devuelve cuántos eran nuevos"""
+        added = 0
+        for receipt in receipts:
+            key = (receipt.message_id, receipt.event)
+            self.stats["received"] += 1
+            if key in self._pending:
+                self.stats["duplicates"] += 1
+                continue
+            self._pending[key] = receipt
+            added += 1
+        self._start()
+        if self.pending >= self.max_pending:
+            self._wakeup.set()
+        return added
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch: List[PushReceipt] = list(self._pending.values())
+            self._pending = {}
+            self.stats["flushes"] += 1
+            try:
+                applied = await asyncio.to_thread(self.apply, batch)
+            except Exception as e:
+                self.stats["dropped"] += len(batch)
+                db_logger.error(f"❌ Push receipts flush failed, dropped {len(batch)}: {e}")
+                return 0
+            self.stats["applied"] += applied
+            db_logger.info(f"📨 Push receipts: {len(batch)} flushed, {applied} log rows updated")
+            return applied
+
+    # ------------------------------------------
+    # Timer
+    # ------------------------------------------
+
+    def _start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="receipt-flush")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def close(self):
+        """Detiene el timer y aplica lo pendiente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,34 @@
+# Serialización JSON rápida para endpoints que devuelven listas grandes
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el encoder de la stdlib
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """JSON compacto en UTF-8; datetime se serializa en ISO 8601 como datetime.isoformat()"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Respuesta JSON codificada con orjson. Devolverla directamente desde el
+    endpoint evita el recorrido de ``jsonable_encoder`` sobre cada fila.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,108 @@
+# Retención: borra periódicamente notificaciones internas, push log y refresh tokens vencidos
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from config import Settings
+from storage.repository import HISTORY_EPOCH, Purged, Repository, retention_cutoff
+
+logger = logging.getLogger("PushNotificationsAPI")
+db_logger = logging.getLogger("Database")
+
+
+def retention_days(settings: Settings) -> Dict[str, int]:
+    """Días de retención por tipo de historial (HISTORY_DATE_COLUMNS); 0 = sin límite"""
+    return {"notifications": settings.notification_retention_days, "pushes": settings.push_log_retention_days}
+
+
+def inbox_since(settings: Settings, now: Optional[datetime] = None) -> datetime:
+    """
+    Límite inferior de created_at del inbox: la ventana del inbox o la retención,
+    la más corta. Con la tabla particionada por created_at es lo que permite a
+    Oracle leer solo las particiones recientes.
+    """
+    return max(retention_cutoff(settings.inbox_window_days, now),
+               retention_cutoff(settings.notification_retention_days, now))
+
+
+class RetentionJob:
+    """
+    Cada ``interval`` segundos llama a ``Repository.purge_history`` por cada tipo
+    con retención configurada. En Oracle eso borra particiones enteras (DDL, sin
+    undo por fila); en SQLite, filas. Varios workers pueden correrlo a la vez:
+    la segunda pasada no encuentra nada que borrar.
+
+    También borra los refresh tokens vencidos (cada rotación deja una fila
+    revocada que se guarda hasta su vencimiento para detectar reusos).
+    Las stats cuentan aparte filas y particiones: una partición no dice
+    cuántas filas tenía.
+    """
+
+    def __init__(self, get_repository: Callable[[], Repository], days: Dict[str, int], interval: float):
+        self.get_repository = get_repository
+        self.days = {kind: value for kind, value in days.items() if value > 0}
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"runs": 0, "purged_rows": 0, "dropped_partitions": 0, "failed": 0}
+
+    async def run_once(self, now: Optional[datetime] = None) -> Dict[str, Purged]:
+        purged = {}
+        repository = self.get_repository()
+        for kind, days in self.days.items():
+            before = retention_cutoff(days, now)
+            if before == HISTORY_EPOCH:
+                continue
+            try:
+                purged[kind] = await asyncio.to_thread(repository.purge_history, kind, before)
+            except Exception as e:
+                # Se reintenta en la próxima pasada
+                self.stats["failed"] += 1
+                db_logger.error(f"❌ Retention purge of {kind} failed: {e}")
+                continue
+            self._count(purged[kind])
+            if purged[kind].partitions:
+                db_logger.info(f"🧹 Retention: dropped {purged[kind].partitions} partitions from {kind} "
+                               f"older than {before:%Y-%m-%d}")
+            if purged[kind].rows:
+                db_logger.info(f"🧹 Retention: purged {purged[kind].rows} rows from {kind} "
+                               f"older than {before:%Y-%m-%d}")
+        try:
+            rows = await asyncio.to_thread(repository.purge_refresh_tokens, now or datetime.utcnow())
+            purged["refresh_tokens"] = Purged(rows=rows)
+            self._count(purged["refresh_tokens"])
+        except Exception as e:
+            self.stats["failed"] += 1
+            db_logger.error(f"❌ Expired refresh token purge failed: {e}")
+        self.stats["runs"] += 1
+        return purged
+
+    def _count(self, purged: Purged):
+        self.stats["purged_rows"] += purged.rows
+        self.stats["dropped_partitions"] += purged.partitions
+
+    # ------------------------------------------
+    # Timer
+    # ------------------------------------------
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"❌ Retention job failed: {e}")
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="history-retention")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
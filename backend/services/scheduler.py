@@ -0,0 +1,112 @@
+# Carriles de prioridad para los envíos push: capacidad global compartida entre requests
+import asyncio
+import contextvars
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict
+
+from services.push_transport import HIGH, NORMAL, PRIORITIES
+
+firebase_logger = logging.getLogger("Firebase")
+
+
+class PushScheduler:
+    """
+    Limita los envíos en vuelo de todo el proceso a ``capacity`` y los ejecuta
+    en un threadpool propio (no compite con las consultas a la base de datos
+    en el executor por defecto de asyncio).
+
+    El carril ``high`` siempre gana: cuando se libera un slot se atiende primero
+    a los envíos de alta prioridad en espera, y ``reserved_high`` slots nunca
+    los ocupa el tráfico ``normal``, así una alerta no espera detrás de un
+    broadcast de 500k tokens.
+    """
+
+    def __init__(self, capacity: int = 64, reserved_high: int = 8):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = capacity
+        self.reserved_high = min(max(reserved_high, 0), capacity - 1)
+        self.in_flight = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {priority: deque() for priority in PRIORITIES}
+        self._executor = None
+        self.stats = {priority: 0 for priority in PRIORITIES}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.capacity, thread_name_prefix="push-send")
+        return self._executor
+
+    def _limit(self, priority: str) -> int:
+        return self.capacity if priority == HIGH else self.capacity - self.reserved_high
+
+    def _can_start(self, priority: str) -> bool:
+        if self.in_flight >= self._limit(priority):
+            return False
+        # Un envío normal no se adelanta a uno de alta prioridad en espera
+        return priority == HIGH or not self._waiters[HIGH]
+
+    def waiting(self, priority: str) -> int:
+        return len(self._waiters[priority])
+
+    async def acquire(self, priority: str = NORMAL):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        if not self._waiters[priority] and self._can_start(priority):
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Recibió el slot justo antes de cancelarse: lo devuelve
+                self.release()
+            else:
+                self._waiters[priority].remove(waiter)
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        for priority in (HIGH, NORMAL):
+            waiters = self._waiters[priority]
+            while waiters and self.in_flight < self._limit(priority):
+                if priority == NORMAL and self._waiters[HIGH]:
+                    return
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self.in_flight += 1
+                    waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = NORMAL):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, priority: str, fn: Callable, *args):
+        """Ejecuta ``fn(*args)`` (bloqueante) en el threadpool de envíos cuando hay un slot del carril"""
+        async with self.slot(priority):
+            self.stats[priority] += 1
+            # run_in_executor no copia el contexto (a diferencia de asyncio.to_thread): sin esto
+            # el envío pierde el span actual del request
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, fn, *args)
+
+    async def run_async(self, priority: str, fn: Callable, *args):
+        """Espera la corrutina ``fn(*args)`` con un slot del carril; no usa el threadpool"""
+        async with self.slot(priority):
+            self.stats[priority] += 1
+            return await fn(*args)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,153 @@
+# Estadísticas incrementales: contadores en stats_rollup mantenidos por los endpoints y reconciliados periódicamente
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from storage.repository import STATS_TOTAL, Repository
+
+logger = logging.getLogger("PushNotificationsAPI")
+db_logger = logging.getLogger("Database")
+
+TOTAL_METRICS = ("users", "active_devices", "unread_notifications")
+DAILY_METRICS = ("pushes_sent", "pushes_failed", "internal_notifications")
+# Epoch de la última reconciliación, guardado como un contador más
+RECONCILED_AT = "reconciled_at"
+
+
+def utc_day(moment: Optional[float] = None) -> str:
+    return datetime.fromtimestamp(time.time() if moment is None else moment, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def recent_days(count: int, moment: Optional[float] = None) -> List[str]:
+    """Los últimos ``count`` días UTC, el más reciente primero"""
+    today = datetime.fromtimestamp(time.time() if moment is None else moment, tz=timezone.utc)
+    return [(today - timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(count)]
+
+
+class StatsRollup:
+    """
+    Los endpoints suman deltas en memoria (``incr``) y cada ``flush_interval``
+    segundos se aplican con un solo MERGE por lote, así /stats lee unas pocas
+    filas de ``stats_rollup`` en vez de hacer COUNT(*) sobre las tablas base.
+
+    Cada ``reconcile_interval`` segundos se recuentan las tablas base (los
+    totales y los últimos ``reconcile_days`` días) y se reemplazan los
+    contadores: corrige lo que los deltas no ven (limpiezas por SQL, devices
+    nuevos vs. actualizados en el MERGE, varios workers, un flush fallido).
+    """
+
+    def __init__(self, get_repository: Callable[[], Repository], flush_interval: float,
+                 reconcile_interval: float, reconcile_days: int = 2, include_pushes: bool = True):
+        self.get_repository = get_repository
+        self.flush_interval = flush_interval
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_days = reconcile_days
+        # Sin push log no hay de dónde recontar los pushes: quedan solo los deltas
+        self.include_pushes = include_pushes
+        self._deltas: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._task: Optional[asyncio.Task] = None
+        self._last_reconcile = time.monotonic()
+        self.stats = {"flushes": 0, "reconciles": 0, "failed": 0}
+
+    @property
+    def pending(self) -> int:
+        return len(self._deltas)
+
+    def incr(self, metric: str, delta: int = 1, daily: bool = False):
+        if delta:
+            self._deltas[(utc_day() if daily else STATS_TOTAL, metric)] += delta
+
+    # ------------------------------------------
+    # Flush y reconciliación
+    # ------------------------------------------
+
+    async def flush(self) -> int:
+        if not self._deltas:
+            return 0
+        deltas, self._deltas = self._deltas, defaultdict(int)
+        rows = [(bucket, metric, delta) for (bucket, metric), delta in deltas.items() if delta]
+        try:
+            count = await asyncio.to_thread(self.get_repository().add_stats, rows)
+        except Exception as e:
+            # Se pierden hasta la próxima reconciliación
+            self.stats["failed"] += 1
+            db_logger.error(f"❌ Stats flush failed, {len(rows)} counters pending reconcile: {e}")
+            return 0
+        self.stats["flushes"] += 1
+        return count
+
+    async def reconcile(self) -> int:
+        await self.flush()
+        days = recent_days(self.reconcile_days)
+        repository = self.get_repository()
+        counted = await asyncio.to_thread(repository.count_stats, days[-1], self.include_pushes)
+
+        # Días sin filas en las tablas base quedan en 0
+        metrics = ("internal_notifications",) + (("pushes_sent", "pushes_failed") if self.include_pushes else ())
+        values = {(day, metric): 0 for day in days for metric in metrics}
+        values.update({(bucket, metric): value for bucket, metric, value in counted})
+        values[(STATS_TOTAL, RECONCILED_AT)] = int(time.time())
+
+        count = await asyncio.to_thread(repository.set_stats, [(b, m, v) for (b, m), v in values.items()])
+        self._last_reconcile = time.monotonic()
+        self.stats["reconciles"] += 1
+        db_logger.info(f"📊 Stats reconciled: {count} counters from base tables")
+        return count
+
+    async def snapshot(self, days: int) -> dict:
+        """Totales y serie diaria desde los rollups más los deltas de este worker sin aplicar"""
+        day_buckets = recent_days(days)
+        rows = await asyncio.to_thread(self.get_repository().get_stats, [STATS_TOTAL] + day_buckets)
+        if not any(metric == RECONCILED_AT for _, metric, _ in rows):
+            # Primera vez sobre esta base: se cuenta una vez para partir de valores reales
+            await self.reconcile()
+            rows = await asyncio.to_thread(self.get_repository().get_stats, [STATS_TOTAL] + day_buckets)
+
+        values: Dict[Tuple[str, str], int] = defaultdict(int)
+        for bucket, metric, value in rows:
+            values[(bucket, metric)] += value
+        for key, delta in self._deltas.items():
+            values[key] += delta
+
+        reconciled_at = values.get((STATS_TOTAL, RECONCILED_AT))
+        return {
+            "totals": {metric: values[(STATS_TOTAL, metric)] for metric in TOTAL_METRICS},
+            "daily": [
+                {"day": day, **{metric: values[(day, metric)] for metric in DAILY_METRICS}}
+                for day in day_buckets
+            ],
+            "reconciled_at": datetime.utcfromtimestamp(reconciled_at).isoformat() if reconciled_at else None,
+        }
+
+    # ------------------------------------------
+    # Timer
+    # ------------------------------------------
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                if self.reconcile_interval > 0 and time.monotonic() - self._last_reconcile >= self.reconcile_interval:
+                    await self.reconcile()
+                else:
+                    await self.flush()
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"❌ Stats rollup job failed: {e}")
+
+    def start(self):
+        if self.flush_interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="stats-rollup")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
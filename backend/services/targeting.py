@@ -0,0 +1,129 @@
+# Resolución de destinatarios (user_ids / usernames) para push y notificaciones internas
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from services.fanout import FanoutResult
+from storage.repository import Repository
+
+
+class TooManyRecipients(ValueError):
+    """El request supera MAX_RECIPIENTS"""
+
+
+@dataclass
+class Recipients:
+    """Destinatarios pedidos, sin duplicados y en el orden del request"""
+    user_ids: List[int] = field(default_factory=list)
+    usernames: List[str] = field(default_factory=list)
+
+    @property
+    def broadcast(self) -> bool:
+        return not self.user_ids and not self.usernames
+
+    @property
+    def count(self) -> int:
+        return len(self.user_ids) + len(self.usernames)
+
+
+def requested_recipients(notification, limit: int) -> Recipients:
+    """Une ``user_id``/``username`` con las listas ``user_ids``/``usernames``"""
+    user_ids = ([notification.user_id] if notification.user_id else []) + (notification.user_ids or [])
+    usernames = ([notification.username] if notification.username else []) + (notification.usernames or [])
+    recipients = Recipients(list(dict.fromkeys(user_ids)), list(dict.fromkeys(usernames)))
+
+    if recipients.count > limit:
+        raise TooManyRecipients(f"Too many recipients: {recipients.count} (max {limit})")
+    return recipients
+
+
+def resolve_recipient_ids(repository: Repository, recipients: Recipients) -> Tuple[List[int], List[str]]:
+    """User ids pedidos más los de los usernames, sin duplicados; y los usernames que no existen"""
+    resolved = repository.get_user_ids_by_usernames(recipients.usernames) if recipients.usernames else {}
+    missing = [username for username in recipients.usernames if username not in resolved]
+    return list(dict.fromkeys(recipients.user_ids + list(resolved.values()))), missing
+
+
+@dataclass
+class PushTargets:
+    recipients: Recipients
+    # username -> user_id de los usernames que existen
+    resolved_usernames: Dict[str, int] = field(default_factory=dict)
+    # user_id -> tokens del usuario (con duplicados entre usuarios)
+    user_tokens: Dict[int, List[str]] = field(default_factory=dict)
+    # Tokens únicos para un solo fan-out y su primer dueño (para el push log)
+    tokens: List[str] = field(default_factory=list)
+    token_owners: Dict[str, Optional[int]] = field(default_factory=dict)
+
+
+def resolve_push_targets(repository: Repository, recipients: Recipients) -> PushTargets:
+    targets = PushTargets(recipients)
+
+    if recipients.broadcast:
+        targets.tokens = list(dict.fromkeys(repository.get_all_tokens()))
+        return targets
+
+    if recipients.usernames:
+        targets.resolved_usernames = repository.get_user_ids_by_usernames(recipients.usernames)
+    user_ids = list(dict.fromkeys(recipients.user_ids + list(targets.resolved_usernames.values())))
+
+    for user_id, token in repository.get_tokens_by_user_ids(user_ids):
+        targets.user_tokens.setdefault(user_id, []).append(token)
+        targets.token_owners.setdefault(token, user_id)
+    targets.tokens = list(targets.token_owners)
+    return targets
+
+
+def _recipient_result(user_id: int, tokens: List[str], delivered: Dict[str, bool]) -> dict:
+    if not tokens:
+        return {"user_id": user_id, "status": "no_devices", "devices": 0, "success": 0, "failure": 0}
+    success = sum(1 for token in tokens if delivered.get(token))
+    failure = len(tokens) - success
+    status = "sent" if not failure else ("failed" if not success else "partial")
+    return {"user_id": user_id, "status": status, "devices": len(tokens), "success": success, "failure": failure}
+
+
+def push_recipient_results(targets: PushTargets, result: FanoutResult) -> List[dict]:
+    """Resultado por destinatario pedido; un token compartido cuenta para cada dueño"""
+    delivered = {token: error is None for token, _, error in result.outcomes}
+    results = []
+
+    for user_id in targets.recipients.user_ids:
+        results.append(_recipient_result(user_id, targets.user_tokens.get(user_id, []), delivered))
+
+    for username in targets.recipients.usernames:
+        user_id = targets.resolved_usernames.get(username)
+        if user_id is None:
+            results.append({"username": username, "status": "not_found"})
+            continue
+        entry = _recipient_result(user_id, targets.user_tokens.get(user_id, []), delivered)
+        results.append({"username": username, **entry})
+
+    return results
+
+
+@dataclass
+class InternalTargets:
+    user_ids: List[int]
+    results: List[dict]
+
+
+def resolve_internal_targets(repository: Repository, recipients: Recipients) -> InternalTargets:
+    if recipients.broadcast:
+        return InternalTargets(repository.list_user_ids(), [])
+
+    resolved = repository.get_user_ids_by_usernames(recipients.usernames) if recipients.usernames else {}
+    candidates = list(dict.fromkeys(recipients.user_ids + list(resolved.values())))
+    existing = set(repository.filter_existing_user_ids(candidates)) if candidates else set()
+
+    results = [
+        {"user_id": user_id, "status": "created" if user_id in existing else "not_found"}
+        for user_id in recipients.user_ids
+    ]
+    for username in recipients.usernames:
+        user_id = resolved.get(username)
+        if user_id is None:
+            results.append({"username": username, "status": "not_found"})
+        else:
+            results.append({"username": username, "user_id": user_id, "status": "created"})
+
+    return InternalTargets([user_id for user_id in candidates if user_id in existing], results)
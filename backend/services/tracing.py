@@ -0,0 +1,292 @@
+# Tracing por spans: etapas anidadas de un request (auth, DB, FCM) con trace-id propagado desde los headers
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger("PushNotificationsAPI")
+
+# W3C Trace Context: version-traceid-parentid-flags
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# OTLP: SpanKind y StatusCode
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_ERROR = 2
+
+
+def _new_id(hex_chars: int) -> str:
+    return f"{random.getrandbits(hex_chars * 4):0{hex_chars}x}"
+
+
+@dataclass
+class Span:
+    name: str
+    trace: "Trace"
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    kind: int = SPAN_KIND_INTERNAL
+    attributes: Dict[str, object] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, end_ns: Optional[int] = None):
+        self.end_ns = end_ns or time.time_ns()
+        self.trace.finished(self)
+
+
+class Trace:
+    """
+    Spans de un request. Se exportan juntos cuando termina el span raíz; los
+    que terminan después (fan-outs que siguen en segundo plano) se exportan
+    de a uno con el mismo trace_id.
+    """
+
+    def __init__(self, exporter: "SpanExporter", trace_id: Optional[str] = None):
+        self.exporter = exporter
+        self.trace_id = trace_id or _new_id(32)
+        self.root: Optional[Span] = None
+        self._spans: List[Span] = []
+        self._exported = False
+        self._lock = threading.Lock()
+
+    def finished(self, span: Span):
+        with self._lock:
+            if self._exported:
+                batch = [span]
+            else:
+                self._spans.append(span)
+                if span is not self.root:
+                    return
+                batch, self._spans, self._exported = self._spans, [], True
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logger.error(f"❌ Span export failed: {e}")
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_span_id) del header ``traceparent``, o (None, None)"""
+    match = TRACEPARENT.match(header.strip().lower()) if header else None
+    if match is None or set(match.group(1)) == {"0"}:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+@contextmanager
+def start_trace(name: str, exporter: "SpanExporter", traceparent: Optional[str] = None, **attributes):
+    """Span raíz (SERVER) del request; continúa el trace del llamador si trae ``traceparent``"""
+    trace_id, parent_id = parse_traceparent(traceparent)
+    trace = Trace(exporter, trace_id)
+    root = Span(name, trace, _new_id(16), parent_id, time.time_ns(), kind=SPAN_KIND_SERVER, attributes=attributes)
+    trace.root = root
+    token = _current.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = root.error or f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        root.end()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Span hijo del actual; dentro del bloque pasa a ser el actual (los spans
+    de funciones llamadas, threads de ``asyncio.to_thread`` y tareas creadas
+    quedan anidados). Fuera de un trace no hace nada.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace, _new_id(16), parent.span_id, time.time_ns(), attributes=attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+def record_span(name: str, start_ns: int, error: Optional[str] = None, **attributes):
+    """
+    Span hoja que empezó en ``start_ns`` y termina ahora, sin tocar el span
+    actual: sirve desde generadores que avanzan en contextos distintos.
+    """
+    parent = _current.get()
+    if parent is None:
+        return
+    leaf = Span(name, parent.trace, _new_id(16), parent.span_id, start_ns, attributes=attributes, error=error)
+    leaf.end()
+
+
+def tracing_active() -> bool:
+    return _current.get() is not None
+
+
+# ------------------------------------------
+# Exporters
+# ------------------------------------------
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_request(spans: Sequence[Span], service_name: str) -> dict:
+    """ExportTraceServiceRequest de OTLP/JSON (el formato del file exporter del OpenTelemetry Collector)"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": service_name},
+                "spans": [
+                    {
+                        "traceId": s.trace_id,
+                        "spanId": s.span_id,
+                        **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                        "name": s.name,
+                        "kind": s.kind,
+                        "startTimeUnixNano": str(s.start_ns),
+                        "endTimeUnixNano": str(s.end_ns),
+                        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                        "status": {"code": STATUS_ERROR, "message": s.error} if s.error else {},
+                    }
+                    for s in spans
+                ],
+            }],
+        }]
+    }
+
+
+class SpanExporter(ABC):
+    @abstractmethod
+    def export(self, spans: Sequence[Span]):
+        pass
+
+    def close(self):
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Guarda los spans en memoria (tests)"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[Span]):
+        with self._lock:
+            self.spans.extend(spans)
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Una línea OTLP/JSON por lote en ``path``: se puede importar en Jaeger,
+    Tempo o un Collector (receiver otlpjsonfile) sin red en el entorno que traza.
+
+    ``export`` se llama al terminar el span raíz, dentro del middleware: solo
+    encola el lote. Un thread serializa y escribe lo acumulado con un flush
+    por tanda, así el event loop no hace I/O de disco por request.
+    """
+
+    def __init__(self, path: str, service_name: str):
+        self.path = path
+        self.service_name = service_name
+        self._queue: "queue.SimpleQueue[Optional[Sequence[Span]]]" = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, spans: Sequence[Span]):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-writer", daemon=True)
+                self._thread.start()
+        self._queue.put(spans)
+
+    def _run(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            output = open(self.path, "a", encoding="utf-8")
+        except OSError as e:
+            # Sin archivo los lotes se descartan igual, para no acumularlos en memoria
+            logger.error(f"❌ Span export failed: {e}")
+            output = None
+        try:
+            while True:
+                batches = [self._queue.get()]
+                # Lo que se encoló mientras se escribía la tanda anterior va en la misma
+                while True:
+                    try:
+                        batches.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if output is not None:
+                    self._write(output, filter(None, batches))
+                if None in batches:
+                    return
+        finally:
+            if output is not None:
+                output.close()
+
+    def _write(self, output, batches):
+        for spans in batches:
+            try:
+                output.write(json.dumps(otlp_request(spans, self.service_name), separators=(",", ":")) + "\n")
+            except Exception as e:
+                logger.error(f"❌ Span export failed: {e}")
+        output.flush()
+
+    def close(self):
+        """Escribe los lotes pendientes y detiene el thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+
+def create_span_exporter(settings) -> Optional[SpanExporter]:
+    """Exporter configurado en TRACE_EXPORTER; None deshabilita el tracing"""
+    if settings.trace_exporter in ("", "none"):
+        return None
+    if settings.trace_exporter == "file":
+        return FileSpanExporter(settings.trace_file, settings.trace_service_name)
+    if settings.trace_exporter == "memory":
+        return InMemorySpanExporter()
+    raise ValueError(f"Unknown TRACE_EXPORTER: {settings.trace_exporter}")
@@ -0,0 +1,646 @@
+# Repositorio Oracle (python-oracledb, pool de conexiones)
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import oracledb
+
+from services.tracing import record_span
+from storage.repository import (
+    HISTORY_EPOCH, DeviceInfo, DigestSettings, HistoryFilter, NotificationRow, Purged, PushLogEntry, PushReceipt,
+    RefreshTokenRow, Repository, StorageError, TableNames, StatRow, chunked, count_stat_rows, history_query,
+    receipt_rows,
+)
+from storage.statements import FEW, MANY, NONE, ONE, StatementRegistry
+
+db_logger = logging.getLogger("Database")
+
+# init_oracle_client solo puede llamarse una vez por proceso
+_oracle_client_lock = threading.Lock()
+_oracle_client_initialized = False
+
+
+def init_oracle_client(lib_dir: str):
+    global _oracle_client_initialized
+
+    with _oracle_client_lock:
+        if _oracle_client_initialized:
+            return
+        _oracle_client_initialized = True
+        try:
+            if lib_dir and os.path.exists(lib_dir):
+                oracledb.init_oracle_client(lib_dir=os.path.abspath(lib_dir))
+                db_logger.info(f"✅ Oracle Client initialized from: {os.path.abspath(lib_dir)}")
+            else:
+                db_logger.warning("⚠️ Oracle Client path not found, using Thin mode")
+        except Exception as e:
+            db_logger.warning(f"⚠️ Oracle Client init failed, using Thin mode: {e}")
+
+
+# Sentencias por nombre: (cardinalidad, SQL con placeholders de tabla)
+STATEMENTS = {
+    "user_exists": (ONE, "SELECT id FROM {users} WHERE username = :1 OR email = :2"),
+    "create_user": (NONE, "INSERT INTO {users} (username, email, password_hash) VALUES (:1, :2, :3)"),
+    "login_user": (ONE, "SELECT id, username, password_hash FROM {users} WHERE username = :1"),
+    "user_id_by_username": (ONE, "SELECT id FROM {users} WHERE username = :1"),
+    "all_user_ids": (MANY, "SELECT id FROM {users}"),
+    # Listas de destinatarios: un solo bind de colección, el texto no cambia con el tamaño
+    "user_ids_by_usernames": (MANY, """
+        SELECT username, id FROM {users}
+        WHERE username IN (SELECT column_value FROM TABLE(:1))
+    """),
+    "existing_user_ids": (MANY, "SELECT id FROM {users} WHERE id IN (SELECT column_value FROM TABLE(:1))"),
+    "insert_refresh_token": (NONE, """
+        INSERT INTO {refresh_tokens} (user_id, token_hash, family_id, expires_at) VALUES (:1, :2, :3, :4)
+    """),
+    "refresh_token": (ONE, """
+        SELECT t.user_id, u.username, t.family_id,
+               CASE WHEN t.revoked_at IS NULL THEN 0 ELSE 1 END,
+               CASE WHEN t.expires_at > :1 THEN 0 ELSE 1 END
+        FROM {refresh_tokens} t JOIN {users} u ON u.id = t.user_id
+        WHERE t.token_hash = :2
+    """),
+    "revoke_refresh_token": (NONE, """
+        UPDATE {refresh_tokens} SET revoked_at = :1
+        WHERE token_hash = :2 AND revoked_at IS NULL AND expires_at > :3
+    """),
+    # El token nuevo hereda usuario y familia del que reemplaza
+    "rotate_refresh_token": (NONE, """
+        INSERT INTO {refresh_tokens} (user_id, token_hash, family_id, expires_at)
+        SELECT user_id, :1, family_id, :2 FROM {refresh_tokens} WHERE token_hash = :3
+    """),
+    "revoke_refresh_family": (NONE, """
+        UPDATE {refresh_tokens} SET revoked_at = :1 WHERE family_id = :2 AND revoked_at IS NULL
+    """),
+    "purge_refresh_tokens": (NONE, "DELETE FROM {refresh_tokens} WHERE expires_at < :1"),
+    # Un solo round trip: registra o actualiza token, metadatos y last_used_at
+    "upsert_device": (NONE, """
+        MERGE INTO {devices} d
+        USING (
+            SELECT :1 AS user_id, :2 AS device_id, :3 AS fcm_token,
+                   :4 AS device_name, :5 AS os_version, :6 AS app_version
+            FROM dual
+        ) s
+        ON (d.user_id = s.user_id AND d.device_id = s.device_id)
+        WHEN MATCHED THEN UPDATE SET
+            d.fcm_token = s.fcm_token,
+            d.device_name = NVL(s.device_name, d.device_name),
+            d.os_version = NVL(s.os_version, d.os_version),
+            d.app_version = NVL(s.app_version, d.app_version),
+            d.is_active = 1,
+            d.last_used_at = CURRENT_TIMESTAMP
+        WHEN NOT MATCHED THEN INSERT
+            (user_id, device_id, fcm_token, device_name, os_version, app_version, last_used_at)
+            VALUES (s.user_id, s.device_id, s.fcm_token, s.device_name, s.os_version, s.app_version,
+                    CURRENT_TIMESTAMP)
+    """),
+    "all_tokens": (MANY, "SELECT fcm_token FROM {devices}"),
+    # Partición de un broadcast; el NOT EXISTS usa idx_devices_fcm_token
+    "broadcast_tokens": (MANY, """
+        SELECT d.user_id, d.fcm_token FROM {devices} d
+        WHERE MOD(d.id, :1) = :2
+          AND NOT EXISTS (SELECT 1 FROM {devices} o WHERE o.fcm_token = d.fcm_token AND o.id < d.id)
+    """),
+    "tokens_by_user_ids": (MANY, """
+        SELECT user_id, fcm_token FROM {devices}
+        WHERE user_id IN (SELECT column_value FROM TABLE(:1))
+    """),
+    "insert_internal_notification": (NONE, """
+        INSERT INTO {internal_notifications} (user_id, title, message)
+        VALUES (:1, :2, :3)
+    """),
+    # message es CLOB: lo convierte lob_output_type_handler, sin TO_CHAR().
+    # El límite en created_at (columna de partición) poda las particiones anteriores
+    "inbox": (FEW, """
+        SELECT id, title, message, is_read, created_at
+        FROM {internal_notifications}
+        WHERE user_id = :1 AND created_at >= :2
+        ORDER BY created_at DESC
+    """),
+    # Solo cuenta si pasa de no leída a leída (el contador de no leídas depende de eso)
+    "mark_notification_read": (NONE, """
+        UPDATE {internal_notifications}
+        SET is_read = 1
+        WHERE id = :1 AND user_id = :2 AND is_read = 0
+    """),
+    "notification_is_read": (ONE, """
+        SELECT is_read FROM {internal_notifications} WHERE id = :1 AND user_id = :2
+    """),
+    "insert_push_log": (NONE, """
+        INSERT INTO {push_log} (user_id, title, body, fcm_message_id, status, response_data, error_message)
+        VALUES (:1, :2, :3, :4, :5, :6, :7)
+    """),
+    # Recibos de la app: solo el destinatario (o cualquiera si fue broadcast, sin user_id) puede
+    # confirmar; un envío fallido no pasa a delivered
+    "mark_push_delivered": (NONE, """
+        UPDATE {push_log}
+        SET status = 'delivered', delivered_at = NVL(delivered_at, :1)
+        WHERE fcm_message_id = :2 AND (user_id = :3 OR user_id IS NULL) AND status <> 'failed' AND sent_at >= :4
+    """),
+    "mark_push_opened": (NONE, """
+        UPDATE {push_log}
+        SET status = 'delivered', delivered_at = NVL(delivered_at, :1), opened_at = NVL(opened_at, :2)
+        WHERE fcm_message_id = :3 AND (user_id = :4 OR user_id IS NULL) AND status <> 'failed' AND sent_at >= :5
+    """),
+    # Retención sobre tablas sin particionar (esquemas anteriores a create_tables.sql actual)
+    "purge_notifications": (NONE, "DELETE FROM {internal_notifications} WHERE created_at < :1"),
+    "purge_pushes": (NONE, "DELETE FROM {push_log} WHERE sent_at < :1"),
+    "digest_settings_by_user_ids": (MANY, """
+        SELECT user_id, push_enabled, digest_window_seconds, quiet_hours_start, quiet_hours_end, timezone
+        FROM {notification_settings}
+        WHERE user_id IN (SELECT column_value FROM TABLE(:1))
+    """),
+    "upsert_digest_settings": (NONE, """
+        MERGE INTO {notification_settings} s
+        USING (
+            SELECT :1 AS user_id, :2 AS push_enabled, :3 AS digest_window_seconds,
+                   :4 AS quiet_hours_start, :5 AS quiet_hours_end, :6 AS timezone
+            FROM dual
+        ) n
+        ON (s.user_id = n.user_id)
+        WHEN MATCHED THEN UPDATE SET
+            s.push_enabled = n.push_enabled,
+            s.digest_window_seconds = n.digest_window_seconds,
+            s.quiet_hours_start = n.quiet_hours_start,
+            s.quiet_hours_end = n.quiet_hours_end,
+            s.timezone = n.timezone,
+            s.updated_at = CURRENT_TIMESTAMP
+        WHEN NOT MATCHED THEN INSERT
+            (user_id, push_enabled, digest_window_seconds, quiet_hours_start, quiet_hours_end, timezone)
+            VALUES (n.user_id, n.push_enabled, n.digest_window_seconds, n.quiet_hours_start, n.quiet_hours_end,
+                    n.timezone)
+    """),
+    "add_stats": (NONE, """
+        MERGE INTO {stats_rollup} s
+        USING (SELECT :1 AS bucket, :2 AS metric, :3 AS delta FROM dual) d
+        ON (s.bucket = d.bucket AND s.metric = d.metric)
+        WHEN MATCHED THEN UPDATE SET s.value = s.value + d.delta, s.updated_at = CURRENT_TIMESTAMP
+        WHEN NOT MATCHED THEN INSERT (bucket, metric, value) VALUES (d.bucket, d.metric, d.delta)
+    """),
+    "set_stats": (NONE, """
+        MERGE INTO {stats_rollup} s
+        USING (SELECT :1 AS bucket, :2 AS metric, :3 AS value FROM dual) d
+        ON (s.bucket = d.bucket AND s.metric = d.metric)
+        WHEN MATCHED THEN UPDATE SET s.value = d.value, s.updated_at = CURRENT_TIMESTAMP
+        WHEN NOT MATCHED THEN INSERT (bucket, metric, value) VALUES (d.bucket, d.metric, d.value)
+    """),
+    "stats_by_buckets": (FEW, """
+        SELECT bucket, metric, value FROM {stats_rollup}
+        WHERE bucket IN (SELECT column_value FROM TABLE(:1))
+    """),
+    # Solo para la reconciliación periódica: recorren las tablas base
+    "count_users": (ONE, "SELECT COUNT(*) FROM {users}"),
+    "count_active_devices": (ONE, "SELECT COUNT(*) FROM {devices} WHERE is_active = 1"),
+    "count_unread": (ONE, "SELECT COUNT(*) FROM {internal_notifications} WHERE is_read = 0"),
+    "notifications_by_day": (FEW, """
+        SELECT TO_CHAR(created_at, 'YYYY-MM-DD'), COUNT(*)
+        FROM {internal_notifications}
+        WHERE created_at >= TO_TIMESTAMP(:1, 'YYYY-MM-DD')
+        GROUP BY TO_CHAR(created_at, 'YYYY-MM-DD')
+    """),
+    "pushes_by_day": (FEW, """
+        SELECT TO_CHAR(sent_at, 'YYYY-MM-DD'),
+               SUM(CASE WHEN status = 'failed' THEN 0 ELSE 1 END),
+               SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END)
+        FROM {push_log}
+        WHERE sent_at >= TO_TIMESTAMP(:1, 'YYYY-MM-DD')
+        GROUP BY TO_CHAR(sent_at, 'YYYY-MM-DD')
+    """),
+    # Export de historial: rango [since, until) siempre bindeado, estado opcional con (:x IS NULL OR ...)
+    "export_notifications": (MANY, """
+        SELECT id, user_id, title, message, notification_type, is_read, read_at, created_at
+        FROM {internal_notifications}
+        WHERE created_at >= :1 AND created_at < :2 AND (:3 IS NULL OR is_read = :4)
+        ORDER BY id
+    """),
+    "export_notifications_by_user": (MANY, """
+        SELECT id, user_id, title, message, notification_type, is_read, read_at, created_at
+        FROM {internal_notifications}
+        WHERE user_id = :1 AND created_at >= :2 AND created_at < :3 AND (:4 IS NULL OR is_read = :5)
+        ORDER BY id
+    """),
+    "export_pushes": (MANY, """
+        SELECT id, user_id, title, body, fcm_message_id, status, sent_at, delivered_at, opened_at, error_message
+        FROM {push_log}
+        WHERE sent_at >= :1 AND sent_at < :2 AND (:3 IS NULL OR status = :4)
+        ORDER BY id
+    """),
+    "export_pushes_by_user": (MANY, """
+        SELECT id, user_id, title, body, fcm_message_id, status, sent_at, delivered_at, opened_at, error_message
+        FROM {push_log}
+        WHERE user_id = :1 AND sent_at >= :2 AND sent_at < :3 AND (:4 IS NULL OR status = :5)
+        ORDER BY id
+    """),
+    "ping": (ONE, "SELECT 1 FROM dual"),
+}
+
+# Tabla de cada tipo de historial (particionadas por HISTORY_DATE_COLUMNS)
+HISTORY_TABLES = {"notifications": "internal_notifications", "pushes": "push_notification_log"}
+# Particiones de intervalo en orden; la 1 es la de rango que ancla los intervalos y
+# Oracle no permite borrarla (ORA-14758). high_value es LONG: llega como texto.
+# Consulta al diccionario, fuera del StatementRegistry como el DDL que la sigue
+HISTORY_PARTITIONS = """
+    SELECT partition_position, partition_name, high_value
+    FROM all_tab_partitions
+    WHERE table_owner = NVL(:1, USER) AND table_name = :2
+    ORDER BY partition_position
+"""
+# high_value de una partición por fecha: TIMESTAMP' 2024-02-01 00:00:00'
+PARTITION_BOUND = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})")
+
+
+def partition_bound(high_value: Optional[str]) -> Optional[datetime]:
+    """Límite superior (exclusivo) de la partición, o None si no es una fecha"""
+    match = PARTITION_BOUND.search(high_value or "")
+    return datetime.fromisoformat(match.group(1)) if match else None
+
+
+# Columnas CLOB de cada insert (posición del bind)
+INTERNAL_NOTIFICATION_LOB_COLUMNS = (2,)   # message
+PUSH_LOG_LOB_COLUMNS = (2, 5)              # body, response_data
+
+
+def lob_output_type_handler(cursor, metadata):
+    """
+    Devuelve CLOB/BLOB como str/bytes dentro del mismo fetch, sin un LOB locator
+    por fila (cada ``LOB.read()`` es un round trip extra). A diferencia de
+    TO_CHAR(), no trunca ni falla con valores de más de 4000 bytes.
+    """
+    if metadata.type_code is oracledb.DB_TYPE_CLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG, arraysize=cursor.arraysize)
+    if metadata.type_code is oracledb.DB_TYPE_NCLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_NVARCHAR, arraysize=cursor.arraysize)
+    if metadata.type_code is oracledb.DB_TYPE_BLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize)
+    return None
+
+
+def exceeds_varchar(value: Optional[str], max_bytes: int) -> bool:
+    if value is None:
+        return False
+    # Hasta 4 bytes por carácter en AL32UTF8: evita codificar los textos cortos
+    if len(value) * 4 <= max_bytes:
+        return False
+    return len(value.encode("utf-8")) > max_bytes
+
+
+def text_input_sizes(rows: Sequence[tuple], lob_columns: Sequence[int], max_varchar_bytes: int):
+    """
+    Tipos de bind para columnas CLOB: los textos cortos se envían como VARCHAR2
+    (bind normal, sin LOB temporal) y solo si algún valor del batch supera
+    ``max_varchar_bytes`` la columna se bindea como CLOB. None = todo VARCHAR2.
+    """
+    if not rows:
+        return None
+    sizes = [None] * len(rows[0])
+    for column in lob_columns:
+        if any(exceeds_varchar(row[column], max_varchar_bytes) for row in rows):
+            sizes[column] = oracledb.DB_TYPE_CLOB
+    return sizes if any(sizes) else None
+
+
+class OracleRepository(Repository):
+    name = "oracle"
+
+    def __init__(self, settings, tables: TableNames, dsn: Optional[str] = None,
+                 pool_min: Optional[int] = None, pool_max: Optional[int] = None):
+        self.settings = settings
+        self.tables = tables
+        # La réplica de lectura usa su propio DSN y tamaño de pool
+        self.dsn = dsn or settings.oracle_dsn
+        self.pool_min = settings.db_pool_min if pool_min is None else pool_min
+        self.pool_max = settings.db_pool_max if pool_max is None else pool_max
+        self.statements = StatementRegistry(STATEMENTS, tables, batch_size=settings.db_fetch_batch_size)
+        self.pool = None
+        self._pool_lock = threading.Lock()
+
+    # ------------------------------------------
+    # Pool y conexiones
+    # ------------------------------------------
+
+    def get_pool(self):
+        if self.pool is not None:
+            return self.pool
+
+        with self._pool_lock:
+            if self.pool is None:
+                settings = self.settings
+                init_oracle_client(settings.oracle_jar_path)
+                db_logger.info(f"🔗 Creating Oracle pool (min={self.pool_min}, max={self.pool_max})...")
+                self.pool = oracledb.create_pool(
+                    user=settings.oracle_user,
+                    password=settings.oracle_password,
+                    dsn=self.dsn,
+                    min=self.pool_min,
+                    max=self.pool_max,
+                    increment=1,
+                    # Todas las sentencias registradas caben en el cache de cada conexión
+                    stmtcachesize=max(settings.db_stmt_cache_size, len(self.statements))
+                )
+        return self.pool
+
+    @contextmanager
+    def connection(self):
+        connection = None
+        breaker = self.breaker
+        if breaker is not None:
+            # Oracle caído: falla al instante en vez de esperar el timeout de conexión
+            breaker.before_call()
+        start_ns = time.time_ns()
+        try:
+            db_logger.info("🔗 Acquiring Oracle connection from pool...")
+            connection = self.get_pool().acquire()
+            connection.outputtypehandler = lob_output_type_handler
+            db_logger.info("✅ Oracle connection established")
+        except oracledb.Error as e:
+            db_logger.error(f"❌ Oracle connection error: {e}")
+            record_span("db.acquire", start_ns, error=str(e))
+            if breaker is not None:
+                breaker.record_failure()
+            raise StorageError("Database connection failed") from e
+        record_span("db.acquire", start_ns)
+        if breaker is not None:
+            breaker.record_success()
+
+        try:
+            yield connection
+        finally:
+            connection.close()
+            db_logger.info("🔗 Oracle connection released")
+
+    def warmup(self):
+        try:
+            with self.connection() as connection:
+                connection.ping()
+            db_logger.info("✅ Oracle pool warmed up")
+        except Exception as e:
+            # Oracle caído no impide arrancar; /health lo reporta
+            db_logger.error(f"❌ Oracle warm-up failed: {e}")
+
+    def close(self):
+        if self.pool is None:
+            return
+        try:
+            self.pool.close()
+        except oracledb.Error as e:
+            db_logger.warning(f"⚠️ Oracle pool busy on close, forcing: {e}")
+            self.pool.close(force=True)
+        self.pool = None
+        db_logger.info("🔗 Oracle pool closed")
+
+    def ping(self) -> int:
+        with self.connection() as connection:
+            result = self.statements.fetch_one(connection, "ping")
+            return result[0] if result else None
+
+    def _fetch_by_list(self, name: str, values: Sequence, collection_type: str) -> list:
+        """Ejecuta ``name`` por lotes de DB_ARRAY_CHUNK_SIZE bindeando cada lote como colección SQL"""
+        rows = []
+        with self.connection() as connection:
+            list_type = connection.gettype(collection_type)
+            for chunk in chunked(list(values), self.settings.db_array_chunk_size):
+                rows.extend(self.statements.fetch_all(connection, name, (list_type.newobject(chunk),)))
+        return rows
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "dsn": self.dsn, "user": self.settings.oracle_user}
+
+    def statement_timings(self) -> dict:
+        return self.statements.timings.snapshot()
+
+    # ------------------------------------------
+    # Usuarios
+    # ------------------------------------------
+
+    def user_exists(self, username: str, email: str) -> bool:
+        with self.connection() as connection:
+            return self.statements.fetch_one(connection, "user_exists", (username, email)) is not None
+
+    def create_user(self, username: str, email: str, password_hash: str):
+        with self.connection() as connection:
+            self.statements.execute(connection, "create_user", (username, email, password_hash))
+            self.statements.commit(connection)
+
+    def get_login_user(self, username: str) -> Optional[Tuple[int, str, str]]:
+        with self.connection() as connection:
+            return self.statements.fetch_one(connection, "login_user", (username,))
+
+    def get_user_id(self, username: str) -> Optional[int]:
+        with self.connection() as connection:
+            row = self.statements.fetch_one(connection, "user_id_by_username", (username,))
+            return row[0] if row else None
+
+    def list_user_ids(self) -> List[int]:
+        with self.connection() as connection:
+            return self.statements.fetch_column(connection, "all_user_ids")
+
+    def get_user_ids_by_usernames(self, usernames: Sequence[str]) -> Dict[str, int]:
+        return dict(self._fetch_by_list("user_ids_by_usernames", usernames, "SYS.ODCIVARCHAR2LIST"))
+
+    def filter_existing_user_ids(self, user_ids: Sequence[int]) -> List[int]:
+        return [row[0] for row in self._fetch_by_list("existing_user_ids", user_ids, "SYS.ODCINUMBERLIST")]
+
+    # ------------------------------------------
+    # Refresh tokens
+    # ------------------------------------------
+
+    def create_refresh_token(self, user_id: int, token_hash: str, family_id: str, expires_at: datetime):
+        with self.connection() as connection:
+            self.statements.execute(connection, "insert_refresh_token",
+                                    (user_id, token_hash, family_id, expires_at))
+            self.statements.commit(connection)
+
+    def get_refresh_token(self, token_hash: str, now: datetime) -> Optional[RefreshTokenRow]:
+        with self.connection() as connection:
+            return self.statements.fetch_one(connection, "refresh_token", (now, token_hash))
+
+    def rotate_refresh_token(self, token_hash: str, new_hash: str, expires_at: datetime, now: datetime) -> bool:
+        with self.connection() as connection:
+            # El UPDATE condicional decide entre rotaciones concurrentes del mismo token
+            if self.statements.execute(connection, "revoke_refresh_token", (now, token_hash, now)) == 0:
+                connection.rollback()
+                return False
+            self.statements.execute(connection, "rotate_refresh_token", (new_hash, expires_at, token_hash))
+            self.statements.commit(connection)
+        return True
+
+    def revoke_refresh_tokens(self, family_id: str, now: datetime) -> int:
+        with self.connection() as connection:
+            count = self.statements.execute(connection, "revoke_refresh_family", (now, family_id))
+            self.statements.commit(connection)
+        return count
+
+    def purge_refresh_tokens(self, before: datetime) -> int:
+        with self.connection() as connection:
+            count = self.statements.execute(connection, "purge_refresh_tokens", (before,))
+            self.statements.commit(connection)
+        return count
+
+    # ------------------------------------------
+    # Devices
+    # ------------------------------------------
+
+    def upsert_devices(self, devices: Sequence[DeviceInfo]) -> int:
+        if not devices:
+            return 0
+        rows = [device.as_row() for device in devices]
+        # Los metadatos pueden venir todos en None: se fijan como VARCHAR2 para el executemany
+        input_sizes = [None, None, None, 100, 50, 20]
+        with self.connection() as connection:
+            self.statements.execute_many(connection, "upsert_device", rows, input_sizes=input_sizes)
+            self.statements.commit(connection)
+        return len(rows)
+
+    def get_all_tokens(self) -> List[str]:
+        with self.connection() as connection:
+            return self.statements.fetch_column(connection, "all_tokens")
+
+    def get_tokens_by_user_ids(self, user_ids: Sequence[int]) -> List[Tuple[int, str]]:
+        return self._fetch_by_list("tokens_by_user_ids", user_ids, "SYS.ODCINUMBERLIST")
+
+    def iter_broadcast_tokens(self, partition: int, partitions: int, batch_size: int) -> Iterator[list]:
+        with self.connection() as connection:
+            yield from self.statements.iterate(connection, "broadcast_tokens", (partitions, partition), batch_size)
+
+    # ------------------------------------------
+    # Notificaciones internas
+    # ------------------------------------------
+
+    def create_internal_notifications(self, user_ids: Sequence[int], title: str, message: str) -> int:
+        rows = [(user_id, title, message) for user_id in user_ids]
+        input_sizes = text_input_sizes(rows, INTERNAL_NOTIFICATION_LOB_COLUMNS, self.settings.db_max_varchar_bytes)
+        with self.connection() as connection:
+            count = self.statements.execute_many(
+                connection, "insert_internal_notification", rows, input_sizes=input_sizes
+            )
+            self.statements.commit(connection)
+            return count
+
+    def list_internal_notifications(self, user_id: int, since: datetime = HISTORY_EPOCH) -> List[NotificationRow]:
+        with self.connection() as connection:
+            return self.statements.fetch_all(connection, "inbox", (user_id, since))
+
+    def mark_notification_read(self, notification_id: int, user_id: int) -> Optional[bool]:
+        with self.connection() as connection:
+            if self.statements.execute(connection, "mark_notification_read", (notification_id, user_id)) == 0:
+                # Ya leída o inexistente: solo en este caso hace falta la segunda consulta
+                row = self.statements.fetch_one(connection, "notification_is_read", (notification_id, user_id))
+                return None if row is None else False
+
+            self.statements.commit(connection)
+            return True
+
+    # ------------------------------------------
+    # Preferencias de digest
+    # ------------------------------------------
+
+    def get_digest_settings(self, user_ids: Sequence[int]) -> Dict[int, DigestSettings]:
+        rows = self._fetch_by_list("digest_settings_by_user_ids", user_ids, "SYS.ODCINUMBERLIST")
+        return {row[0]: DigestSettings.from_row(row) for row in rows}
+
+    def save_digest_settings(self, settings: DigestSettings):
+        with self.connection() as connection:
+            self.statements.execute(connection, "upsert_digest_settings", settings.as_row())
+            self.statements.commit(connection)
+
+    # ------------------------------------------
+    # Log de push notifications
+    # ------------------------------------------
+
+    def record_push_log(self, entries: Sequence[PushLogEntry]) -> int:
+        if not entries:
+            return 0
+        rows = [entry.as_row() for entry in entries]
+        input_sizes = text_input_sizes(rows, PUSH_LOG_LOB_COLUMNS, self.settings.db_max_varchar_bytes)
+        with self.connection() as connection:
+            count = self.statements.execute_many(connection, "insert_push_log", rows, input_sizes=input_sizes)
+            self.statements.commit(connection)
+            return count
+
+    def apply_push_receipts(self, receipts: Sequence[PushReceipt]) -> int:
+        delivered, opened = receipt_rows(receipts)
+        count = 0
+        # Array DML: un round-trip por tipo de recibo en vez de uno por recibo
+        with self.connection() as connection:
+            if delivered:
+                count += self.statements.execute_many(connection, "mark_push_delivered", delivered)
+            if opened:
+                count += self.statements.execute_many(connection, "mark_push_opened", opened)
+            self.statements.commit(connection)
+        return count
+
+    # ------------------------------------------
+    # Estadísticas (rollups)
+    # ------------------------------------------
+
+    def _merge_stats(self, name: str, rows: Sequence[StatRow]) -> int:
+        if not rows:
+            return 0
+        with self.connection() as connection:
+            count = self.statements.execute_many(connection, name, rows)
+            self.statements.commit(connection)
+            return count
+
+    def add_stats(self, deltas: Sequence[StatRow]) -> int:
+        return self._merge_stats("add_stats", deltas)
+
+    def set_stats(self, values: Sequence[StatRow]) -> int:
+        return self._merge_stats("set_stats", values)
+
+    def get_stats(self, buckets: Sequence[str]) -> List[StatRow]:
+        return self._fetch_by_list("stats_by_buckets", buckets, "SYS.ODCIVARCHAR2LIST")
+
+    def count_stats(self, since_day: str, include_pushes: bool) -> List[StatRow]:
+        with self.connection() as connection:
+            return count_stat_rows(self.statements, connection, since_day, include_pushes)
+
+    # ------------------------------------------
+    # Retención
+    # ------------------------------------------
+
+    def purge_history(self, kind: str, before: datetime) -> Purged:
+        table = HISTORY_TABLES[kind]
+        owner = self.tables.schema.upper() or None
+        dropped = 0
+        with self.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(HISTORY_PARTITIONS, (owner, f"{self.tables.prefix}{table}".upper()))
+                partitions = cursor.fetchall()
+            if not partitions:
+                count = self.statements.execute(connection, f"purge_{kind}", (before,))
+                self.statements.commit(connection)
+                return Purged(rows=count)
+            for position, partition_name, high_value in partitions:
+                if position == 1:
+                    continue
+                bound = partition_bound(high_value)
+                # Solo particiones enteramente anteriores a ``before``; vienen en orden de fecha
+                if bound is None or bound > before:
+                    break
+                start_ns = time.time_ns()
+                # DDL sin binds: el nombre sale del diccionario. UPDATE GLOBAL INDEXES mantiene
+                # usable la PK global (en 12c+ la limpieza del índice es diferida)
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'ALTER TABLE {self.tables.qualify(table)} DROP PARTITION "{partition_name}" '
+                        f'UPDATE GLOBAL INDEXES'
+                    )
+                record_span("db.drop_partition", start_ns, table=table, partition=partition_name)
+                db_logger.info(f"🧹 Dropped partition {partition_name} of {table} (< {bound:%Y-%m-%d})")
+                dropped += 1
+        return Purged(partitions=dropped)
+
+    # ------------------------------------------
+    # Export de historial
+    # ------------------------------------------
+
+    def iter_history(self, kind: str, filters: HistoryFilter, batch_size: int) -> Iterator[list]:
+        name, params = history_query(kind, filters)
+        # La conexión vuelve al pool cuando el generador termina o se cierra (cliente desconectado)
+        with self.connection() as connection:
+            yield from self.statements.iterate(connection, name, params, batch_size)
@@ -0,0 +1,512 @@
+# Capa de acceso a datos: interfaz común para Oracle y SQLite
+import json
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+class StorageError(Exception):
+    """Error del backend de almacenamiento (conexión o consulta)"""
+
+
+@dataclass(frozen=True)
+class TableNames:
+    """
+    Nombres completos de las tablas según el esquema y prefijo configurados.
+    Con ``schema="test"`` y ``prefix="np_"`` se obtiene ``test.np_users``.
+    """
+    schema: str = "test"
+    prefix: str = "np_"
+
+    def qualify(self, table: str) -> str:
+        name = f"{self.prefix}{table}"
+        return f"{self.schema}.{name}" if self.schema else name
+
+    @property
+    def users(self) -> str:
+        return self.qualify("users")
+
+    @property
+    def devices(self) -> str:
+        return self.qualify("devices")
+
+    @property
+    def internal_notifications(self) -> str:
+        return self.qualify("internal_notifications")
+
+    @property
+    def push_log(self) -> str:
+        return self.qualify("push_notification_log")
+
+    @property
+    def notification_settings(self) -> str:
+        return self.qualify("notification_settings")
+
+    @property
+    def stats_rollup(self) -> str:
+        return self.qualify("stats_rollup")
+
+    @property
+    def refresh_tokens(self) -> str:
+        return self.qualify("refresh_tokens")
+
+
+def chunked(values: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def truncate_utf8(value: Optional[str], max_bytes: int) -> Optional[str]:
+    """Recorta ``value`` a ``max_bytes`` bytes UTF-8 (VARCHAR2 en bytes) sin partir un carácter"""
+    # Hasta 4 bytes por carácter en AL32UTF8: evita codificar los textos cortos
+    if value is None or len(value) * 4 <= max_bytes:
+        return value
+    encoded = value.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return value
+    return encoded[:max_bytes].decode("utf-8", "ignore")
+
+
+# Fila de inbox: (id, title, message, is_read, created_at)
+NotificationRow = Tuple[int, str, str, int, object]
+
+# Refresh token guardado: (user_id, username, family_id, revoked, expired); revoked/expired son 0/1
+RefreshTokenRow = Tuple[int, str, str, int, int]
+
+# Contador de stats_rollup: (bucket, metric, value); bucket es "YYYY-MM-DD" o "total"
+StatRow = Tuple[str, str, int]
+STATS_TOTAL = "total"
+
+
+@dataclass
+class PushLogEntry:
+    """Fila de push_notification_log: un envío FCM a un token"""
+    title: str
+    body: str
+    status: str = "sent"  # sent, delivered, failed
+    user_id: Optional[int] = None
+    fcm_message_id: Optional[str] = None
+    response_data: Optional[str] = None
+    error_message: Optional[str] = None
+
+    def as_row(self) -> tuple:
+        # Mismo orden que la sentencia insert_push_log; recorta a los VARCHAR2 del DDL
+        return (
+            self.user_id,
+            truncate_utf8(self.title, 255),
+            self.body,
+            self.fcm_message_id,
+            self.status,
+            self.response_data,
+            truncate_utf8(self.error_message, 500) or None,
+        )
+
+
+def message_id_of(name: Optional[str]) -> Optional[str]:
+    """
+    ID de mensaje FCM tal como lo ve la app (``RemoteMessage.messageId``):
+    el Admin SDK devuelve ``projects/<p>/messages/<id>``, se guarda solo ``<id>``.
+    """
+    return name.rsplit("/", 1)[-1] if name else name
+
+
+def push_log_entries(title: str, body: str, outcomes, token_owners: Dict[str, Optional[int]]) -> List[PushLogEntry]:
+    """Una fila de push log por ``(token, respuesta, error)`` del fan-out"""
+    return [
+        PushLogEntry(
+            title=title,
+            body=body,
+            status="failed" if error else "sent",
+            user_id=token_owners.get(token),
+            fcm_message_id=message_id_of(response),
+            response_data=json.dumps({"token": token, "response": response, "error": error}),
+            error_message=error,
+        )
+        for token, response, error in outcomes
+    ]
+
+
+@dataclass
+class PushReceipt:
+    """Confirmación de la app: el push llegó (delivered) o el usuario lo abrió (opened)"""
+    user_id: int
+    message_id: str
+    event: str
+    at: datetime
+
+
+# FCM descarta un mensaje no entregado a las 4 semanas (TTL máximo): ningún recibo es de un envío
+# más viejo. El límite en sent_at acota los UPDATE de recibos a las particiones recientes del log
+RECEIPT_WINDOW = timedelta(days=28)
+
+
+def receipt_rows(receipts: Sequence[PushReceipt], stamp=lambda at: at,
+                 now: Optional[datetime] = None) -> Tuple[list, list]:
+    """Binds de mark_push_delivered y mark_push_opened; ``stamp`` adapta el timestamp al driver"""
+    sent_since = stamp((now or datetime.utcnow()) - RECEIPT_WINDOW)
+    delivered, opened = [], []
+    for receipt in receipts:
+        at = stamp(receipt.at)
+        if receipt.event == "opened":
+            opened.append((at, at, receipt.message_id, receipt.user_id, sent_since))
+        else:
+            delivered.append((at, receipt.message_id, receipt.user_id, sent_since))
+    return delivered, opened
+
+
+def count_stat_rows(statements, connection, since_day: str, include_pushes: bool) -> List[StatRow]:
+    """Valores de la reconciliación con las sentencias count_* y *_by_day de cada backend"""
+    rows = [
+        (STATS_TOTAL, "users", statements.fetch_one(connection, "count_users")[0]),
+        (STATS_TOTAL, "active_devices", statements.fetch_one(connection, "count_active_devices")[0]),
+        (STATS_TOTAL, "unread_notifications", statements.fetch_one(connection, "count_unread")[0]),
+    ]
+    for day, created in statements.fetch_all(connection, "notifications_by_day", (since_day,)):
+        rows.append((day, "internal_notifications", created))
+    if include_pushes:
+        for day, sent, failed in statements.fetch_all(connection, "pushes_by_day", (since_day,)):
+            rows.append((day, "pushes_sent", sent))
+            rows.append((day, "pushes_failed", failed))
+    return rows
+
+
+# Historial exportable: columnas de cada tipo y valores de ``status`` que acepta el filtro
+EXPORT_COLUMNS = {
+    "notifications": ("id", "user_id", "title", "message", "notification_type", "is_read", "read_at", "created_at"),
+    "pushes": ("id", "user_id", "title", "body", "fcm_message_id", "status", "sent_at", "delivered_at", "opened_at",
+               "error_message"),
+}
+HISTORY_STATUSES = {
+    "notifications": {"read": 1, "unread": 0},
+    "pushes": {"sent": "sent", "delivered": "delivered", "failed": "failed"},
+}
+# Rango abierto cuando el export no filtra por fecha
+HISTORY_EPOCH = datetime(1970, 1, 1)
+HISTORY_END = datetime(9999, 12, 31)
+# Columna de partición (intervalos por fecha en Oracle) de cada tabla de historial
+HISTORY_DATE_COLUMNS = {"notifications": "created_at", "pushes": "sent_at"}
+
+
+@dataclass
+class Purged:
+    """Resultado de una pasada de retención: particiones borradas (Oracle) o filas (DELETE)"""
+    partitions: int = 0
+    rows: int = 0
+
+
+def retention_cutoff(days: int, now: Optional[datetime] = None) -> datetime:
+    """Inicio de los últimos ``days`` días; 0 = sin límite (HISTORY_EPOCH)"""
+    if days <= 0:
+        return HISTORY_EPOCH
+    return (now or datetime.utcnow()) - timedelta(days=days)
+
+
+@dataclass(frozen=True)
+class HistoryFilter:
+    """Filtros del export de historial; None no filtra. ``until`` es exclusivo"""
+    user_id: Optional[int] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    status: Optional[str] = None
+
+
+def history_query(kind: str, filters: HistoryFilter, stamp=lambda at: at) -> Tuple[str, tuple]:
+    """
+    Sentencia y binds del export. El rango de fechas siempre se bindea y el
+    filtro de usuario usa su propia sentencia (índice por user_id), así cada
+    variante tiene un solo texto y un solo plan.
+    """
+    status = HISTORY_STATUSES[kind][filters.status] if filters.status else None
+    params = (stamp(filters.since or HISTORY_EPOCH), stamp(filters.until or HISTORY_END), status, status)
+    if filters.user_id is not None:
+        return f"export_{kind}_by_user", (filters.user_id,) + params
+    return f"export_{kind}", params
+
+
+@dataclass
+class DeviceInfo:
+    """Registro de un device; los metadatos en None conservan el valor guardado"""
+    user_id: int
+    device_id: str
+    fcm_token: str
+    device_name: Optional[str] = None
+    os_version: Optional[str] = None
+    app_version: Optional[str] = None
+
+    def as_row(self) -> tuple:
+        # Mismo orden que la sentencia upsert_device
+        return (self.user_id, self.device_id, self.fcm_token, self.device_name, self.os_version, self.app_version)
+
+
+@dataclass
+class DigestSettings:
+    """
+    Preferencias de push de las notificaciones internas de un usuario.
+    ``window_seconds`` agrupa lo que llega en la ventana en un solo push;
+    ``quiet_start``/``quiet_end`` ("HH:MM" en ``timezone``) posponen el push al final del horario.
+    """
+    user_id: int
+    push_enabled: bool = False
+    window_seconds: int = 0
+    quiet_start: Optional[str] = None
+    quiet_end: Optional[str] = None
+    timezone: str = "UTC"
+
+    def as_row(self) -> tuple:
+        # Mismo orden que la sentencia upsert_digest_settings
+        return (self.user_id, int(self.push_enabled), self.window_seconds, self.quiet_start, self.quiet_end,
+                self.timezone)
+
+    @classmethod
+    def from_row(cls, row) -> "DigestSettings":
+        user_id, push_enabled, window_seconds, quiet_start, quiet_end, timezone = row
+        return cls(user_id, bool(push_enabled), window_seconds or 0, quiet_start, quiet_end, timezone or "UTC")
+
+
+class Repository(ABC):
+    """Operaciones de datos que usan los endpoints de la API"""
+
+    name = "abstract"
+    # Circuit breaker opcional (lo asigna AppContext): se consulta al tomar una
+    # conexión y registra si la base de datos respondió
+    breaker = None
+
+    # ------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------
+
+    def warmup(self):
+        """Abre conexiones/crea el esquema antes del primer request"""
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def ping(self) -> int:
+        """Consulta trivial para el health check"""
+
+    def describe(self) -> dict:
+        return {"backend": self.name}
+
+    def statement_timings(self) -> dict:
+        """Llamadas, filas y latencia por sentencia registrada"""
+        return {}
+
+    # ------------------------------------------
+    # Usuarios
+    # ------------------------------------------
+
+    @abstractmethod
+    def user_exists(self, username: str, email: str) -> bool:
+        """True si ya existe un usuario con ese username o email"""
+
+    @abstractmethod
+    def create_user(self, username: str, email: str, password_hash: str):
+        pass
+
+    @abstractmethod
+    def get_login_user(self, username: str) -> Optional[Tuple[int, str, str]]:
+        """(id, username, password_hash) o None"""
+
+    @abstractmethod
+    def get_user_id(self, username: str) -> Optional[int]:
+        pass
+
+    @abstractmethod
+    def list_user_ids(self) -> List[int]:
+        pass
+
+    @abstractmethod
+    def get_user_ids_by_usernames(self, usernames: Sequence[str]) -> Dict[str, int]:
+        """{username: id} de los que existen; consulta con array bind por lotes"""
+
+    @abstractmethod
+    def filter_existing_user_ids(self, user_ids: Sequence[int]) -> List[int]:
+        pass
+
+    # ------------------------------------------
+    # Refresh tokens (se guarda solo el SHA-256 del token)
+    # ------------------------------------------
+
+    @abstractmethod
+    def create_refresh_token(self, user_id: int, token_hash: str, family_id: str, expires_at: datetime):
+        """Primer token de una familia (un login); las rotaciones heredan ``family_id``"""
+
+    @abstractmethod
+    def get_refresh_token(self, token_hash: str, now: datetime) -> Optional[RefreshTokenRow]:
+        pass
+
+    @abstractmethod
+    def rotate_refresh_token(self, token_hash: str, new_hash: str, expires_at: datetime, now: datetime) -> bool:
+        """
+        Revoca ``token_hash`` y crea ``new_hash`` en la misma familia en una sola
+        transacción. False si ya estaba revocado o vencido: otro request lo rotó antes.
+        """
+
+    @abstractmethod
+    def revoke_refresh_tokens(self, family_id: str, now: datetime) -> int:
+        """Revoca los tokens vigentes de la familia (logout o reuso de un token rotado)"""
+
+    @abstractmethod
+    def purge_refresh_tokens(self, before: datetime) -> int:
+        """Borra los tokens vencidos antes de ``before``; los revocados se guardan hasta vencer"""
+
+    # ------------------------------------------
+    # Devices
+    # ------------------------------------------
+
+    def upsert_device(self, user_id: int, device_id: str, fcm_token: str, device_name: Optional[str] = None,
+                      os_version: Optional[str] = None, app_version: Optional[str] = None) -> int:
+        """Registra o actualiza un device (token, metadatos y last_used_at)"""
+        return self.upsert_devices([DeviceInfo(user_id, device_id, fcm_token, device_name, os_version, app_version)])
+
+    @abstractmethod
+    def upsert_devices(self, devices: Sequence[DeviceInfo]) -> int:
+        """Upsert de varios devices en un solo executemany y un commit; devuelve las filas afectadas"""
+
+    @abstractmethod
+    def get_all_tokens(self) -> List[str]:
+        pass
+
+    @abstractmethod
+    def get_tokens_by_user_ids(self, user_ids: Sequence[int]) -> List[Tuple[int, str]]:
+        """(user_id, fcm_token) de todos los devices de esos usuarios"""
+
+    @abstractmethod
+    def iter_broadcast_tokens(self, partition: int, partitions: int, batch_size: int) -> Iterator[list]:
+        """
+        Lotes de (user_id, fcm_token) de los devices con ``id % partitions == partition``.
+        Un token repetido en varios devices sale una sola vez, en la partición del
+        device de menor id, así las particiones no se solapan.
+        """
+
+    # ------------------------------------------
+    # Notificaciones internas
+    # ------------------------------------------
+
+    @abstractmethod
+    def create_internal_notifications(self, user_ids: Sequence[int], title: str, message: str) -> int:
+        """Inserta una notificación por usuario en un solo batch; devuelve la cantidad"""
+
+    @abstractmethod
+    def list_internal_notifications(self, user_id: int, since: datetime = HISTORY_EPOCH) -> List[NotificationRow]:
+        """
+        Inbox del usuario desde ``since``, más recientes primero. El límite
+        inferior en created_at deja afuera las particiones más viejas.
+        """
+
+    @abstractmethod
+    def mark_notification_read(self, notification_id: int, user_id: int) -> Optional[bool]:
+        """
+        True si pasó a leída, False si ya estaba leída y None si no existe o
+        no pertenece al usuario.
+        """
+
+    # ------------------------------------------
+    # Preferencias de digest
+    # ------------------------------------------
+
+    @abstractmethod
+    def get_digest_settings(self, user_ids: Sequence[int]) -> Dict[int, DigestSettings]:
+        """Preferencias guardadas de esos usuarios (los que no tienen fila no aparecen)"""
+
+    @abstractmethod
+    def save_digest_settings(self, settings: DigestSettings):
+        pass
+
+    # ------------------------------------------
+    # Log de push notifications
+    # ------------------------------------------
+
+    @abstractmethod
+    def record_push_log(self, entries: Sequence[PushLogEntry]) -> int:
+        """Inserta el resultado de cada envío en un solo batch; devuelve la cantidad"""
+
+    @abstractmethod
+    def apply_push_receipts(self, receipts: Sequence[PushReceipt]) -> int:
+        """
+        Marca delivered_at/opened_at con un UPDATE por lote para cada tipo de
+        recibo; devuelve las filas del log actualizadas.
+        """
+
+    # ------------------------------------------
+    # Estadísticas (rollups)
+    # ------------------------------------------
+
+    @abstractmethod
+    def add_stats(self, deltas: Sequence[StatRow]) -> int:
+        """Suma cada delta a su contador, creándolo si no existe (un MERGE por lote)"""
+
+    @abstractmethod
+    def set_stats(self, values: Sequence[StatRow]) -> int:
+        """Reemplaza contadores por valores absolutos (reconciliación)"""
+
+    @abstractmethod
+    def get_stats(self, buckets: Sequence[str]) -> List[StatRow]:
+        pass
+
+    @abstractmethod
+    def count_stats(self, since_day: str, include_pushes: bool) -> List[StatRow]:
+        """
+        Recalcula los contadores desde las tablas base: totales y, por día
+        desde ``since_day``, notificaciones internas y (con push log) pushes.
+        """
+
+    # ------------------------------------------
+    # Retención
+    # ------------------------------------------
+
+    @abstractmethod
+    def purge_history(self, kind: str, before: datetime) -> Purged:
+        """
+        Elimina el historial (``kind`` de HISTORY_DATE_COLUMNS) anterior a
+        ``before``. Oracle borra particiones enteras (``partitions``; el DDL
+        no informa filas); las filas de la partición que contiene ``before``
+        esperan a la siguiente pasada. SQLite (y Oracle con tablas sin
+        particionar) borra filas (``rows``).
+        """
+
+    # ------------------------------------------
+    # Export de historial
+    # ------------------------------------------
+
+    @abstractmethod
+    def iter_history(self, kind: str, filters: HistoryFilter, batch_size: int) -> Iterator[list]:
+        """
+        Lotes de filas (columnas de ``EXPORT_COLUMNS[kind]``) en orden de id.
+        La conexión queda tomada hasta agotar o cerrar el iterador.
+        """
+
+
+def create_repository(settings) -> Repository:
+    primary = _create_backend(settings)
+    replica = _create_backend(settings, read_replica=True)
+    if replica is None:
+        return primary
+
+    from storage.routing import ReadWriteRepository
+    return ReadWriteRepository(primary, replica)
+
+
+def _create_backend(settings, read_replica: bool = False) -> Optional[Repository]:
+    """Repositorio del primario, o de la réplica de lectura (None si no está configurada)"""
+    if settings.storage_backend == "oracle":
+        if read_replica and not settings.oracle_read_dsn:
+            return None
+        from storage.oracle_repository import OracleRepository
+        tables = TableNames(settings.db_schema, settings.db_table_prefix)
+        if read_replica:
+            return OracleRepository(settings, tables, dsn=settings.oracle_read_dsn,
+                                    pool_min=settings.db_read_pool_min, pool_max=settings.db_read_pool_max)
+        return OracleRepository(settings, tables)
+    if settings.storage_backend == "sqlite":
+        path = settings.sqlite_read_path if read_replica else settings.sqlite_path
+        if not path:
+            return None
+        # SQLite no tiene esquemas: solo se aplica el prefijo de tabla
+        from storage.sqlite_repository import SQLiteRepository
+        return SQLiteRepository(path, TableNames("", settings.db_table_prefix),
+                                batch_size=settings.db_fetch_batch_size,
+                                array_chunk_size=settings.db_array_chunk_size)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {settings.storage_backend}")
@@ -0,0 +1,254 @@
+# Separación lectura/escritura: lecturas a una réplica (Active Data Guard) y escrituras al primario
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from storage.repository import (
+    HISTORY_EPOCH, DeviceInfo, DigestSettings, HistoryFilter, NotificationRow, Purged, PushLogEntry, PushReceipt,
+    RefreshTokenRow, Repository, StatRow, StorageError,
+)
+
+db_logger = logging.getLogger("Database")
+
+# Lecturas del request actual al primario (read-your-writes); asyncio.to_thread copia el contexto
+_primary_reads: ContextVar[bool] = ContextVar("primary_reads", default=False)
+
+
+@contextmanager
+def primary_reads(enabled: bool = True):
+    """Dentro del bloque las lecturas van al primario"""
+    token = _primary_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+def use_primary_reads(enabled: bool = True):
+    """Como ``primary_reads`` pero para el resto del request/tarea actual"""
+    _primary_reads.set(enabled)
+
+
+class RecentWriters:
+    """
+    Usuarios que escribieron hace menos de ``window`` segundos: sus requests
+    leen del primario hasta que la réplica haya aplicado el cambio.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._writes: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def note(self, user_id: int):
+        if self.window <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._writes[user_id] = now + self.window
+            # Limpieza perezosa para que el dict no crezca sin límite
+            if len(self._writes) > 10000:
+                self._writes = {uid: until for uid, until in self._writes.items() if until > now}
+
+    def recent(self, user_id: int) -> bool:
+        until = self._writes.get(user_id)
+        return until is not None and until > time.monotonic()
+
+
+class ReadWriteRepository(Repository):
+    """
+    Envuelve dos repositorios: ``primary`` recibe escrituras y las lecturas que
+    deciden una escritura (unicidad al registrar); ``replica`` el resto de las
+    lecturas, con su propio pool. Si la réplica falla se lee del primario.
+    """
+
+    def __init__(self, primary: Repository, replica: Repository):
+        self.primary = primary
+        self.replica = replica
+        self.name = primary.name
+        self.stats = {"replica_reads": 0, "primary_reads": 0, "replica_fallbacks": 0}
+
+    @property
+    def breaker(self):
+        return self.primary.breaker
+
+    @breaker.setter
+    def breaker(self, breaker):
+        self.primary.breaker = breaker
+
+    def _read(self, method: str, *args):
+        if _primary_reads.get():
+            self.stats["primary_reads"] += 1
+            return getattr(self.primary, method)(*args)
+        try:
+            result = getattr(self.replica, method)(*args)
+            self.stats["replica_reads"] += 1
+            return result
+        except StorageError as e:
+            db_logger.warning(f"⚠️ Read replica unavailable for {method}, using primary: {e}")
+            self.stats["replica_fallbacks"] += 1
+            return getattr(self.primary, method)(*args)
+
+    # ------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------
+
+    def warmup(self):
+        self.primary.warmup()
+        self.replica.warmup()
+
+    def close(self):
+        self.replica.close()
+        self.primary.close()
+
+    def ping(self) -> int:
+        return self.primary.ping()
+
+    def describe(self) -> dict:
+        return {**self.primary.describe(), "read_replica": self.replica.describe(), "routing": dict(self.stats)}
+
+    def statement_timings(self) -> dict:
+        timings = dict(self.primary.statement_timings())
+        timings.update({f"replica.{name}": value for name, value in self.replica.statement_timings().items()})
+        return timings
+
+    # ------------------------------------------
+    # Usuarios
+    # ------------------------------------------
+
+    def user_exists(self, username: str, email: str) -> bool:
+        # Decide si se puede registrar: con lag de réplica daría falsos negativos
+        return self.primary.user_exists(username, email)
+
+    def create_user(self, username: str, email: str, password_hash: str):
+        return self.primary.create_user(username, email, password_hash)
+
+    def get_login_user(self, username: str) -> Optional[Tuple[int, str, str]]:
+        # Un usuario recién registrado puede no estar aún en la réplica
+        user = self._read("get_login_user", username)
+        if user is None and not _primary_reads.get():
+            user = self.primary.get_login_user(username)
+        return user
+
+    def get_user_id(self, username: str) -> Optional[int]:
+        return self._read("get_user_id", username)
+
+    def list_user_ids(self) -> List[int]:
+        return self._read("list_user_ids")
+
+    def get_user_ids_by_usernames(self, usernames: Sequence[str]) -> Dict[str, int]:
+        return self._read("get_user_ids_by_usernames", usernames)
+
+    def filter_existing_user_ids(self, user_ids: Sequence[int]) -> List[int]:
+        return self._read("filter_existing_user_ids", user_ids)
+
+    # ------------------------------------------
+    # Refresh tokens: todo al primario (la réplica atrasada vería un token
+    # recién rotado como vigente, o uno recién emitido como inexistente)
+    # ------------------------------------------
+
+    def create_refresh_token(self, user_id: int, token_hash: str, family_id: str, expires_at: datetime):
+        return self.primary.create_refresh_token(user_id, token_hash, family_id, expires_at)
+
+    def get_refresh_token(self, token_hash: str, now: datetime) -> Optional[RefreshTokenRow]:
+        return self.primary.get_refresh_token(token_hash, now)
+
+    def rotate_refresh_token(self, token_hash: str, new_hash: str, expires_at: datetime, now: datetime) -> bool:
+        return self.primary.rotate_refresh_token(token_hash, new_hash, expires_at, now)
+
+    def revoke_refresh_tokens(self, family_id: str, now: datetime) -> int:
+        return self.primary.revoke_refresh_tokens(family_id, now)
+
+    def purge_refresh_tokens(self, before: datetime) -> int:
+        return self.primary.purge_refresh_tokens(before)
+
+    # ------------------------------------------
+    # Devices
+    # ------------------------------------------
+
+    def upsert_devices(self, devices: Sequence[DeviceInfo]) -> int:
+        return self.primary.upsert_devices(devices)
+
+    def get_all_tokens(self) -> List[str]:
+        return self._read("get_all_tokens")
+
+    def get_tokens_by_user_ids(self, user_ids: Sequence[int]) -> List[Tuple[int, str]]:
+        return self._read("get_tokens_by_user_ids", user_ids)
+
+    def iter_broadcast_tokens(self, partition: int, partitions: int, batch_size: int) -> Iterator[list]:
+        # Como iter_history: cursor largo en la réplica, sin fallback al primario
+        repository = self.primary if _primary_reads.get() else self.replica
+        self.stats["primary_reads" if repository is self.primary else "replica_reads"] += 1
+        return repository.iter_broadcast_tokens(partition, partitions, batch_size)
+
+    # ------------------------------------------
+    # Notificaciones internas
+    # ------------------------------------------
+
+    def create_internal_notifications(self, user_ids: Sequence[int], title: str, message: str) -> int:
+        return self.primary.create_internal_notifications(user_ids, title, message)
+
+    def list_internal_notifications(self, user_id: int, since: datetime = HISTORY_EPOCH) -> List[NotificationRow]:
+        return self._read("list_internal_notifications", user_id, since)
+
+    def mark_notification_read(self, notification_id: int, user_id: int) -> Optional[bool]:
+        return self.primary.mark_notification_read(notification_id, user_id)
+
+    # ------------------------------------------
+    # Preferencias de digest
+    # ------------------------------------------
+
+    def get_digest_settings(self, user_ids: Sequence[int]) -> Dict[int, DigestSettings]:
+        return self._read("get_digest_settings", user_ids)
+
+    def save_digest_settings(self, settings: DigestSettings):
+        return self.primary.save_digest_settings(settings)
+
+    # ------------------------------------------
+    # Log de push notifications
+    # ------------------------------------------
+
+    def record_push_log(self, entries: Sequence[PushLogEntry]) -> int:
+        return self.primary.record_push_log(entries)
+
+    def apply_push_receipts(self, receipts: Sequence[PushReceipt]) -> int:
+        return self.primary.apply_push_receipts(receipts)
+
+    # ------------------------------------------
+    # Estadísticas (rollups)
+    # ------------------------------------------
+
+    def add_stats(self, deltas: Sequence[StatRow]) -> int:
+        return self.primary.add_stats(deltas)
+
+    def set_stats(self, values: Sequence[StatRow]) -> int:
+        return self.primary.set_stats(values)
+
+    def get_stats(self, buckets: Sequence[str]) -> List[StatRow]:
+        return self._read("get_stats", buckets)
+
+    def count_stats(self, since_day: str, include_pushes: bool) -> List[StatRow]:
+        # La reconciliación escribe valores absolutos: se cuentan en el primario
+        return self.primary.count_stats(since_day, include_pushes)
+
+    # ------------------------------------------
+    # Retención
+    # ------------------------------------------
+
+    def purge_history(self, kind: str, before: datetime) -> Purged:
+        return self.primary.purge_history(kind, before)
+
+    # ------------------------------------------
+    # Export de historial
+    # ------------------------------------------
+
+    def iter_history(self, kind: str, filters: HistoryFilter, batch_size: int) -> Iterator[list]:
+        # Un export largo retiene su conexión: va a la réplica para no ocupar el pool del primario.
+        # El generador falla al iterar, no al llamarlo, así que no hay fallback al primario
+        repository = self.primary if _primary_reads.get() else self.replica
+        self.stats["primary_reads" if repository is self.primary else "replica_reads"] += 1
+        return repository.iter_history(kind, filters, batch_size)
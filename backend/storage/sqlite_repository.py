@@ -0,0 +1,639 @@
+# Repositorio SQLite embebido (modo WAL) para despliegues pequeños y pruebas locales
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from services.tracing import record_span
+from storage.repository import (
+    HISTORY_EPOCH, DeviceInfo, DigestSettings, HistoryFilter, NotificationRow, Purged, PushLogEntry, PushReceipt,
+    RefreshTokenRow, Repository, StorageError, TableNames, StatRow, chunked, count_stat_rows, history_query,
+    receipt_rows,
+)
+from storage.statements import FEW, MANY, NONE, ONE, StatementRegistry
+
+db_logger = logging.getLogger("Database")
+
+# CURRENT_TIMESTAMP de SQLite se guarda como texto; se devuelve como datetime igual que Oracle
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+
+def sqlite_stamp(at: datetime) -> str:
+    """Bind de un datetime con el mismo formato de texto que CURRENT_TIMESTAMP"""
+    return at.isoformat(sep=" ", timespec="seconds")
+
+
+def schema_sql(tables: TableNames) -> str:
+    """Mismo esquema que ddbb/create_tables.sql (constraints, defaults y triggers)"""
+    return f"""
+    CREATE TABLE IF NOT EXISTS {tables.users} (
+        id INTEGER PRIMARY KEY,
+        username VARCHAR(50) NOT NULL UNIQUE,
+        email VARCHAR(100) NOT NULL UNIQUE,
+        password_hash VARCHAR(255) NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS {tables.devices} (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES {tables.users}(id) ON DELETE CASCADE,
+        device_id VARCHAR(255) NOT NULL,
+        fcm_token VARCHAR(500) NOT NULL,
+        device_name VARCHAR(100),
+        device_model VARCHAR(100),
+        os_version VARCHAR(50),
+        app_version VARCHAR(20),
+        is_active INTEGER DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_{tables.prefix}devices_user_id ON {tables.devices}(user_id);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_{tables.prefix}devices_user_device ON {tables.devices}(user_id, device_id);
+    CREATE INDEX IF NOT EXISTS idx_{tables.prefix}devices_fcm_token ON {tables.devices}(fcm_token);
+
+    CREATE TABLE IF NOT EXISTS {tables.internal_notifications} (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES {tables.users}(id) ON DELETE CASCADE,
+        title VARCHAR(255) NOT NULL,
+        message TEXT NOT NULL,
+        notification_type VARCHAR(50) DEFAULT 'info',
+        priority_level INTEGER DEFAULT 1 CHECK (priority_level IN (1, 2, 3)),
+        is_read INTEGER DEFAULT 0 CHECK (is_read IN (0, 1)),
+        read_at TIMESTAMP,
+        expires_at TIMESTAMP,
+        metadata TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_{tables.prefix}internal_notifications_user_read
+        ON {tables.internal_notifications}(user_id, is_read);
+    CREATE INDEX IF NOT EXISTS idx_{tables.prefix}internal_notifications_created_at
+        ON {tables.internal_notifications}(created_at DESC);
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tables.prefix}internal_notifications_updated_at
+        AFTER UPDATE ON {tables.internal_notifications}
+        FOR EACH ROW
+    BEGIN
+        UPDATE {tables.internal_notifications}
+        SET updated_at = CURRENT_TIMESTAMP,
+            read_at = CASE WHEN OLD.is_read = 0 AND NEW.is_read = 1 THEN CURRENT_TIMESTAMP ELSE NEW.read_at END
+        WHERE id = NEW.id;
+    END;
+
+    CREATE TABLE IF NOT EXISTS {tables.push_log} (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER REFERENCES {tables.users}(id) ON DELETE SET NULL,
+        device_id INTEGER REFERENCES {tables.devices}(id) ON DELETE SET NULL,
+        title VARCHAR(255) NOT NULL,
+        body TEXT NOT NULL,
+        fcm_message_id VARCHAR(255),
+        status VARCHAR(20) DEFAULT 'sent' CHECK (status IN ('sent', 'delivered', 'failed')),
+        response_data TEXT,
+        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        delivered_at TIMESTAMP,
+        opened_at TIMESTAMP,
+        error_message VARCHAR(500)
+    );
+    CREATE INDEX IF NOT EXISTS idx_{tables.prefix}push_log_sent_at ON {tables.push_log}(sent_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_{tables.prefix}push_log_message_id ON {tables.push_log}(fcm_message_id);
+    CREATE INDEX IF NOT EXISTS idx_{tables.prefix}push_log_user_id ON {tables.push_log}(user_id);
+
+    CREATE TABLE IF NOT EXISTS {tables.notification_settings} (
+        user_id INTEGER PRIMARY KEY REFERENCES {tables.users}(id) ON DELETE CASCADE,
+        push_enabled INTEGER DEFAULT 0 CHECK (push_enabled IN (0, 1)),
+        digest_window_seconds INTEGER DEFAULT 0,
+        quiet_hours_start VARCHAR(5),
+        quiet_hours_end VARCHAR(5),
+        timezone VARCHAR(64) DEFAULT 'UTC',
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS {tables.refresh_tokens} (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES {tables.users}(id) ON DELETE CASCADE,
+        token_hash VARCHAR(64) NOT NULL UNIQUE,
+        family_id VARCHAR(32) NOT NULL,
+        expires_at TIMESTAMP NOT NULL,
+        revoked_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_{tables.prefix}refresh_tokens_family ON {tables.refresh_tokens}(family_id);
+    CREATE INDEX IF NOT EXISTS idx_{tables.prefix}refresh_tokens_expires ON {tables.refresh_tokens}(expires_at);
+
+    CREATE TABLE IF NOT EXISTS {tables.stats_rollup} (
+        bucket VARCHAR(10) NOT NULL,
+        metric VARCHAR(40) NOT NULL,
+        value INTEGER DEFAULT 0 NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (bucket, metric)
+    );
+    """
+
+
+# Mismas sentencias que storage/oracle_repository.py con binds posicionales de sqlite3
+STATEMENTS = {
+    "user_exists": (ONE, "SELECT id FROM {users} WHERE username = ? OR email = ?"),
+    "create_user": (NONE, "INSERT INTO {users} (username, email, password_hash) VALUES (?, ?, ?)"),
+    "login_user": (ONE, "SELECT id, username, password_hash FROM {users} WHERE username = ?"),
+    "user_id_by_username": (ONE, "SELECT id FROM {users} WHERE username = ?"),
+    "all_user_ids": (MANY, "SELECT id FROM {users}"),
+    # Equivalente del bind de colección de Oracle: un array JSON expandido con json_each
+    "user_ids_by_usernames": (MANY, """
+        SELECT username, id FROM {users}
+        WHERE username IN (SELECT value FROM json_each(?))
+    """),
+    "existing_user_ids": (MANY, "SELECT id FROM {users} WHERE id IN (SELECT value FROM json_each(?))"),
+    "insert_refresh_token": (NONE, """
+        INSERT INTO {refresh_tokens} (user_id, token_hash, family_id, expires_at) VALUES (?, ?, ?, ?)
+    """),
+    "refresh_token": (ONE, """
+        SELECT t.user_id, u.username, t.family_id,
+               CASE WHEN t.revoked_at IS NULL THEN 0 ELSE 1 END,
+               CASE WHEN t.expires_at > ? THEN 0 ELSE 1 END
+        FROM {refresh_tokens} t JOIN {users} u ON u.id = t.user_id
+        WHERE t.token_hash = ?
+    """),
+    "revoke_refresh_token": (NONE, """
+        UPDATE {refresh_tokens} SET revoked_at = ?
+        WHERE token_hash = ? AND revoked_at IS NULL AND expires_at > ?
+    """),
+    # El token nuevo hereda usuario y familia del que reemplaza
+    "rotate_refresh_token": (NONE, """
+        INSERT INTO {refresh_tokens} (user_id, token_hash, family_id, expires_at)
+        SELECT user_id, ?, family_id, ? FROM {refresh_tokens} WHERE token_hash = ?
+    """),
+    "revoke_refresh_family": (NONE, """
+        UPDATE {refresh_tokens} SET revoked_at = ? WHERE family_id = ? AND revoked_at IS NULL
+    """),
+    "purge_refresh_tokens": (NONE, "DELETE FROM {refresh_tokens} WHERE expires_at < ?"),
+    "upsert_device": (NONE, """
+        INSERT INTO {devices} (user_id, device_id, fcm_token, device_name, os_version, app_version, last_used_at)
+        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (user_id, device_id) DO UPDATE SET
+            fcm_token = excluded.fcm_token,
+            device_name = COALESCE(excluded.device_name, device_name),
+            os_version = COALESCE(excluded.os_version, os_version),
+            app_version = COALESCE(excluded.app_version, app_version),
+            is_active = 1,
+            last_used_at = CURRENT_TIMESTAMP,
+            updated_at = CURRENT_TIMESTAMP
+    """),
+    "all_tokens": (MANY, "SELECT fcm_token FROM {devices}"),
+    "broadcast_tokens": (MANY, """
+        SELECT d.user_id, d.fcm_token FROM {devices} d
+        WHERE d.id % ? = ?
+          AND NOT EXISTS (SELECT 1 FROM {devices} o WHERE o.fcm_token = d.fcm_token AND o.id < d.id)
+    """),
+    "tokens_by_user_ids": (MANY, """
+        SELECT user_id, fcm_token FROM {devices}
+        WHERE user_id IN (SELECT value FROM json_each(?))
+    """),
+    "insert_internal_notification": (NONE, """
+        INSERT INTO {internal_notifications} (user_id, title, message) VALUES (?, ?, ?)
+    """),
+    "inbox": (FEW, """
+        SELECT id, title, message, is_read, created_at
+        FROM {internal_notifications}
+        WHERE user_id = ? AND created_at >= ?
+        ORDER BY created_at DESC, id DESC
+    """),
+    "mark_notification_read": (NONE, """
+        UPDATE {internal_notifications}
+        SET is_read = 1
+        WHERE id = ? AND user_id = ? AND is_read = 0
+    """),
+    "notification_is_read": (ONE, "SELECT is_read FROM {internal_notifications} WHERE id = ? AND user_id = ?"),
+    "insert_push_log": (NONE, """
+        INSERT INTO {push_log} (user_id, title, body, fcm_message_id, status, response_data, error_message)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """),
+    # Recibos de la app: solo el destinatario (o cualquiera si fue broadcast, sin user_id) puede
+    # confirmar; un envío fallido no pasa a delivered
+    "mark_push_delivered": (NONE, """
+        UPDATE {push_log}
+        SET status = 'delivered', delivered_at = COALESCE(delivered_at, ?)
+        WHERE fcm_message_id = ? AND (user_id = ? OR user_id IS NULL) AND status <> 'failed' AND sent_at >= ?
+    """),
+    "mark_push_opened": (NONE, """
+        UPDATE {push_log}
+        SET status = 'delivered', delivered_at = COALESCE(delivered_at, ?), opened_at = COALESCE(opened_at, ?)
+        WHERE fcm_message_id = ? AND (user_id = ? OR user_id IS NULL) AND status <> 'failed' AND sent_at >= ?
+    """),
+    # Retención: sin particiones en SQLite se borran filas
+    "purge_notifications": (NONE, "DELETE FROM {internal_notifications} WHERE created_at < ?"),
+    "purge_pushes": (NONE, "DELETE FROM {push_log} WHERE sent_at < ?"),
+    "add_stats": (NONE, """
+        INSERT INTO {stats_rollup} (bucket, metric, value) VALUES (?, ?, ?)
+        ON CONFLICT (bucket, metric) DO UPDATE SET
+            value = value + excluded.value,
+            updated_at = CURRENT_TIMESTAMP
+    """),
+    "set_stats": (NONE, """
+        INSERT INTO {stats_rollup} (bucket, metric, value) VALUES (?, ?, ?)
+        ON CONFLICT (bucket, metric) DO UPDATE SET
+            value = excluded.value,
+            updated_at = CURRENT_TIMESTAMP
+    """),
+    "stats_by_buckets": (FEW, """
+        SELECT bucket, metric, value FROM {stats_rollup}
+        WHERE bucket IN (SELECT value FROM json_each(?))
+    """),
+    "count_users": (ONE, "SELECT COUNT(*) FROM {users}"),
+    "count_active_devices": (ONE, "SELECT COUNT(*) FROM {devices} WHERE is_active = 1"),
+    "count_unread": (ONE, "SELECT COUNT(*) FROM {internal_notifications} WHERE is_read = 0"),
+    "notifications_by_day": (FEW, """
+        SELECT date(created_at), COUNT(*)
+        FROM {internal_notifications}
+        WHERE created_at >= ?
+        GROUP BY date(created_at)
+    """),
+    "pushes_by_day": (FEW, """
+        SELECT date(sent_at),
+               SUM(CASE WHEN status = 'failed' THEN 0 ELSE 1 END),
+               SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END)
+        FROM {push_log}
+        WHERE sent_at >= ?
+        GROUP BY date(sent_at)
+    """),
+    "digest_settings_by_user_ids": (MANY, """
+        SELECT user_id, push_enabled, digest_window_seconds, quiet_hours_start, quiet_hours_end, timezone
+        FROM {notification_settings}
+        WHERE user_id IN (SELECT value FROM json_each(?))
+    """),
+    "upsert_digest_settings": (NONE, """
+        INSERT INTO {notification_settings}
+            (user_id, push_enabled, digest_window_seconds, quiet_hours_start, quiet_hours_end, timezone)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            push_enabled = excluded.push_enabled,
+            digest_window_seconds = excluded.digest_window_seconds,
+            quiet_hours_start = excluded.quiet_hours_start,
+            quiet_hours_end = excluded.quiet_hours_end,
+            timezone = excluded.timezone,
+            updated_at = CURRENT_TIMESTAMP
+    """),
+    # Export de historial: rango [since, until) siempre bindeado, estado opcional con (? IS NULL OR ...)
+    "export_notifications": (MANY, """
+        SELECT id, user_id, title, message, notification_type, is_read, read_at, created_at
+        FROM {internal_notifications}
+        WHERE created_at >= ? AND created_at < ? AND (? IS NULL OR is_read = ?)
+        ORDER BY id
+    """),
+    "export_notifications_by_user": (MANY, """
+        SELECT id, user_id, title, message, notification_type, is_read, read_at, created_at
+        FROM {internal_notifications}
+        WHERE user_id = ? AND created_at >= ? AND created_at < ? AND (? IS NULL OR is_read = ?)
+        ORDER BY id
+    """),
+    "export_pushes": (MANY, """
+        SELECT id, user_id, title, body, fcm_message_id, status, sent_at, delivered_at, opened_at, error_message
+        FROM {push_log}
+        WHERE sent_at >= ? AND sent_at < ? AND (? IS NULL OR status = ?)
+        ORDER BY id
+    """),
+    "export_pushes_by_user": (MANY, """
+        SELECT id, user_id, title, body, fcm_message_id, status, sent_at, delivered_at, opened_at, error_message
+        FROM {push_log}
+        WHERE user_id = ? AND sent_at >= ? AND sent_at < ? AND (? IS NULL OR status = ?)
+        ORDER BY id
+    """),
+    "ping": (ONE, "SELECT 1"),
+}
+
+
+class SQLiteRepository(Repository):
+    """
+    Una conexión por thread (sqlite3 no comparte conexiones entre threads).
+    WAL permite lecturas concurrentes mientras un writer hace commit.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, tables: TableNames, batch_size: int = 1000, array_chunk_size: int = 1000):
+        self.path = path
+        self.tables = tables
+        self.array_chunk_size = array_chunk_size
+        self.statements = StatementRegistry(STATEMENTS, tables, batch_size=batch_size)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    # ------------------------------------------
+    # Conexiones
+    # ------------------------------------------
+
+    def _open(self) -> sqlite3.Connection:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        connection = sqlite3.connect(
+            self.path,
+            timeout=30,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            cached_statements=max(128, len(self.statements)),
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        connection.execute("PRAGMA busy_timeout=30000")
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def _ensure_schema(self, connection: sqlite3.Connection):
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if not self._schema_ready:
+                connection.executescript(schema_sql(self.tables))
+                self.statements.commit(connection)
+                self._schema_ready = True
+                db_logger.info(f"✅ SQLite schema ready at: {os.path.abspath(self.path)}")
+
+    @contextmanager
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+        breaker = self.breaker
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            if connection is None:
+                start_ns = time.time_ns()
+                connection = self._open()
+                self._local.connection = connection
+                record_span("db.connect", start_ns)
+            self._ensure_schema(connection)
+        except sqlite3.Error as e:
+            db_logger.error(f"❌ SQLite connection error: {e}")
+            if breaker is not None:
+                breaker.record_failure()
+            raise StorageError("Database connection failed") from e
+        if breaker is not None:
+            breaker.record_success()
+
+        try:
+            yield connection
+        except Exception:
+            connection.rollback()
+            raise
+
+    @contextmanager
+    def _dedicated_connection(self):
+        """
+        Conexión propia para un cursor que vive más que un request (export): se
+        avanza desde threads distintos y no debe compartir transacción con la
+        conexión por thread del resto de los requests.
+        """
+        with self.connection():
+            # Pasa por el circuit breaker y crea el esquema si hace falta
+            pass
+        try:
+            connection = self._open()
+        except sqlite3.Error as e:
+            raise StorageError("Database connection failed") from e
+        try:
+            yield connection
+        finally:
+            with self._connections_lock:
+                if connection in self._connections:
+                    self._connections.remove(connection)
+            connection.close()
+
+    def warmup(self):
+        with self.connection() as connection:
+            connection.execute("SELECT 1")
+        db_logger.info("✅ SQLite database warmed up")
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+        db_logger.info("🔗 SQLite connections closed")
+
+    def ping(self) -> int:
+        with self.connection() as connection:
+            return self.statements.fetch_one(connection, "ping")[0]
+
+    def _fetch_by_list(self, name: str, values: Sequence) -> list:
+        rows = []
+        with self.connection() as connection:
+            for chunk in chunked(list(values), self.array_chunk_size):
+                rows.extend(self.statements.fetch_all(connection, name, (json.dumps(chunk),)))
+        return rows
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "path": os.path.abspath(self.path)}
+
+    def statement_timings(self) -> dict:
+        return self.statements.timings.snapshot()
+
+    # ------------------------------------------
+    # Usuarios
+    # ------------------------------------------
+
+    def user_exists(self, username: str, email: str) -> bool:
+        with self.connection() as connection:
+            return self.statements.fetch_one(connection, "user_exists", (username, email)) is not None
+
+    def create_user(self, username: str, email: str, password_hash: str):
+        with self.connection() as connection:
+            self.statements.execute(connection, "create_user", (username, email, password_hash))
+            self.statements.commit(connection)
+
+    def get_login_user(self, username: str) -> Optional[Tuple[int, str, str]]:
+        with self.connection() as connection:
+            return self.statements.fetch_one(connection, "login_user", (username,))
+
+    def get_user_id(self, username: str) -> Optional[int]:
+        with self.connection() as connection:
+            row = self.statements.fetch_one(connection, "user_id_by_username", (username,))
+            return row[0] if row else None
+
+    def list_user_ids(self) -> List[int]:
+        with self.connection() as connection:
+            return self.statements.fetch_column(connection, "all_user_ids")
+
+    def get_user_ids_by_usernames(self, usernames: Sequence[str]) -> Dict[str, int]:
+        return dict(self._fetch_by_list("user_ids_by_usernames", usernames))
+
+    def filter_existing_user_ids(self, user_ids: Sequence[int]) -> List[int]:
+        return [row[0] for row in self._fetch_by_list("existing_user_ids", user_ids)]
+
+    # ------------------------------------------
+    # Refresh tokens
+    # ------------------------------------------
+
+    def create_refresh_token(self, user_id: int, token_hash: str, family_id: str, expires_at: datetime):
+        with self.connection() as connection:
+            self.statements.execute(connection, "insert_refresh_token",
+                                    (user_id, token_hash, family_id, sqlite_stamp(expires_at)))
+            self.statements.commit(connection)
+
+    def get_refresh_token(self, token_hash: str, now: datetime) -> Optional[RefreshTokenRow]:
+        with self.connection() as connection:
+            return self.statements.fetch_one(connection, "refresh_token", (sqlite_stamp(now), token_hash))
+
+    def rotate_refresh_token(self, token_hash: str, new_hash: str, expires_at: datetime, now: datetime) -> bool:
+        with self.connection() as connection:
+            # El UPDATE condicional decide entre rotaciones concurrentes del mismo token
+            if self.statements.execute(connection, "revoke_refresh_token", (sqlite_stamp(now), token_hash, sqlite_stamp(now))) == 0:
+                connection.rollback()
+                return False
+            self.statements.execute(connection, "rotate_refresh_token", (new_hash, sqlite_stamp(expires_at), token_hash))
+            self.statements.commit(connection)
+        return True
+
+    def revoke_refresh_tokens(self, family_id: str, now: datetime) -> int:
+        with self.connection() as connection:
+            count = self.statements.execute(connection, "revoke_refresh_family", (sqlite_stamp(now), family_id))
+            self.statements.commit(connection)
+        return count
+
+    def purge_refresh_tokens(self, before: datetime) -> int:
+        with self.connection() as connection:
+            count = self.statements.execute(connection, "purge_refresh_tokens", (sqlite_stamp(before),))
+            self.statements.commit(connection)
+        return count
+
+    # ------------------------------------------
+    # Devices
+    # ------------------------------------------
+
+    def upsert_devices(self, devices: Sequence[DeviceInfo]) -> int:
+        if not devices:
+            return 0
+        rows = [device.as_row() for device in devices]
+        with self.connection() as connection:
+            self.statements.execute_many(connection, "upsert_device", rows)
+            self.statements.commit(connection)
+        return len(rows)
+
+    def get_all_tokens(self) -> List[str]:
+        with self.connection() as connection:
+            return self.statements.fetch_column(connection, "all_tokens")
+
+    def get_tokens_by_user_ids(self, user_ids: Sequence[int]) -> List[Tuple[int, str]]:
+        return self._fetch_by_list("tokens_by_user_ids", user_ids)
+
+    def iter_broadcast_tokens(self, partition: int, partitions: int, batch_size: int) -> Iterator[list]:
+        with self._dedicated_connection() as connection:
+            yield from self.statements.iterate(connection, "broadcast_tokens", (partitions, partition), batch_size)
+
+    # ------------------------------------------
+    # Notificaciones internas
+    # ------------------------------------------
+
+    def create_internal_notifications(self, user_ids: Sequence[int], title: str, message: str) -> int:
+        with self.connection() as connection:
+            count = self.statements.execute_many(
+                connection, "insert_internal_notification", [(user_id, title, message) for user_id in user_ids]
+            )
+            self.statements.commit(connection)
+            return count
+
+    def list_internal_notifications(self, user_id: int, since: datetime = HISTORY_EPOCH) -> List[NotificationRow]:
+        with self.connection() as connection:
+            return self.statements.fetch_all(connection, "inbox", (user_id, sqlite_stamp(since)))
+
+    def mark_notification_read(self, notification_id: int, user_id: int) -> Optional[bool]:
+        with self.connection() as connection:
+            if self.statements.execute(connection, "mark_notification_read", (notification_id, user_id)) == 0:
+                connection.rollback()
+                row = self.statements.fetch_one(connection, "notification_is_read", (notification_id, user_id))
+                return None if row is None else False
+
+            self.statements.commit(connection)
+            return True
+
+    # ------------------------------------------
+    # Preferencias de digest
+    # ------------------------------------------
+
+    def get_digest_settings(self, user_ids: Sequence[int]) -> Dict[int, DigestSettings]:
+        rows = self._fetch_by_list("digest_settings_by_user_ids", user_ids)
+        return {row[0]: DigestSettings.from_row(row) for row in rows}
+
+    def save_digest_settings(self, settings: DigestSettings):
+        with self.connection() as connection:
+            self.statements.execute(connection, "upsert_digest_settings", settings.as_row())
+            self.statements.commit(connection)
+
+    # ------------------------------------------
+    # Log de push notifications
+    # ------------------------------------------
+
+    def record_push_log(self, entries: Sequence[PushLogEntry]) -> int:
+        if not entries:
+            return 0
+        with self.connection() as connection:
+            count = self.statements.execute_many(connection, "insert_push_log", [entry.as_row() for entry in entries])
+            self.statements.commit(connection)
+            return count
+
+    def apply_push_receipts(self, receipts: Sequence[PushReceipt]) -> int:
+        # Mismo formato de texto que CURRENT_TIMESTAMP
+        delivered, opened = receipt_rows(receipts, stamp=sqlite_stamp)
+        count = 0
+        with self.connection() as connection:
+            if delivered:
+                count += self.statements.execute_many(connection, "mark_push_delivered", delivered)
+            if opened:
+                count += self.statements.execute_many(connection, "mark_push_opened", opened)
+            self.statements.commit(connection)
+        return count
+
+    # ------------------------------------------
+    # Estadísticas (rollups)
+    # ------------------------------------------
+
+    def _merge_stats(self, name: str, rows: Sequence[StatRow]) -> int:
+        if not rows:
+            return 0
+        with self.connection() as connection:
+            count = self.statements.execute_many(connection, name, rows)
+            self.statements.commit(connection)
+            return count
+
+    def add_stats(self, deltas: Sequence[StatRow]) -> int:
+        return self._merge_stats("add_stats", deltas)
+
+    def set_stats(self, values: Sequence[StatRow]) -> int:
+        return self._merge_stats("set_stats", values)
+
+    def get_stats(self, buckets: Sequence[str]) -> List[StatRow]:
+        return self._fetch_by_list("stats_by_buckets", buckets)
+
+    def count_stats(self, since_day: str, include_pushes: bool) -> List[StatRow]:
+        with self.connection() as connection:
+            return count_stat_rows(self.statements, connection, since_day, include_pushes)
+
+    # ------------------------------------------
+    # Retención
+    # ------------------------------------------
+
+    def purge_history(self, kind: str, before: datetime) -> Purged:
+        with self.connection() as connection:
+            count = self.statements.execute(connection, f"purge_{kind}", (sqlite_stamp(before),))
+            self.statements.commit(connection)
+        return Purged(rows=count)
+
+    # ------------------------------------------
+    # Export de historial
+    # ------------------------------------------
+
+    def iter_history(self, kind: str, filters: HistoryFilter, batch_size: int) -> Iterator[list]:
+        name, params = history_query(kind, filters, stamp=sqlite_stamp)
+        with self._dedicated_connection() as connection:
+            yield from self.statements.iterate(connection, name, params, batch_size)
@@ -0,0 +1,211 @@
+# Registro de sentencias SQL con nombre: texto, cardinalidad esperada y tiempos por sentencia
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from services.tracing import record_span, tracing_active
+from storage.repository import TableNames
+
+db_logger = logging.getLogger("Database")
+
+# Cardinalidad esperada del resultado
+NONE = "none"    # DML, no devuelve filas
+ONE = "one"      # a lo sumo una fila (lookups por clave)
+FEW = "few"      # decenas de filas (tokens de un usuario, inbox)
+MANY = "many"    # scans completos (broadcast, todos los usuarios)
+
+CARDINALITIES = (NONE, ONE, FEW, MANY)
+
+
+def fetch_tuning(cardinality: str, batch_size: int = 1000) -> Tuple[int, int]:
+    """
+    (prefetchrows, arraysize) para cada cardinalidad.
+    ONE usa prefetchrows=2 para que el driver vea el fin del cursor en el mismo
+    round trip del execute; MANY trae lotes grandes para reducir round trips.
+    """
+    if cardinality == ONE:
+        return 2, 1
+    if cardinality == FEW:
+        return 100, 100
+    if cardinality == MANY:
+        return batch_size, batch_size
+    return 0, 1
+
+
+@dataclass(frozen=True)
+class Statement:
+    name: str
+    sql: str
+    cardinality: str
+
+
+class StatementTimings:
+    """Llamadas, filas y tiempo acumulado por sentencia (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, dict] = {}
+
+    def record(self, name: str, elapsed: float, rows: int):
+        with self._lock:
+            entry = self._stats.setdefault(name, {"calls": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += 1
+            entry["rows"] += rows
+            entry["total_ms"] += elapsed * 1000
+            entry["max_ms"] = max(entry["max_ms"], elapsed * 1000)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                name: {
+                    "calls": entry["calls"],
+                    "rows": entry["rows"],
+                    "mean_ms": round(entry["total_ms"] / entry["calls"], 3),
+                    "max_ms": round(entry["max_ms"], 3),
+                }
+                for name, entry in sorted(self._stats.items())
+            }
+
+
+class StatementRegistry:
+    """
+    Sentencias con nombre para un backend. El SQL se escribe con los nombres
+    de tabla como placeholders (``{users}``, ``{devices}``...) y se resuelve
+    una sola vez con el esquema/prefijo configurados, así el texto es idéntico
+    en cada ejecución y el statement cache del driver lo reutiliza.
+    """
+
+    def __init__(self, definitions: Dict[str, Tuple[str, str]], tables: TableNames, batch_size: int = 1000):
+        names = {
+            "users": tables.users,
+            "devices": tables.devices,
+            "internal_notifications": tables.internal_notifications,
+            "push_log": tables.push_log,
+            "notification_settings": tables.notification_settings,
+            "stats_rollup": tables.stats_rollup,
+            "refresh_tokens": tables.refresh_tokens,
+        }
+        self.batch_size = batch_size
+        self.timings = StatementTimings()
+        self.statements: Dict[str, Statement] = {}
+        for name, (cardinality, sql) in definitions.items():
+            if cardinality not in CARDINALITIES:
+                raise ValueError(f"Unknown cardinality for statement {name}: {cardinality}")
+            self.statements[name] = Statement(name, sql.format(**names), cardinality)
+
+    def __getitem__(self, name: str) -> Statement:
+        return self.statements[name]
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def cursor(self, connection, statement: Statement):
+        cursor = connection.cursor()
+        prefetchrows, arraysize = fetch_tuning(statement.cardinality, self.batch_size)
+        # prefetchrows solo existe en python-oracledb; sqlite3 usa arraysize en fetchmany
+        if hasattr(cursor, "prefetchrows"):
+            cursor.prefetchrows = prefetchrows
+        cursor.arraysize = arraysize
+        return cursor
+
+    @contextmanager
+    def _timed(self, name: str, rows: List[int]):
+        # Dentro de un request trazado cada sentencia es además un span hoja
+        start_ns = time.time_ns() if tracing_active() else None
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.timings.record(name, time.perf_counter() - start, rows[0] if rows else 0)
+            if start_ns is not None:
+                record_span(f"db.{name}", start_ns, error=error, rows=rows[0] if rows else 0)
+
+    def commit(self, connection):
+        start_ns = time.time_ns() if tracing_active() else None
+        connection.commit()
+        if start_ns is not None:
+            record_span("db.commit", start_ns)
+
+    # ------------------------------------------
+    # Ejecución
+    # ------------------------------------------
+
+    def fetch_one(self, connection, name: str, params: Sequence = ()):
+        statement = self[name]
+        rows = []
+        with self._timed(name, rows):
+            cursor = self.cursor(connection, statement)
+            cursor.execute(statement.sql, params)
+            row = cursor.fetchone()
+            rows.append(int(row is not None))
+        return row
+
+    def fetch_all(self, connection, name: str, params: Sequence = ()) -> list:
+        statement = self[name]
+        rows = []
+        with self._timed(name, rows):
+            cursor = self.cursor(connection, statement)
+            cursor.execute(statement.sql, params)
+            result = cursor.fetchall()
+            rows.append(len(result))
+        return result
+
+    def iterate(self, connection, name: str, params: Sequence = (), batch_size: Optional[int] = None) -> Iterator[list]:
+        """
+        Recorre el resultado con fetchmany en lotes de ``batch_size`` (cursor del
+        lado del servidor): en memoria solo hay un lote a la vez, sea cual sea el
+        total. El tiempo se registra al agotar o cerrar el iterador.
+        """
+        statement = self[name]
+        size = batch_size or self.batch_size
+        rows = [0]
+        with self._timed(name, rows):
+            cursor = self.cursor(connection, statement)
+            if hasattr(cursor, "prefetchrows"):
+                cursor.prefetchrows = size
+            cursor.arraysize = size
+            cursor.execute(statement.sql, params)
+            try:
+                while True:
+                    batch = cursor.fetchmany(size)
+                    if not batch:
+                        break
+                    rows[0] += len(batch)
+                    yield batch
+            finally:
+                cursor.close()
+
+    def fetch_column(self, connection, name: str, params: Sequence = ()) -> list:
+        return [row[0] for row in self.fetch_all(connection, name, params)]
+
+    def execute(self, connection, name: str, params: Sequence = (), input_sizes: Sequence = None) -> int:
+        """Ejecuta DML; devuelve las filas afectadas"""
+        statement = self[name]
+        rows = []
+        with self._timed(name, rows):
+            cursor = self.cursor(connection, statement)
+            if input_sizes:
+                cursor.setinputsizes(*input_sizes)
+            cursor.execute(statement.sql, params)
+            rows.append(max(cursor.rowcount, 0))
+        return rows[0]
+
+    def execute_many(self, connection, name: str, params: Iterable[Sequence], input_sizes: Sequence = None) -> int:
+        statement = self[name]
+        params = list(params)
+        rows = []
+        with self._timed(name, rows):
+            cursor = self.cursor(connection, statement)
+            if input_sizes:
+                cursor.setinputsizes(*input_sizes)
+            cursor.executemany(statement.sql, params)
+            # Filas afectadas (un UPDATE puede no encontrar la fila); sin dato, las enviadas
+            rows.append(cursor.rowcount if cursor.rowcount >= 0 else len(params))
+        return rows[0]
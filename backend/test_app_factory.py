@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test del app factory
+Verifica que importar main.py no toca Oracle, Firebase ni la configuración
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config import Settings
+
+
+def offline_settings(**overrides) -> Settings:
+    credentials_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+    credentials_file.close()
+    values = dict(
+        oracle_user="test",
+        oracle_password="test",
+        server_key="test",
+        firebase_credentials_path=credentials_file.name,
+        startup_warmup=False,
+        log_file="",
+    )
+    values.update(overrides)
+    return Settings(**values)
+
+
+def test_import_has_no_side_effects():
+    """Importar main no inicializa Oracle ni Firebase ni exige variables de entorno"""
+    probe = (
+        "import sys, logging; import main; "
+        "assert 'firebase_admin' not in sys.modules; "
+        "assert 'oracledb' not in sys.modules; "
+        "assert not logging.getLogger().handlers"
+    )
+    env = {"PATH": "", "ORACLE_USER": "", "SERVER_KEY": ""}
+    subprocess.run([sys.executable, "-c", probe], env=env, cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+
+def test_startup_validates_configuration():
+    """La validación de variables críticas ocurre al arrancar, no al importar"""
+    from main import create_app
+
+    app = create_app(offline_settings(oracle_user=""))
+    with pytest.raises(ValueError, match="ORACLE_USER"):
+        with TestClient(app):
+            pass
+
+
+def test_first_request_without_warmup():
+    """Con el warm-up desactivado la app responde sin recursos externos"""
+    from main import create_app
+
+    app = create_app(offline_settings())
+    with TestClient(app) as client:
+        response = client.get("/")
+
+    assert response.status_code == 200
+    assert response.json()["message"] == "Push Notifications API"
+    assert app.state.ctx.repository is None
+    assert app.state.ctx.push_transport is None
+
+
+def test_warmup_runs_database_and_firebase_in_parallel(monkeypatch):
+    """El warm-up inicializa el storage y el push transport en paralelo"""
+    import threading
+
+    from main import create_app
+
+    app = create_app(offline_settings(startup_warmup=True))
+    ctx = app.state.ctx
+    barrier = threading.Barrier(2, timeout=5)
+    calls = []
+
+    def fake_warm_repository():
+        barrier.wait()
+        calls.append("storage")
+
+    def fake_warm_push_transport():
+        barrier.wait()
+        calls.append("firebase")
+
+    monkeypatch.setattr(ctx, "warm_repository", fake_warm_repository)
+    monkeypatch.setattr(ctx, "warm_push_transport", fake_warm_push_transport)
+
+    with TestClient(app):
+        pass
+
+    assert sorted(calls) == ["firebase", "storage"]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test del broadcast particionado
+Verifica el reparto de devices por MOD(id, N), la deduplicación de tokens y el envío con procesos worker
+"""
+
+import sqlite3
+
+from storage.repository import TableNames
+from storage.sqlite_repository import SQLiteRepository
+
+
+def register_devices(repository, devices):
+    for user_id, device_id, token in devices:
+        repository.upsert_device(user_id, device_id, token, None, None, None)
+
+
+def test_partitions_cover_devices_once(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "devices.db"), TableNames("", "np_"))
+    for name in ("ana", "luis", "eva"):
+        repository.create_user(name, f"{name}@example.com", "hash")
+    # tok-shared está en dos usuarios: solo lo emite el device de menor id
+    register_devices(repository, [(1, "a1", "tok-a1"), (1, "a2", "tok-shared"), (2, "l1", "tok-shared"),
+                                  (2, "l2", "tok-l2"), (3, "e1", "tok-e1"), (3, "e2", "tok-e2"),
+                                  (3, "e3", "tok-e3")])
+
+    partitions = [[row for batch in repository.iter_broadcast_tokens(k, 3, batch_size=2) for row in batch]
+                  for k in range(3)]
+    repository.close()
+
+    tokens = [token for rows in partitions for _, token in rows]
+    assert sorted(tokens) == ["tok-a1", "tok-e1", "tok-e2", "tok-e3", "tok-l2", "tok-shared"]
+    assert (1, "tok-shared") in partitions[2]
+    assert all(partitions)
+
+
+def test_broadcast_across_worker_processes(api, login, tmp_path):
+    with api(broadcast_workers=2, broadcast_batch_size=2) as (client, ctx):
+        headers = login(client)
+        empty = client.post("/send-push-notification", headers=headers, json={"title": "Hola", "body": "a todos"})
+        register_devices(ctx.get_repository(),
+                         [(1, f"d{i}", f"tok-{i}") for i in range(5)] + [(1, "d5", "tok-0")])
+        response = client.post("/send-push-notification", headers=headers, json={"title": "Hola", "body": "a todos"})
+
+    assert empty.status_code == 404
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["success_count"], body["failure_count"], body["tokens_used"]) == (5, 0, 5)
+    assert body["partitions"] == 2
+
+    # Cada worker escribe el push log de sus lotes; ningún token se envía dos veces
+    with sqlite3.connect(str(tmp_path / "api.db")) as connection:
+        rows = connection.execute("SELECT user_id, status FROM np_push_notification_log").fetchall()
+    assert rows == [(1, "sent")] * 5
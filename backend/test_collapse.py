@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test de collapse_key
+Verifica que una ráfaga con la misma clave se envía una sola vez (la última)
+"""
+
+import time
+from contextlib import contextmanager
+
+from services.push_transport import HIGH, FirebaseTransport, PushMessage
+
+
+@contextmanager
+def collapse_api(api, login, **overrides):
+    with api(**{"push_collapse_window_ms": 1000, **overrides}) as (client, ctx):
+        headers = {}
+        for name in ("ana", "bob"):
+            headers = login(client, name, [f"{name}-phone"])
+        yield client, headers, ctx
+
+
+def push(client, headers, title, **fields):
+    return client.post("/send-push-notification", headers=headers, json={"title": title, "body": "b", **fields})
+
+
+def test_burst_with_same_key_sends_only_latest(api, login):
+    with collapse_api(api, login) as (client, headers, ctx):
+        responses = [push(client, headers, f"Marcador {i}", user_id=1, collapse_key="score") for i in range(5)]
+        other_user = push(client, headers, "Marcador bob", username="bob", collapse_key="score")
+        time.sleep(1.2)
+        sent = list(ctx.push_transport.sent)
+        stats = dict(ctx.push_coalescer.stats)
+
+    assert [r.json()["status"] for r in responses] == ["held"] + ["collapsed"] * 4
+    assert responses[0].json()["message"] == "Push notification queued"
+    assert other_user.json()["status"] == "held"
+
+    assert sorted((token, message.title) for token, message in sent) == [
+        ("ana-phone", "Marcador 4"), ("bob-phone", "Marcador bob"),
+    ]
+    assert all(message.collapse_key == "score" for _, message in sent)
+    assert stats == {"held": 2, "collapsed": 4, "sent": 2, "failed": 0}
+
+
+def test_collapse_is_per_resolved_user(api, login):
+    with collapse_api(api, login) as (client, headers, ctx):
+        single = push(client, headers, "Solo ana", user_id=1, collapse_key="score")
+        both = push(client, headers, "Ambos", user_ids=[1, 2], collapse_key="score")
+        by_name = push(client, headers, "Ana por nombre", username="ana", usernames=["nadie"], collapse_key="score")
+        time.sleep(1.2)
+        sent = list(ctx.push_transport.sent)
+        stats = dict(ctx.push_coalescer.stats)
+
+    assert single.json()["status"] == "held"
+    assert both.json()["status"] == "held"
+    assert [(r["user_id"], r["status"]) for r in both.json()["recipients"]] == [(1, "collapsed"), (2, "held")]
+    assert by_name.json()["status"] == "collapsed"
+    assert by_name.json()["recipients"][1] == {"username": "nadie", "status": "not_found"}
+
+    # Un solo envío por usuario en la ventana: el último que lo incluyó
+    assert sorted((token, message.title) for token, message in sent) == [
+        ("ana-phone", "Ana por nombre"), ("bob-phone", "Ambos"),
+    ]
+    assert stats == {"held": 2, "collapsed": 2, "sent": 2, "failed": 0}
+
+
+def test_without_window_or_key_pushes_are_sent_immediately(api, login):
+    with collapse_api(api, login, push_collapse_window_ms=0) as (client, headers, ctx):
+        keyed = push(client, headers, "Uno", user_id=1, collapse_key="score")
+        plain = push(client, headers, "Dos", user_id=1)
+        sent = [message.collapse_key for _, message in ctx.push_transport.sent]
+
+    assert keyed.json()["success_count"] == 1 and plain.json()["success_count"] == 1
+    assert sent == ["score", None]
+
+
+def test_held_push_is_flushed_on_shutdown(api, login):
+    with collapse_api(api, login, push_collapse_window_ms=300) as (client, headers, ctx):
+        push(client, headers, "Final", user_id=2, collapse_key="score")
+        assert ctx.push_transport.sent == []
+
+    assert [(token, message.title) for token, message in ctx.push_transport.sent] == [("bob-phone", "Final")]
+
+
+def test_collapse_key_maps_to_fcm_and_apns_fields():
+    transport = FirebaseTransport("unused.json")
+    keyed = transport.build_message("token", PushMessage("t", "b", priority=HIGH, collapse_key="score"))
+    plain = transport.build_message("token", PushMessage("t", "b"))
+
+    assert keyed.android.collapse_key == "score"
+    assert keyed.android.notification.tag == "score"
+    assert keyed.apns.headers == {"apns-priority": "10", "apns-collapse-id": "score"}
+    assert plain.android.collapse_key is None and plain.android.notification is None
+    assert "apns-collapse-id" not in plain.apns.headers
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test de registro de devices
+Verifica el upsert en una sola sentencia con metadatos y el endpoint de sync por lotes
+"""
+
+from storage.repository import DeviceInfo, TableNames
+from storage.sqlite_repository import SQLiteRepository
+
+
+def device_rows(repository, user_id):
+    with repository.connection() as connection:
+        return connection.execute(
+            f"SELECT device_id, fcm_token, device_name, os_version, app_version, last_used_at "
+            f"FROM {repository.tables.devices} WHERE user_id = ? ORDER BY device_id", (user_id,)
+        ).fetchall()
+
+
+def test_upsert_records_metadata_and_keeps_it_when_omitted(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "push.db"), TableNames("", "np_"))
+    repository.create_user("ana", "ana@example.com", "hash")
+    user_id = repository.get_user_id("ana")
+
+    repository.upsert_device(user_id, "phone", "token-1", "Pixel 8", "Android 14", "1.0.0")
+    repository.upsert_device(user_id, "phone", "token-2", app_version="1.1.0")
+
+    [(device_id, token, name, os_version, app_version, last_used_at)] = device_rows(repository, user_id)
+    assert (device_id, token, name, os_version, app_version) == ("phone", "token-2", "Pixel 8", "Android 14", "1.1.0")
+    assert last_used_at is not None
+    assert repository.statement_timings()["upsert_device"]["calls"] == 2
+    repository.close()
+
+
+def test_upsert_devices_is_one_executemany(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "push.db"), TableNames("", "np_"))
+    repository.create_user("ana", "ana@example.com", "hash")
+    user_id = repository.get_user_id("ana")
+
+    devices = [DeviceInfo(user_id, f"d{i}", f"token-{i}", os_version="iOS 17") for i in range(50)]
+    assert repository.upsert_devices(devices) == 50
+    assert repository.upsert_devices([]) == 0
+
+    timings = repository.statement_timings()["upsert_device"]
+    assert (timings["calls"], timings["rows"]) == (1, 50)
+    assert len(repository.get_tokens_by_user_ids([user_id])) == 50
+    repository.close()
+
+
+def test_register_devices_endpoint(api, login):
+    with api(max_device_batch=3) as (client, ctx):
+        headers = login(client)
+
+        single = client.post("/register-device", headers=headers, json={
+            "device_id": "tablet", "fcm_token": "t-0", "device_name": "iPad", "app_version": "2.0.0",
+        })
+        batch = client.post("/register-devices", headers=headers, json={"devices": [
+            {"device_id": "phone", "fcm_token": "p-1"},
+            {"device_id": "tablet", "fcm_token": "t-1", "os_version": "iPadOS 17"},
+            {"device_id": "phone", "fcm_token": "p-2", "device_name": "iPhone"},
+        ]})
+        too_many = client.post("/register-devices", headers=headers, json={"devices": [
+            {"device_id": f"d{i}", "fcm_token": f"x-{i}"} for i in range(4)
+        ]})
+        too_long = client.post("/register-device", headers=headers, json={
+            "device_id": "watch", "fcm_token": "w", "app_version": "x" * 21,
+        })
+        rows = device_rows(ctx.get_repository(), 1)
+
+    assert single.status_code == 200
+    assert batch.json() == {"message": "Devices registered successfully", "count": 2}
+    assert too_many.status_code == 400 and "max 3" in too_many.json()["detail"]
+    assert too_long.status_code == 422
+    assert [row[:5] for row in rows] == [
+        ("phone", "p-2", "iPhone", None, None),
+        ("tablet", "t-1", "iPad", "iPadOS 17", "2.0.0"),
+    ]
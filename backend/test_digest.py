@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test del modo digest
+Verifica que varias notificaciones internas terminan en un solo push y que se respeta el horario silencioso
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from services.digest import DigestScheduler, quiet_until
+from services.push_transport import FakeFCMTransport
+from storage.repository import DigestSettings
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def epoch(hour, minute=0, tz="UTC"):
+    return datetime(2024, 3, 5, hour, minute, tzinfo=ZoneInfo(tz)).timestamp()
+
+
+def test_quiet_until_same_day_and_overnight():
+    lunch = DigestSettings(1, quiet_start="13:00", quiet_end="15:00")
+    night = DigestSettings(1, quiet_start="22:00", quiet_end="07:00", timezone="America/Argentina/Buenos_Aires")
+
+    assert quiet_until(epoch(14), lunch) == epoch(15)
+    assert quiet_until(epoch(16), lunch) is None
+    # 23:30 en Buenos Aires: se pospone a las 07:00 del día siguiente
+    late = quiet_until(epoch(23, 30, night.timezone), night)
+    assert datetime.fromtimestamp(late, tz=ZoneInfo(night.timezone)).strftime("%d %H:%M") == "06 07:00"
+    assert quiet_until(epoch(6, 0, night.timezone), night) == epoch(7, 0, night.timezone)
+    assert quiet_until(epoch(12, 0, night.timezone), night) is None
+    assert quiet_until(epoch(3), DigestSettings(1)) is None
+
+
+def test_scheduler_groups_per_user_and_postpones_quiet_hours():
+    clock = FakeClock(epoch(10))
+    scheduler = DigestScheduler(clock=clock)
+    ana = DigestSettings(1, push_enabled=True, window_seconds=60)
+    beto = DigestSettings(2, push_enabled=True, window_seconds=60, quiet_start="10:00", quiet_end="12:00")
+
+    async def queue():
+        # add() arranca el timer en el event loop actual
+        for i in range(5):
+            scheduler.add(ana, f"Aviso {i}", "texto")
+        scheduler.add(beto, "Solo uno", "detalle")
+        await scheduler.stop()
+
+    asyncio.run(queue())
+
+    assert scheduler.pop_due(clock.now + 59) == []
+    [digest] = scheduler.pop_due(clock.now + 60)
+    assert digest.user_id == 1 and digest.count == 5
+    assert digest.summary() == ("Tenés 5 notificaciones nuevas", "Aviso 4 · Aviso 3 · Aviso 2 y 2 más")
+
+    # Beto está en horario silencioso: sale al terminar, con la notificación tal cual
+    assert scheduler.next_due() == epoch(12)
+    [quiet] = scheduler.pop_due(epoch(12))
+    assert quiet.quiet and quiet.summary() == ("Solo uno", "detalle")
+    assert scheduler.stats == {"queued": 6, "digests": 2, "pushes_saved": 4}
+
+
+def test_internal_notifications_become_one_digest_push(api, login):
+    transport = FakeFCMTransport(record=True)
+
+    with api(transport=transport) as (client, ctx):
+        headers = login(client, tokens=["tok-1"])
+
+        default = client.get("/notification-settings", headers=headers).json()
+        invalid = client.put("/notification-settings", headers=headers,
+                             json={"push_enabled": True, "quiet_hours_start": "25:00", "timezone": "Mars/Base"})
+        updated = client.put("/notification-settings", headers=headers,
+                             json={"push_enabled": True, "digest_window_seconds": 1})
+        sends = [client.post("/send-internal-notification", headers=headers,
+                             json={"title": f"Aviso {i}", "message": "texto", "user_id": 1}).json()
+                 for i in range(3)]
+        time.sleep(1.3)
+        stored = client.get("/notification-settings", headers=headers).json()
+
+    assert default["push_enabled"] is False and default["timezone"] == "UTC"
+    assert invalid.status_code == 422
+    assert updated.status_code == 200
+    assert stored["push_enabled"] is True and stored["digest_window_seconds"] == 1
+    assert [send["push_queued"] for send in sends] == [1, 1, 1]
+    assert len(transport.sent) == 1
+    sent_token, message = transport.sent[0]
+    assert sent_token == "tok-1"
+    assert message.title == "Tenés 3 notificaciones nuevas"
+    assert message.data["count"] == "3"
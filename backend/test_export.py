@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test del export de historial
+Verifica el cursor por lotes, los filtros y la respuesta en streaming NDJSON/CSV
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+
+from export_history import export, parse_args
+from storage.repository import HistoryFilter, PushLogEntry, TableNames
+from storage.sqlite_repository import SQLiteRepository
+
+
+def test_iter_history_streams_batches_and_releases_connection(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "export.db"), TableNames("", "np_"))
+    repository.create_user("ana", "ana@example.com", "hash")
+    repository.create_user("beto", "beto@example.com", "hash")
+    repository.record_push_log(
+        [PushLogEntry("t", f"b{i}", user_id=1 + i % 2, status="failed" if i % 5 == 0 else "sent") for i in range(25)]
+    )
+
+    batches = list(repository.iter_history("pushes", HistoryFilter(), batch_size=10))
+    mine = [row for batch in repository.iter_history("pushes", HistoryFilter(user_id=1, status="sent"), 10)
+            for row in batch]
+    future = list(repository.iter_history("pushes", HistoryFilter(since=datetime(2999, 1, 1)), 10))
+    timings = repository.statement_timings()
+    open_connections = len(repository._connections)
+    repository.close()
+
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [row[0] for batch in batches for row in batch] == list(range(1, 26))
+    assert len(mine) == 10 and {row[1] for row in mine} == {1} and {row[5] for row in mine} == {"sent"}
+    assert future == []
+    assert timings["export_pushes"]["rows"] == 25
+    assert timings["export_pushes_by_user"]["calls"] == 1
+    # Solo queda la conexión por thread; las del export se cerraron
+    assert open_connections == 1
+
+
+def test_cli_writes_csv(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "cli.db"), TableNames("", "np_"))
+    repository.create_user("ana", "ana@example.com", "hash")
+    repository.create_internal_notifications([1, 1], "Hola", "texto, con coma")
+    repository.mark_notification_read(1, 1)
+    output = io.BytesIO()
+
+    export(repository, parse_args(["notifications", "--format", "csv", "--status", "unread"]), output, 1)
+    repository.close()
+
+    rows = list(csv.reader(io.StringIO(output.getvalue().decode())))
+    assert rows[0][:4] == ["id", "user_id", "title", "message"]
+    assert len(rows) == 2 and rows[1][0] == "2" and rows[1][3] == "texto, con coma"
+
+
+def test_export_endpoint_streams_own_history(api, login):
+    with api(admin_usernames="admin", export_fetch_size=2) as (client, ctx):
+        tokens = {username: login(client, username) for username in ("ana", "admin")}
+        for i in range(3):
+            client.post("/send-internal-notification", headers=tokens["admin"],
+                        json={"title": f"Aviso {i}", "message": "texto", "user_id": 1})
+        client.post("/send-internal-notification", headers=tokens["admin"],
+                    json={"title": "Para admin", "message": "texto", "user_id": 2})
+
+        own = client.get("/export/notifications", headers=tokens["ana"])
+        other = client.get("/export/notifications", params={"user_id": 2}, headers=tokens["ana"])
+        everyone = client.get("/export/notifications", params={"format": "csv"}, headers=tokens["admin"])
+        invalid = client.get("/export/pushes", params={"status": "unread"}, headers=tokens["ana"])
+        empty = client.get("/export/pushes", headers=tokens["ana"])
+
+    lines = [json.loads(line) for line in own.text.splitlines()]
+    assert own.headers["content-type"] == "application/x-ndjson"
+    assert [line["title"] for line in lines] == ["Aviso 0", "Aviso 1", "Aviso 2"]
+    assert {line["user_id"] for line in lines} == {1}
+    datetime.fromisoformat(lines[0]["created_at"])
+    assert other.status_code == 403
+    assert everyone.headers["content-type"].startswith("text/csv")
+    assert len(everyone.text.splitlines()) == 5
+    assert invalid.status_code == 400
+    assert empty.status_code == 200 and empty.text == ""
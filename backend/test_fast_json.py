@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Test del camino rápido de JSON
+Verifica la serialización con orjson, el conteo de no leídos y la compresión gzip
+"""
+
+import json
+from contextlib import contextmanager
+from datetime import datetime
+
+from services.responses import FastJSONResponse, dumps
+
+
+def test_dumps_matches_stdlib_output():
+    created_at = datetime(2025, 7, 23, 10, 30, 0, 123456)
+    content = {"id": 1, "title": "Notificación", "is_read": False, "created_at": created_at}
+
+    assert json.loads(dumps(content)) == {**content, "created_at": created_at.isoformat()}
+    assert "Notificación".encode("utf-8") in FastJSONResponse(content).body
+
+
+@contextmanager
+def inbox_client(api, notifications: int):
+    from benchmarks.standins import seed
+
+    with api(gzip_minimum_size=1024) as (client, ctx):
+        seed(ctx.get_repository(), users=0, devices_per_user=0, notifications_per_user=notifications)
+        token = client.post("/login", json={"username": "admin", "password": "admin123"}).json()["access_token"]
+        yield client, {"Authorization": f"Bearer {token}"}
+
+
+def test_inbox_counts_unread_in_one_pass(api):
+    with inbox_client(api, notifications=6) as (client, headers):
+        body = client.get("/internal-notifications", headers=headers).json()
+
+    assert len(body["notifications"]) == 6
+    # seed marca como leídas las notificaciones n % 3 == 0
+    assert body["unread_count"] == 4
+    assert body["unread_count"] == sum(not n["is_read"] for n in body["notifications"])
+    first = body["notifications"][0]
+    assert set(first) == {"id", "title", "message", "is_read", "created_at"}
+    datetime.fromisoformat(first["created_at"])
+
+
+def test_large_pages_are_gzipped_when_accepted(api):
+    with inbox_client(api, notifications=200) as (client, headers):
+        gzipped = client.get("/internal-notifications", headers={**headers, "Accept-Encoding": "gzip"})
+        plain = client.get("/internal-notifications", headers={**headers, "Accept-Encoding": "identity"})
+        small = client.get("/", headers={"Accept-Encoding": "gzip"})
+
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert int(gzipped.headers["content-length"]) < int(plain.headers["content-length"]) / 5
+    assert gzipped.json() == plain.json()
+    assert "content-encoding" not in plain.headers
+    assert "content-encoding" not in small.headers
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test del transport FCM HTTP v1 async
+Verifica el body codificado una vez, el cache del access token, el mapeo de errores y el fan-out sin threads
+"""
+
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+
+from services.push_transport import (
+    HIGH, INVALID_ARGUMENT, QUOTA_EXCEEDED, UNAVAILABLE, UNREGISTERED, AccessTokenCache, FCMHttpTransport,
+    PushError, PushMessage,
+)
+
+
+class StubGoogle:
+    """Responde messages:send y cuenta los access tokens emitidos"""
+
+    def __init__(self, errors=None):
+        self.errors = dict(errors or {})
+        self.requests = []
+        self.fetches = 0
+        self.threads = set()
+
+    def fetch(self):
+        self.fetches += 1
+        return f"access-{self.fetches}", 4102444800.0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.threads.add(threading.get_ident())
+        body = json.loads(request.content)
+        self.requests.append((request, body))
+        token = body["message"]["token"]
+        if request.headers["authorization"] == "Bearer access-1" and token == "expired":
+            return httpx.Response(401, json={"error": {"code": 401, "status": "UNAUTHENTICATED"}})
+        if token in self.errors:
+            return self.errors[token]
+        return httpx.Response(200, json={"name": f"projects/demo/messages/{len(self.requests)}"})
+
+    def transport(self, **kwargs) -> FCMHttpTransport:
+        return FCMHttpTransport("unused.json", token_source=("demo", self.fetch),
+                                http_transport=httpx.MockTransport(self.handler), **kwargs)
+
+
+def test_access_token_cache_refreshes_before_expiry():
+    now = [1000.0]
+    issued = []
+
+    def fetch():
+        issued.append(now[0])
+        return f"token-{len(issued)}", now[0] + 3600
+
+    cache = AccessTokenCache(fetch, margin=300, clock=lambda: now[0])
+    assert cache.current() is None
+    assert cache.get() == cache.get() == "token-1"
+    now[0] += 3299
+    assert cache.current() == "token-1"
+    now[0] += 2
+    assert cache.get() == "token-2"
+    cache.invalidate("token-1")
+    assert cache.current() == "token-2"
+    cache.invalidate("token-2")
+    assert cache.get() == "token-3" and len(issued) == 3
+
+
+def test_send_async_encodes_prepared_body_and_maps_errors():
+    google = StubGoogle(errors={
+        "gone": httpx.Response(404, json={"error": {"code": 404, "status": "NOT_FOUND", "message": "not found",
+                                                    "details": [{"@type": "type.googleapis.com/google.firebase"
+                                                                 ".fcm.v1.FcmError", "errorCode": "UNREGISTERED"}]}}),
+        "bad": httpx.Response(400, json={"error": {"code": 400, "status": "INVALID_ARGUMENT"}}),
+        "slow": httpx.Response(429, text="Too Many Requests"),
+        "down": httpx.Response(503, text="<html>"),
+    })
+    transport = google.transport()
+    message = transport.prepare(PushMessage("Gol", "Árbitro \"VAR\"", {"type": "score"}, HIGH, "score"))
+
+    async def scenario():
+        results = {}
+        for token in ("tok-1", "expired", "gone", "bad", "slow", "down"):
+            try:
+                results[token] = await transport.send_async(token, message)
+            except PushError as e:
+                results[token] = e.code
+        await transport.close()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert results == {"tok-1": "projects/demo/messages/1", "expired": "projects/demo/messages/3",
+                       "gone": UNREGISTERED, "bad": INVALID_ARGUMENT, "slow": QUOTA_EXCEEDED, "down": UNAVAILABLE}
+    request, body = google.requests[0]
+    assert str(request.url) == "https://fcm.googleapis.com/v1/projects/demo/messages:send"
+    assert body == {"message": {
+        "token": "tok-1",
+        "notification": {"title": "Gol", "body": "Árbitro \"VAR\""},
+        "data": {"type": "score"},
+        "android": {"priority": "high", "collapse_key": "score", "notification": {"tag": "score"}},
+        "apns": {"headers": {"apns-priority": "10", "apns-collapse-id": "score"}},
+    }}
+    # Un solo token hasta el 401; después uno nuevo que se reutiliza
+    assert google.fetches == 2
+    assert {r.headers["authorization"] for r, _ in google.requests[2:]} == {"Bearer access-2"}
+    assert transport.stats == {"sent": 2, "errors": 4, "auth_retries": 1}
+
+
+def test_push_fanout_runs_on_event_loop(api, login):
+    google = StubGoogle(errors={"tok-3": httpx.Response(404, json={"error": {
+        "status": "NOT_FOUND", "details": [{"errorCode": "UNREGISTERED"}]}})})
+
+    with api(transport=google.transport()) as (client, ctx):
+        headers = login(client, tokens=["tok-1", "tok-2", "tok-3"])
+        response = client.post("/send-push-notification", headers=headers,
+                               json={"title": "t", "body": "b", "user_id": 1}).json()
+        loop_thread = client.portal.call(threading.get_ident)
+
+    assert response["success_count"] == 2 and response["failure_count"] == 1
+    assert "UNREGISTERED" in response["errors"][0]
+    # Todos los envíos corrieron en el thread del event loop, ninguno en el threadpool
+    assert google.threads == {loop_thread}
+    assert ctx.push_scheduler.stats["normal"] == 3
+    assert ctx.push_transport._client is None
+
+
+def test_sync_send_for_scripts():
+    transport = StubGoogle().transport()
+    assert transport.send("tok-1", PushMessage("t", "b")) == "projects/demo/messages/1"
+    with pytest.raises(PushError):
+        StubGoogle(errors={"x": httpx.Response(500)}).transport().send("x", PushMessage("t", "b"))
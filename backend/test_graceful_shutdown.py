@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test de apagado ordenado
+Verifica que un shutdown a mitad de broadcast no pierde push notifications
+"""
+
+import asyncio
+import threading
+import time
+
+from services.fanout import fan_out
+from services.lifecycle import LifecycleManager, ShutdownInProgress
+
+
+class RecordingSender:
+    """Sender FCM falso que registra cada token enviado"""
+
+    def __init__(self, delay: float = 0.002):
+        self.delay = delay
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def __call__(self, token: str) -> str:
+        time.sleep(self.delay)
+        with self._lock:
+            self.sent.append(token)
+        return f"projects/test/messages/{token}"
+
+
+def test_shutdown_mid_broadcast_delivers_every_push():
+    """Un shutdown a mitad de un broadcast espera a que se envíen todos los tokens"""
+    tokens = [f"token-{i}" for i in range(300)]
+    sender = RecordingSender()
+    events = []
+
+    async def scenario():
+        lifecycle = LifecycleManager()
+        lifecycle.add_drain_hook("oracle_pool", lambda: events.append(("pool_closed", len(sender.sent))))
+
+        task = lifecycle.spawn(fan_out(tokens, sender, concurrency=8))
+
+        # Esperar a que el broadcast esté en curso
+        while len(sender.sent) < 20:
+            await asyncio.sleep(0.001)
+        assert len(sender.sent) < len(tokens)
+
+        summary = await lifecycle.shutdown(timeout=30)
+        return summary, task.result()
+
+    summary, result = asyncio.run(scenario())
+
+    assert sorted(sender.sent) == sorted(tokens)
+    assert result.success_count == len(tokens)
+    assert result.failure_count == 0
+    assert summary == {"drained": 1, "abandoned": 0}
+    # El pool se cierra solo después de terminar el fan-out
+    assert events == [("pool_closed", len(tokens))]
+
+
+def test_new_work_rejected_after_shutdown():
+    """Después de iniciar el apagado no se aceptan fan-outs nuevos"""
+
+    async def scenario():
+        lifecycle = LifecycleManager()
+        await lifecycle.shutdown(timeout=1)
+        assert not lifecycle.accepting
+        try:
+            lifecycle.spawn(fan_out(["token"], RecordingSender()))
+        except ShutdownInProgress:
+            return True
+        return False
+
+    assert asyncio.run(scenario())
+
+
+def test_drain_hooks_run_in_order_and_survive_failures():
+    """Un hook que falla no impide que se ejecuten los siguientes"""
+    calls = []
+
+    async def flush_queue():
+        calls.append("queue")
+
+    def broken_hook():
+        raise RuntimeError("boom")
+
+    async def scenario():
+        lifecycle = LifecycleManager()
+        lifecycle.add_drain_hook("queue", flush_queue)
+        lifecycle.add_drain_hook("broken", broken_hook)
+        lifecycle.add_drain_hook("log_buffers", lambda: calls.append("logs"))
+        await lifecycle.shutdown(timeout=1)
+
+    asyncio.run(scenario())
+    assert calls == ["queue", "logs"]
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test de health checks y circuit breakers
+Verifica que /health sirve el resultado cacheado y que las dependencias caídas fallan rápido
+"""
+
+import functools
+
+import pytest
+
+from services.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from services.push_transport import UNAVAILABLE, UNREGISTERED, FakeFCMTransport, PushError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker("oracle", failure_threshold=3, reset_timeout=30, clock=clock)
+
+    def down():
+        raise PushError(UNAVAILABLE)
+
+    for _ in range(3):
+        with pytest.raises(PushError):
+            breaker.call(down)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.call(lambda: "never called")
+    assert error.value.retry_after == 30
+    assert breaker.snapshot()["rejected"] == 1
+
+    clock.now += 30
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(PushError):
+        breaker.call(down)
+    assert breaker.state == OPEN
+
+    clock.now += 30
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_breaker_ignores_errors_that_are_not_outages():
+    breaker = CircuitBreaker("fcm", failure_threshold=1)
+
+    def unregistered():
+        raise PushError(UNREGISTERED)
+
+    with pytest.raises(PushError):
+        breaker.call(unregistered, is_failure=lambda e: e.code == UNAVAILABLE)
+    assert breaker.state == CLOSED
+
+
+@pytest.fixture
+def health_api(api):
+    """Probe en segundo plano cada 60 s: los tests ven el resultado del probe de arranque"""
+    return functools.partial(api, health_probe_interval=60, circuit_failure_threshold=3)
+
+
+def test_health_is_served_from_the_background_probe(health_api):
+    with health_api() as (client, ctx):
+        responses = [client.get("/health").json() for _ in range(20)]
+        pings = ctx.get_repository().statement_timings()["ping"]["calls"]
+
+    assert all(body["status"] == "healthy" for body in responses)
+    assert responses[0]["sqlite"]["status"] == "✅ Connected"
+    assert len({body["checked_at"] for body in responses}) == 1
+    assert responses[0]["circuit_breakers"]["storage"]["state"] == CLOSED
+    # El probe de arranque y, como mucho, uno en línea si el primer /health le ganó
+    assert pings <= 2
+
+
+def test_open_storage_circuit_returns_503(health_api, login):
+    with health_api() as (client, ctx):
+        headers = login(client)
+        for _ in range(3):
+            ctx.storage_breaker.record_failure()
+
+        inbox = client.get("/internal-notifications", headers=headers)
+        health = client.get("/health", headers=headers).json()
+
+    assert inbox.status_code == 503
+    assert inbox.json()["detail"] == "Database unavailable"
+    assert 0 < int(inbox.headers["Retry-After"]) <= 30
+    assert health["circuit_breakers"]["storage"]["state"] == OPEN
+
+
+def test_fcm_outage_opens_circuit_mid_fanout(health_api, login):
+    transport = FakeFCMTransport(error_rates={UNAVAILABLE: 1.0})
+    with health_api(transport=transport, push_concurrency=1) as (client, ctx):
+        headers = login(client, tokens=[f"ana-{i}" for i in range(10)])
+        first = client.post("/send-push-notification", headers=headers, json={"title": "t", "body": "b"})
+        second = client.post("/send-push-notification", headers=headers, json={"title": "t", "body": "b"})
+
+    assert first.json()["failure_count"] == 10
+    assert sum("circuit open" in error for error in first.json()["errors"]) == 7
+    # Solo los 3 primeros envíos llegan al transport
+    assert transport.stats["calls"] == 3
+    assert second.status_code == 503
+    assert second.json()["detail"] == "Push service unavailable"
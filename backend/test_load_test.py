@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Test del benchmark de carga
+Corre una pasada corta offline y verifica el formato del reporte
+"""
+
+from benchmarks.load_test import SCENARIOS, compare, load_collection, main
+
+
+def test_scenarios_exist_in_postman_collection():
+    """Cada escenario apunta a un request de la colección Postman"""
+    templates = load_collection()
+    for scenario in SCENARIOS:
+        assert scenario.request_name in templates
+
+
+def test_offline_run_reports_latency_and_errors(tmp_path, capsys):
+    """Una pasada offline corta reporta RPS, percentiles y errores por escenario"""
+    output = tmp_path / "report.json"
+    exit_code = main([
+        "--requests", "10", "--concurrency", "4", "--users", "3",
+        "--fcm-latency-ms", "0", "--save-baseline", str(output),
+    ])
+    assert exit_code == 0
+
+    import json
+    report = json.loads(output.read_text())
+    assert set(report["scenarios"]) == {s.name for s in SCENARIOS}
+    for name, scenario in report["scenarios"].items():
+        assert scenario["error_rate"] == 0.0, (name, scenario["status_codes"])
+        assert scenario["rps"] > 0
+        assert set(scenario["latency_ms"]) >= {"p50", "p95", "p99"}
+
+
+def test_compare_flags_regressions():
+    """Una caída de RPS mayor a la tolerancia se marca como regresión"""
+    def report(rps, p95, error_rate=0.0):
+        return {"scenarios": {"inbox_polling": {"rps": rps, "error_rate": error_rate, "latency_ms": {"p95": p95}}}}
+
+    result = compare(report(70, 10), report(100, 10), tolerance=20)
+    assert result["inbox_polling"]["regression"]
+    assert result["inbox_polling"]["rps_change_pct"] == -30.0
+
+    result = compare(report(95, 11), report(100, 10), tolerance=20)
+    assert not result["inbox_polling"]["regression"]
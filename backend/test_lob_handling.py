@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test del manejo de CLOB
+Verifica el binding VARCHAR2/CLOB según tamaño, el output type handler
+y el log de push notifications
+"""
+
+import json
+from types import SimpleNamespace
+
+import oracledb
+
+from services.push_transport import FakeFCMTransport
+from storage.oracle_repository import exceeds_varchar, lob_output_type_handler, text_input_sizes
+from storage.repository import PushLogEntry, TableNames
+from storage.sqlite_repository import SQLiteRepository
+
+
+def test_short_texts_bind_as_varchar_and_long_ones_as_clob():
+    short = [(1, "Hola", "m" * 100), (2, "Hola", "m" * 3000)]
+    assert text_input_sizes(short, (2,), 4000) is None
+    assert text_input_sizes([], (2,), 4000) is None
+
+    mixed = short + [(3, "Hola", "m" * 5000)]
+    assert text_input_sizes(mixed, (2,), 4000) == [None, None, oracledb.DB_TYPE_CLOB]
+    # Con MAX_STRING_SIZE=EXTENDED el mismo batch entra como VARCHAR2
+    assert text_input_sizes(mixed, (2,), 32767) is None
+
+
+def test_varchar_limit_counts_utf8_bytes():
+    assert not exceeds_varchar(None, 4000)
+    assert not exceeds_varchar("a" * 4000, 4000)
+    assert exceeds_varchar("a" * 4001, 4000)
+    # 2000 caracteres de 2 bytes caben justo; uno más ya no
+    assert not exceeds_varchar("é" * 2000, 4000)
+    assert exceeds_varchar("é" * 2001, 4000)
+
+
+def test_output_type_handler_fetches_lobs_inline():
+    class Cursor:
+        arraysize = 250
+
+        def var(self, db_type, arraysize):
+            return (db_type, arraysize)
+
+    def metadata(type_code):
+        return SimpleNamespace(type_code=type_code)
+
+    cursor = Cursor()
+    assert lob_output_type_handler(cursor, metadata(oracledb.DB_TYPE_CLOB)) == (oracledb.DB_TYPE_LONG, 250)
+    assert lob_output_type_handler(cursor, metadata(oracledb.DB_TYPE_BLOB)) == (oracledb.DB_TYPE_LONG_RAW, 250)
+    assert lob_output_type_handler(cursor, metadata(oracledb.DB_TYPE_VARCHAR)) is None
+
+
+def test_long_messages_round_trip(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "push.db"), TableNames("", "np_"))
+    repository.create_user("ana", "ana@example.com", "hash")
+    user_id = repository.get_user_id("ana")
+    message = "ñ" * 20000
+
+    repository.create_internal_notifications([user_id], "Largo", message)
+    assert repository.list_internal_notifications(user_id)[0][2] == message
+
+    entries = [
+        PushLogEntry(title="t" * 300, body=message, user_id=user_id, fcm_message_id="msg-1"),
+        PushLogEntry(title="Hola", body="corto", status="failed", error_message="x" * 600),
+        # VARCHAR2 en bytes: 255 "ñ" son 510 bytes y no deben partir un carácter
+        PushLogEntry(title="ñ" * 255, body="corto", status="failed", error_message="€" * 300),
+    ]
+    assert repository.record_push_log(entries) == 3
+    with repository.connection() as connection:
+        rows = connection.execute("SELECT title, body, status, error_message FROM np_push_notification_log").fetchall()
+    assert len(rows[0][0]) == 255 and rows[0][1] == message
+    assert rows[1][2] == "failed" and len(rows[1][3]) == 500
+    assert rows[2][0] == "ñ" * 127 and rows[2][3] == "€" * 166
+    assert PushLogEntry(title="ñ" * 255, body="", error_message="").as_row()[6] is None
+    repository.close()
+
+
+def test_push_send_writes_push_log(api, login):
+    with api(transport=FakeFCMTransport(error_rates={"UNREGISTERED": 1})) as (client, ctx):
+        headers = login(client, tokens=["fcm-" + "x" * 40])
+
+        response = client.post("/send-push-notification", json={"title": "Hola", "body": "Mundo", "user_id": 1},
+                               headers=headers)
+        assert response.json()["failure_count"] == 1
+
+        with ctx.get_repository().connection() as connection:
+            rows = connection.execute(
+                "SELECT user_id, status, response_data, error_message FROM np_push_notification_log"
+            ).fetchall()
+
+    assert len(rows) == 1
+    user_id, status, response_data, error_message = rows[0]
+    assert (user_id, status) == (1, "failed")
+    assert json.loads(response_data)["token"] == "fcm-" + "x" * 40
+    assert error_message
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test del payload compartido del push
+Verifica el cálculo de tamaño contra el límite de FCM, el recorte configurable y el template por envío
+"""
+
+import pytest
+
+from services.push_transport import (
+    HIGH, FirebaseTransport, PayloadTooLarge, PushMessage, fit_payload, payload_size,
+)
+
+DATA = {"click_action": "FLUTTER_NOTIFICATION_CLICK", "type": "push_notification"}
+
+
+def test_fit_payload_rejects_or_truncates():
+    small = PushMessage("Hola", "texto", DATA)
+    large = PushMessage("Título " * 20, "ñandú " * 1000, DATA)
+
+    assert fit_payload(small, 4096) is small
+    with pytest.raises(PayloadTooLarge) as error:
+        fit_payload(large, 4096)
+    assert error.value.size == payload_size(large.title, large.body, DATA) > 4096
+
+    fitted = fit_payload(large, 4096, truncate=True)
+    assert fitted.title == large.title
+    assert fitted.body.endswith("…") and large.body.startswith(fitted.body[:-1])
+    assert 4096 - 8 < payload_size(fitted.title, fitted.body, DATA) <= 4096
+
+    # Sin body alcanza con recortar el título; con data demasiado grande no hay recorte posible
+    title_only = fit_payload(PushMessage("x" * 200, "y" * 200, DATA), 150, truncate=True)
+    assert title_only.body == "" and title_only.title.endswith("…")
+    with pytest.raises(PayloadTooLarge):
+        fit_payload(PushMessage("t", "b", {"blob": "z" * 5000}), 4096, truncate=True)
+
+
+def test_prepared_template_is_shared_across_tokens():
+    transport = FirebaseTransport.__new__(FirebaseTransport)
+    message = PushMessage("t", "b", DATA, priority=HIGH, collapse_key="score")
+    prepared = transport.prepare(message)
+
+    first = transport.build_message("tok-1", prepared)
+    second = transport.build_message("tok-2", prepared)
+    fresh = transport.build_message("tok-1", message)
+
+    assert prepared == message
+    assert (first.token, second.token) == ("tok-1", "tok-2")
+    assert first.notification is second.notification and first.android is second.android
+    assert first.apns is second.apns and first.data is second.data
+    assert fresh.notification is not first.notification
+    assert fresh.android.collapse_key == first.android.collapse_key == "score"
+    assert fresh.apns.headers == first.apns.headers
+
+
+def test_send_push_notification_checks_payload_before_fanout(api, login, tmp_path):
+    results = {}
+    for overflow in ("reject", "truncate"):
+        with api(sqlite_path=str(tmp_path / f"{overflow}.db"), push_payload_overflow=overflow) as (client, ctx):
+            headers = login(client, tokens=["tok-1"])
+            response = client.post("/send-push-notification", headers=headers,
+                                   json={"title": "Aviso", "body": "b" * 5000, "user_id": 1})
+        results[overflow] = (response, ctx.push_transport.sent)
+
+    rejected, rejected_sent = results["reject"]
+    truncated, truncated_sent = results["truncate"]
+    assert rejected.status_code == 400 and "4096" in rejected.json()["detail"]
+    assert rejected_sent == []
+    assert truncated.status_code == 200 and truncated.json()["success_count"] == 1
+    [(_, message)] = truncated_sent
+    assert message.body.endswith("…") and payload_size(message.title, message.body, message.data) <= 4096
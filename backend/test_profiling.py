@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test del profiling bajo demanda
+Verifica el sampler de stacks, la rotación de perfiles en disco y los endpoints de admin
+"""
+
+import os
+import threading
+import time
+
+from services.profiling import ProfileStore, StackSampler
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_records_folded_stacks_of_other_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy-worker")
+    worker.start()
+    sampler = StackSampler(0.001)
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+    stop.set()
+    worker.join()
+
+    lines = sampler.folded().splitlines()
+    busy = [line for line in lines if line.startswith("busy-worker;")]
+    assert busy and all("busy_loop (test_profiling.py:" in line for line in busy)
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines)
+    assert not any("stack-sampler" in line for line in lines)
+
+
+def test_store_rotates_by_count_and_bytes(tmp_path):
+    store = ProfileStore(str(tmp_path), max_files=3, max_bytes=250)
+    names = []
+    for i in range(5):
+        names.append(store.save("get", "/internal-notifications", 0.012, "x" * 100))
+        # mtime distinto para que el orden de rotación sea determinista
+        os.utime(tmp_path / names[-1], (1000 + i, 1000 + i))
+    store.rotate()
+
+    # 3 archivos por cantidad, pero 300 bytes superan los 250: quedan los 2 más nuevos
+    assert [profile["name"] for profile in store.list()] == [names[4], names[3]]
+    assert "_GET_internal-notifications_12ms_" in names[0]
+    assert store.path(names[4]) is not None
+    assert store.path(names[0]) is None
+    assert store.path("../" + names[4]) is None
+
+
+def test_profile_header_and_admin_endpoints(api, login, tmp_path):
+    with api(admin_usernames="admin", profile_token="secret", profile_interval_ms=0.5,
+             profile_dir=str(tmp_path / "profiles")) as (client, ctx):
+        tokens = {username: login(client, username) for username in ("ana", "admin")}
+
+        plain = client.get("/internal-notifications", headers=tokens["ana"])
+        wrong = client.get("/internal-notifications", headers={**tokens["ana"], "X-Profile-Token": "nope"})
+        profiled = client.get("/internal-notifications", headers={**tokens["ana"], "X-Profile-Token": "secret"})
+        name = profiled.headers["X-Profile-Id"]
+
+        listing = client.get("/admin/profiles", headers=tokens["admin"]).json()
+        download = client.get(f"/admin/profiles/{name}", headers=tokens["admin"])
+        denied = client.get("/admin/profiles", headers=tokens["ana"])
+        missing = client.get("/admin/profiles/nope.folded", headers=tokens["admin"])
+
+    assert "X-Profile-Id" not in plain.headers and "X-Profile-Id" not in wrong.headers
+    assert profiled.status_code == 200
+    assert listing["enabled"] is True
+    assert [profile["name"] for profile in listing["profiles"]] == [name]
+    assert download.status_code == 200 and download.text.strip()
+    assert denied.status_code == 403
+    assert missing.status_code == 404
+
+
+def test_profiling_disabled_installs_no_middleware(api):
+    from main import profile_requests
+
+    with api() as (client, ctx):
+        middlewares = client.app.user_middleware
+
+    assert ctx.profiler.enabled is False
+    assert all(middleware.kwargs.get("dispatch") is not profile_requests for middleware in middlewares)
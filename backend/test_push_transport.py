@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test de los push transports
+Verifica la inyección de latencia, errores y límites del FCM falso
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from config import Settings
+from services.fanout import fan_out
+from services.push_transport import (
+    QUOTA_EXCEEDED, UNAVAILABLE, UNREGISTERED,
+    FakeFCMTransport, FirebaseTransport, LatencyModel, PushError, PushMessage,
+    create_push_transport, firebase_error_code, parse_error_rates,
+)
+
+MESSAGE = PushMessage(title="Hola", body="Mundo")
+
+
+def outcomes(transport, calls=2000):
+    results = []
+    for i in range(calls):
+        try:
+            transport.send(f"token-{i}", MESSAGE)
+            results.append("OK")
+        except PushError as e:
+            results.append(e.code)
+    return results
+
+
+def test_error_injection_is_reproducible_with_seed():
+    """Con la misma semilla los errores inyectados son idénticos"""
+    rates = {UNREGISTERED: 0.05, QUOTA_EXCEEDED: 0.02, UNAVAILABLE: 0.03}
+    first = outcomes(FakeFCMTransport(error_rates=rates, seed=7))
+    second = outcomes(FakeFCMTransport(error_rates=rates, seed=7))
+
+    assert first == second
+    for code, rate in rates.items():
+        assert abs(first.count(code) / len(first) - rate) < 0.02
+
+
+def test_latency_distributions():
+    """Cada distribución respeta la media configurada"""
+    import random
+
+    rng = random.Random(1)
+    for distribution in LatencyModel.DISTRIBUTIONS:
+        model = LatencyModel(distribution, mean_ms=10, jitter_ms=2)
+        samples = [model.sample(rng) for _ in range(5000)]
+        assert all(sample >= 0 for sample in samples)
+        mean = sum(samples) / len(samples)
+        assert 8 < mean < 12.5, (distribution, mean)
+
+    with pytest.raises(ValueError):
+        LatencyModel("pareto", 10)
+
+
+def test_latency_is_applied_per_call():
+    transport = FakeFCMTransport(latency=LatencyModel("constant", mean_ms=20))
+    start = time.perf_counter()
+    transport.send("token", MESSAGE)
+    assert time.perf_counter() - start >= 0.019
+
+
+def test_throughput_cap_rejects_with_quota_exceeded():
+    """Por encima de max_rps el FCM falso responde QUOTA_EXCEEDED"""
+    transport = FakeFCMTransport(max_rps=50)
+    results = outcomes(transport, calls=200)
+
+    assert results.count("OK") <= 55
+    assert results.count(QUOTA_EXCEEDED) >= 145
+    assert transport.stats["errors"][QUOTA_EXCEEDED] == results.count(QUOTA_EXCEEDED)
+
+
+def test_fan_out_reports_injected_failures():
+    transport = FakeFCMTransport(error_rates={UNREGISTERED: 0.1}, seed=3, record=True)
+    tokens = [f"token-{i}" for i in range(500)]
+
+    result = asyncio.run(fan_out(tokens, lambda token: transport.send(token, MESSAGE), concurrency=8))
+
+    assert result.success_count + result.failure_count == 500
+    assert result.failure_count == transport.stats["errors"][UNREGISTERED]
+    assert len(transport.sent) == result.success_count
+
+
+def test_factory_and_error_rate_parsing():
+    assert parse_error_rates("unregistered=0.01, UNAVAILABLE=0.5") == {UNREGISTERED: 0.01, UNAVAILABLE: 0.5}
+
+    fake = create_push_transport(Settings(push_transport="fake", fake_fcm_error_rates="UNAVAILABLE=1"))
+    assert isinstance(fake, FakeFCMTransport)
+    with pytest.raises(PushError) as excinfo:
+        fake.send("token", MESSAGE)
+    assert excinfo.value.code == UNAVAILABLE
+    assert excinfo.value.retryable
+
+    assert isinstance(create_push_transport(Settings(push_transport="firebase")), FirebaseTransport)
+    with pytest.raises(ValueError):
+        create_push_transport(Settings(push_transport="carrier-pigeon"))
+
+
+def test_firebase_errors_map_to_fcm_codes():
+    from firebase_admin import exceptions, messaging
+
+    assert firebase_error_code(messaging.UnregisteredError("gone")) == UNREGISTERED
+    assert firebase_error_code(messaging.QuotaExceededError("slow down")) == QUOTA_EXCEEDED
+    assert firebase_error_code(exceptions.UnavailableError("down")) == UNAVAILABLE
+
+
+def test_fake_transport_needs_no_firebase_credentials():
+    """Con PUSH_TRANSPORT=fake la validación no exige credenciales de Firebase"""
+    Settings(oracle_user="u", oracle_password="p", push_transport="fake",
+             firebase_credentials_path="/does/not/exist.json").validate()
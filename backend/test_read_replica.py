@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test del read/write split
+Usa dos bases SQLite como stand-ins del primario y de la réplica de lectura
+"""
+
+import time
+
+from config import Settings
+from storage.repository import StorageError, TableNames, create_repository
+from storage.routing import ReadWriteRepository, primary_reads
+from storage.sqlite_repository import SQLiteRepository
+
+
+def standins(tmp_path):
+    tables = TableNames("", "np_")
+    return SQLiteRepository(str(tmp_path / "primary.db"), tables), SQLiteRepository(str(tmp_path / "replica.db"), tables)
+
+
+def test_reads_go_to_replica_and_writes_to_primary(tmp_path):
+    primary, replica = standins(tmp_path)
+    repository = ReadWriteRepository(primary, replica)
+    for backend in (primary, replica):
+        backend.create_user("ana", "ana@example.com", "hash")
+
+    assert repository.create_internal_notifications([1], "Hola", "primario") == 1
+    # La réplica todavía no aplicó el cambio
+    assert repository.list_internal_notifications(1) == []
+    with primary_reads():
+        assert [row[2] for row in repository.list_internal_notifications(1)] == ["primario"]
+    assert repository.list_internal_notifications(1) == []
+
+    assert repository.stats == {"replica_reads": 2, "primary_reads": 1, "replica_fallbacks": 0}
+    assert "replica.inbox" in repository.statement_timings()
+    repository.close()
+
+
+def test_replica_failure_and_missing_login_fall_back_to_primary(tmp_path):
+    primary, replica = standins(tmp_path)
+    repository = ReadWriteRepository(primary, replica)
+    primary.create_user("ana", "ana@example.com", "hash")
+
+    # Usuario recién registrado: todavía no está en la réplica
+    assert repository.get_login_user("ana") == (1, "ana", "hash")
+
+    def replica_down(*args):
+        raise StorageError("Database connection failed")
+
+    replica.get_user_id = replica_down
+    assert repository.get_user_id("ana") == 1
+    assert repository.stats["replica_fallbacks"] == 1
+    repository.close()
+
+
+def test_create_repository_builds_split_only_when_configured(tmp_path):
+    single = create_repository(Settings(storage_backend="sqlite", sqlite_path=str(tmp_path / "a.db")))
+    split = create_repository(Settings(storage_backend="sqlite", sqlite_path=str(tmp_path / "a.db"),
+                                       sqlite_read_path=str(tmp_path / "b.db")))
+
+    assert isinstance(single, SQLiteRepository)
+    assert isinstance(split, ReadWriteRepository) and split.name == "sqlite"
+    assert split.describe()["read_replica"]["path"].endswith("b.db")
+    single.close()
+    split.close()
+
+
+def test_inbox_reads_your_own_writes_from_primary(api, login, tmp_path):
+    with api(sqlite_read_path=str(tmp_path / "replica.db"), read_your_writes_seconds=0.5) as (client, ctx):
+        # Login funciona aunque la réplica todavía no tenga al usuario
+        headers = login(client)
+
+        replica = ctx.get_repository().replica
+        replica.create_user("ana", "ana@example.com", "hash")
+        replica.create_internal_notifications([1], "Réplica", "copia atrasada")
+        client.post("/send-internal-notification", headers=headers,
+                    json={"title": "Primario", "message": "nueva", "user_id": 1})
+
+        def inbox_titles():
+            return [n["title"] for n in client.get("/internal-notifications", headers=headers).json()["notifications"]]
+
+        from_replica = inbox_titles()
+        client.post("/register-device", headers=headers, json={"device_id": "d1", "fcm_token": "tok"})
+        after_write = inbox_titles()
+        time.sleep(0.6)
+        after_window = inbox_titles()
+
+    assert from_replica == ["Réplica"]
+    assert after_write == ["Primario"]
+    assert after_window == ["Réplica"]
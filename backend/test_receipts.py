@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test de recibos de entrega y apertura
+Verifica el buffer en memoria y que los recibos terminan en push_notification_log
+"""
+
+import asyncio
+import sqlite3
+import time
+from datetime import datetime
+
+from services.receipts import ReceiptBuffer
+from storage.repository import PushLogEntry, PushReceipt, TableNames, message_id_of
+from storage.sqlite_repository import SQLiteRepository
+
+
+def test_message_id_of_matches_client_message_id():
+    assert message_id_of("projects/demo/messages/0:1712%abc") == "0:1712%abc"
+    assert message_id_of("0:1712%abc") == "0:1712%abc"
+    assert message_id_of(None) is None
+
+
+def test_sqlite_applies_receipts_in_batches(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "receipts.db"), TableNames("", "np_"))
+    repository.create_user("ana", "ana@example.com", "hash")
+    repository.record_push_log([
+        PushLogEntry("t", "b", user_id=1, fcm_message_id="m1"),
+        PushLogEntry("t", "b", user_id=1, fcm_message_id="m2"),
+        PushLogEntry("t", "b", status="failed", user_id=1, fcm_message_id="m3"),
+    ])
+    at = datetime(2024, 3, 5, 10, 0, 0)
+
+    updated = repository.apply_push_receipts([
+        PushReceipt(1, "m1", "delivered", at),
+        PushReceipt(1, "m2", "opened", at),
+        PushReceipt(1, "m3", "delivered", at),
+        # Otro usuario no puede confirmar envíos ajenos
+        PushReceipt(2, "m1", "opened", at),
+    ])
+
+    with sqlite3.connect(str(tmp_path / "receipts.db")) as connection:
+        rows = connection.execute(
+            "SELECT fcm_message_id, status, delivered_at, opened_at FROM np_push_notification_log ORDER BY id"
+        ).fetchall()
+    repository.close()
+
+    assert updated == 2
+    assert rows == [
+        ("m1", "delivered", "2024-03-05 10:00:00", None),
+        ("m2", "delivered", "2024-03-05 10:00:00", "2024-03-05 10:00:00"),
+        ("m3", "failed", None, None),
+    ]
+    assert repository.statement_timings()["mark_push_delivered"]["calls"] == 1
+
+
+def test_buffer_deduplicates_and_flushes_early_when_full():
+    batches = []
+
+    def apply(receipts):
+        batches.append(list(receipts))
+        return len(receipts)
+
+    async def scenario():
+        buffer = ReceiptBuffer(apply, flush_interval=60, max_pending=3)
+        now = datetime.utcnow()
+        assert buffer.add([PushReceipt(1, "m1", "delivered", now), PushReceipt(1, "m1", "delivered", now)]) == 1
+        buffer.add([PushReceipt(1, "m1", "opened", now), PushReceipt(1, "m2", "delivered", now)])
+        # Con 3 pendientes se adelanta el flush sin esperar el intervalo
+        for _ in range(100):
+            if batches:
+                break
+            await asyncio.sleep(0.01)
+        buffer.add([PushReceipt(1, "m4", "delivered", now)])
+        await buffer.close()
+        return buffer.stats
+
+    stats = asyncio.run(scenario())
+
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert stats["duplicates"] == 1 and stats["applied"] == 4
+
+
+def test_receipts_endpoint_updates_push_log(api, login, tmp_path):
+    with api(receipt_flush_interval_ms=100) as (client, ctx):
+        headers = login(client, tokens=["tok-1", "tok-2"])
+        client.post("/send-push-notification", headers=headers, json={"title": "t", "body": "b", "user_id": 1})
+
+        single = client.post("/push-receipts", headers=headers, json={"message_id": "1"})
+        batch = client.post("/push-receipts", headers=headers, json={"receipts": [
+            {"message_id": "projects/fake/messages/2", "event": "opened", "at": "2024-03-05T10:00:00+00:00"},
+            {"message_id": "1", "event": "delivered"},
+        ]})
+        invalid = client.post("/push-receipts", headers=headers, json={"message_id": "1", "event": "read"})
+        time.sleep(0.3)
+
+    with sqlite3.connect(str(tmp_path / "api.db")) as connection:
+        rows = connection.execute(
+            "SELECT fcm_message_id, status, delivered_at IS NOT NULL, opened_at "
+            "FROM np_push_notification_log ORDER BY fcm_message_id"
+        ).fetchall()
+
+    assert single.status_code == 202 and single.json()["accepted"] == 1
+    # El reintento de "1" todavía estaba en el buffer
+    assert batch.json()["accepted"] == 1
+    assert invalid.status_code == 422
+    assert rows == [("1", "delivered", 1, None), ("2", "delivered", 1, "2024-03-05 10:00:00")]
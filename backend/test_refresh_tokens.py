@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test de refresh tokens rotativos
+Verifica la renovación sin bcrypt, la rotación, la detección de reusos, el logout y la limpieza de vencidos
+"""
+
+import hashlib
+import sqlite3
+from datetime import datetime, timedelta
+
+from storage.repository import TableNames
+from storage.sqlite_repository import SQLiteRepository
+
+
+def login_tokens(client) -> dict:
+    """Respuesta completa de /login (el fixture ``login`` solo devuelve los headers)"""
+    return client.post("/login", json={"username": "ana", "password": "secreto"}).json()
+
+
+def test_refresh_rotates_without_bcrypt(api, tmp_path, monkeypatch):
+    import main
+
+    with api() as (client, ctx):
+        client.post("/register", json={"username": "ana", "email": "ana@example.com", "password": "secreto"})
+        tokens = login_tokens(client)
+
+        def no_bcrypt(*args):
+            raise AssertionError("bcrypt en /token/refresh")
+
+        monkeypatch.setattr(main, "verify_password", no_bcrypt)
+        first = client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+        second = client.post("/token/refresh", json={"refresh_token": first.json()["refresh_token"]})
+        headers = {"Authorization": f"Bearer {second.json()['access_token']}"}
+        device = client.post("/register-device", headers=headers, json={"device_id": "d1", "fcm_token": "tok-1"})
+
+    assert first.status_code == second.status_code == 200
+    assert second.json()["username"] == "ana" and second.json()["user_id"] == 1
+    assert len({tokens["refresh_token"], first.json()["refresh_token"], second.json()["refresh_token"]}) == 3
+    assert device.status_code == 200
+
+    # Solo se guarda el hash; las rotaciones comparten familia
+    with sqlite3.connect(str(tmp_path / "api.db")) as connection:
+        rows = connection.execute(
+            "SELECT token_hash, family_id, revoked_at IS NOT NULL FROM np_refresh_tokens ORDER BY id"
+        ).fetchall()
+    assert [row[0] for row in rows] == [hashlib.sha256(token.encode()).hexdigest() for token in (
+        tokens["refresh_token"], first.json()["refresh_token"], second.json()["refresh_token"])]
+    assert len({row[1] for row in rows}) == 1
+    assert [row[2] for row in rows] == [1, 1, 0]
+
+
+def test_reuse_revokes_family_and_logout(api):
+    with api() as (client, ctx):
+        client.post("/register", json={"username": "ana", "email": "ana@example.com", "password": "secreto"})
+        stolen = login_tokens(client)["refresh_token"]
+        other_login = login_tokens(client)["refresh_token"]
+        current = client.post("/token/refresh", json={"refresh_token": stolen}).json()["refresh_token"]
+
+        reused = client.post("/token/refresh", json={"refresh_token": stolen})
+        after_reuse = client.post("/token/refresh", json={"refresh_token": current})
+        unknown = client.post("/token/refresh", json={"refresh_token": "no-existe"})
+
+        # Otro login (otra familia) sigue vigente hasta el logout
+        logout = client.post("/token/revoke", json={"refresh_token": other_login})
+        after_logout = client.post("/token/refresh", json={"refresh_token": other_login})
+        unknown_logout = client.post("/token/revoke", json={"refresh_token": "no-existe"})
+
+    assert reused.status_code == after_reuse.status_code == unknown.status_code == 401
+    assert reused.json()["detail"] == "Invalid refresh token"
+    assert logout.status_code == unknown_logout.status_code == 200
+    assert after_logout.status_code == 401
+
+
+def test_repository_rotation_is_single_use_and_purges_expired(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "tokens.db"), TableNames("", "np_"))
+    repository.create_user("ana", "ana@example.com", "hash")
+    now = datetime.utcnow()
+    repository.create_refresh_token(1, "h1", "fam", now + timedelta(days=30))
+    repository.create_refresh_token(1, "old", "fam-old", now - timedelta(days=1))
+
+    assert repository.get_refresh_token("h1", now) == (1, "ana", "fam", 0, 0)
+    assert repository.get_refresh_token("old", now) == (1, "ana", "fam-old", 0, 1)
+    assert repository.rotate_refresh_token("h1", "h2", now + timedelta(days=30), now)
+    # Segunda rotación del mismo token (request concurrente): no crea otro
+    assert not repository.rotate_refresh_token("h1", "h3", now + timedelta(days=30), now)
+    assert not repository.rotate_refresh_token("old", "h4", now + timedelta(days=30), now)
+    assert repository.get_refresh_token("h3", now) is None
+    assert repository.get_refresh_token("h2", now) == (1, "ana", "fam", 0, 0)
+
+    assert repository.revoke_refresh_tokens("fam", now) == 1
+    assert repository.get_refresh_token("h2", now)[3] == 1
+    assert repository.purge_refresh_tokens(now) == 1
+    assert repository.get_refresh_token("old", now) is None
+    repository.close()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test de retención y ventanas del historial
+Verifica el borrado por fecha, el límite del inbox, la ventana de los recibos y el job periódico
+"""
+
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+from config import Settings
+from services.retention import RetentionJob, inbox_since, retention_days
+from storage.oracle_repository import partition_bound
+from storage.repository import HISTORY_EPOCH, Purged, PushLogEntry, PushReceipt, TableNames
+from storage.sqlite_repository import SQLiteRepository
+
+
+def age(path, table, column, days):
+    """Corre hacia atrás la fecha de todas las filas con id par"""
+    with sqlite3.connect(path) as connection:
+        connection.execute(f"UPDATE {table} SET {column} = datetime({column}, '-{days} days') WHERE id % 2 = 0")
+
+
+def make_repository(tmp_path):
+    path = str(tmp_path / "history.db")
+    repository = SQLiteRepository(path, TableNames("", "np_"))
+    repository.create_user("ana", "ana@example.com", "hash")
+    repository.create_internal_notifications([1, 1, 1, 1], "t", "m")
+    repository.record_push_log([PushLogEntry("t", "b", user_id=1, fcm_message_id=f"m{i}") for i in range(1, 5)])
+    age(path, "np_internal_notifications", "created_at", 90)
+    age(path, "np_push_notification_log", "sent_at", 40)
+    return path, repository
+
+
+def test_inbox_bound_and_purge_by_date(tmp_path):
+    path, repository = make_repository(tmp_path)
+    now = datetime.utcnow()
+
+    assert len(repository.list_internal_notifications(1)) == 4
+    assert [row[0] for row in repository.list_internal_notifications(1, now - timedelta(days=30))] == [3, 1]
+
+    assert repository.purge_history("notifications", now - timedelta(days=60)) == Purged(rows=2)
+    assert repository.purge_history("notifications", now - timedelta(days=60)) == Purged()
+    assert repository.purge_history("pushes", now - timedelta(days=30)) == Purged(rows=2)
+    assert [row[0] for row in repository.list_internal_notifications(1)] == [3, 1]
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT id FROM np_push_notification_log ORDER BY id").fetchall() == [(1,), (3,)]
+    repository.close()
+
+
+def test_receipts_only_match_recent_pushes(tmp_path):
+    path, repository = make_repository(tmp_path)
+    at = datetime.utcnow()
+
+    # m2 y m4 se enviaron hace 40 días: fuera de RECEIPT_WINDOW
+    updated = repository.apply_push_receipts([PushReceipt(1, f"m{i}", "delivered", at) for i in range(1, 5)])
+
+    with sqlite3.connect(path) as connection:
+        rows = connection.execute("SELECT fcm_message_id, status FROM np_push_notification_log ORDER BY id").fetchall()
+    repository.close()
+    assert updated == 2
+    assert rows == [("m1", "delivered"), ("m2", "sent"), ("m3", "delivered"), ("m4", "sent")]
+
+
+def test_retention_settings_and_partition_bounds():
+    now = datetime(2024, 6, 30, 12, 0, 0)
+    settings = Settings(notification_retention_days=90, inbox_window_days=30)
+
+    assert inbox_since(settings, now) == now - timedelta(days=30)
+    assert inbox_since(Settings(notification_retention_days=90), now) == now - timedelta(days=90)
+    assert inbox_since(Settings(), now) == HISTORY_EPOCH
+    assert retention_days(Settings(push_log_retention_days=14)) == {"notifications": 0, "pushes": 14}
+
+    assert partition_bound("TIMESTAMP' 2024-02-01 00:00:00'") == datetime(2024, 2, 1)
+    assert partition_bound("MAXVALUE") is None
+
+
+def test_retention_job_purges_configured_kinds(tmp_path):
+    path, repository = make_repository(tmp_path)
+    job = RetentionJob(lambda: repository, {"notifications": 60, "pushes": 0}, interval=3600)
+
+    assert asyncio.run(job.run_once()) == {"notifications": Purged(rows=2), "refresh_tokens": Purged()}
+    assert job.stats == {"runs": 1, "purged_rows": 2, "dropped_partitions": 0, "failed": 0}
+    repository.close()
+
+
+def test_inbox_endpoint_uses_window(api, login, tmp_path):
+    with api(inbox_window_days=30) as (client, ctx):
+        headers = login(client)
+        client.post("/send-internal-notification", headers=headers,
+                    json={"title": "Aviso", "message": "texto", "user_id": 1})
+        before = client.get("/internal-notifications", headers=headers).json()
+        with sqlite3.connect(str(tmp_path / "api.db")) as connection:
+            connection.execute("UPDATE np_internal_notifications SET created_at = datetime(created_at, '-45 days')")
+        after = client.get("/internal-notifications", headers=headers).json()
+
+    assert len(before["notifications"]) == 1
+    assert after["notifications"] == []
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test de los carriles de prioridad
+Verifica que priority=high siempre obtiene capacidad antes que el tráfico normal
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from services.fanout import fan_out
+from services.push_transport import HIGH, NORMAL, FakeFCMTransport, FirebaseTransport, PushMessage
+from services.scheduler import PushScheduler
+
+
+def test_reserved_slots_are_only_for_high_priority():
+    async def scenario():
+        scheduler = PushScheduler(capacity=3, reserved_high=1)
+        await scheduler.acquire(NORMAL)
+        await scheduler.acquire(NORMAL)
+
+        blocked = asyncio.create_task(scheduler.acquire(NORMAL))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+
+        # El slot reservado sigue libre para una alerta
+        await asyncio.wait_for(scheduler.acquire(HIGH), timeout=1)
+        assert scheduler.in_flight == 3
+        blocked.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await blocked
+        assert scheduler.waiting(NORMAL) == 0
+
+    asyncio.run(scenario())
+
+
+def test_high_priority_waiters_are_served_first():
+    async def scenario():
+        scheduler = PushScheduler(capacity=1, reserved_high=0)
+        order = []
+        await scheduler.acquire(NORMAL)
+
+        async def waiter(name, priority):
+            async with scheduler.slot(priority):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(waiter("bulk-1", NORMAL)), asyncio.create_task(waiter("bulk-2", NORMAL))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(waiter("alert", HIGH)))
+        await asyncio.sleep(0)
+
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        assert order == ["alert", "bulk-1", "bulk-2"]
+        assert scheduler.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_fan_out_through_scheduler_respects_global_capacity():
+    transport = FakeFCMTransport()
+    peak = 0
+    active = 0
+    lock = threading.Lock()
+
+    def send_one(token):
+        nonlocal peak, active
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        try:
+            return transport.send(token, PushMessage("t", "b"))
+        finally:
+            with lock:
+                active -= 1
+
+    async def scenario():
+        scheduler = PushScheduler(capacity=4, reserved_high=1)
+        tokens = [f"token-{i}" for i in range(200)]
+        results = await asyncio.gather(*(
+            fan_out(tokens, send_one, concurrency=10, scheduler=scheduler, priority=NORMAL) for _ in range(3)
+        ))
+        scheduler.close()
+        return results, scheduler
+
+    results, scheduler = asyncio.run(scenario())
+    assert all(result.success_count == 200 for result in results)
+    # Tres requests con concurrency=10 no superan los 3 slots normales
+    assert peak <= 3
+    assert scheduler.stats[NORMAL] == 600
+
+
+def test_priority_maps_to_android_and_apns():
+    from firebase_admin import messaging
+
+    transport = FirebaseTransport("unused.json")
+    high = transport.build_message("token", PushMessage("t", "b", priority=HIGH))
+    normal = transport.build_message("token", PushMessage("t", "b"))
+
+    assert isinstance(high.android, messaging.AndroidConfig)
+    assert (high.android.priority, high.apns.headers["apns-priority"]) == ("high", "10")
+    assert (normal.android.priority, normal.apns.headers["apns-priority"]) == ("normal", "5")
+
+
+def test_push_endpoint_forwards_priority(api, login):
+    with api() as (client, ctx):
+        headers = login(client, tokens=["ana-phone"])
+
+        sent = client.post("/send-push-notification", headers=headers,
+                           json={"title": "Alerta", "body": "Hola", "user_id": 1, "priority": "high"})
+        invalid = client.post("/send-push-notification", headers=headers,
+                              json={"title": "Alerta", "body": "Hola", "priority": "urgent"})
+        stats = dict(ctx.push_scheduler.stats)
+
+    assert sent.status_code == 200 and sent.json()["success_count"] == 1
+    assert [message.priority for _, message in ctx.push_transport.sent] == [HIGH]
+    assert stats[HIGH] == 1
+    assert invalid.status_code == 422
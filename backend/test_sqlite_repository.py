@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test del repositorio SQLite
+Verifica el esquema, el modo WAL y el flujo completo de la API sin Oracle
+"""
+
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from config import Settings
+from storage.repository import TableNames, create_repository
+from storage.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture
+def repository(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / "push.db"), TableNames("", "np_"))
+    yield repo
+    repo.close()
+
+
+def test_table_names_follow_schema_and_prefix():
+    assert TableNames().users == "test.np_users"
+    assert TableNames("app", "push_").push_log == "app.push_push_notification_log"
+    assert TableNames("", "np_").devices == "np_devices"
+
+
+def test_factory_selects_backend(tmp_path):
+    repo = create_repository(Settings(storage_backend="sqlite", sqlite_path=str(tmp_path / "x.db"),
+                                      db_table_prefix="t_"))
+    assert isinstance(repo, SQLiteRepository)
+    assert repo.tables.users == "t_users"
+    with pytest.raises(ValueError):
+        create_repository(Settings(storage_backend="mongodb"))
+
+
+def test_wal_mode_and_schema(repository):
+    repository.warmup()
+    with repository.connection() as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"np_users", "np_devices", "np_internal_notifications", "np_push_notification_log"} <= tables
+
+
+def test_users_devices_and_notifications(repository):
+    repository.create_user("ana", "ana@example.com", "hash")
+    assert repository.user_exists("ana", "otro@example.com")
+    assert repository.user_exists("otra", "ana@example.com")
+    with pytest.raises(sqlite3.IntegrityError):
+        repository.create_user("ana", "ana2@example.com", "hash")
+
+    user_id = repository.get_user_id("ana")
+    assert repository.get_login_user("ana") == (user_id, "ana", "hash")
+    assert repository.get_login_user("nadie") is None
+
+    assert repository.upsert_device(user_id, "phone", "token-1") == 1
+    assert repository.upsert_device(user_id, "phone", "token-2") == 1
+    assert repository.get_tokens_by_user_ids([user_id]) == [(user_id, "token-2")]
+    assert repository.get_all_tokens() == ["token-2"]
+
+    assert repository.create_internal_notifications([user_id, user_id], "Hola", "Mundo") == 2
+    rows = repository.list_internal_notifications(user_id)
+    assert [row[0] for row in rows] == sorted((row[0] for row in rows), reverse=True)
+    assert rows[0][4] is not None and hasattr(rows[0][4], "isoformat")
+
+    assert repository.mark_notification_read(rows[0][0], user_id)
+    assert not repository.mark_notification_read(rows[0][0], user_id + 1)
+    assert not repository.mark_notification_read(999, user_id)
+    with repository.connection() as connection:
+        read_at = connection.execute(
+            "SELECT read_at FROM np_internal_notifications WHERE id = ?", (rows[0][0],)
+        ).fetchone()[0]
+    assert read_at is not None
+
+
+def test_concurrent_writers_from_threads(repository):
+    """Cada thread usa su propia conexión; WAL + busy_timeout serializa los commits"""
+    repository.create_user("ana", "ana@example.com", "hash")
+    user_id = repository.get_user_id("ana")
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(20):
+                repository.upsert_device(user_id, f"device-{n}-{i}", f"token-{n}-{i}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(repository.get_all_tokens()) == 80
+
+
+def test_api_flow_on_sqlite(api, tmp_path):
+    """La API completa funciona con STORAGE_BACKEND=sqlite y el FCM falso"""
+    with api() as (client, ctx):
+        user = {"username": "ana", "email": "ana@example.com", "password": "secreto"}
+        assert client.post("/register", json=user).status_code == 200
+        assert client.post("/register", json=user).status_code == 400
+
+        login = client.post("/login", json={"username": "ana", "password": "secreto"})
+        assert login.status_code == 200
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        device = {"device_id": "phone", "fcm_token": "fcm-token-" + "x" * 40}
+        assert client.post("/register-device", json=device, headers=headers).status_code == 200
+
+        push = client.post("/send-push-notification", json={"title": "Hola", "body": "Mundo", "username": "ana"},
+                           headers=headers)
+        assert push.status_code == 200
+        assert push.json()["success_count"] == 1
+
+        sent = client.post("/send-internal-notification", json={"title": "Aviso", "message": "Texto"},
+                           headers=headers)
+        assert sent.json()["count"] == 1
+
+        inbox = client.get("/internal-notifications", headers=headers).json()["notifications"]
+        assert inbox[0]["title"] == "Aviso" and inbox[0]["is_read"] is False
+
+        read = client.put(f"/internal-notifications/{inbox[0]['id']}/read", headers=headers)
+        assert read.status_code == 200
+        assert client.put("/internal-notifications/999/read", headers=headers).status_code == 404
+
+        health = client.get("/health").json()
+        assert health["sqlite"]["status"] == "✅ Connected"
+        assert health["sqlite"]["path"] == os.path.abspath(ctx.settings.sqlite_path)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test del registro de sentencias
+Verifica el ajuste de fetch por cardinalidad y los tiempos por sentencia
+"""
+
+import pytest
+
+from storage.repository import TableNames
+from storage.sqlite_repository import SQLiteRepository
+from storage.statements import FEW, MANY, NONE, ONE, StatementRegistry, fetch_tuning
+
+
+class RecordingCursor:
+    """Cursor mínimo con la interfaz de python-oracledb que recuerda el ajuste aplicado"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.prefetchrows = 2
+        self.arraysize = 100
+        self.executed = []
+        self.rowcount = len(rows)
+
+    def execute(self, sql, params):
+        self.executed.append((sql, params, self.prefetchrows, self.arraysize))
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+class RecordingConnection:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.cursors = []
+
+    def cursor(self):
+        cursor = RecordingCursor(self.rows)
+        self.cursors.append(cursor)
+        return cursor
+
+
+DEFINITIONS = {
+    "login_user": (ONE, "SELECT id FROM {users} WHERE username = :1"),
+    "all_tokens": (MANY, "SELECT fcm_token FROM {devices}"),
+    "inbox": (FEW, "SELECT id FROM {internal_notifications} WHERE user_id = :1"),
+    "mark_read": (NONE, "UPDATE {internal_notifications} SET is_read = 1 WHERE id = :1"),
+}
+
+
+def test_single_row_lookups_fetch_in_one_round_trip():
+    """ONE: prefetchrows=2/arraysize=1 para que execute traiga la fila y el fin del cursor"""
+    assert fetch_tuning(ONE) == (2, 1)
+    assert fetch_tuning(MANY, batch_size=5000) == (5000, 5000)
+    assert fetch_tuning(FEW)[0] == fetch_tuning(FEW)[1]
+
+    registry = StatementRegistry(DEFINITIONS, TableNames("app", "np_"), batch_size=2000)
+    connection = RecordingConnection(rows=[(7,)])
+
+    assert registry.fetch_one(connection, "login_user", ("ana",)) == (7,)
+    sql, params, prefetchrows, arraysize = connection.cursors[-1].executed[0]
+    assert sql == "SELECT id FROM app.np_users WHERE username = :1"
+    assert (prefetchrows, arraysize) == (2, 1)
+
+    registry.fetch_column(connection, "all_tokens")
+    assert connection.cursors[-1].executed[0][2:] == (2000, 2000)
+
+
+def test_timings_are_recorded_per_statement():
+    registry = StatementRegistry(DEFINITIONS, TableNames())
+    connection = RecordingConnection(rows=[(1,), (2,), (3,)])
+
+    for _ in range(3):
+        registry.fetch_all(connection, "inbox", (1,))
+    assert registry.execute(connection, "mark_read", (1,)) == 3
+
+    timings = registry.timings.snapshot()
+    assert timings["inbox"]["calls"] == 3
+    assert timings["inbox"]["rows"] == 9
+    assert timings["mark_read"]["calls"] == 1
+    assert "login_user" not in timings
+
+
+def test_unknown_cardinality_is_rejected():
+    with pytest.raises(ValueError):
+        StatementRegistry({"bad": ("lots", "SELECT 1")}, TableNames())
+
+
+def test_backends_register_the_same_statements():
+    from storage import oracle_repository, sqlite_repository
+
+    assert oracle_repository.STATEMENTS.keys() == sqlite_repository.STATEMENTS.keys()
+    for name, (cardinality, _) in oracle_repository.STATEMENTS.items():
+        assert sqlite_repository.STATEMENTS[name][0] == cardinality, name
+
+
+def test_repository_exposes_statement_timings(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "push.db"), TableNames("", "np_"))
+    repository.create_user("ana", "ana@example.com", "hash")
+    repository.get_login_user("ana")
+    repository.get_login_user("nadie")
+
+    timings = repository.statement_timings()
+    assert timings["login_user"]["calls"] == 2
+    assert timings["login_user"]["rows"] == 1
+    assert timings["create_user"]["calls"] == 1
+    repository.close()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test de estadísticas incrementales
+Verifica que /stats sale de stats_rollup y que la reconciliación corrige los contadores
+"""
+
+import asyncio
+
+from services.stats import StatsRollup, utc_day
+from storage.repository import PushLogEntry, TableNames
+from storage.sqlite_repository import SQLiteRepository
+
+
+def test_mark_read_tells_newly_read_from_already_read(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "read.db"), TableNames("", "np_"))
+    repository.create_user("ana", "ana@example.com", "hash")
+    repository.create_internal_notifications([1], "Hola", "texto")
+    [(notification_id, *_)] = repository.list_internal_notifications(1)
+
+    assert repository.mark_notification_read(notification_id, 1) is True
+    assert repository.mark_notification_read(notification_id, 1) is False
+    assert repository.mark_notification_read(notification_id, 2) is None
+    repository.close()
+
+
+def test_reconcile_replaces_counters_from_base_tables(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "stats.db"), TableNames("", "np_"))
+    repository.create_user("ana", "ana@example.com", "hash")
+    repository.create_internal_notifications([1], "Hola", "texto")
+    repository.record_push_log([PushLogEntry("t", "b", user_id=1), PushLogEntry("t", "b", status="failed")])
+    rollup = StatsRollup(lambda: repository, flush_interval=0, reconcile_interval=0)
+    today = utc_day()
+
+    async def scenario():
+        await rollup.reconcile()
+        # Deltas con drift: el recuento los reemplaza
+        rollup.incr("users", 5)
+        rollup.incr("pushes_sent", 7, daily=True)
+        await rollup.flush()
+        drifted = await rollup.snapshot(1)
+        await rollup.reconcile()
+        return drifted, await rollup.snapshot(2)
+
+    drifted, snapshot = asyncio.run(scenario())
+    repository.close()
+
+    assert drifted["totals"]["users"] == 6
+    assert snapshot["totals"] == {"users": 1, "active_devices": 0, "unread_notifications": 1}
+    assert snapshot["daily"][0] == {"day": today, "pushes_sent": 1, "pushes_failed": 1, "internal_notifications": 1}
+    assert snapshot["daily"][1]["pushes_sent"] == 0
+    assert snapshot["reconciled_at"] is not None
+
+
+def test_stats_endpoint_follows_send_read_and_register(api, login):
+    with api(stats_flush_interval=60) as (client, ctx):
+        headers = login(client, tokens=["tok-1"])
+        # La primera consulta reconcilia: parte de los valores reales
+        first = client.get("/stats", headers=headers).json()
+
+        client.post("/register", json={"username": "beto", "email": "beto@example.com", "password": "secreto"})
+        client.post("/send-push-notification", headers=headers, json={"title": "t", "body": "b"})
+        client.post("/send-internal-notification", headers=headers, json={"title": "a", "message": "m"})
+        inbox = client.get("/internal-notifications", headers=headers).json()["notifications"]
+        client.put(f"/internal-notifications/{inbox[0]['id']}/read", headers=headers)
+        again = client.put(f"/internal-notifications/{inbox[0]['id']}/read", headers=headers)
+        counts = ctx.get_repository().statement_timings()
+
+        live = client.get("/stats", params={"days": 3}, headers=headers).json()
+        invalid = client.get("/stats", params={"days": 0}, headers=headers)
+        rollup_counts = ctx.get_repository().statement_timings()
+
+    assert first["totals"] == {"users": 1, "active_devices": 1, "unread_notifications": 0}
+    assert again.status_code == 200
+    assert live["totals"] == {"users": 2, "active_devices": 1, "unread_notifications": 1}
+    assert live["daily"][0]["pushes_sent"] == 1
+    assert live["daily"][0]["internal_notifications"] == 2
+    assert len(live["daily"]) == 3
+    assert invalid.status_code == 422
+    # El segundo /stats no recuenta las tablas base
+    assert rollup_counts["count_users"]["calls"] == counts["count_users"]["calls"] == 1
+    assert rollup_counts["stats_by_buckets"]["calls"] == counts["stats_by_buckets"]["calls"] + 1
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test de destinatarios múltiples
+Verifica la resolución por lotes, la deduplicación de tokens y los resultados por destinatario
+"""
+
+from contextlib import contextmanager
+
+from storage.repository import TableNames
+from storage.sqlite_repository import SQLiteRepository
+
+
+def test_array_bound_lookups_span_chunks(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "push.db"), TableNames("", "np_"), array_chunk_size=2)
+    for i in range(5):
+        repository.create_user(f"user{i}", f"user{i}@example.com", "hash")
+        repository.upsert_device(i + 1, "phone", f"token-{i}")
+
+    resolved = repository.get_user_ids_by_usernames(["user0", "user3", "user4", "ghost"])
+    assert resolved == {"user0": 1, "user3": 4, "user4": 5}
+    assert sorted(repository.filter_existing_user_ids([1, 2, 3, 99, 5])) == [1, 2, 3, 5]
+    assert sorted(repository.get_tokens_by_user_ids([1, 2, 3, 4, 5])) == [(i + 1, f"token-{i}") for i in range(5)]
+    assert repository.statement_timings()["tokens_by_user_ids"]["calls"] == 3
+    repository.close()
+
+
+@contextmanager
+def recipients_api(api, login, **overrides):
+    """ana y bob comparten el token ``shared``; carl no tiene devices"""
+    with api(db_array_chunk_size=2, **overrides) as (client, ctx):
+        headers = {}
+        for name, tokens in (("ana", ["shared", "ana-phone"]), ("bob", ["shared", "bob-phone"]), ("carl", [])):
+            headers = login(client, name, tokens)
+        yield client, headers, ctx
+
+
+def test_push_to_lists_fans_out_once_with_unique_tokens(api, login):
+    with recipients_api(api, login) as (client, headers, ctx):
+        response = client.post("/send-push-notification", headers=headers, json={
+            "title": "Campaña", "body": "Hola",
+            "user_ids": [1, 3, 1], "usernames": ["bob", "ghost"], "user_id": 2,
+        })
+
+    body = response.json()
+    assert response.status_code == 200
+    # shared pertenece a ana y bob pero se envía una sola vez
+    assert sorted(token for token, _ in ctx.push_transport.sent) == ["ana-phone", "bob-phone", "shared"]
+    assert body["tokens_used"] == 3 and body["success_count"] == 3
+
+    recipients = body["recipients"]
+    assert [r.get("user_id") for r in recipients[:3]] == [2, 1, 3]
+    assert recipients[1] == {"user_id": 1, "status": "sent", "devices": 2, "success": 2, "failure": 0}
+    assert recipients[2]["status"] == "no_devices"
+    assert recipients[3] == {"username": "bob", "user_id": 2, "status": "sent", "devices": 2, "success": 2,
+                             "failure": 0}
+    assert recipients[4] == {"username": "ghost", "status": "not_found"}
+
+
+def test_recipient_limit(api, login):
+    with recipients_api(api, login, max_recipients=3) as (client, headers, _):
+        response = client.post("/send-push-notification", headers=headers, json={
+            "title": "Campaña", "body": "Hola", "user_ids": [1, 2], "usernames": ["ana", "bob"],
+        })
+        internal = client.post("/send-internal-notification", headers=headers, json={
+            "title": "Aviso", "message": "Hola", "user_ids": list(range(1, 5)),
+        })
+
+    assert response.status_code == 400
+    assert "max 3" in response.json()["detail"]
+    assert internal.status_code == 400
+
+
+def test_internal_notification_to_lists_skips_unknown_users(api, login):
+    with recipients_api(api, login) as (client, headers, ctx):
+        response = client.post("/send-internal-notification", headers=headers, json={
+            "title": "Aviso", "message": "Hola", "user_ids": [1, 42], "usernames": ["carl", "ghost", "ana"],
+        })
+        repository = ctx.get_repository()
+        inbox_sizes = [len(repository.list_internal_notifications(user_id)) for user_id in (1, 2, 3)]
+
+    body = response.json()
+    assert body["count"] == 2
+    assert inbox_sizes == [1, 0, 1]
+    assert body["recipients"] == [
+        {"user_id": 1, "status": "created"},
+        {"user_id": 42, "status": "not_found"},
+        {"username": "carl", "user_id": 3, "status": "created"},
+        {"username": "ghost", "status": "not_found"},
+        {"username": "ana", "user_id": 1, "status": "created"},
+    ]
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test de tracing por spans
+Verifica el anidamiento entre threads, la propagación de traceparent y el árbol de spans de un push
+"""
+
+import asyncio
+import json
+import time
+
+from services.tracing import (
+    FileSpanExporter, InMemorySpanExporter, parse_traceparent, record_span, span, start_trace,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def children(spans, parent):
+    return sorted((s for s in spans if s.parent_id == parent.span_id), key=lambda s: s.start_ns)
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID)
+    assert parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") == (None, None)
+    assert parse_traceparent("garbage") == (None, None)
+    assert parse_traceparent(None) == (None, None)
+
+
+def test_spans_nest_across_threads_and_export_with_root():
+    exporter = InMemorySpanExporter()
+
+    def blocking_stage():
+        with span("inner"):
+            record_span("leaf", time.time_ns())
+
+    async def scenario():
+        with start_trace("root", exporter) as root:
+            with span("stage", step=1):
+                await asyncio.to_thread(blocking_stage)
+            exported_before_root = len(exporter.spans)
+        return root, exported_before_root
+
+    root, exported_before_root = asyncio.run(scenario())
+    # Fuera de un trace los spans no hacen nada
+    with span("orphan") as orphan:
+        pass
+
+    by_name = {s.name: s for s in exporter.spans}
+    assert exported_before_root == 0
+    assert orphan is None
+    assert set(by_name) == {"root", "stage", "inner", "leaf"}
+    assert by_name["stage"].parent_id == root.span_id
+    assert by_name["inner"].parent_id == by_name["stage"].span_id
+    assert by_name["leaf"].parent_id == by_name["inner"].span_id
+    assert {s.trace_id for s in exporter.spans} == {root.trace_id}
+    assert by_name["stage"].attributes == {"step": 1}
+
+
+def test_file_exporter_writes_otlp_json_lines(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    exporter = FileSpanExporter(str(path), "test-service")
+    try:
+        with start_trace("root", exporter, f"00-{TRACE_ID}-{PARENT_ID}-01"):
+            with span("child", rows=3):
+                pass
+        try:
+            with start_trace("failing", exporter):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+    finally:
+        exporter.close()
+
+    first, second = [json.loads(line) for line in path.read_text().splitlines()]
+    resource = first["resourceSpans"][0]
+    spans = resource["scopeSpans"][0]["spans"]
+    assert resource["resource"]["attributes"][0]["value"]["stringValue"] == "test-service"
+    assert [s["name"] for s in spans] == ["child", "root"]
+    assert spans[1]["traceId"] == TRACE_ID and spans[1]["parentSpanId"] == PARENT_ID
+    assert spans[0]["attributes"] == [{"key": "rows", "value": {"intValue": "3"}}]
+    assert int(spans[1]["endTimeUnixNano"]) >= int(spans[1]["startTimeUnixNano"])
+    assert second["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["status"] == {
+        "code": 2, "message": "ValueError: boom"
+    }
+
+
+def test_push_request_span_tree(api, login):
+    with api(trace_exporter="memory") as (client, ctx):
+        headers = login(client, tokens=["tok-1", "tok-2"])
+        ctx.span_exporter.spans.clear()
+
+        response = client.post("/send-push-notification", json={"title": "t", "body": "b", "user_id": 1},
+                               headers={**headers, "traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+
+    spans = ctx.span_exporter.spans
+    [root] = [s for s in spans if s.parent_id == PARENT_ID]
+    stages = {s.name: s for s in children(spans, root)}
+
+    assert response.headers["X-Trace-Id"] == TRACE_ID
+    assert {s.trace_id for s in spans} == {TRACE_ID}
+    assert root.name == "POST /send-push-notification"
+    assert root.attributes["http.status_code"] == 200
+    assert {"auth.jwt_verify", "push.resolve_targets", "push.fanout", "push.log"} <= set(stages)
+
+    resolve = [s.name for s in children(spans, stages["push.resolve_targets"])]
+    assert "db.tokens_by_user_ids" in resolve
+    assert stages["push.resolve_targets"].attributes["tokens"] == 2
+
+    sends = children(spans, stages["push.fanout"])
+    assert [s.name for s in sends] == ["fcm.send", "fcm.send"]
+    assert sorted(s.attributes["token"] for s in sends) == ["tok-1", "tok-2"]
+    assert stages["push.fanout"].attributes["success"] == 2
+
+    assert [s.name for s in children(spans, stages["push.log"])] == ["db.insert_push_log", "db.commit"]
@@ -42,7 +42,7 @@ WHERE n.is_read = 0
 GROUP BY u.username
 ORDER BY unread_notifications DESC;
 
--- Ver estadísticas generales
+-- Ver estadísticas generales (recorre las tablas base; para dashboards usar stats_rollup o GET /stats)
 SELECT 
     (SELECT COUNT(*) FROM users) as total_users,
     (SELECT COUNT(*) FROM devices WHERE is_active = 1) as active_devices,
@@ -50,6 +50,26 @@ SELECT
     (SELECT COUNT(*) FROM push_notification_log WHERE sent_at >= SYSDATE - 1) as push_sent_last_24h
 FROM dual;
 
+-- Estadísticas desde los rollups: lectura por clave primaria, no depende del tamaño de las tablas
+SELECT bucket, metric, value, updated_at
+FROM stats_rollup
+WHERE bucket = 'total' OR bucket >= TO_CHAR(SYSDATE - 7, 'YYYY-MM-DD')
+ORDER BY bucket DESC, metric;
+
+-- Tasa de entrega y apertura de push (últimas 24 h, según los recibos de la app)
+SELECT 
+    COUNT(*) as sent,
+    COUNT(delivered_at) as delivered,
+    COUNT(opened_at) as opened,
+    ROUND(100 * COUNT(delivered_at) / NULLIF(COUNT(*), 0), 2) as delivery_rate_pct,
+    ROUND(100 * COUNT(opened_at) / NULLIF(COUNT(delivered_at), 0), 2) as open_rate_pct,
+    ROUND(AVG(EXTRACT(SECOND FROM (delivered_at - sent_at))
+        + 60 * EXTRACT(MINUTE FROM (delivered_at - sent_at))
+        + 3600 * EXTRACT(HOUR FROM (delivered_at - sent_at))), 1) as avg_delivery_seconds
+FROM push_notification_log
+WHERE sent_at >= SYSDATE - 1
+  AND status <> 'failed';
+
 -- ==========================================
 -- 2. CONSULTAS PARA TESTING
 -- ==========================================
@@ -97,9 +117,14 @@ WHERE is_read = 1
 AND read_at < SYSDATE - 30;
 
 -- Limpiar logs de push notifications más antiguos que 7 días
+-- (con la tabla particionada es mejor PUSH_LOG_RETENTION_DAYS: borra particiones enteras)
 DELETE FROM push_notification_log 
 WHERE sent_at < SYSDATE - 7;
 
+-- Borrar a mano una partición vencida (nombre y límite en la consulta de particiones de la sección 6);
+-- UPDATE GLOBAL INDEXES mantiene usable la PK
+-- ALTER TABLE push_notification_log DROP PARTITION "SYS_P1234" UPDATE GLOBAL INDEXES;
+
 -- ==========================================
 -- 4. CONSULTAS PARA INSERTAR DATOS DE PRUEBA
 -- ==========================================
@@ -208,6 +233,24 @@ WHERE segment_type = 'TABLE'
 AND segment_name IN ('USERS', 'DEVICES', 'INTERNAL_NOTIFICATIONS', 'PUSH_NOTIFICATION_LOG')
 ORDER BY bytes DESC;
 
+-- Particiones del historial: límite superior, filas (según estadísticas) y tamaño
+SELECT
+    p.table_name,
+    p.partition_position,
+    p.partition_name,
+    p.high_value,
+    p.num_rows,
+    ROUND(s.bytes/1024/1024, 2) as size_mb
+FROM user_tab_partitions p
+LEFT JOIN user_segments s ON s.segment_name = p.table_name AND s.partition_name = p.partition_name
+WHERE p.table_name IN ('INTERNAL_NOTIFICATIONS', 'PUSH_NOTIFICATION_LOG')
+ORDER BY p.table_name, p.partition_position;
+
+-- Índices locales inutilizables (no debería haber después de un DROP PARTITION)
+SELECT index_name, partition_name, status
+FROM user_ind_partitions
+WHERE status = 'UNUSABLE';
+
 -- Recompilar objetos inválidos (si los hay)
 BEGIN
     FOR cur IN (SELECT object_name, object_type FROM user_objects WHERE status = 'INVALID') LOOP
@@ -109,6 +109,8 @@ CREATE UNIQUE INDEX idx_devices_user_device ON devices(user_id, device_id);
 -- ==========================================
 -- Tabla: INTERNAL_NOTIFICATIONS
 -- Almacena notificaciones internas de la app
+-- Particionada por mes de created_at: la retención (NOTIFICATION_RETENTION_DAYS)
+-- borra particiones enteras y el inbox (created_at >= :since) solo lee las recientes
 -- ==========================================
 CREATE TABLE internal_notifications (
     id NUMBER(10) PRIMARY KEY,
@@ -121,13 +123,21 @@ CREATE TABLE internal_notifications (
     read_at TIMESTAMP,
     expires_at TIMESTAMP,
     metadata CLOB, -- JSON adicional si necesitas
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Clave de partición: NOT NULL (una fila sin fecha no tiene partición de intervalo)
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     CONSTRAINT fk_internal_notifications_user_id FOREIGN KEY (user_id) 
         REFERENCES users(id) ON DELETE CASCADE,
     CONSTRAINT chk_is_read CHECK (is_read IN (0, 1)),
     CONSTRAINT chk_priority_level CHECK (priority_level IN (1, 2, 3))
-);
+)
+-- Mensajes de hasta ~4000 bytes se guardan en la fila (sin segmento LOB aparte);
+-- CACHE porque el inbox los lee en cada polling
+LOB (message) STORE AS SECUREFILE (ENABLE STORAGE IN ROW CACHE)
+-- Oracle crea una partición por mes al insertar; p_initial solo ancla los intervalos
+-- y no se puede borrar (ORA-14758): la retención la salta
+PARTITION BY RANGE (created_at) INTERVAL (NUMTOYMINTERVAL(1, 'MONTH'))
+(PARTITION p_initial VALUES LESS THAN (TIMESTAMP '2024-01-01 00:00:00'));
 
 -- Trigger para auto-incrementar ID
 CREATE OR REPLACE TRIGGER trg_internal_notifications_id
@@ -154,16 +164,20 @@ BEGIN
 END;
 /
 
--- Índices para optimizar consultas
-CREATE INDEX idx_internal_notifications_user_id ON internal_notifications(user_id);
-CREATE INDEX idx_internal_notifications_is_read ON internal_notifications(is_read);
-CREATE INDEX idx_internal_notifications_created_at ON internal_notifications(created_at DESC);
-CREATE INDEX idx_internal_notifications_user_read ON internal_notifications(user_id, is_read);
-CREATE INDEX idx_internal_notifications_priority ON internal_notifications(priority_level, created_at DESC);
+-- Índices LOCAL (uno por partición): se borran con la partición y cada insert
+-- mantiene solo los segmentos del mes actual. La PK (id) queda global.
+-- El inbox (user_id = :1 AND created_at >= :2 ORDER BY created_at DESC) recorre
+-- idx_internal_notifications_user_created solo en las particiones desde :2
+CREATE INDEX idx_internal_notifications_user_created ON internal_notifications(user_id, created_at DESC) LOCAL;
+CREATE INDEX idx_internal_notifications_is_read ON internal_notifications(is_read) LOCAL;
+CREATE INDEX idx_internal_notifications_user_read ON internal_notifications(user_id, is_read) LOCAL;
+CREATE INDEX idx_internal_notifications_priority ON internal_notifications(priority_level, created_at DESC) LOCAL;
 
 -- ==========================================
 -- Tabla: PUSH_NOTIFICATION_LOG (Opcional)
 -- Para auditoría de notificaciones push enviadas
+-- Particionada por semana de sent_at: la retención (PUSH_LOG_RETENTION_DAYS) borra
+-- semanas enteras y los recibos (sent_at >= ahora - 28 días) leen unas 5 particiones
 -- ==========================================
 CREATE TABLE push_notification_log (
     id NUMBER(10) PRIMARY KEY,
@@ -174,15 +188,19 @@ CREATE TABLE push_notification_log (
     fcm_message_id VARCHAR2(255),
     status VARCHAR2(20) DEFAULT 'sent', -- sent, delivered, failed
     response_data CLOB, -- Respuesta de FCM
-    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL, -- Clave de partición
     delivered_at TIMESTAMP,
+    opened_at TIMESTAMP, -- El usuario tocó la notificación
     error_message VARCHAR2(500),
     CONSTRAINT fk_push_log_user_id FOREIGN KEY (user_id) 
         REFERENCES users(id) ON DELETE SET NULL,
     CONSTRAINT fk_push_log_device_id FOREIGN KEY (device_id) 
         REFERENCES devices(id) ON DELETE SET NULL,
     CONSTRAINT chk_push_status CHECK (status IN ('sent', 'delivered', 'failed'))
-);
+)
+LOB (body, response_data) STORE AS SECUREFILE (ENABLE STORAGE IN ROW)
+PARTITION BY RANGE (sent_at) INTERVAL (NUMTODSINTERVAL(7, 'DAY'))
+(PARTITION p_initial VALUES LESS THAN (TIMESTAMP '2024-01-01 00:00:00'));
 
 -- Crear secuencia para push_notification_log
 CREATE SEQUENCE seq_push_notification_log_id
@@ -202,11 +220,85 @@ BEGIN
 END;
 /
 
--- Índices para la tabla de log
-CREATE INDEX idx_push_log_user_id ON push_notification_log(user_id);
-CREATE INDEX idx_push_log_device_id ON push_notification_log(device_id);
-CREATE INDEX idx_push_log_sent_at ON push_notification_log(sent_at DESC);
-CREATE INDEX idx_push_log_status ON push_notification_log(status);
+-- Índices LOCAL para la tabla de log (la PK id queda global)
+CREATE INDEX idx_push_log_user_id ON push_notification_log(user_id, sent_at) LOCAL;
+CREATE INDEX idx_push_log_device_id ON push_notification_log(device_id) LOCAL;
+CREATE INDEX idx_push_log_sent_at ON push_notification_log(sent_at DESC) LOCAL;
+CREATE INDEX idx_push_log_status ON push_notification_log(status, sent_at) LOCAL;
+-- Los recibos de la app (POST /push-receipts) actualizan por fcm_message_id dentro
+-- de RECEIPT_WINDOW: un probe por partición de las últimas semanas
+CREATE INDEX idx_push_log_message_id ON push_notification_log(fcm_message_id) LOCAL;
+
+-- ==========================================
+-- Tabla: NOTIFICATION_SETTINGS
+-- Preferencias de push para notificaciones internas (digest y horario silencioso)
+-- ==========================================
+CREATE TABLE notification_settings (
+    user_id NUMBER(10) PRIMARY KEY,
+    push_enabled NUMBER(1) DEFAULT 0,
+    digest_window_seconds NUMBER(6) DEFAULT 0,
+    quiet_hours_start VARCHAR2(5), -- HH:MM
+    quiet_hours_end VARCHAR2(5), -- HH:MM
+    timezone VARCHAR2(64) DEFAULT 'UTC',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_notification_settings_user_id FOREIGN KEY (user_id)
+        REFERENCES users(id) ON DELETE CASCADE,
+    CONSTRAINT chk_notification_settings_push CHECK (push_enabled IN (0, 1))
+);
+
+-- ==========================================
+-- Tabla: REFRESH_TOKENS
+-- Refresh tokens rotativos de POST /token/refresh: se guarda solo el SHA-256.
+-- Cada rotación revoca la fila usada y crea otra en la misma familia (un login);
+-- las revocadas se guardan hasta vencer para detectar reusos
+-- ==========================================
+CREATE TABLE refresh_tokens (
+    id NUMBER(19) PRIMARY KEY,
+    user_id NUMBER(10) NOT NULL,
+    token_hash VARCHAR2(64) NOT NULL,
+    family_id VARCHAR2(32) NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_refresh_tokens_user_id FOREIGN KEY (user_id)
+        REFERENCES users(id) ON DELETE CASCADE,
+    CONSTRAINT uq_refresh_tokens_hash UNIQUE (token_hash)
+);
+
+CREATE SEQUENCE seq_refresh_tokens_id
+    START WITH 1
+    INCREMENT BY 1
+    NOCACHE
+    NOCYCLE;
+
+-- Trigger para auto-incrementar ID
+CREATE OR REPLACE TRIGGER trg_refresh_tokens_id
+    BEFORE INSERT ON refresh_tokens
+    FOR EACH ROW
+BEGIN
+    IF :NEW.id IS NULL THEN
+        :NEW.id := seq_refresh_tokens_id.NEXTVAL;
+    END IF;
+END;
+/
+
+-- Índices: familia (revocación), vencimiento (limpieza) y usuario (FK con ON DELETE CASCADE)
+CREATE INDEX idx_refresh_tokens_family ON refresh_tokens(family_id);
+CREATE INDEX idx_refresh_tokens_expires ON refresh_tokens(expires_at);
+CREATE INDEX idx_refresh_tokens_user_id ON refresh_tokens(user_id);
+
+-- ==========================================
+-- Tabla: STATS_ROLLUP
+-- Contadores para /stats: por día (bucket = 'YYYY-MM-DD') y totales (bucket = 'total')
+-- ==========================================
+CREATE TABLE stats_rollup (
+    bucket VARCHAR2(10) NOT NULL,
+    metric VARCHAR2(40) NOT NULL,
+    value NUMBER(19) DEFAULT 0 NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT pk_stats_rollup PRIMARY KEY (bucket, metric)
+)
+ORGANIZATION INDEX;
 
 -- ==========================================
 -- Comentarios en las tablas
@@ -226,8 +318,18 @@ COMMENT ON TABLE internal_notifications IS 'Notificaciones internas de la aplica
 COMMENT ON COLUMN internal_notifications.priority_level IS '1=Baja, 2=Media, 3=Alta';
 COMMENT ON COLUMN internal_notifications.is_read IS '1 = leída, 0 = no leída';
 COMMENT ON COLUMN internal_notifications.metadata IS 'Datos adicionales en formato JSON';
+COMMENT ON COLUMN internal_notifications.created_at IS 'Clave de partición (intervalo mensual)';
 
 COMMENT ON TABLE push_notification_log IS 'Log de notificaciones push enviadas';
+COMMENT ON COLUMN push_notification_log.sent_at IS 'Clave de partición (intervalo semanal)';
+
+COMMENT ON TABLE notification_settings IS 'Preferencias de push de notificaciones internas por usuario';
+COMMENT ON COLUMN notification_settings.digest_window_seconds IS '0 = un push por notificación, > 0 = un push de resumen por ventana';
+
+COMMENT ON TABLE refresh_tokens IS 'Refresh tokens rotativos (solo el hash SHA-256 del token)';
+COMMENT ON COLUMN refresh_tokens.family_id IS 'Tokens rotados desde un mismo login; el reuso de uno revocado revoca la familia';
+
+COMMENT ON TABLE stats_rollup IS 'Contadores incrementales de /stats, reconciliados periódicamente con las tablas base';
 
 -- ==========================================
 -- Datos de prueba (Opcional)
@@ -17,6 +17,9 @@ import 'dart:convert';
 Future<void> _firebaseMessagingBackgroundHandler(RemoteMessage message) async {
   await Firebase.initializeApp();
   print('🔔 Handling a background message: ${message.messageId}');
+  // El isolate de background puede terminar enseguida: se envía sin esperar al lote
+  NotificationService.reportReceipt(message.messageId);
+  await NotificationService.flushReceipts();
 }
 
 final FlutterLocalNotificationsPlugin flutterLocalNotificationsPlugin = FlutterLocalNotificationsPlugin();
@@ -168,6 +171,7 @@ class _AuthWrapperState extends State<AuthWrapper> {
       print('Title: ${message.notification?.title}');
       print('Body: ${message.notification?.body}');
       print('Data: ${message.data}');
+      NotificationService.reportReceipt(message.messageId);
 
       if (message.notification != null) {
         _showNotification(message);
@@ -179,6 +183,7 @@ class _AuthWrapperState extends State<AuthWrapper> {
       if (!mounted) return;
 
       print('🔔 A new onMessageOpenedApp event was published!');
+      NotificationService.reportReceipt(message.messageId, event: 'opened');
       _handleNotificationTap(message);
     });
 
@@ -186,6 +191,7 @@ class _AuthWrapperState extends State<AuthWrapper> {
     RemoteMessage? initialMessage = await messaging.getInitialMessage();
     if (initialMessage != null && mounted) {
       print('🔔 Got initial message on app launch!');
+      NotificationService.reportReceipt(initialMessage.messageId, event: 'opened');
       // Delay handling to ensure UI is ready
       WidgetsBinding.instance.addPostFrameCallback((_) {
         if (mounted) {
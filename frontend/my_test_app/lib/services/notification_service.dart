@@ -1,3 +1,4 @@
+import 'dart:async';
 import 'dart:convert';
 import 'package:flutter/material.dart';
 import 'package:http/http.dart' as http;
@@ -187,6 +188,62 @@ class NotificationService extends ChangeNotifier {
     }
   }
 
+  // Recibos de entrega/apertura: se juntan unos segundos y se envían en un solo POST
+  static final List<Map<String, dynamic>> _pendingReceipts = [];
+  static Timer? _receiptTimer;
+  static const Duration _receiptFlushDelay = Duration(seconds: 2);
+  static const int _maxReceiptBatch = 50;
+
+  static void reportReceipt(String? messageId, {String event = 'delivered'}) {
+    if (messageId == null || messageId.isEmpty) return;
+
+    _pendingReceipts.add({
+      'message_id': messageId,
+      'event': event,
+      'at': DateTime.now().toUtc().toIso8601String(),
+    });
+
+    if (_pendingReceipts.length >= _maxReceiptBatch) {
+      flushReceipts();
+    } else {
+      _receiptTimer ??= Timer(_receiptFlushDelay, flushReceipts);
+    }
+  }
+
+  static Future<void> flushReceipts() async {
+    _receiptTimer?.cancel();
+    _receiptTimer = null;
+    if (_pendingReceipts.isEmpty) return;
+
+    final receipts = List<Map<String, dynamic>>.from(_pendingReceipts);
+    _pendingReceipts.clear();
+
+    try {
+      SharedPreferences prefs = await SharedPreferences.getInstance();
+      String? token = prefs.getString('access_token');
+
+      if (token == null || token.isEmpty) {
+        print('⚠️ Dropping ${receipts.length} push receipts: No auth token');
+        return;
+      }
+
+      final response = await http.post(
+        Uri.parse('$baseUrl/push-receipts'),
+        headers: {'Authorization': 'Bearer $token', 'Content-Type': 'application/json'},
+        body: jsonEncode({'receipts': receipts}),
+      ).timeout(const Duration(seconds: 10));
+
+      if (response.statusCode == 202) {
+        print('📨 ${receipts.length} push receipts sent');
+      } else {
+        print('❌ Failed to send push receipts: ${response.statusCode}');
+      }
+    } catch (e) {
+      // Son métricas: no se reintentan
+      print('❌ Error sending push receipts: $e');
+    }
+  }
+
   void clearError() {
     _errorMessage = null;
     notifyListeners();